@@ -1,3 +1,2 @@
-from .main import create_app
-
-app = create_app()
+# The ASGI app is built in app.main (``uvicorn app.main:app``), not on package import, so
+# tools such as ``python -m app.db.migrations`` can run before the schema is up to date
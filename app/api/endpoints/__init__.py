@@ -3,4 +3,7 @@
 from .task_routes import TaskRoutes
 from .user_routes import UserRoutes
 from .pathfinder_routes import PathfinderRoutes
-from .text_generator_routes import TextGeneratorRoutes
\ No newline at end of file
+from .text_generator_routes import TextGeneratorRoutes
+from .metrics_routes import MetricsRoutes
+from .async_task_routes import AsyncTaskRoutes
+from .async_user_routes import AsyncUserRoutes
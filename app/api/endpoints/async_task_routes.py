@@ -0,0 +1,152 @@
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.security import OAuth2PasswordBearer
+from pydantic_core import to_json
+
+from app.crud.async_task_crud import AsyncTaskCRUD
+from app.crud.async_user_crud import AsyncUserCRUD
+from app.crud.task_crud import TASK_FIELDS, TaskVersionConflict
+from app.db.async_database import AsyncDatabase
+from .task_routes import NEXT_CURSOR_HEADER, VERSION_CONFLICT_DETAIL
+from ..schemas.task_schemas import TaskCreate, Task, TaskPatch
+from app.utils.auth_service import AuthService
+from app.utils.etags import request_etag, etag_matches, cache_headers, version_etag, if_match_versions
+from app.utils.fieldsets import parse_fields
+
+
+class AsyncTaskRoutes:
+    """
+    ``async def`` versions of the single-task and list routes of TaskRoutes.
+
+    Included ahead of TaskRoutes when ASYNC_DB_ENABLED is set, so these paths are served on
+    the event loop and bounded by the async pool size instead of the threadpool. Scoped to
+    the bearer token's user like TaskRoutes.
+    """
+
+    def __init__(self, async_db: AsyncDatabase, task_crud=AsyncTaskCRUD, user_crud=AsyncUserCRUD):
+        self.router = APIRouter()
+        self.async_db = async_db
+        self.task_crud = task_crud
+        self.user_crud = user_crud(async_db)
+        self.auth_service = AuthService(async_db)
+        self.oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+        async def get_owner_id(token: str = Depends(self.oauth2_scheme)) -> int:
+            # The user the request's task queries are scoped to; see TaskRoutes.owner_id. A token
+            # either route set verified before is answered from token_cache without a query
+            user = await self.auth_service.verify_token_async(token, self.user_crud.get_by_username)
+            return user.id
+
+        @self.router.post("/api/tasks/", response_model=Task)
+        async def create_task(task: TaskCreate, owner_id: int = Depends(get_owner_id)):
+            try:
+                return await self.task_crud(self.async_db, owner_id).create_task(task)
+            except Exception as e:
+                print(f"Failed to create task: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while creating the task.")
+
+        @self.router.get("/api/tasks/", response_model=list[Task])
+        async def read_tasks(request: Request,
+                             limit: int = Query(100, ge=1, le=1000),
+                             cursor: Optional[str] = None,
+                             status: Optional[str] = None,
+                             created_after: Optional[datetime] = None,
+                             created_before: Optional[datetime] = None,
+                             order: Literal["asc", "desc"] = "asc",
+                             fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+                             owner_id: int = Depends(get_owner_id)):
+            try:
+                selected = parse_fields(fields, TASK_FIELDS)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            try:
+                crud = self.task_crud(self.async_db, owner_id)
+                etag = request_etag(request, await crud.get_version(), owner_id)
+                if etag_matches(request.headers.get("If-None-Match"), etag):
+                    return Response(status_code=304, headers=cache_headers(etag))
+                rows, next_cursor = await crud.get_tasks_page(
+                    limit=limit, cursor=cursor, status=status, created_after=created_after,
+                    created_before=created_before, descending=order == "desc", fields=selected)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor.")
+            except Exception as e:
+                print(f"Failed to fetch tasks: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while fetching tasks.")
+            headers = cache_headers(etag)
+            if next_cursor:
+                headers[NEXT_CURSOR_HEADER] = next_cursor
+            return Response(content=to_json(rows), media_type="application/json", headers=headers)
+
+        @self.router.get("/api/tasks/{task_id:int}", response_model=Task)
+        async def read_task(task_id: int, request: Request, response: Response,
+                            fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+                            owner_id: int = Depends(get_owner_id)):
+            try:
+                selected = parse_fields(fields, TASK_FIELDS)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            try:
+                db_task = await self.task_crud(self.async_db, owner_id).get_task(task_id, selected)
+            except Exception as e:
+                print(f"Failed to fetch task: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while fetching the task.")
+            if db_task is None:
+                raise HTTPException(status_code=404, detail="Task not found.")
+            etag = version_etag(db_task["version"])
+            if etag_matches(request.headers.get("If-None-Match"), etag):
+                return Response(status_code=304, headers=cache_headers(etag))
+            if selected:
+                # Only the requested columns and the version were selected
+                content = {name: db_task[name] for name in selected}
+                return Response(content=to_json(content), media_type="application/json", headers=cache_headers(etag))
+            response.headers.update(cache_headers(etag))
+            return db_task
+
+        @self.router.put("/api/tasks/{task_id:int}", response_model=Task)
+        async def update_task(task_id: int, task: TaskCreate, response: Response,
+                              if_match: Optional[str] = Header(None),
+                              owner_id: int = Depends(get_owner_id)):
+            try:
+                crud = self.task_crud(self.async_db, owner_id)
+                db_task = await crud.update_task(task_id, task, if_match_versions(if_match))
+            except TaskVersionConflict as e:
+                raise HTTPException(status_code=409, detail=VERSION_CONFLICT_DETAIL,
+                                    headers={"ETag": version_etag(e.version)})
+            except Exception as e:
+                print(f"Failed to update task: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while updating the task.")
+            if db_task is None:
+                raise HTTPException(status_code=404, detail="Task not found.")
+            response.headers["ETag"] = version_etag(db_task["version"])
+            return db_task
+
+        @self.router.patch("/api/tasks/{task_id:int}", response_model=Task)
+        async def patch_task(task_id: int, task: TaskPatch, response: Response,
+                             if_match: Optional[str] = Header(None),
+                             owner_id: int = Depends(get_owner_id)):
+            try:
+                crud = self.task_crud(self.async_db, owner_id)
+                db_task = await crud.patch_task(task_id, task, if_match_versions(if_match))
+            except TaskVersionConflict as e:
+                raise HTTPException(status_code=409, detail=VERSION_CONFLICT_DETAIL,
+                                    headers={"ETag": version_etag(e.version)})
+            except Exception as e:
+                print(f"Failed to patch task: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while updating the task.")
+            if db_task is None:
+                raise HTTPException(status_code=404, detail="Task not found.")
+            response.headers["ETag"] = version_etag(db_task["version"])
+            return db_task
+
+        @self.router.delete("/api/tasks/{task_id:int}", status_code=204)
+        async def delete_task(task_id: int, owner_id: int = Depends(get_owner_id)):
+            try:
+                deleted = await self.task_crud(self.async_db, owner_id).delete_task(task_id)
+            except Exception as e:
+                print(f"Failed to delete task: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while deleting the task.")
+            if not deleted:
+                raise HTTPException(status_code=404, detail="Task not found.")
+            return Response(status_code=204)
@@ -0,0 +1,53 @@
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from pydantic_core import to_json
+
+from app.crud.async_user_crud import AsyncUserCRUD
+from app.crud.user_crud import USER_FIELDS
+from app.db.async_database import AsyncDatabase
+from ..schemas.user_schemas import UserCreate, User, UserBase
+from app.utils.etags import request_etag, etag_matches, cache_headers
+from app.utils.fieldsets import parse_fields
+from app.utils.auth_service import password_pool_busy
+from app.utils.passwords import PasswordPoolBusy
+
+
+class AsyncUserRoutes:
+    """``async def`` versions of the user listing and registration routes, included ahead of UserRoutes."""
+
+    def __init__(self, async_db: AsyncDatabase, user_crud=AsyncUserCRUD):
+        self.router = APIRouter()
+        self.user_crud = user_crud(async_db)
+
+        @self.router.get("/api/users/", response_model=list[User])
+        async def read_users(request: Request,
+                             fields: Optional[str] = Query(None, description="Comma separated fields to return")):
+            try:
+                selected = parse_fields(fields, USER_FIELDS)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            try:
+                etag = request_etag(request, await self.user_crud.get_version())
+                if etag_matches(request.headers.get("If-None-Match"), etag):
+                    return Response(status_code=304, headers=cache_headers(etag))
+                rows = await self.user_crud.get_user_rows(fields=selected)
+                return Response(content=to_json(rows), media_type="application/json", headers=cache_headers(etag))
+            except Exception as e:
+                logging.error(f"Failed to fetch users: {e}")
+                raise HTTPException(status_code=500, detail="An error occurred while fetching users.")
+
+        @self.router.post("/register/", response_model=UserBase)
+        async def register(user: UserCreate):
+            if await self.user_crud.get_by_username(user.username):
+                raise HTTPException(status_code=400, detail="Username already registered.")
+            if await self.user_crud.get_by_email(user.email):
+                raise HTTPException(status_code=400, detail="Email already registered.")
+            try:
+                return await self.user_crud.create_user(user)
+            except PasswordPoolBusy:
+                raise password_pool_busy()
+            except Exception as e:
+                logging.error(f"Failed to register user: {e}")
+                raise HTTPException(status_code=500, detail="An error occurred during registration.")
@@ -0,0 +1,19 @@
+import logging
+
+from fastapi import APIRouter, HTTPException
+
+from app.utils.metrics import collect_metrics
+
+
+class MetricsRoutes:
+    def __init__(self, collect=collect_metrics):
+        self.router = APIRouter()
+        self.collect = collect
+
+        @self.router.get("/api/metrics")
+        def read_metrics():
+            try:
+                return self.collect()
+            except Exception as e:
+                logging.error(f"Failed to collect metrics: {e}")
+                raise HTTPException(status_code=500, detail="An error occurred while collecting metrics.")
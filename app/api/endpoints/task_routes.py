@@ -1,26 +1,374 @@
-from fastapi import APIRouter, HTTPException
-from app.crud.task_crud import TaskCRUD
-from ..schemas.task_schemas import TaskCreate, Task
+import asyncio
+import itertools
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, Body, Depends, File, Header, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+from pydantic import BaseModel, ValidationError
+from pydantic_core import to_json
+from app.db.change_feed import ChangeHub, Subscription, task_changes
+from app.db.export import ExportsBusy
+from app.db.task_import import TaskImportError, import_format
+from app.crud.task_crud import TaskCRUD, TaskVersionConflict, TASK_FIELDS, TASK_EXPORT_COLUMNS
+from ..schemas.task_schemas import (TaskCreate, Task, TaskPatch, TaskBulkUpdate, TaskBulkDelete, BulkItemError,
+                                    TaskBulkResult, TaskBulkDeleteResult, TaskBoard, TaskImportResult, TaskMove,
+                                    MAX_BULK_ITEMS)
 from app.dependencies import Dependency
+from app.utils.export_formats import ndjson_chunks, csv_chunks
+from app.utils.etags import request_etag, etag_matches, cache_headers, version_etag, if_match_versions
+from app.utils.fieldsets import parse_fields
+from app.utils.sse import format_sse, SSE_KEEPALIVE
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+VERSION_CONFLICT_DETAIL = "The task was changed by another request; fetch it again and retry."
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Seconds of silence on a change stream before a keepalive is sent
+SSE_KEEPALIVE_INTERVAL = 15.0
 
 class TaskRoutes:
-    def __init__(self, dependency: Dependency, task_crud=TaskCRUD):
+    def __init__(self, dependency: Dependency, task_crud=TaskCRUD, change_hub: ChangeHub = task_changes):
         self.router = APIRouter()
-        self.db = dependency.get_db()
+        self.get_db = dependency.get_db
         self.task_crud = task_crud
+        self.change_hub = change_hub
+        self.db = dependency.db
+        self.auth_service = dependency.get_auth_service()
+        # Every task route needs a bearer token: a request without one gets a 401 before any query
+        self.oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+        def get_owner_id(token: str = Depends(self.oauth2_scheme), db=Depends(self.get_db)) -> int:
+            # The user the request's task queries are scoped to, on the request's connection
+            return self.owner_id(token)
+
+        def get_stream_owner_id(token: str = Depends(self.oauth2_scheme)) -> int:
+            # A stream runs for as long as the client listens, so it holds no pooled connection;
+            # the user is looked up on one of its own
+            with self.db.database.connection_context():
+                return self.owner_id(token)
 
         @self.router.post("/api/tasks/", response_model=Task)
-        def create_task(task: TaskCreate):
+        def create_task(task: TaskCreate, db=Depends(self.get_db), owner_id: int = Depends(get_owner_id)):
             try:
-                return self.task_crud(self.db).create_task(task)
+                return self.task_crud(db, owner_id).create_task(task)
             except Exception as e:
                 print(f"Failed to create task: {e}")  # Replace with proper logging in production
                 raise HTTPException(status_code=500, detail="An error occurred while creating the task.")
 
         @self.router.get("/api/tasks/", response_model=list[Task])
-        def read_tasks():
+        def read_tasks(request: Request,
+                       limit: int = Query(100, ge=1, le=1000),
+                       cursor: Optional[str] = None,
+                       status: Optional[str] = None,
+                       created_after: Optional[datetime] = None,
+                       created_before: Optional[datetime] = None,
+                       order: Literal["asc", "desc"] = "asc",
+                       fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+                       db=Depends(self.get_db), owner_id: int = Depends(get_owner_id)):
             try:
-                return self.task_crud(self.db).get_tasks()
+                selected = parse_fields(fields, TASK_FIELDS)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            try:
+                crud = self.task_crud(db, owner_id)
+                # Answer polling clients from the table version alone, before any row is read
+                etag = request_etag(request, crud.get_version(), owner_id)
+                if etag_matches(request.headers.get("If-None-Match"), etag):
+                    return Response(status_code=304, headers=cache_headers(etag))
+                rows, next_cursor = crud.get_tasks_page(
+                    limit=limit, cursor=cursor, status=status, created_after=created_after,
+                    created_before=created_before, descending=order == "desc", fields=selected)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor.")
             except Exception as e:
-                print(f"Failed to create task: {e}")  # Replace with proper logging in production
+                print(f"Failed to fetch tasks: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while fetching tasks.")
+            # Rows are already shaped like the response model, so skip validation and encode directly
+            headers = cache_headers(etag)
+            if next_cursor:
+                headers[NEXT_CURSOR_HEADER] = next_cursor
+            return Response(content=to_json(rows), media_type="application/json", headers=headers)
+
+        @self.router.post("/api/tasks/import", response_model=TaskImportResult)
+        def import_tasks(file: UploadFile = File(..., description="CSV with a header line, or NDJSON"),
+                         format: Optional[Literal["csv", "ndjson"]] = Query(
+                             None, description="Defaults to the extension of the uploaded file name"),
+                         db=Depends(self.get_db), owner_id: int = Depends(get_owner_id)):
+            # The upload is spooled to disk by the form parser and read from there row by row
+            format = format or import_format(file.filename)
+            if format is None:
+                raise HTTPException(status_code=400, detail="Unknown upload format, pass format=csv or format=ndjson.")
+            try:
+                imported = self.task_crud(db, owner_id).import_tasks(file.file, format)
+            except TaskImportError as e:
+                raise HTTPException(status_code=422, detail=e.errors)
+            except Exception as e:
+                print(f"Failed to import tasks: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while importing tasks.")
+            return TaskImportResult(imported=imported)
+
+        @self.router.get("/api/tasks/search", response_model=list[Task])
+        def search_tasks(q: str = Query(..., min_length=1, max_length=200),
+                         limit: int = Query(20, ge=1, le=100),
+                         cursor: Optional[str] = None,
+                         db=Depends(self.get_db), owner_id: int = Depends(get_owner_id)):
+            try:
+                rows, next_cursor = self.task_crud(db, owner_id).search_tasks(q, limit=limit, cursor=cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor.")
+            except Exception as e:
+                print(f"Failed to search tasks: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while searching tasks.")
+            headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+            return Response(content=to_json(rows), media_type="application/json", headers=headers)
+
+        @self.router.get("/api/tasks/board", response_model=TaskBoard)
+        def read_task_board(request: Request,
+                            limit: int = Query(20, ge=1, le=100, description="Tasks listed per status"),
+                            db=Depends(self.get_db), owner_id: int = Depends(get_owner_id)):
+            try:
+                crud = self.task_crud(db, owner_id)
+                etag = request_etag(request, crud.get_version(), owner_id)
+                if etag_matches(request.headers.get("If-None-Match"), etag):
+                    return Response(status_code=304, headers=cache_headers(etag))
+                columns = crud.get_board(limit)
+            except Exception as e:
+                print(f"Failed to load task board: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while loading the task board.")
+            return Response(content=to_json({"columns": columns}), media_type="application/json",
+                            headers=cache_headers(etag))
+
+        @self.router.get("/api/tasks/column", response_model=list[Task])
+        def read_task_column(request: Request,
+                             status: str = Query(..., min_length=1),
+                             limit: int = Query(100, ge=1, le=1000),
+                             cursor: Optional[str] = None,
+                             db=Depends(self.get_db), owner_id: int = Depends(get_owner_id)):
+            # One board column in its manual order, continuing from a board's next_cursor
+            try:
+                crud = self.task_crud(db, owner_id)
+                etag = request_etag(request, crud.get_version(), owner_id)
+                if etag_matches(request.headers.get("If-None-Match"), etag):
+                    return Response(status_code=304, headers=cache_headers(etag))
+                rows, next_cursor = crud.get_column_page(status, limit=limit, cursor=cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor.")
+            except Exception as e:
+                print(f"Failed to fetch task column: {e}")  # Replace with proper logging in production
                 raise HTTPException(status_code=500, detail="An error occurred while fetching tasks.")
+            headers = cache_headers(etag)
+            if next_cursor:
+                headers[NEXT_CURSOR_HEADER] = next_cursor
+            return Response(content=to_json(rows), media_type="application/json", headers=headers)
+
+        @self.router.get("/api/tasks/export")
+        def export_tasks(format: Literal["ndjson", "csv"] = "ndjson",
+                         status: Optional[str] = None,
+                         created_after: Optional[datetime] = None,
+                         created_before: Optional[datetime] = None,
+                         db=Depends(self.get_db), owner_id: int = Depends(get_owner_id)):
+            # The export reads through a connection of its own, so this one goes back before streaming
+            try:
+                batches = self.task_crud(db, owner_id).export_tasks(
+                    status=status, created_after=created_after, created_before=created_before)
+                if format == "csv":
+                    chunks = csv_chunks(batches, [column.name for column in TASK_EXPORT_COLUMNS])
+                else:
+                    chunks = ndjson_chunks(batches)
+                # Pull the first chunk here so a failing query is still a 500, not a truncated 200
+                first = next(chunks, b"")
+            except ExportsBusy:
+                raise HTTPException(status_code=503, detail="Too many exports in progress, please retry.",
+                                    headers={"Retry-After": "1"})
+            except Exception as e:
+                print(f"Failed to export tasks: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while exporting tasks.")
+            return StreamingResponse(
+                itertools.chain([first], chunks), media_type=EXPORT_MEDIA_TYPES[format],
+                headers={"Content-Disposition": f'attachment; filename="tasks.{format}"'})
+
+        @self.router.get("/api/tasks/changes")
+        async def task_change_feed(request: Request,
+                                   last_event_id: Optional[str] = Query(None, description="Resume after this event id"),
+                                   last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+                                   owner_id: int = Depends(get_stream_owner_id)):
+            # EventSource resends the last id it saw as a header when it reconnects by itself
+            subscription = self.change_hub.subscribe(last_event_id_header or last_event_id)
+            return StreamingResponse(self.sse_events(request, subscription, owner_id), media_type="text/event-stream",
+                                     headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+        # The :int convertor keeps these routes from matching /api/tasks/bulk
+        @self.router.get("/api/tasks/{task_id:int}", response_model=Task)
+        def read_task(task_id: int, request: Request, response: Response,
+                      fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+                      db=Depends(self.get_db), owner_id: int = Depends(get_owner_id)):
+            try:
+                selected = parse_fields(fields, TASK_FIELDS)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            try:
+                crud = self.task_crud(db, owner_id)
+                # Requested fields are selected alone, past task_cache; the whole row goes through it
+                db_task = crud.get_task_fields(task_id, selected) if selected else crud.get_task(task_id)
+            except Exception as e:
+                print(f"Failed to fetch task: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while fetching the task.")
+            if db_task is None:
+                raise HTTPException(status_code=404, detail="Task not found.")
+            # The row version, so the same ETag can be sent back in If-Match to update the task
+            etag = version_etag(db_task.pop("version") if selected else db_task.version)
+            if etag_matches(request.headers.get("If-None-Match"), etag):
+                return Response(status_code=304, headers=cache_headers(etag))
+            if selected:
+                # The row is already shaped like the requested fields, so encode it directly
+                return Response(content=to_json(db_task), media_type="application/json", headers=cache_headers(etag))
+            response.headers.update(cache_headers(etag))
+            return db_task
+
+        @self.router.put("/api/tasks/{task_id:int}", response_model=Task)
+        def update_task(task_id: int, task: TaskCreate, response: Response,
+                        if_match: Optional[str] = Header(None), db=Depends(self.get_db),
+                        owner_id: int = Depends(get_owner_id)):
+            try:
+                db_task = self.task_crud(db, owner_id).update_task(task_id, task, if_match_versions(if_match))
+            except TaskVersionConflict as e:
+                raise HTTPException(status_code=409, detail=VERSION_CONFLICT_DETAIL,
+                                    headers={"ETag": version_etag(e.version)})
+            except Exception as e:
+                print(f"Failed to update task: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while updating the task.")
+            if db_task is None:
+                raise HTTPException(status_code=404, detail="Task not found.")
+            response.headers["ETag"] = version_etag(db_task.version)
+            return db_task
+
+        @self.router.patch("/api/tasks/{task_id:int}", response_model=Task)
+        def patch_task(task_id: int, task: TaskPatch, response: Response,
+                       if_match: Optional[str] = Header(None), db=Depends(self.get_db),
+                       owner_id: int = Depends(get_owner_id)):
+            try:
+                db_task = self.task_crud(db, owner_id).patch_task(task_id, task, if_match_versions(if_match))
+            except TaskVersionConflict as e:
+                raise HTTPException(status_code=409, detail=VERSION_CONFLICT_DETAIL,
+                                    headers={"ETag": version_etag(e.version)})
+            except Exception as e:
+                print(f"Failed to patch task: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while updating the task.")
+            if db_task is None:
+                raise HTTPException(status_code=404, detail="Task not found.")
+            response.headers["ETag"] = version_etag(db_task.version)
+            return db_task
+
+        @self.router.post("/api/tasks/{task_id:int}/move", response_model=Task)
+        def move_task(task_id: int, move: TaskMove, response: Response,
+                      if_match: Optional[str] = Header(None), db=Depends(self.get_db),
+                      owner_id: int = Depends(get_owner_id)):
+            try:
+                db_task = self.task_crud(db, owner_id).move_task(task_id, move, if_match_versions(if_match))
+            except TaskVersionConflict as e:
+                raise HTTPException(status_code=409, detail=VERSION_CONFLICT_DETAIL,
+                                    headers={"ETag": version_etag(e.version)})
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except Exception as e:
+                print(f"Failed to move task: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while moving the task.")
+            if db_task is None:
+                raise HTTPException(status_code=404, detail="Task not found.")
+            response.headers["ETag"] = version_etag(db_task.version)
+            return db_task
+
+        @self.router.delete("/api/tasks/{task_id:int}", status_code=204)
+        def delete_task(task_id: int, db=Depends(self.get_db), owner_id: int = Depends(get_owner_id)):
+            try:
+                deleted = self.task_crud(db, owner_id).delete_task(task_id)
+            except Exception as e:
+                print(f"Failed to delete task: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while deleting the task.")
+            if not deleted:
+                raise HTTPException(status_code=404, detail="Task not found.")
+            return Response(status_code=204)
+
+        @self.router.post("/api/tasks/bulk", response_model=TaskBulkResult)
+        def create_tasks(items: List[Dict[str, Any]] = Body(..., min_length=1, max_length=MAX_BULK_ITEMS),
+                         db=Depends(self.get_db), owner_id: int = Depends(get_owner_id)):
+            valid, errors = self.validate_bulk_items(items, TaskCreate)
+            try:
+                tasks = self.task_crud(db, owner_id).create_tasks([task for _, task in valid]) if valid else []
+            except Exception as e:
+                print(f"Failed to bulk create tasks: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while creating the tasks.")
+            return TaskBulkResult(tasks=tasks, errors=errors)
+
+        @self.router.put("/api/tasks/bulk", response_model=TaskBulkResult)
+        def update_tasks(items: List[Dict[str, Any]] = Body(..., min_length=1, max_length=MAX_BULK_ITEMS),
+                         db=Depends(self.get_db), owner_id: int = Depends(get_owner_id)):
+            valid, errors = self.validate_bulk_items(items, TaskBulkUpdate)
+            try:
+                tasks = self.task_crud(db, owner_id).update_tasks([task for _, task in valid]) if valid else []
+            except Exception as e:
+                print(f"Failed to bulk update tasks: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while updating the tasks.")
+            updated_ids = {task["id"] for task in tasks}
+            errors += [BulkItemError(index=index, id=task.id, detail="Task not found.")
+                       for index, task in valid if task.id not in updated_ids]
+            return TaskBulkResult(tasks=tasks, errors=sorted(errors, key=lambda error: error.index))
+
+        @self.router.delete("/api/tasks/bulk", response_model=TaskBulkDeleteResult)
+        def delete_tasks(request: TaskBulkDelete, db=Depends(self.get_db),
+                         owner_id: int = Depends(get_owner_id)):
+            try:
+                deleted = self.task_crud(db, owner_id).delete_tasks(list(dict.fromkeys(request.ids)))
+            except Exception as e:
+                print(f"Failed to bulk delete tasks: {e}")  # Replace with proper logging in production
+                raise HTTPException(status_code=500, detail="An error occurred while deleting the tasks.")
+            deleted_ids = set(deleted)
+            errors = [BulkItemError(index=index, id=task_id, detail="Task not found.")
+                      for index, task_id in enumerate(request.ids) if task_id not in deleted_ids]
+            return TaskBulkDeleteResult(deleted=deleted, errors=errors)
+
+    def owner_id(self, token: str) -> int:
+        """Id of the user a bearer token belongs to. Raises a 401."""
+        return self.auth_service.verify_token(token).id
+
+    async def sse_events(self, request: Request, subscription: Subscription, owner_id: int):
+        """
+        Stream a subscription as server-sent events until the client disconnects. Only changes
+        to ``owner_id``'s tasks are sent, and resets.
+        """
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield SSE_KEEPALIVE
+                    continue
+                if event["op"] != "reset" and event.get("owner_id") != owner_id:
+                    continue
+                yield format_sse(event)
+        finally:
+            self.change_hub.unsubscribe(subscription)
+
+    def validate_bulk_items(self, items: List[Dict[str, Any]], schema: type[BaseModel]
+                            ) -> Tuple[List[Tuple[int, BaseModel]], List[BulkItemError]]:
+        """Validate bulk items one by one so a bad item is reported instead of failing the whole request."""
+        valid, errors, seen_ids = [], [], set()
+        for index, item in enumerate(items):
+            try:
+                model = schema.model_validate(item)
+            except ValidationError as e:
+                detail = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+                item_id = item.get("id")
+                errors.append(BulkItemError(index=index, id=item_id if isinstance(item_id, int) else None, detail=detail))
+                continue
+            task_id = getattr(model, "id", None)
+            if task_id is not None:
+                if task_id in seen_ids:
+                    errors.append(BulkItemError(index=index, id=task_id, detail="Duplicate id in request."))
+                    continue
+                seen_ids.add(task_id)
+            valid.append((index, model))
+        return valid, errors
@@ -1,44 +1,77 @@
 import logging
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
+from peewee import IntegrityError
+from pydantic_core import to_json
 
-from app.crud.user_crud import UserCRUD
+from app.crud.user_crud import UserCRUD, USER_FIELDS
 from ..schemas.user_schemas import UserCreate, User, TokenResponse, UserBase
 from app.dependencies import Dependency
 from app.models.user_models import User as UserModel
+from app.utils.etags import request_etag, etag_matches, cache_headers
+from app.utils.fieldsets import parse_fields
+from app.utils.auth_service import credentials_exception, password_pool_busy
+from app.utils.passwords import PasswordPoolBusy
 
 class UserRoutes:
     def __init__(self, dependency: Dependency, user_crud=UserCRUD):
         self.router = APIRouter()
-        self.db = dependency.get_db()
-        self.user_crud = user_crud(self.db)
+        self.db = dependency.db
+        self.get_db = dependency.get_db
+        self.user_crud = user_crud
         self.auth_service = dependency.get_auth_service()
         self.oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
         @self.router.get("/api/users/", response_model=list[User])
-        def read_users():
+        def read_users(request: Request,
+                       fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+                       db=Depends(self.get_db)):
             try:
-                return self.user_crud.get_users()
+                selected = parse_fields(fields, USER_FIELDS)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            try:
+                crud = self.user_crud(db)
+                # Answer polling clients from the table version alone, before any row is read
+                etag = request_etag(request, crud.get_version())
+                if etag_matches(request.headers.get("If-None-Match"), etag):
+                    return Response(status_code=304, headers=cache_headers(etag))
+                # Rows are already shaped like the response model, so skip validation and encode directly
+                rows = crud.get_user_rows(fields=selected)
+                return Response(content=to_json(rows), media_type="application/json", headers=cache_headers(etag))
             except Exception as e:
                 logging.error(f"Failed to fetch users: {e}")
                 raise HTTPException(status_code=500, detail="An error occurred while fetching users.")
 
         @self.router.post("/register/", response_model=UserBase)
         def register(user: UserCreate):
-            if self.user_crud.get_by_username(user.username):
-                raise HTTPException(status_code=400, detail="Username already registered.")
-            if self.user_crud.get_by_email(user.email):
-                raise HTTPException(status_code=400, detail="Email already registered.")
+            # Connections are held for the lookups and the insert only, each on a connection of
+            # its own: the password hash between them takes far longer and needs none
+            crud = self.user_crud(self.db.database)
+            with self.db.database.connection_context():
+                if crud.get_by_username(user.username):
+                    raise HTTPException(status_code=400, detail="Username already registered.")
+                if crud.get_by_email(user.email):
+                    raise HTTPException(status_code=400, detail="Email already registered.")
             try:
-                return self.user_crud.create_user(user)
+                password_hash = crud.hash_password(user.password)
+                with self.db.database.connection_context():
+                    return crud.create_user(user, password_hash=password_hash)
+            except IntegrityError:
+                # Registered by a concurrent request since the lookups
+                raise HTTPException(status_code=400, detail="Username or email already registered.")
+            except PasswordPoolBusy:
+                raise password_pool_busy()
             except Exception as e:
                 logging.error(f"Failed to register user: {e}")
                 raise HTTPException(status_code=500, detail="An error occurred during registration.")
 
         @self.router.post("/login/", response_model=TokenResponse)
         def login(login_request: OAuth2PasswordRequestForm = Depends()):
+            # authenticate_user holds a connection for the user lookup only, not for the Argon2 check
             try:
                 user = self.auth_service.authenticate_user(login_request.username, login_request.password)
                 if isinstance(user, UserModel):
@@ -48,14 +81,37 @@ class UserRoutes:
                     raise HTTPException(status_code=401, detail="Invalid credentials")
             except HTTPException as e:
                 raise e
+            except PasswordPoolBusy:
+                raise password_pool_busy()
             except Exception as e:
                 logging.error(f"Login failed: {e}")
                 raise HTTPException(status_code=500, detail="An error occurred during login")
 
         @self.router.get("/users/me/", response_model=UserBase)
-        def read_users_me(token: str = Depends(self.oauth2_scheme)):
+        def read_users_me(token: str = Depends(self.oauth2_scheme),
+                          fields: Optional[str] = Query(None, description="Comma separated fields to return")):
+            # A token verified before is answered from the token cache, so this holds no pooled
+            # connection; only a new token has its user looked up, on a connection of its own.
+            # Requested fields are selected alone, past the token cache, which holds whole rows
+            try:
+                selected = parse_fields(fields, UserBase.model_fields)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
             try:
-                return self.auth_service.verify_token(token)
+                if selected:
+                    username = self.auth_service.token_subject(token)
+                    with self.db.database.connection_context():
+                        row = self.user_crud(self.db.database).get_user_fields(username, selected)
+                    if row is None:
+                        raise credentials_exception()
+                    return Response(content=to_json(row), media_type="application/json")
+                user = self.auth_service.cached_user(token)
+                if user is None:
+                    with self.db.database.connection_context():
+                        user = self.auth_service.verify_token(token)
+                return user
+            except HTTPException as e:
+                raise e
             except Exception as e:
                 logging.error(f"Failed to retrieve user info: {e}")
                 raise HTTPException(status_code=500, detail="Failed to retrieve user info")
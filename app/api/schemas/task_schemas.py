@@ -1,6 +1,11 @@
+from datetime import datetime
 from enum import Enum
+from typing import List, Optional
 
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, field_validator, model_validator
+
+# Upper bound on the number of items accepted by a single bulk request
+MAX_BULK_ITEMS = 1000
 
 class TaskBase(BaseModel):
     title: str = Field(max_length=100)
@@ -17,4 +22,63 @@ class Task(TaskBase):
 
     model_config = ConfigDict(from_attributes=True)  # Updated from 'orm_mode'
 
+class TaskPatch(BaseModel):
+    # Only the fields present in the request are written
+    title: Optional[str] = Field(None, max_length=100)
+    description: Optional[str] = None
+    status: Optional[str] = None
+
+    @field_validator('title', 'status')
+    def reject_null(cls, value):
+        if value is None:
+            raise ValueError('Field cannot be null.')
+        return value
+
+class TaskBulkUpdate(TaskBase):
+    id: int
+
+class TaskBulkDelete(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+
+class BulkItemError(BaseModel):
+    index: int  # Position of the item in the request
+    id: Optional[int] = None
+    detail: str
+
+class TaskBulkResult(BaseModel):
+    tasks: List[Task] = []
+    errors: List[BulkItemError] = []
+
+class TaskBulkDeleteResult(BaseModel):
+    deleted: List[int] = []
+    errors: List[BulkItemError] = []
+
+class TaskImportRow(TaskCreate):
+    # Rows from other tools often have no description, and keep their own creation time
+    description: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class TaskImportResult(BaseModel):
+    imported: int
+
+class TaskBoardColumn(BaseModel):
+    status: str
+    count: int  # Every task with this status, not just the ones listed
+    tasks: List[Task] = []
+    next_cursor: Optional[str] = None  # Continues the column through GET /api/tasks/column?status=...
+
+class TaskBoard(BaseModel):
+    columns: List[TaskBoardColumn] = []
+
+class TaskMove(BaseModel):
+    # Right after one task or right before another; at the top of the column without either.
+    # The column is the task's own status unless status moves it to another one
+    status: Optional[str] = None
+    after_id: Optional[int] = None
+    before_id: Optional[int] = None
 
+    @model_validator(mode='after')
+    def one_anchor(self):
+        if self.after_id is not None and self.before_id is not None:
+            raise ValueError('Give after_id or before_id, not both.')
+        return self
@@ -1,13 +1,26 @@
-from app.db.database import database_instance
-from app.models.task_models import Task
-from app.models.user_models import User
+import os
+
+from app.db.change_feed import get_change_listener, task_changes
+from app.db.migrations import check_schema, upgrade
+
+# What startup does about the schema: 'check' that it is at the version this build needs,
+# 'migrate' it first (local development), or 'skip' it entirely (extra workers)
+DB_SCHEMA_MODE = os.getenv('DB_SCHEMA_MODE', 'check')
 
 
 class AppInitializer:
-    def __init__(self, app, db):
+    def __init__(self, app, db, schema_mode: str = DB_SCHEMA_MODE):
         self.app = app
         self.db = db
+        self.schema_mode = schema_mode
 
     def initialize(self):
         self.app.state.db = self.db
-        self.db.create_tables([Task, User])  # Create your models here
\ No newline at end of file
+        # Schema changes are applied by `python -m app.db.migrations upgrade` ahead of a deploy
+        if self.schema_mode == 'migrate':
+            upgrade(self.db)
+        elif self.schema_mode != 'skip':
+            # Returns the connection to the pool once the check is done instead of leaving it checked out
+            with self.db.connection_context():
+                check_schema(self.db)
+        task_changes.attach(get_change_listener(self.db, task_changes))  # Started by the first /api/tasks/changes subscriber
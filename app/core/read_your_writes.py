@@ -0,0 +1,46 @@
+# app/core/read_your_writes.py
+import math
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+from app.db.routing import PRIMARY_STICKY_COOKIE, PRIMARY_STICKY_SECONDS, begin_session
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Keeps a client's reads on the primary for a while after it wrote.
+
+    Each request starts a routing session from the client's ``db_primary_until`` cookie.
+    When the request wrote, the response renews the cookie, so the client's next requests
+    read from the primary until the replicas have had time to catch up. Plain ASGI rather
+    than BaseHTTPMiddleware, so streamed responses are passed through untouched.
+    """
+
+    def __init__(self, app, sticky_seconds: float = PRIMARY_STICKY_SECONDS):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        session = begin_session(self._sticky_until(scope))
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and session["wrote"]:
+                until = time.time() + self.sticky_seconds
+                MutableHeaders(scope=message).append(
+                    "set-cookie", f"{PRIMARY_STICKY_COOKIE}={until:.3f}; Max-Age={math.ceil(self.sticky_seconds)}; "
+                                  f"Path=/; HttpOnly; SameSite=Lax")
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+    @staticmethod
+    def _sticky_until(scope) -> float:
+        try:
+            return float(HTTPConnection(scope).cookies.get(PRIMARY_STICKY_COOKIE, 0))
+        except ValueError:
+            return 0.0
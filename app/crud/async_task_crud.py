@@ -0,0 +1,92 @@
+from datetime import datetime
+from typing import Optional, List, Sequence, Tuple
+
+from app.api.schemas.task_schemas import TaskCreate, TaskPatch
+from app.crud.task_crud import (TASK_FIELDS, TASK_RESPONSE_COLUMNS, TaskVersionConflict, task_cache, page_query,
+                                 page_result)
+from app.db.async_database import AsyncDatabase
+from app.db.audit import audit_log
+from app.models.table_version_models import TableVersion
+from app.models.task_models import Task
+
+
+class AsyncTaskCRUD:
+    """
+    Awaitable counterpart of TaskCRUD for async handlers; rows come back as response-shaped dicts.
+    Scoped to ``owner_id`` like TaskCRUD.
+    """
+
+    def __init__(self, db: AsyncDatabase, owner_id: Optional[int] = None):
+        self.db = db
+        self.owner_id = owner_id
+
+    async def create_task(self, task: TaskCreate) -> dict:
+        row = task.model_dump()
+        if self.owner_id is not None:
+            row['owner'] = self.owner_id
+        created = await self.db.fetch_one(Task.insert(**row).returning(*TASK_RESPONSE_COLUMNS))
+        self._audit('create', created['id'], task.model_dump())
+        return created
+
+    async def get_tasks_page(self, limit: int, cursor: Optional[str] = None, status: Optional[str] = None,
+                             created_after: Optional[datetime] = None, created_before: Optional[datetime] = None,
+                             descending: bool = False, fields: Optional[Sequence[str]] = None
+                             ) -> Tuple[List[dict], Optional[str]]:
+        """See TaskCRUD.get_tasks_page. Raises ValueError on a bad cursor."""
+        query, cursor_only = page_query(limit, cursor, status, created_after, created_before, descending, fields,
+                                        self.owner_id)
+        return page_result(await self.db.fetch_all(query), limit, cursor_only)
+
+    async def get_version(self) -> int:
+        row = await self.db.fetch_one(TableVersion.current_query(Task._meta.table_name))
+        return row['version']
+
+    async def get_task(self, task_id: int, fields: Optional[Sequence[str]] = None) -> Optional[dict]:
+        # The version is only read for the ETag; response_model leaves it out of the body.
+        # ``fields`` narrows the SELECT list to those TASK_FIELDS names
+        columns = [TASK_FIELDS[name] for name in fields] if fields else TASK_RESPONSE_COLUMNS
+        query = Task.select(*columns, Task.version).where(self._scope(Task.id == task_id))
+        return await self.db.fetch_one(query)
+
+    async def update_task(self, task_id: int, task_data: TaskCreate,
+                          expected_versions: Optional[Sequence[int]] = None) -> Optional[dict]:
+        """See TaskCRUD.update_task. Raises TaskVersionConflict."""
+        return await self._update_columns(task_id, task_data.model_dump(), expected_versions)
+
+    async def patch_task(self, task_id: int, task_data: TaskPatch,
+                         expected_versions: Optional[Sequence[int]] = None) -> Optional[dict]:
+        changes = task_data.model_dump(exclude_unset=True)
+        if not changes:
+            row = await self.get_task(task_id)
+            if row is not None and expected_versions is not None and row['version'] not in expected_versions:
+                raise TaskVersionConflict(row['version'])
+            return row
+        return await self._update_columns(task_id, changes, expected_versions)
+
+    async def delete_task(self, task_id: int) -> bool:
+        deleted = await self.db.fetch_all(Task.delete().where(self._scope(Task.id == task_id)).returning(Task.id))
+        task_cache.invalidate(task_id)  # The sync path may still hold the row
+        if deleted:
+            self._audit('delete', task_id)
+        return len(deleted) > 0
+
+    async def _update_columns(self, task_id: int, changes: dict,
+                              expected_versions: Optional[Sequence[int]] = None) -> Optional[dict]:
+        query = Task.update(**changes, version=Task.version + 1).where(self._scope(Task.id == task_id))
+        if expected_versions is not None:
+            query = query.where(Task.version.in_(list(expected_versions)))
+        row = await self.db.fetch_one(query.returning(*TASK_RESPONSE_COLUMNS, Task.version))
+        task_cache.invalidate(task_id)
+        if row is not None:
+            self._audit('update', task_id, changes)
+        if row is None and expected_versions is not None:
+            current = await self.db.fetch_one(Task.select(Task.version).where(self._scope(Task.id == task_id)))
+            if current is not None:
+                raise TaskVersionConflict(current['version'])
+        return row
+
+    def _audit(self, action: str, task_id: int, changes: Optional[dict] = None):
+        audit_log.record(action, 'task', task_id, self.owner_id, changes)
+
+    def _scope(self, condition):
+        return condition if self.owner_id is None else condition & (Task.owner == self.owner_id)
@@ -0,0 +1,40 @@
+from typing import Optional, List, Sequence
+
+from app.api.schemas.user_schemas import UserCreate
+from app.crud.user_crud import USER_RESPONSE_COLUMNS, USER_FIELDS, audit_changes, user_cache
+from app.db.async_database import AsyncDatabase
+from app.db.audit import audit_log
+from app.models.table_version_models import TableVersion
+from app.models.user_models import User
+from app.utils.passwords import password_pool
+
+
+class AsyncUserCRUD:
+    """Awaitable counterpart of UserCRUD for async handlers; rows come back as response-shaped dicts."""
+
+    def __init__(self, db: AsyncDatabase):
+        self.db = db
+
+    async def create_user(self, user: UserCreate) -> dict:
+        # Argon2 is deliberately slow CPU work, so keep it off the event loop and on the password pool
+        password = await password_pool.hash_async(user.password)
+        query = User.insert(username=user.username, email=user.email, role=user.role,
+                            password=password).returning(*USER_RESPONSE_COLUMNS)
+        row = await self.db.fetch_one(query)
+        user_cache.invalidate(('username', user.username))
+        audit_log.record('create', 'user', row['id'], changes=audit_changes(user))
+        return row
+
+    async def get_user_rows(self, fields: Optional[Sequence[str]] = None) -> List[dict]:
+        columns = [USER_FIELDS[name] for name in fields] if fields else USER_RESPONSE_COLUMNS
+        return await self.db.fetch_all(User.select(*columns))
+
+    async def get_version(self) -> int:
+        row = await self.db.fetch_one(TableVersion.current_query(User._meta.table_name))
+        return row['version']
+
+    async def get_by_username(self, username: str) -> Optional[dict]:
+        return await self.db.fetch_one(User.select(*USER_RESPONSE_COLUMNS).where(User.username == username))
+
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        return await self.db.fetch_one(User.select(*USER_RESPONSE_COLUMNS).where(User.email == email))
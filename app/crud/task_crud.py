@@ -1,32 +1,394 @@
-from typing import Optional, List
-from app.api.schemas.task_schemas import TaskCreate
+import os
+from datetime import datetime
+from typing import BinaryIO, Iterator, Optional, List, Sequence, Tuple
+from peewee import Tuple as SQLTuple, ValuesList
+from app.api.schemas.task_schemas import TaskCreate, TaskPatch, TaskBulkUpdate, TaskMove
+from app.db.audit import audit_log
+from app.db.board import get_task_board
+from app.db.export import stream_query
+from app.db.group_commit import GroupCommit
+from app.db.ranks import RankRebalancer, TASK_RANK_MAX_LENGTH, lock_column, place, rebalance
+from app.db.routing import replica_reads
+from app.db.search import get_task_search
+from app.db.task_import import get_task_importer
+from app.models.table_version_models import TableVersion
 from app.models.task_models import Task
+from app.utils.cache import TTLCache
+from app.utils.metrics import register_metrics
+from app.utils.pagination import encode_cursor, decode_cursor, encode_column_cursor, decode_column_cursor
+
+# Columns of the Task response schema, in response order
+TASK_RESPONSE_COLUMNS = (Task.id, Task.title, Task.description, Task.status)
+# Allow-list for sparse fieldsets, mapping response field names to columns
+TASK_FIELDS = {column.name: column for column in TASK_RESPONSE_COLUMNS}
+# Columns of an export row: the response columns plus the creation time they are ordered by
+TASK_EXPORT_COLUMNS = TASK_RESPONSE_COLUMNS + (Task.created_at,)
+# Rows fetched from the server-side cursor per round trip while exporting
+EXPORT_BATCH_SIZE = int(os.getenv('TASK_EXPORT_BATCH_SIZE', 1000))
+# Rows per statement for bulk writes, keeping parameter counts well below driver limits
+BULK_CHUNK_SIZE = 500
+# Read-through cache of get_task lookups, shared by every TaskCRUD in this process
+task_cache = TTLCache(maxsize=int(os.getenv('TASK_CACHE_SIZE', 4096)), ttl=float(os.getenv('TASK_CACHE_TTL', 30)))
+register_metrics('task_cache', task_cache.stats)
+# Opt-in group commit of single-task creates: concurrent POSTs share one INSERT and one commit
+TASK_GROUP_COMMIT = os.getenv('TASK_GROUP_COMMIT', 'false').lower() in ('1', 'true', 'yes')
+# Most creates per shared INSERT, and the longest a create waits for others to join it
+TASK_GROUP_COMMIT_MAX_BATCH = int(os.getenv('TASK_GROUP_COMMIT_MAX_BATCH', 100))
+TASK_GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv('TASK_GROUP_COMMIT_MAX_DELAY_MS', 2))
+
+class TaskVersionConflict(Exception):
+    """The task exists but its version is not one the write was conditioned on."""
+
+    def __init__(self, version: int):
+        super().__init__(f"Task is at version {version}")
+        self.version = version
+
 
 class TaskCRUD:
-    def __init__(self, db):
+    """
+    Task reads and writes. With an ``owner_id`` (the authenticated user's id) every query is
+    scoped to that user's tasks and new tasks are owned by them: other users' tasks read as
+    missing. Without one the whole table is visible, which only scripts and background jobs
+    use: every task route needs a bearer token.
+    """
+
+    def __init__(self, db, owner_id: Optional[int] = None):
         self.db = db  # The db is now an instance of SqliteDatabase
+        self.owner_id = owner_id
 
     def create_task(self, task: TaskCreate) -> Task:
-        db_task = Task.create(**task.model_dump())
+        # Misses are not cached, so a new id never has a stale entry to invalidate
+        row = self._row(task)
+        if TASK_GROUP_COMMIT:
+            created = task_writes.submit(row)  # A response-shaped dict
+            self._audit('create', created['id'], task.model_dump())
+            return created
+        db_task = Task.create(**row)
+        self._audit('create', db_task.id, task.model_dump())
         return db_task
 
-    def get_tasks(self) -> List[Task]:
-        return list(Task.select())  # Returns all tasks as a list
+    def create_tasks(self, tasks: List[TaskCreate]) -> List[dict]:
+        """Insert tasks with one multi-row INSERT ... RETURNING per chunk, committed once."""
+        rows = [self._row(task) for task in tasks]
+        created = []
+        with Task._meta.database.atomic():
+            for chunk in self._chunks(rows):
+                created.extend(Task.insert_many(chunk).returning(*TASK_RESPONSE_COLUMNS).dicts().execute())
+        for row in created:
+            self._audit('create', row['id'], {key: value for key, value in row.items() if key != 'id'})
+        return created
+
+    def import_tasks(self, stream: BinaryIO, format: str) -> int:
+        """Load a CSV or NDJSON upload with COPY; see app.db.task_import. Raises TaskImportError."""
+        imported = get_task_importer(Task._meta.database).import_tasks(stream, format, self.owner_id)
+        self._audit('import', None, {"count": imported})  # One event for the whole upload
+        return imported
+
+    def get_tasks(self, status: Optional[str] = None, created_after: Optional[datetime] = None,
+                  created_before: Optional[datetime] = None) -> List[Task]:
+        query = filter_tasks(Task.select(), status, created_after, created_before, self.owner_id)
+        return list(query)  # Returns all matching tasks as a list
+
+    def get_tasks_page(self, limit: int, cursor: Optional[str] = None, status: Optional[str] = None,
+                       created_after: Optional[datetime] = None, created_before: Optional[datetime] = None,
+                       descending: bool = False, fields: Optional[Sequence[str]] = None
+                       ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Return one page of tasks ordered by (created_at, id) and the cursor of the next page.
+
+        Pages are addressed by keyset rather than OFFSET, so every page is a single index
+        range scan no matter how deep into the table it is. Rows come back as plain dicts
+        holding only the response columns, ready to be encoded without building models.
+        ``fields`` narrows the SELECT list to the given TASK_FIELDS names; an owner's page of
+        one status selecting only id and title is an index-only scan of the
+        (owner_id, status, created_at, id) INCLUDE (title) index.
+        Raises ValueError on a bad cursor.
+        """
+        query, cursor_only = page_query(limit, cursor, status, created_after, created_before, descending, fields,
+                                        self.owner_id)
+        with replica_reads(Task._meta.database):
+            rows = list(query)
+        return page_result(rows, limit, cursor_only)
+
+    def export_tasks(self, status: Optional[str] = None, created_after: Optional[datetime] = None,
+                     created_before: Optional[datetime] = None, batch_size: int = EXPORT_BATCH_SIZE
+                     ) -> Iterator[List[dict]]:
+        """Stream every matching task in (created_at, id) order as batches of dicts; see app.db.export."""
+        query = filter_tasks(Task.select(*TASK_EXPORT_COLUMNS), status, created_after, created_before, self.owner_id)
+        # The replica is picked now; the rows are only read once the response is streamed
+        with replica_reads(Task._meta.database) as source:
+            return stream_query(query.order_by(Task.created_at, Task.id), batch_size, source)
+
+    def search_tasks(self, q: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """Full-text search over title and description; see app.db.search. Raises ValueError on a bad cursor."""
+        with replica_reads(Task._meta.database):
+            return get_task_search(Task._meta.database).search(q, limit, cursor, self.owner_id)
+
+    def get_board(self, limit: int) -> List[dict]:
+        """Count and first ``limit`` tasks of every status; see app.db.board."""
+        with replica_reads(Task._meta.database):
+            return get_task_board(Task._meta.database).board(limit, self.owner_id)
+
+    def get_column_page(self, status: str, limit: int, cursor: Optional[str] = None
+                        ) -> Tuple[List[dict], Optional[str]]:
+        """
+        One page of a status column in board order: the ranked tasks by rank, then the
+        never moved ones by (created_at, id). Each part is a range scan of the
+        (status, rank, created_at, id) index, filtered to the owner's tasks when scoped.
+        Raises ValueError on a bad cursor.
+        """
+        rank = last_created_at = last_id = None
+        if cursor:
+            rank, last_created_at, last_id = decode_column_cursor(cursor)
+        columns = TASK_RESPONSE_COLUMNS + (Task.rank, Task.created_at)
+        rows = []
+        column = self._scope(Task.status == status)
+        with replica_reads(Task._meta.database):
+            if not cursor or rank is not None:
+                query = Task.select(*columns).where(column & Task.rank.is_null(False))
+                if rank is not None:
+                    query = query.where(Task.rank > rank)
+                rows = list(query.order_by(Task.rank).limit(limit + 1).dicts())
+            if len(rows) <= limit:
+                query = Task.select(*columns).where(column & Task.rank.is_null())
+                if rank is None and cursor:
+                    query = query.where(SQLTuple(Task.created_at, Task.id) > SQLTuple(last_created_at, last_id))
+                rows.extend(query.order_by(Task.created_at, Task.id).limit(limit + 1 - len(rows)).dicts())
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_column_cursor(rows[-1]['rank'], rows[-1]['created_at'], rows[-1]['id'])
+        for row in rows:
+            del row['rank'], row['created_at']  # Only selected for the cursor
+        return rows, next_cursor
+
+    def get_version(self) -> int:
+        """Change counter of the tasks table; moves on every committed write."""
+        # Read from the same database as the rows it validates, so an ETag never runs ahead of them
+        with replica_reads(Task._meta.database):
+            return TableVersion.current(Task._meta.table_name)
 
     def get_task(self, task_id: int) -> Optional[Task]:
-        return Task.get_or_none(Task.id == task_id)  # Returns None if not found
-
-    def update_task(self, task_id: int, task_data: TaskCreate) -> Optional[Task]:
-        db_task = Task.get_or_none(Task.id == task_id)
-        if db_task:
-            for key, value in task_data.model_dump().items():
-                setattr(db_task, key, value)
-            db_task.save()  # Save changes to the database
+        # Returns None if not found. Cached instances are shared, so treat them as read-only
+        db_task = task_cache.get_or_load(task_id, lambda: Task.get_or_none(Task.id == task_id))
+        if db_task is not None and self.owner_id is not None and db_task.owner_id != self.owner_id:
+            return None  # Someone else's task reads as missing
+        return db_task
+
+    def get_task_fields(self, task_id: int, fields: Sequence[str]) -> Optional[dict]:
+        """
+        The given TASK_FIELDS of the task and its version, for the ETag, as a dict; None if
+        not found. The SELECT list holds only those columns, so task_cache, which holds
+        whole rows, is neither read nor filled.
+        """
+        query = Task.select(*(TASK_FIELDS[name] for name in fields), Task.version)
+        return query.where(self._scope(Task.id == task_id)).dicts().first()
+
+    def update_task(self, task_id: int, task_data: TaskCreate,
+                    expected_versions: Optional[Sequence[int]] = None) -> Optional[Task]:
+        """
+        Replace the task's fields. With ``expected_versions`` the write only happens while the
+        task is at one of them, and TaskVersionConflict is raised otherwise.
+        """
+        db_task = self._update_columns(task_id, task_data.model_dump(), expected_versions)
+        task_cache.invalidate(task_id)
+        return db_task
+
+    def patch_task(self, task_id: int, task_data: TaskPatch,
+                   expected_versions: Optional[Sequence[int]] = None) -> Optional[Task]:
+        """Write only the fields present in the request; see update_task for ``expected_versions``."""
+        changes = task_data.model_dump(exclude_unset=True)
+        if not changes:
+            db_task = self.get_task(task_id)
+            if db_task is not None and expected_versions is not None and db_task.version not in expected_versions:
+                raise TaskVersionConflict(db_task.version)
+            return db_task
+        db_task = self._update_columns(task_id, changes, expected_versions)
+        task_cache.invalidate(task_id)
+        return db_task
+
+    def move_task(self, task_id: int, move: TaskMove,
+                  expected_versions: Optional[Sequence[int]] = None) -> Optional[Task]:
+        """
+        Place the task in its column, or in the column of ``move.status``, by giving it a rank
+        between its new neighbours (see app.db.ranks): one row is written however long the
+        column is. Raises ValueError when the anchor task is not in that column; see
+        update_task for ``expected_versions``.
+        """
+        database = Task._meta.database
+        with database.atomic():
+            current = Task.select(Task.status).where(self._scope(Task.id == task_id)).scalar()
+            if current is None:
+                return None
+            status = move.status or current
+            lock_column(database, status, self.owner_id)
+            rank = place(database, task_id, status, move.after_id, move.before_id, self.owner_id)
+            db_task = self._update_columns(task_id, {"status": status, "rank": rank}, expected_versions, 'move')
+        # Once committed: dropped any earlier, a concurrent get_task could cache the row as it
+        # was before the move until the TTL runs out
+        task_cache.invalidate(task_id)
+        if len(rank) > TASK_RANK_MAX_LENGTH:
+            task_ranks.request(status, self.owner_id)
         return db_task
 
     def delete_task(self, task_id: int) -> bool:
-        db_task = Task.get_or_none(Task.id == task_id)
-        if db_task:
-            db_task.delete_instance()  # Delete the task from the database
-            return True
-        return False
+        # DELETE ... RETURNING tells us whether the row existed without a prior SELECT
+        query = Task.delete().where(self._scope(Task.id == task_id)).returning(Task.id)
+        deleted = len(list(query.tuples().execute())) > 0
+        task_cache.invalidate(task_id)
+        if deleted:
+            self._audit('delete', task_id)
+        return deleted
+
+    def update_tasks(self, tasks: List[TaskBulkUpdate]) -> List[dict]:
+        """
+        Update tasks by joining the tasks table against a VALUES list, one UPDATE per chunk,
+        committed once. Returns the updated rows; ids that matched nothing are absent.
+        """
+        updated = []
+        with Task._meta.database.atomic():
+            for chunk in self._chunks(tasks):
+                values = ValuesList([(task.id, task.title, task.description, task.status) for task in chunk]).cte(
+                    'task_values', columns=('id', 'title', 'description', 'status'))
+                query = (Task
+                         .update(title=values.c.title, description=values.c.description, status=values.c.status,
+                                 version=Task.version + 1)
+                         .with_cte(values)
+                         .from_(values)
+                         .where(self._scope(Task.id == values.c.id))
+                         .returning(*TASK_RESPONSE_COLUMNS))
+                updated.extend(query.dicts().execute())
+        for task in tasks:
+            task_cache.invalidate(task.id)
+        for row in updated:
+            self._audit('update', row['id'], {key: value for key, value in row.items() if key != 'id'})
+        return updated
+
+    def delete_tasks(self, task_ids: List[int]) -> List[int]:
+        """Delete tasks with DELETE ... WHERE id IN per chunk, committed once. Returns the deleted ids."""
+        deleted = []
+        with Task._meta.database.atomic():
+            for chunk in self._chunks(task_ids):
+                query = Task.delete().where(self._scope(Task.id.in_(chunk))).returning(Task.id)
+                deleted.extend(task_id for task_id, in query.tuples().execute())
+        for task_id in task_ids:
+            task_cache.invalidate(task_id)
+        for task_id in deleted:
+            self._audit('delete', task_id)
+        return deleted
+
+    def _update_columns(self, task_id: int, changes: dict, expected_versions: Optional[Sequence[int]] = None,
+                        action: str = 'update') -> Optional[Task]:
+        # UPDATE ... RETURNING writes and reads back the row in a single round trip. The version
+        # check is part of the same statement, so a lost race matches no row instead of failing
+        # later. Writers of different tasks don't queue on a shared row either: the table version
+        # and status count triggers spread their upserts over slots
+        query = Task.update(**changes, version=Task.version + 1).where(self._scope(Task.id == task_id))
+        if expected_versions is not None:
+            query = query.where(Task.version.in_(list(expected_versions)))
+        # task_cache is left to the callers, which drop the task once their transaction has committed
+        db_task = next(iter(query.returning(Task).execute()), None)
+        if db_task is not None:
+            self._audit(action, task_id, changes)
+        if db_task is None and expected_versions is not None:
+            # Only on a miss: tell a stale version apart from a missing task
+            current = Task.select(Task.version).where(self._scope(Task.id == task_id)).scalar()
+            if current is not None:
+                raise TaskVersionConflict(current)
+        return db_task
+
+    def _row(self, task: TaskCreate) -> dict:
+        row = task.model_dump()
+        if self.owner_id is not None:
+            row['owner'] = self.owner_id
+        return row
+
+    def _audit(self, action: str, task_id: Optional[int], changes: Optional[dict] = None):
+        # Queued for the background writer; see app.db.audit
+        audit_log.record(action, 'task', task_id, self.owner_id, changes)
+
+    def _scope(self, condition):
+        """``condition``, narrowed to the owner's tasks when this TaskCRUD is scoped."""
+        return condition if self.owner_id is None else condition & (Task.owner == self.owner_id)
+
+    def _chunks(self, items: list):
+        for start in range(0, len(items), BULK_CHUNK_SIZE):
+            yield items[start:start + BULK_CHUNK_SIZE]
+
+
+def insert_task_rows(rows: List[dict]) -> List[dict]:
+    """Insert ``rows`` with one INSERT ... RETURNING in one transaction; results come back in row order."""
+    with Task._meta.database.atomic():
+        return list(Task.insert_many(rows).returning(*TASK_RESPONSE_COLUMNS).dicts().execute())
+
+
+# Creates waiting to share a commit, across every TaskCRUD in this process
+task_writes = GroupCommit(insert_task_rows, max_batch_size=min(TASK_GROUP_COMMIT_MAX_BATCH, BULK_CHUNK_SIZE),
+                          max_delay=TASK_GROUP_COMMIT_MAX_DELAY_MS / 1000)
+register_metrics('task_group_commit', task_writes.stats)
+
+
+def rebalance_column(status: str, owner_id: Optional[int] = None) -> int:
+    """Rebalance the ranks of one column on a connection of its own; returns the rows rewritten."""
+    database = Task._meta.database
+    with database.connection_context():
+        task_ids = rebalance(database, status, owner_id)
+    for task_id in task_ids:
+        task_cache.invalidate(task_id)
+    return len(task_ids)
+
+
+# Columns whose ranks grew too long, rebalanced in the background for every TaskCRUD in this process
+task_ranks = RankRebalancer(rebalance_column)
+register_metrics('task_rank_rebalancer', task_ranks.stats)
+
+
+def filter_tasks(query, status: Optional[str], created_after: Optional[datetime], created_before: Optional[datetime],
+                 owner_id: Optional[int] = None):
+    if owner_id is not None:
+        query = query.where(Task.owner == owner_id)
+    if status is not None:
+        query = query.where(Task.status == status)
+    if created_after is not None:
+        query = query.where(Task.created_at >= created_after)
+    if created_before is not None:
+        query = query.where(Task.created_at < created_before)
+    return query
+
+
+def page_query(limit: int, cursor: Optional[str], status: Optional[str], created_after: Optional[datetime],
+               created_before: Optional[datetime], descending: bool, fields: Optional[Sequence[str]],
+               owner_id: Optional[int] = None):
+    """Build the keyset page SELECT shared by TaskCRUD and AsyncTaskCRUD; see TaskCRUD.get_tasks_page."""
+    names = list(fields or TASK_FIELDS)
+    cursor_only = [name for name in ('id', 'created_at') if name not in names]
+    query = Task.select(*(Task._meta.fields[name] for name in names + cursor_only)).dicts()
+    query = filter_tasks(query, status, created_after, created_before, owner_id)
+    position = SQLTuple(Task.created_at, Task.id)
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor)
+        last_seen = SQLTuple(last_created_at, last_id)
+        # The scalar bound follows from the row comparison, but only a scalar one lets Postgres
+        # skip the created_at partitions (see app.db.partitions) the page cannot reach
+        if descending:
+            query = query.where((position < last_seen) & (Task.created_at <= last_created_at))
+        else:
+            query = query.where((position > last_seen) & (Task.created_at >= last_created_at))
+    if descending:
+        query = query.order_by(Task.created_at.desc(), Task.id.desc())
+    else:
+        query = query.order_by(Task.created_at, Task.id)
+    # Fetch one extra row to find out whether another page exists
+    return query.limit(limit + 1), cursor_only
+
+
+def page_result(rows: List[dict], limit: int, cursor_only: List[str]) -> Tuple[List[dict], Optional[str]]:
+    """Trim the rows of a page_query to ``limit`` and derive the next cursor from the last one."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    for row in rows:
+        for name in cursor_only:
+            del row[name]  # Only selected for the cursor
+    return rows, next_cursor
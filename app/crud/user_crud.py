@@ -1,34 +1,77 @@
-from typing import Optional, List
-
-from argon2 import PasswordHasher
+import os
+from typing import Optional, List, Sequence
 
 from app.api.schemas.user_schemas import UserCreate
+from app.db.audit import audit_log
+from app.db.routing import replica_reads
+from app.models.table_version_models import TableVersion
 from app.models.user_models import User
+from app.utils.cache import TTLCache
+from app.utils.metrics import register_metrics
+from app.utils.passwords import password_pool
+
+# Columns of the User response schema; the password hash never leaves the database
+USER_RESPONSE_COLUMNS = (User.id, User.username, User.email, User.role)
+# Allow-list for sparse fieldsets, mapping response field names to columns
+USER_FIELDS = {column.name: column for column in USER_RESPONSE_COLUMNS}
+# Read-through cache of id and username lookups, keyed ('id', 1) / ('username', 'alice')
+user_cache = TTLCache(maxsize=int(os.getenv('USER_CACHE_SIZE', 4096)), ttl=float(os.getenv('USER_CACHE_TTL', 30)))
+register_metrics('user_cache', user_cache.stats)
+
+# Access tokens verified by AuthService.verify_token, keyed by the SHA-256 of the token. Each entry
+# lives until its token expires, capped by TOKEN_CACHE_TTL seconds. invalidate_user only reaches
+# the cache of the worker that made the change, so the cap is how long other workers keep
+# accepting the tokens of a deleted or changed user
+token_cache = TTLCache(maxsize=int(os.getenv('TOKEN_CACHE_SIZE', 4096)), ttl=float(os.getenv('TOKEN_CACHE_TTL', 30)))
+register_metrics('token_cache', token_cache.stats)
+
+
+def audit_changes(user: UserCreate) -> dict:
+    """Fields of a user write for the audit log; the password is only noted as set, never copied."""
+    return {**user.model_dump(exclude={'password'}), 'password': 'set'}
 
-ph = PasswordHasher()
 
 class UserCRUD:
     def __init__(self, db):
         self.db = db  # The db is now an instance of SqliteDatabase
 
-    def create_user(self, user: UserCreate) -> User:
-        # Create a user in the database
+    def create_user(self, user: UserCreate, password_hash: Optional[str] = None) -> User:
+        # Create a user in the database; a caller that hashed the password beforehand passes the hash
         db_user = User.create(
             username=user.username,
             email=user.email,
             role=user.role,
-            password=self._hash_password(user.password)  # Hash the password before saving
+            password=password_hash or self.hash_password(user.password)  # Hash the password before saving
         )
+        user_cache.invalidate(('username', db_user.username))
+        audit_log.record('create', 'user', db_user.id, changes=audit_changes(user))
         return db_user
 
     def get_users(self) -> List[User]:
         return list(User.select())  # Returns all users as a list
 
+    def get_user_rows(self, fields: Optional[Sequence[str]] = None) -> List[dict]:
+        # Only the requested response columns, as plain dicts ready to be encoded
+        columns = [USER_FIELDS[name] for name in fields] if fields else USER_RESPONSE_COLUMNS
+        with replica_reads(User._meta.database):
+            return list(User.select(*columns).dicts())
+
+    def get_version(self) -> int:
+        """Change counter of the users table; moves on every committed write."""
+        with replica_reads(User._meta.database):
+            return TableVersion.current(User._meta.table_name)
+
     def get_user(self, user_id: int) -> Optional[User]:
-        return User.get_or_none(User.id == user_id)  # Returns None if not found
+        # Returns None if not found. Cached instances are shared, so treat them as read-only
+        return user_cache.get_or_load(('id', user_id), lambda: User.get_or_none(User.id == user_id))
 
     def get_by_username(self, username: str) -> Optional[User]:
-        return User.get_or_none(User.username == username)  # Returns None if not found
+        # Returns None if not found. Cached instances are shared, so treat them as read-only
+        return user_cache.get_or_load(('username', username), lambda: User.get_or_none(User.username == username))
+
+    def get_user_fields(self, username: str, fields: Sequence[str]) -> Optional[dict]:
+        # Only the given USER_FIELDS columns, bypassing user_cache, which holds whole rows
+        return User.select(*(USER_FIELDS[name] for name in fields)).where(User.username == username).dicts().first()
 
     def get_by_email(self, email: str) -> Optional[User]:
         return User.get_or_none(User.email == email)  # Returns None if not found
@@ -38,15 +81,28 @@ class UserCRUD:
         if db_user:
             for key, value in user_data.model_dump().items():
                 setattr(db_user, key, value)
+            db_user.password = self.hash_password(user_data.password)  # Never store the plain password
             db_user.save()  # Save changes to the database
+            invalidate_user(user_id)
+            audit_log.record('update', 'user', user_id, changes=audit_changes(user_data))
         return db_user
 
     def delete_user(self, user_id: int) -> bool:
         db_user = User.get_or_none(User.id == user_id)
         if db_user:
             db_user.delete_instance()  # Delete the user from the database
+            invalidate_user(user_id)
+            audit_log.record('delete', 'user', user_id)
             return True
         return False
 
-    def _hash_password(self, plain_password: str) -> str:
-        return ph.hash(plain_password)
+    def hash_password(self, plain_password: str) -> str:
+        # Blocks this request's thread, not a core: the work runs on the password pool. Needs no connection
+        return password_pool.hash(plain_password)
+
+
+def invalidate_user(user_id: int):
+    """Forget a user who changed or was deleted: its id and username entries and every token verified for it."""
+    # Matched on the id, whatever the username was before the write
+    user_cache.invalidate_where(lambda key, user: user.id == user_id)
+    token_cache.invalidate_where(lambda key, verified: verified.user.id == user_id)
@@ -0,0 +1,72 @@
+# app/db/async_database.py
+import asyncio
+import os
+from typing import List, Optional
+
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from app.utils.metrics import register_metrics
+
+# Connections held by the async pool; in-flight async queries per worker are bounded by the max
+ASYNC_POOL_MIN_SIZE = int(os.getenv('ASYNC_DB_POOL_MIN', 2))
+ASYNC_POOL_MAX_SIZE = int(os.getenv('ASYNC_DB_POOL_MAX', 20))
+# Seconds a request waits for a free connection before failing
+ASYNC_POOL_TIMEOUT = float(os.getenv('ASYNC_DB_POOL_TIMEOUT', 5))
+
+
+class AsyncDatabase:
+    """
+    psycopg 3 connection pool for ``async def`` handlers.
+
+    Queries are still built with peewee, bound to the Postgres database as usual, and only
+    their SQL and parameters are sent through the pool, so the sync and async paths share
+    one query definition. Awaiting a connection or a result yields the event loop instead of
+    holding a threadpool thread. The pool opens on first use, inside the serving event loop.
+    """
+
+    def __init__(self, database_url: str, min_size: int = ASYNC_POOL_MIN_SIZE, max_size: int = ASYNC_POOL_MAX_SIZE,
+                 timeout: float = ASYNC_POOL_TIMEOUT):
+        self.database_url = database_url
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pool: Optional[AsyncConnectionPool] = None
+        self._open_lock = asyncio.Lock()
+
+    async def open(self):
+        async with self._open_lock:
+            if self.pool is None:
+                pool = AsyncConnectionPool(self.database_url, min_size=self.min_size, max_size=self.max_size,
+                                           timeout=self.timeout, kwargs={"autocommit": True, "row_factory": dict_row},
+                                           open=False)
+                await pool.open()
+                self.pool = pool
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def fetch_all(self, query) -> List[dict]:
+        """Run a peewee query and return its rows as dicts keyed by column name."""
+        if self.pool is None:
+            await self.open()
+        sql, params = query.sql()
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(sql, params)
+            return await cursor.fetchall()
+
+    async def fetch_one(self, query) -> Optional[dict]:
+        """Run a peewee query and return its first row, or None."""
+        rows = await self.fetch_all(query)
+        return rows[0] if rows else None
+
+    def stats(self) -> dict:
+        if self.pool is None:
+            return {"open": False, "max_size": self.max_size}
+        return {"open": True, "max_size": self.max_size, **self.pool.get_stats()}
+
+
+async_database_instance = AsyncDatabase(f"{os.getenv('DATABASE_PUBLIC_URL')}")
+register_metrics('async_db_pool', async_database_instance.stats)
@@ -0,0 +1,228 @@
+# app/db/audit.py
+"""
+Audit trail of task and user changes: who did what to which row, and when.
+
+The CRUD classes call ``audit_log.record`` once a change is made. Recording only appends
+the event to a bounded in-memory queue, so a write never waits on the audit table. A
+background thread drains the queue in batches of up to AUDIT_BATCH_SIZE events, waiting at
+most AUDIT_FLUSH_INTERVAL_MS for a batch to fill. Each batch is one COPY on Postgres and a
+few multi-row INSERTs on SQLite. When the queue is full because the database cannot keep
+up, new events are dropped and counted instead of slowing down the writes they describe.
+The queue depth, its high-water mark and the drop count are in /api/metrics under
+``audit_log``. Events still queued when the process is killed are lost; a clean shutdown
+flushes them.
+
+audit_log is append-only. Rows are never updated and have no foreign keys, so they outlive
+the tasks and users they describe. The primary key leads with occurred_at, so the table can
+be range-partitioned on it later and old months detached whole, as app.db.partitions does
+for tasks.
+
+Recording is opt-in through AUDIT_LOG_ENABLED.
+"""
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, List, NamedTuple, Optional
+
+from peewee import SqliteDatabase
+
+from app.db.database import database_instance
+from app.db.task_import import CopyStream, copy_chunks
+from app.utils.metrics import register_metrics
+
+AUDIT_LOG_ENABLED = os.getenv('AUDIT_LOG_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+# Events held in memory waiting to be written; more are dropped
+AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', 10000))
+# Most events per write, and the longest the writer waits for a batch to fill
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', 500))
+AUDIT_FLUSH_INTERVAL_MS = float(os.getenv('AUDIT_FLUSH_INTERVAL_MS', 50))
+# Seconds a shutdown waits for the queue to be written
+AUDIT_SHUTDOWN_TIMEOUT = 5.0
+
+AUDIT_TABLE = 'audit_log'
+AUDIT_COLUMNS = ('occurred_at', 'actor_id', 'action', 'entity', 'entity_id', 'changes')
+# Rows per INSERT where COPY is not available
+INSERT_CHUNK_SIZE = 100
+
+
+class AuditEvent(NamedTuple):
+    """One change, in AUDIT_COLUMNS order; ``changes`` holds the written fields, if any."""
+    occurred_at: datetime
+    actor_id: Optional[int]
+    action: str
+    entity: str
+    entity_id: Optional[int]
+    changes: Optional[dict]
+
+
+class AuditLog:
+    """
+    Bounded queue of audit events written in batches by a background thread.
+
+    ``write`` receives a list of AuditEvent and stores all of them; it runs on the writer
+    thread and opens its own connection. A batch whose write fails is counted and reported,
+    not retried, so a database outage cannot pile events up behind it.
+    """
+
+    def __init__(self, write: Callable[[List[AuditEvent]], None], max_queue_size: int = AUDIT_QUEUE_SIZE,
+                 max_batch_size: int = AUDIT_BATCH_SIZE, max_delay: float = AUDIT_FLUSH_INTERVAL_MS / 1000,
+                 enabled: bool = True, clock: Callable[[], float] = time.monotonic):
+        self.write = write
+        self.max_queue_size = max_queue_size
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.enabled = enabled
+        self._clock = clock
+        self._events = deque()
+        self._writing = 0  # Events taken off the queue whose write has not finished
+        self._flushing = False
+        self._cond = threading.Condition()
+        self._thread = None
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_pending = 0
+
+    def record(self, action: str, entity: str, entity_id: Optional[int], actor_id: Optional[int] = None,
+               changes: Optional[dict] = None) -> bool:
+        """Queue an event without blocking; returns False when it was dropped or recording is off."""
+        if not self.enabled:
+            return False
+        event = AuditEvent(datetime.now(timezone.utc).replace(tzinfo=None), actor_id, action, entity, entity_id,
+                           changes)
+        with self._cond:
+            if len(self._events) >= self.max_queue_size:
+                self.dropped += 1
+                return False
+            self._events.append(event)
+            self.recorded += 1
+            self.max_pending = max(self.max_pending, len(self._events))
+            if len(self._events) == 1 or len(self._events) >= self.max_batch_size:
+                self._cond.notify_all()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+                self._thread.start()
+        return True
+
+    def flush(self, timeout: float = AUDIT_SHUTDOWN_TIMEOUT) -> bool:
+        """Wait until every queued event is written or given up on; False if some are left after ``timeout``."""
+        deadline = self._clock() + timeout
+        with self._cond:
+            self._flushing = True  # The writer stops waiting for batches to fill
+            self._cond.notify_all()
+            try:
+                while self._events or self._writing:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0 or self._thread is None or not self._thread.is_alive():
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flushing = False
+        return True
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "recorded": self.recorded,
+                "dropped": self.dropped,
+                "written": self.written,
+                "failed": self.failed,
+                "batches": self.batches,
+                "pending": len(self._events) + self._writing,
+                "max_pending": self.max_pending,
+                "queue_size": self.max_queue_size,
+            }
+
+    def _take(self) -> List[AuditEvent]:
+        with self._cond:
+            while not self._events:
+                self._cond.wait()
+            deadline = self._clock() + self.max_delay
+            while len(self._events) < self.max_batch_size and not self._flushing:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._events.popleft() for _ in range(min(len(self._events), self.max_batch_size))]
+            self._writing = len(batch)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            try:
+                self.write(batch)
+            except Exception as e:
+                print(f"Failed to write {len(batch)} audit event(s): {e}")  # Replace with proper logging in production
+                with self._cond:
+                    self.failed += len(batch)
+            else:
+                with self._cond:
+                    self.written += len(batch)
+                    self.batches += 1
+            finally:
+                with self._cond:
+                    self._writing = 0
+                    self._cond.notify_all()
+
+
+class AuditWriter(ABC):
+    """Appends audit events to audit_log in one transaction."""
+
+    def __init__(self, database):
+        self.database = database
+
+    def write(self, events: List[AuditEvent]):
+        rows = [(*event[:5], None if event.changes is None else json.dumps(event.changes, default=str))
+                for event in events]
+        with self.database.atomic():
+            self._insert(rows)
+
+    @abstractmethod
+    def _insert(self, rows: List[tuple]):
+        """Append the rows to audit_log within the open transaction."""
+
+
+class PostgresAuditWriter(AuditWriter):
+    """Streams the batch with COPY FROM STDIN, one round trip however many events it holds."""
+
+    COPY_SQL = f"COPY {AUDIT_TABLE} ({', '.join(AUDIT_COLUMNS)}) FROM STDIN"
+
+    def _insert(self, rows: List[tuple]):
+        self.database.cursor().copy_expert(self.COPY_SQL, CopyStream(copy_chunks(rows)))
+
+
+class SqliteAuditWriter(AuditWriter):
+    """Multi-row INSERTs for local development and tests; SQLite has no COPY."""
+
+    def _insert(self, rows: List[tuple]):
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            chunk = rows[start:start + INSERT_CHUNK_SIZE]
+            placeholders = ", ".join([f"({', '.join('?' * len(AUDIT_COLUMNS))})"] * len(chunk))
+            self.database.execute_sql(f"INSERT INTO {AUDIT_TABLE} ({', '.join(AUDIT_COLUMNS)}) VALUES {placeholders}",
+                                      [value for row in chunk for value in row])
+
+
+def get_audit_writer(database) -> AuditWriter:
+    """Pick the writer matching ``database``."""
+    if isinstance(database, SqliteDatabase):
+        return SqliteAuditWriter(database)
+    return PostgresAuditWriter(database)
+
+
+def write_audit_events(events: List[AuditEvent]):
+    """Write a batch on a connection of the writer thread's own."""
+    database = database_instance.database
+    with database.connection_context():
+        get_audit_writer(database).write(events)
+
+
+# Changes of every TaskCRUD and UserCRUD in this process, sync and async
+audit_log = AuditLog(write_audit_events, enabled=AUDIT_LOG_ENABLED)
+register_metrics('audit_log', audit_log.stats)
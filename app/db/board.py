@@ -0,0 +1,217 @@
+# app/db/board.py
+from datetime import datetime
+from typing import List, Optional
+
+from peewee import SqliteDatabase
+
+from app.utils.pagination import encode_column_cursor
+
+# Tasks per owner and status as of the last committed write, kept up to date by triggers on
+# tasks; tasks without an owner count under owner 0. A count is the sum of its slots: each
+# transaction adds its delta to the slot its id hashes to, so writers of one owner's status
+# rarely wait on each other's row lock until commit
+STATUS_COUNTS_TABLE = 'task_status_counts'
+COUNT_SLOTS = 64
+CREATE_STATUS_COUNTS_SQL = (
+    f"CREATE TABLE IF NOT EXISTS {STATUS_COUNTS_TABLE} ("
+    "owner_id BIGINT NOT NULL DEFAULT 0, "
+    "status TEXT NOT NULL, "
+    "slot SMALLINT NOT NULL DEFAULT 0, "
+    "task_count BIGINT NOT NULL DEFAULT 0, "
+    "PRIMARY KEY (owner_id, status, slot))"
+)
+# Recount from scratch; the install runs in one transaction with the triggers, so no write is missed
+BACKFILL_STATUS_COUNTS_SQL = (
+    f"DELETE FROM {STATUS_COUNTS_TABLE}",
+    f"INSERT INTO {STATUS_COUNTS_TABLE} (owner_id, status, task_count) "
+    "SELECT COALESCE(owner_id, 0), status, COUNT(*) FROM tasks GROUP BY COALESCE(owner_id, 0), status",
+)
+# Names of the Postgres triggers, which app.db.partitions moves to a partitioned tasks table
+POSTGRES_TRIGGERS = ('tasks_count_insert', 'tasks_count_update', 'tasks_count_delete', 'tasks_count_truncate')
+
+_UPSERT_DELTAS = (
+    f"INSERT INTO {STATUS_COUNTS_TABLE} (owner_id, status, slot, task_count) "
+    f"SELECT owner_id, status, mod(txid_current(), {COUNT_SLOTS}), SUM(delta) FROM ({{deltas}}) AS d "
+    "GROUP BY owner_id, status HAVING SUM(delta) <> 0 "
+    # Fixed order, so statements touching several counts lock their rows in the same order
+    "ORDER BY owner_id, status "
+    f"ON CONFLICT (owner_id, status, slot) DO UPDATE SET task_count = {STATUS_COUNTS_TABLE}.task_count "
+    "+ EXCLUDED.task_count; "
+)
+_NEW_ROWS = "SELECT COALESCE(owner_id, 0) AS owner_id, status, 1 AS delta FROM new_rows"
+_OLD_ROWS = "SELECT COALESCE(owner_id, 0) AS owner_id, status, -1 AS delta FROM old_rows"
+# Every slot of a status, summed over all owners or, through the primary key, over one owner's
+# rows; the board skips statuses without tasks
+_STATUS_COUNTS = (
+    f"(SELECT status, CAST(SUM(task_count) AS BIGINT) AS task_count FROM {STATUS_COUNTS_TABLE} {{where}}"
+    "GROUP BY status HAVING SUM(task_count) > 0) AS c "
+)
+
+
+class TaskBoard:
+    """Kanban board: the task count and the first tasks of every status, in one statement."""
+
+    INSTALL_SQL = ()
+    BOARD_SQL = ""
+    # An owner's board reads their rows of the counts table
+    OWNER_BOARD_SQL = ""
+
+    def __init__(self, database):
+        self.database = database
+
+    def install(self):
+        """Create the counts table and its triggers and count the existing tasks. Safe to run repeatedly."""
+        with self.database.atomic():
+            for sql in (CREATE_STATUS_COUNTS_SQL, *self.INSTALL_SQL, *BACKFILL_STATUS_COUNTS_SQL):
+                self.database.execute_sql(sql)
+
+    def board(self, limit: int, owner_id: Optional[int] = None) -> List[dict]:
+        """
+        One column per status with tasks: its count, its first ``limit`` tasks in column
+        order (see app.db.ranks) and, when there are more, the cursor that continues the
+        column through GET /api/tasks/column?status=... With ``owner_id`` only that user's
+        tasks are counted and listed.
+        """
+        if owner_id is None:
+            cursor = self.database.execute_sql(self.BOARD_SQL, (limit,))
+        else:
+            cursor = self.database.execute_sql(self.OWNER_BOARD_SQL, self._owner_params(owner_id, limit))
+        columns = []
+        for status, count, task_id, title, description, rank, created_at in cursor.fetchall():
+            if not columns or columns[-1]["status"] != status:
+                columns.append({"status": status, "count": count, "tasks": [], "next_cursor": None})
+            column = columns[-1]
+            if task_id is not None:
+                column["tasks"].append({"id": task_id, "title": title, "description": description, "status": status})
+                if len(column["tasks"]) == limit and count > limit:
+                    column["next_cursor"] = encode_column_cursor(rank, self._datetime(created_at), task_id)
+        return columns
+
+    def _owner_params(self, owner_id: int, limit: int) -> tuple:
+        return owner_id, owner_id, limit
+
+    def _datetime(self, value) -> datetime:
+        return value
+
+
+class PostgresTaskBoard(TaskBoard):
+    """
+    Statement-level triggers fold each write into one upsert per owner and status it touched,
+    and skip updates that leave both alone. The top tasks of each status come from a LATERAL
+    LIMIT over the (status, rank, created_at, id) index, so the query reads ``limit`` rows per
+    status; ascending order puts the unranked tasks, whose rank is NULL, last.
+    A ``row_number() OVER (PARTITION BY status ...)`` filter would read every task to rank it.
+    An owner's column reads its moved and its never moved tasks apart, each from an owner
+    index in order: the status-wide index would skip over every other owner's tasks.
+    """
+
+    INSTALL_SQL = (
+        "CREATE OR REPLACE FUNCTION count_task_statuses() RETURNS trigger AS $$ "
+        "BEGIN "
+        "IF TG_OP = 'INSERT' THEN "
+        + _UPSERT_DELTAS.format(deltas=_NEW_ROWS) +
+        "ELSIF TG_OP = 'DELETE' THEN "
+        + _UPSERT_DELTAS.format(deltas=_OLD_ROWS) +
+        "ELSIF TG_OP = 'UPDATE' THEN "
+        + _UPSERT_DELTAS.format(deltas=f"{_NEW_ROWS} UNION ALL {_OLD_ROWS}") +
+        "ELSE "
+        f"UPDATE {STATUS_COUNTS_TABLE} SET task_count = 0; "
+        "END IF; "
+        "RETURN NULL; "
+        "END $$ LANGUAGE plpgsql",
+        *(f"DROP TRIGGER IF EXISTS {trigger} ON tasks" for trigger in POSTGRES_TRIGGERS),
+        "CREATE TRIGGER tasks_count_insert AFTER INSERT ON tasks REFERENCING NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION count_task_statuses()",
+        "CREATE TRIGGER tasks_count_update AFTER UPDATE ON tasks REFERENCING OLD TABLE AS old_rows "
+        "NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION count_task_statuses()",
+        "CREATE TRIGGER tasks_count_delete AFTER DELETE ON tasks REFERENCING OLD TABLE AS old_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION count_task_statuses()",
+        "CREATE TRIGGER tasks_count_truncate AFTER TRUNCATE ON tasks "
+        "FOR EACH STATEMENT EXECUTE FUNCTION count_task_statuses()",
+    )
+    BOARD_SQL = (
+        "SELECT c.status, c.task_count, t.id, t.title, t.description, t.rank, t.created_at "
+        "FROM " + _STATUS_COUNTS.format(where="") +
+        "LEFT JOIN LATERAL (SELECT id, title, description, rank, created_at FROM tasks "
+        "WHERE tasks.status = c.status ORDER BY rank, created_at, id LIMIT %s) AS t ON TRUE "
+        "ORDER BY c.status, t.rank, t.created_at, t.id"
+    )
+    OWNER_BOARD_SQL = (
+        "SELECT c.status, c.task_count, t.id, t.title, t.description, t.rank, t.created_at "
+        "FROM " + _STATUS_COUNTS.format(where="WHERE owner_id = %s ") +
+        "LEFT JOIN LATERAL ("
+        "(SELECT id, title, description, rank, created_at FROM tasks "
+        "WHERE owner_id = %s AND status = c.status AND rank IS NOT NULL ORDER BY rank LIMIT %s) "
+        "UNION ALL "
+        "(SELECT id, title, description, rank, created_at FROM tasks "
+        "WHERE owner_id = %s AND status = c.status AND rank IS NULL ORDER BY created_at, id LIMIT %s) "
+        "ORDER BY rank, created_at, id LIMIT %s) AS t ON TRUE "
+        "ORDER BY c.status, t.rank, t.created_at, t.id"
+    )
+
+    def _owner_params(self, owner_id: int, limit: int) -> tuple:
+        return owner_id, owner_id, limit, owner_id, limit, limit
+
+
+class SqliteTaskBoard(TaskBoard):
+    """Row-level triggers and a row_number() window for local development and tests."""
+
+    # SQLite has a single writer, so its triggers keep to slot 0
+    INSTALL_SQL = (
+        *(f"DROP TRIGGER IF EXISTS {trigger}"
+          for trigger in ('tasks_count_insert', 'tasks_count_delete', 'tasks_count_update')),
+        "CREATE TRIGGER tasks_count_insert AFTER INSERT ON tasks BEGIN "
+        f"INSERT INTO {STATUS_COUNTS_TABLE} (owner_id, status, slot, task_count) "
+        "VALUES (COALESCE(new.owner_id, 0), new.status, 0, 1) "
+        "ON CONFLICT (owner_id, status, slot) DO UPDATE SET task_count = task_count + 1; END",
+        "CREATE TRIGGER tasks_count_delete AFTER DELETE ON tasks BEGIN "
+        f"UPDATE {STATUS_COUNTS_TABLE} SET task_count = task_count - 1 "
+        "WHERE owner_id = COALESCE(old.owner_id, 0) AND status = old.status AND slot = 0; END",
+        "CREATE TRIGGER tasks_count_update AFTER UPDATE OF status, owner_id ON tasks "
+        "WHEN old.status IS NOT new.status OR old.owner_id IS NOT new.owner_id BEGIN "
+        f"UPDATE {STATUS_COUNTS_TABLE} SET task_count = task_count - 1 "
+        "WHERE owner_id = COALESCE(old.owner_id, 0) AND status = old.status AND slot = 0; "
+        f"INSERT INTO {STATUS_COUNTS_TABLE} (owner_id, status, slot, task_count) "
+        "VALUES (COALESCE(new.owner_id, 0), new.status, 0, 1) "
+        "ON CONFLICT (owner_id, status, slot) DO UPDATE SET task_count = task_count + 1; END",
+    )
+    BOARD_SQL = (
+        "SELECT c.status, c.task_count, t.id, t.title, t.description, t.rank, t.created_at "
+        "FROM " + _STATUS_COUNTS.format(where="") +
+        "LEFT JOIN (SELECT id, title, description, status, rank, created_at, "
+        "row_number() OVER (PARTITION BY status ORDER BY rank NULLS LAST, created_at, id) AS position "
+        "FROM tasks) AS t "
+        "ON t.status = c.status AND t.position <= ? "
+        "ORDER BY c.status, t.rank NULLS LAST, t.created_at, t.id"
+    )
+    OWNER_BOARD_SQL = (
+        "SELECT c.status, c.task_count, t.id, t.title, t.description, t.rank, t.created_at "
+        "FROM " + _STATUS_COUNTS.format(where="WHERE owner_id = ? ") +
+        "LEFT JOIN (SELECT id, title, description, status, rank, created_at, "
+        "row_number() OVER (PARTITION BY status ORDER BY rank NULLS LAST, created_at, id) AS position "
+        "FROM tasks WHERE owner_id = ?) AS t "
+        "ON t.status = c.status AND t.position <= ? "
+        "ORDER BY c.status, t.rank NULLS LAST, t.created_at, t.id"
+    )
+
+    def _datetime(self, value) -> datetime:
+        return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def subtract_status_counts(database, table: str):
+    """Take the tasks in ``table``, e.g. a partition detached from tasks, off the counts."""
+    # A negative delta in slot 0; any slot will do, as the board sums them. SQLite needs the
+    # WHERE to tell the upsert's ON CONFLICT from a join's ON
+    database.execute_sql(
+        f"INSERT INTO {STATUS_COUNTS_TABLE} (owner_id, status, slot, task_count) "
+        f"SELECT COALESCE(owner_id, 0), status, 0, -COUNT(*) FROM {table} WHERE TRUE "
+        "GROUP BY COALESCE(owner_id, 0), status "
+        f"ON CONFLICT (owner_id, status, slot) DO UPDATE SET task_count = {STATUS_COUNTS_TABLE}.task_count "
+        "+ EXCLUDED.task_count")
+
+
+def get_task_board(database) -> TaskBoard:
+    """Pick the board backend matching the database the Task model is bound to."""
+    if isinstance(database, SqliteDatabase):
+        return SqliteTaskBoard(database)
+    return PostgresTaskBoard(database)
@@ -0,0 +1,257 @@
+# app/db/change_feed.py
+import asyncio
+import itertools
+import json
+import os
+import select
+import threading
+from collections import deque
+from typing import Optional
+
+from peewee import SqliteDatabase
+
+from app.db.database import dedicated_connection
+from app.utils.metrics import register_metrics
+
+# NOTIFY channel the tasks trigger publishes on
+CHANGE_CHANNEL = 'task_changes'
+# Events each worker keeps for clients resuming with Last-Event-ID
+CHANGE_BACKLOG_SIZE = int(os.getenv('TASK_CHANGE_BACKLOG', 1000))
+# Events buffered per subscriber before it is told to resynchronise
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv('TASK_CHANGE_QUEUE_SIZE', 256))
+# Seconds the listener waits on the socket before checking whether it should stop
+LISTEN_POLL_INTERVAL = 1.0
+# Sent when events were missed: the client must refetch the task list before applying deltas again
+RESET_EVENT = {"op": "reset"}
+# Transaction-local setting under which the trigger stays quiet; set by writes of many rows
+# (see app.db.task_import), which send RESET_EVENT once instead of an event per row
+BULK_WRITE_SETTING = 'app.bulk_task_write'
+
+POSTGRES_INSTALL_SQL = (
+    "CREATE SEQUENCE IF NOT EXISTS task_change_seq",
+    "CREATE OR REPLACE FUNCTION notify_task_change() RETURNS trigger AS $$ "
+    "DECLARE seq bigint; payload text; "
+    "BEGIN "
+    f"IF current_setting('{BULK_WRITE_SETTING}', true) = 'on' THEN RETURN NULL; END IF; "
+    "seq := nextval('task_change_seq'); "
+    "IF TG_OP = 'DELETE' THEN "
+    "payload := json_build_object('seq', seq, 'op', 'delete', 'id', OLD.id, 'owner_id', OLD.owner_id)::text; "
+    "ELSE "
+    "payload := json_build_object('seq', seq, 'op', lower(TG_OP), 'id', NEW.id, 'owner_id', NEW.owner_id, "
+    "'task', json_build_object("
+    "'id', NEW.id, 'title', NEW.title, 'description', NEW.description, 'status', NEW.status))::text; "
+    # NOTIFY payloads are capped at 8000 bytes; larger rows go out as bare ids for the client to refetch
+    "IF octet_length(payload) > 7900 THEN "
+    "payload := json_build_object('seq', seq, 'op', lower(TG_OP), 'id', NEW.id, 'owner_id', NEW.owner_id)::text; "
+    "END IF; "
+    "END IF; "
+    f"PERFORM pg_notify('{CHANGE_CHANNEL}', payload); "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql",
+    "DROP TRIGGER IF EXISTS tasks_notify_change ON tasks",
+    "CREATE TRIGGER tasks_notify_change AFTER INSERT OR UPDATE OR DELETE ON tasks "
+    "FOR EACH ROW EXECUTE FUNCTION notify_task_change()",
+)
+# Dropped and recreated, so reinstalling picks up a changed payload
+SQLITE_INSTALL_SQL = tuple(
+    sql
+    for event, row, task in (
+        ("INSERT", "new", ", 'task', json_object('id', new.id, 'title', new.title, "
+                          "'description', new.description, 'status', new.status)"),
+        ("UPDATE", "new", ", 'task', json_object('id', new.id, 'title', new.title, "
+                          "'description', new.description, 'status', new.status)"),
+        ("DELETE", "old", ""),
+    )
+    for sql in (
+        f"DROP TRIGGER IF EXISTS tasks_notify_change_{event}",
+        f"CREATE TRIGGER tasks_notify_change_{event} AFTER {event} ON tasks BEGIN "
+        f"SELECT notify_task_change(json_object('op', '{event.lower()}', 'id', {row}.id, "
+        f"'owner_id', {row}.owner_id{task})); END",
+    )
+)
+
+
+class Subscription:
+    """One connected client: a bounded queue the hub fills from any thread and the client drains."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def push(self, event: dict):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event: dict):
+        if self.queue.full():
+            # A client this far behind has to resynchronise anyway, so drop its backlog
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = RESET_EVENT
+        self.queue.put_nowait(event)
+
+
+class ChangeHub:
+    """
+    Fans task change events out to the subscribers of this worker.
+
+    Events arrive from a single listener per worker (see ``attach``), so the number of
+    database connections does not grow with the number of open clients. The last events
+    are kept so a reconnecting client can resume after the ``seq`` it last saw; a token that
+    has already left the backlog gets a reset event instead.
+    """
+
+    def __init__(self, backlog_size: int = CHANGE_BACKLOG_SIZE, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._backlog = deque(maxlen=backlog_size)
+        self._subscribers = set()
+        self._listener = None
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def attach(self, listener):
+        """Use ``listener`` as the event source; it is started by the first subscription."""
+        self._listener = listener
+
+    def publish(self, event: dict):
+        """Record ``event`` and deliver it to every subscriber. Safe to call from any thread."""
+        with self._lock:
+            if event is not RESET_EVENT:
+                self._backlog.append(event)
+            self.published += 1
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.push(event)
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscription:
+        """Register a subscriber on the running event loop, replaying events after ``last_event_id``."""
+        if self._listener is not None:
+            self._listener.start()
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            replay = self._replay_after(last_event_id)
+            self._subscribers.add(subscription)
+        if replay is None or len(replay) > self.queue_size:
+            replay = [RESET_EVENT]
+        for event in replay:
+            subscription.queue.put_nowait(event)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"subscribers": len(self._subscribers), "published": self.published,
+                    "backlog": len(self._backlog)}
+
+    def _replay_after(self, last_event_id: Optional[str]) -> Optional[list]:
+        # Events are matched by position rather than compared by seq: sequence values are
+        # taken at write time, but NOTIFY delivers in commit order
+        if not last_event_id:
+            return []
+        events = list(self._backlog)
+        for position, event in enumerate(events):
+            if str(event.get("seq")) == last_event_id:
+                return events[position + 1:]
+        return None
+
+
+class ChangeListener:
+    """Installs the tasks change triggers and feeds their events into a ChangeHub."""
+
+    def __init__(self, database, hub: ChangeHub):
+        self.database = database
+        self.hub = hub
+
+    def install(self):
+        """Create the change triggers. Safe to run repeatedly."""
+        install_change_triggers(self.database)
+
+    def start(self):
+        """Begin delivering events to the hub. Safe to call repeatedly."""
+
+
+class PostgresChangeListener(ChangeListener):
+    """LISTENs on a connection of its own in a background thread; one per worker process."""
+
+    def __init__(self, database, hub: ChangeHub):
+        super().__init__(database, hub)
+        self._thread = None
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="task-change-listener", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                print(f"Task change listener failed, reconnecting: {e}")  # Replace with proper logging in production
+                # Notifications sent while disconnected are lost, so subscribers must resynchronise
+                self.hub.publish(RESET_EVENT)
+                self._stopping.wait(LISTEN_POLL_INTERVAL)
+
+    def _listen(self):
+        conn = dedicated_connection(self.database)  # Autocommit, so notifications are delivered as they arrive
+        try:
+            conn.cursor().execute(f"LISTEN {CHANGE_CHANNEL}")
+            while not self._stopping.is_set():
+                if select.select([conn], [], [], LISTEN_POLL_INTERVAL) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self.hub.publish(json.loads(conn.notifies.pop(0).payload))
+        finally:
+            conn.close()
+
+
+class SqliteChangeListener(ChangeListener):
+    """
+    Local stand-in: the triggers call a Python function that publishes straight to the hub.
+
+    Events are published as the statement runs rather than on commit, which is close enough
+    for development and tests.
+    """
+
+    def __init__(self, database, hub: ChangeHub):
+        super().__init__(database, hub)
+        self._seq = itertools.count(1)
+        database.register_function(self._notify, 'notify_task_change', 1)
+
+    def _notify(self, payload: str):
+        self.hub.publish({"seq": next(self._seq), **json.loads(payload)})
+
+
+def install_change_triggers(database):
+    """Create the task change triggers matching ``database``. Safe to run repeatedly."""
+    if isinstance(database, SqliteDatabase):
+        for sql in SQLITE_INSTALL_SQL:
+            database.execute_sql(sql)
+        return
+    with database.atomic():
+        for sql in POSTGRES_INSTALL_SQL:
+            database.execute_sql(sql)
+
+
+def get_change_listener(database, hub: ChangeHub) -> ChangeListener:
+    """Pick the change listener matching the database the Task model is bound to."""
+    if isinstance(database, SqliteDatabase):
+        return SqliteChangeListener(database, hub)
+    return PostgresChangeListener(database, hub)
+
+
+# Hub shared by every TaskRoutes in this process
+task_changes = ChangeHub()
+register_metrics('task_changes', task_changes.stats)
@@ -1,21 +1,198 @@
 # app/db/database.py
+import asyncio
 import os
-from peewee import PostgresqlDatabase
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional, Sequence
+
+from peewee import _ConnectionState, SelectBase
+from playhouse.pool import PooledDatabase, PooledPostgresqlDatabase, MaxConnectionsExceeded
 from dotenv import load_dotenv, dotenv_values
+from starlette.concurrency import run_in_threadpool
+
+from app.db.routing import ReplicaRouter, current_read_target, mark_write
+from app.utils.metrics import register_metrics
 
 load_dotenv()
 
+# Connections the pool may hold open at once, checked out or idle
+DB_POOL_MAX_CONNECTIONS = int(os.getenv('DB_POOL_MAX_CONNECTIONS', 20))
+# Seconds after which an idle pooled connection is closed instead of reused
+DB_POOL_STALE_TIMEOUT = float(os.getenv('DB_POOL_STALE_TIMEOUT', 300))
+# Seconds a request waits for a free connection before failing
+DB_POOL_WAIT_TIMEOUT = float(os.getenv('DB_POOL_WAIT_TIMEOUT', 10))
+# Comma-separated URLs of read replicas of DATABASE_PUBLIC_URL; none by default
+DB_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+
+# Peewee connection state of the current request; set by Dependency.get_db
+_request_state: ContextVar[Optional[dict]] = ContextVar('db_request_state', default=None)
+
+
+class RequestConnectionState(_ConnectionState):
+    """
+    Peewee connection state kept per request instead of per thread.
+
+    The connection a request checks out, the sync handler using it and the return to the
+    pool may each run on a different threadpool thread, so a thread-local state would lose
+    the connection between them. Every thread runs in a copy of the request's context and
+    so sees the same state dict, in which each database keeps its own entry. Outside a
+    request (startup, scripts, tests) the state falls back to one per thread.
+    """
+
+    def __init__(self, **kwargs):
+        object.__setattr__(self, '_local', threading.local())
+        super().__init__(**kwargs)
+
+    def _store(self) -> dict:
+        state = _request_state.get()
+        if state is None:
+            state = self._local.__dict__
+        else:
+            state = state.setdefault(id(self), {})  # The primary and each replica connect separately
+        if not state:
+            state.update(closed=True, conn=None, ctx=[], transactions=[])
+        return state
+
+    def __getattr__(self, name):
+        try:
+            return self._store()[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self._store()[name] = value
+
+
+def begin_request_state():
+    """Give the current request its own peewee connection state. Call from the request's event loop task."""
+    _request_state.set({})
+
+
+class PingingPooledPostgresqlDatabase(PooledPostgresqlDatabase):
+    """
+    Pooled Postgres database that pings connections on checkout and reports pool usage.
+
+    Inside a ``replica_reads`` block (see app.db.routing) its cursors come from the replica
+    the router picked; any other statement that is not a SELECT marks the request as having
+    written, which keeps its later reads on the primary.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._state = RequestConnectionState()
+        self.router = None  # Set by Database when replicas are configured
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._stats_lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def _is_closed(self, conn):
+        # Pre-ping: a connection the server or a proxy dropped while idle is replaced, not handed out
+        if super()._is_closed(conn):
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception:
+            return True
+        return False
+
+    def cursor(self, commit=None, named_cursor=None):
+        target = current_read_target()
+        if target is not None and target is not self:
+            return target.cursor(commit, named_cursor)
+        return super().cursor(commit, named_cursor)
+
+    def execute(self, query, commit=None, **context_options):
+        if current_read_target() is None and not isinstance(query, SelectBase):
+            mark_write()
+        return super().execute(query, commit, **context_options)
+
+    def stats(self) -> dict:
+        in_use, idle = len(self._in_use), len(self._connections)
+        with self._stats_lock:
+            return {
+                "max_connections": self._max_connections,
+                "in_use": in_use,
+                "idle": idle,
+                "utilisation": in_use / self._max_connections if self._max_connections else 0.0,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": self.wait_seconds_total / self.checkouts * 1000 if self.checkouts else 0.0,
+                "wait_ms_max": self.wait_seconds_max * 1000,
+            }
+
+
+def dedicated_connection(database):
+    """Open a driver connection outside the pool, for long-lived or cross-thread use. The caller closes it."""
+    if isinstance(database, PooledDatabase):
+        return super(PooledDatabase, database)._connect()
+    return database._connect()
+
+
 class Database:
 
-    def __init__(self, database_url: str):
-        self.database = PostgresqlDatabase(database_url)
+    def __init__(self, database_url: str, replica_urls: Sequence[str] = ()):
+        self.database = self._pool(database_url)
+        # Replicas get pools of the same size; a request holds a primary slot while it reads
+        # from one, so they never have more checkouts than the primary
+        self.replicas = [self._pool(url) for url in replica_urls]
+        if self.replicas:
+            self.database.router = ReplicaRouter(self.database, self.replicas)
+        # One slot per pooled connection; requests queue here, on the event loop, rather than
+        # in peewee's sleep-and-retry loop, where waiters would hold every threadpool thread
+        # and starve the requests that already have a connection of threads to finish on
+        self._slots = asyncio.Semaphore(DB_POOL_MAX_CONNECTIONS)
 
     def connect(self):
         self.database.connect()
 
     def close(self):
-        if not self.database.is_closed():
-            self.database.close()
+        # Returns the connections to their pools rather than closing them. Replicas are only
+        # connected once a replica_reads block picked them
+        for database in [self.database, *self.replicas]:
+            if not database.is_closed():
+                database.close()
+
+    async def acquire(self):
+        """Check a connection out for the current request. Raises MaxConnectionsExceeded after the wait timeout."""
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), DB_POOL_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.database.record_wait(time.perf_counter() - start, timed_out=True)
+            raise MaxConnectionsExceeded('Timed out waiting for a pooled connection.')
+        try:
+            await run_in_threadpool(self.connect)  # May open a new connection or ping an idle one
+        except BaseException:
+            self._slots.release()
+            raise
+        self.database.record_wait(time.perf_counter() - start)
+
+    async def release(self):
+        """Return the connection checked out by ``acquire``."""
+        try:
+            await run_in_threadpool(self.close)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _pool(database_url: str) -> PingingPooledPostgresqlDatabase:
+        return PingingPooledPostgresqlDatabase(
+            database_url,
+            max_connections=DB_POOL_MAX_CONNECTIONS,
+            stale_timeout=DB_POOL_STALE_TIMEOUT,
+            timeout=DB_POOL_WAIT_TIMEOUT,
+        )
 
     def create_tables(self, models):
         """Create tables in the database."""
@@ -23,4 +200,7 @@ class Database:
             self.database.create_tables(models, safe=True)
 
 db_url = f"{os.getenv('DATABASE_PUBLIC_URL')}"
-database_instance = Database(db_url)
\ No newline at end of file
+database_instance = Database(db_url, DB_REPLICA_URLS)
+register_metrics('db_pool', database_instance.database.stats)
+if database_instance.database.router is not None:
+    register_metrics('db_replicas', database_instance.database.router.stats)
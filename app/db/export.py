@@ -0,0 +1,102 @@
+# app/db/export.py
+import os
+import threading
+import uuid
+from typing import Iterator, List
+
+from peewee import SqliteDatabase
+
+from app.db.database import dedicated_connection
+from app.utils.metrics import register_metrics
+
+# Exports streaming at once. Each holds a connection outside the pool for as long as its
+# client takes to download, so further ones are turned away rather than left to use up the
+# server's max_connections
+EXPORT_MAX_CONCURRENT = int(os.getenv('EXPORT_MAX_CONCURRENT', 4))
+
+
+class ExportsBusy(RuntimeError):
+    """Every export connection is in use; retry later."""
+
+
+class ExportSlots:
+    """A non-blocking cap on the connections held by exports at once."""
+
+    def __init__(self, limit: int = EXPORT_MAX_CONCURRENT):
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.rejected = 0
+
+    def acquire(self):
+        """Take a slot or raise ExportsBusy; never waits."""
+        if not self._semaphore.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ExportsBusy(f"{self.limit} export(s) already running")
+        with self._lock:
+            self.in_use += 1
+
+    def release(self):
+        with self._lock:
+            self.in_use -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_use": self.in_use, "limit": self.limit, "rejected": self.rejected}
+
+
+export_slots = ExportSlots()
+register_metrics('export_connections', export_slots.stats)
+
+
+def stream_query(query, batch_size: int, database=None) -> Iterator[List[dict]]:
+    """
+    Yield the rows of a peewee SELECT as lists of at most ``batch_size`` dicts.
+
+    On Postgres the rows come from a named (server-side) cursor on a connection of its
+    own, so only one batch is held in memory however large the result is, and the whole
+    export reads from a single snapshot. The connection is not the thread-bound one peewee
+    manages, which lets a StreamingResponse pull batches from any worker thread. SQLite
+    cursors already step through rows lazily, so the stand-in uses a plain cursor.
+    ``database`` overrides the one the query's model is bound to, e.g. with a replica.
+    Postgres exports share EXPORT_MAX_CONCURRENT connections; the first batch raises
+    ExportsBusy when they are all in use.
+    """
+    database = database or query.model._meta.database
+    sql, params = query.sql()
+    if isinstance(database, SqliteDatabase):
+        cursor = database.execute_sql(sql, params)
+        conn = None
+    else:
+        export_slots.acquire()
+        try:
+            conn = dedicated_connection(database)
+        except BaseException:
+            export_slots.release()
+            raise
+        conn.autocommit = False  # Named cursors only live inside a transaction
+        cursor = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+        cursor.itersize = batch_size
+    try:
+        if conn is not None:
+            cursor.execute(sql, params)
+        columns = None
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            if columns is None:
+                # A named cursor only has a description once the first rows are fetched
+                columns = [column[0] for column in cursor.description]
+            yield [dict(zip(columns, row)) for row in rows]
+    finally:
+        cursor.close()
+        if conn is not None:
+            try:
+                conn.rollback()
+                conn.close()
+            finally:
+                export_slots.release()
@@ -0,0 +1,128 @@
+# app/db/group_commit.py
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+from app.db.routing import mark_write
+
+
+class _Waiter:
+    """One submitted item and the result its caller is waiting for."""
+
+    def __init__(self, item: Any):
+        self.item = item
+        self.event = threading.Event()
+        self.leads = False
+        self.done = False
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class GroupCommit:
+    """
+    Buffers concurrent writes for up to ``max_delay`` seconds and commits them together.
+
+    The first caller to arrive becomes the leader: it waits until ``max_batch_size`` items
+    are pending or the delay runs out (no wait while the previous batch held a single item),
+    then calls ``flush`` with the whole batch on its own thread and connection, and hands
+    each caller the result at its position. Callers that
+    arrive during a flush queue up for the next batch, whose leader is the oldest of them,
+    so under load commits overlap with collection instead of waiting behind each other.
+
+    ``flush`` must be all-or-nothing (one transaction) and return one result per item, in
+    order. When a batch fails, its items are retried one by one, so a bad item only fails
+    its own caller.
+    """
+
+    def __init__(self, flush: Callable[[List[Any]], List[Any]], max_batch_size: int = 100,
+                 max_delay: float = 0.002, clock: Callable[[], float] = time.monotonic):
+        self.flush = flush
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._clock = clock
+        self._pending: List[_Waiter] = []
+        self._leading = False
+        self._cond = threading.Condition()
+        self.batches = 0
+        self.items = 0
+        self.failed_batches = 0
+        self.largest_batch = 0
+        self._last_batch_size = 0
+
+    def submit(self, item: Any) -> Any:
+        """Write ``item`` with the next batch and return its result, raising its error if it failed."""
+        waiter = _Waiter(item)
+        with self._cond:
+            self._pending.append(waiter)
+            if not self._leading:
+                self._leading = waiter.leads = True
+            elif len(self._pending) >= self.max_batch_size:
+                self._cond.notify_all()  # The batch is full, the leader need not wait out the delay
+        if not waiter.leads:
+            waiter.event.wait()  # Set when the item is written, or when this caller is made leader
+        if waiter.leads and not waiter.done:
+            self._lead()
+        # The leader wrote on this request's connection; the others count as writes too
+        mark_write()
+        if waiter.error is not None:
+            raise waiter.error
+        return waiter.result
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "failed_batches": self.failed_batches,
+                "largest_batch": self.largest_batch,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+                "pending": len(self._pending),
+            }
+
+    def _lead(self):
+        with self._cond:
+            # A lone writer does not wait for company it never gets; items arriving during its
+            # flush still make up the next batch
+            deadline = self._clock() + (self.max_delay if self._last_batch_size > 1 else 0)
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+        try:
+            self._write(batch)
+        finally:
+            with self._cond:
+                self.batches += 1
+                self.items += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self._last_batch_size = len(batch)
+                if self._pending:
+                    successor = self._pending[0]
+                    successor.leads = True
+                    successor.event.set()
+                else:
+                    self._leading = False
+            for waiter in batch:
+                if not waiter.done and waiter.error is None:
+                    waiter.error = RuntimeError("The write batch was abandoned.")
+                waiter.done = True
+                waiter.event.set()
+
+    def _write(self, batch: List[_Waiter]):
+        try:
+            results = self.flush([waiter.item for waiter in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].error = e
+                return
+            with self._cond:
+                self.failed_batches += 1
+            for waiter in batch:
+                self._write([waiter])
+            return
+        for waiter, result in zip(batch, results):
+            waiter.result = result
+            waiter.done = True
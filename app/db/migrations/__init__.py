@@ -0,0 +1,129 @@
+# app/db/migrations/__init__.py
+import importlib
+import pkgutil
+from contextlib import contextmanager, nullcontext
+from typing import Callable, List, Optional
+
+from peewee import DatabaseError, SqliteDatabase
+
+from app.db.migrations import versions
+
+# Applied migrations, one row per version
+SCHEMA_VERSION_TABLE = 'schema_version'
+# Key of the Postgres advisory lock held while migrating, so concurrent deploys apply each script once
+MIGRATION_LOCK_KEY = 7_305_112_039
+
+CREATE_SCHEMA_VERSION_SQL = (
+    f"CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} ("
+    "version INTEGER PRIMARY KEY, "
+    "description TEXT NOT NULL, "
+    "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+)
+
+
+class SchemaVersionError(RuntimeError):
+    """The database schema is older than the one this build needs."""
+
+
+class Migration:
+    """
+    One versioned schema change, loaded from a module in app.db.migrations.versions.
+
+    A module defines ``VERSION``, ``DESCRIPTION`` and ``upgrade(database)``. It runs in a
+    transaction together with its schema_version row unless it sets ``TRANSACTIONAL = False``,
+    which statements such as CREATE INDEX CONCURRENTLY need; such a script must be safe to
+    run again if it fails halfway.
+    """
+
+    def __init__(self, version: int, description: str, upgrade: Callable, transactional: bool = True):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+        self.transactional = transactional
+
+    def __repr__(self):
+        return f"Migration({self.version}, {self.description!r})"
+
+
+def load_migrations(package=versions) -> List[Migration]:
+    """Collect the migrations of ``package`` in version order. Raises ValueError on gaps or duplicates."""
+    migrations = []
+    for module_info in pkgutil.iter_modules(package.__path__):
+        module = importlib.import_module(f"{package.__name__}.{module_info.name}")
+        migrations.append(Migration(module.VERSION, module.DESCRIPTION, module.upgrade,
+                                    getattr(module, 'TRANSACTIONAL', True)))
+    migrations.sort(key=lambda migration: migration.version)
+    if [migration.version for migration in migrations] != list(range(1, len(migrations) + 1)):
+        raise ValueError(f"Migration versions must run 1..n without gaps: {migrations}")
+    return migrations
+
+
+MIGRATIONS = load_migrations()
+# Version of the schema this build expects
+LATEST_VERSION = MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def current_version(database) -> int:
+    """Version the database schema is at; 0 if it was never migrated. A single-row query."""
+    try:
+        row = database.execute_sql(f"SELECT MAX(version) FROM {SCHEMA_VERSION_TABLE}").fetchone()
+    except DatabaseError:
+        if database.in_transaction():
+            raise
+        return 0  # No schema_version table yet
+    return row[0] or 0
+
+
+def check_schema(database, required: int = LATEST_VERSION) -> int:
+    """Return the schema version, raising SchemaVersionError if it is behind ``required``."""
+    version = current_version(database)
+    if version < required:
+        raise SchemaVersionError(f"Database schema is at version {version}, this build needs {required}. "
+                                 f"Run `python -m app.db.migrations upgrade` first.")
+    return version
+
+
+def upgrade(database, target: Optional[int] = None, migrations: Optional[List[Migration]] = None) -> List[Migration]:
+    """Apply the migrations above the current version, up to ``target``. Returns the ones applied."""
+    migrations = MIGRATIONS if migrations is None else migrations
+    if target is None:
+        target = migrations[-1].version if migrations else 0
+    applied = []
+    with connection(database):
+        database.execute_sql(CREATE_SCHEMA_VERSION_SQL)
+        with _migration_lock(database):
+            version = current_version(database)  # Read under the lock: another deploy may have just migrated
+            for migration in migrations:
+                if version < migration.version <= target:
+                    _apply(database, migration)
+                    applied.append(migration)
+    return applied
+
+
+def connection(database):
+    """Connect ``database`` for a block and close it after, unless it was already connected."""
+    return database.connection_context() if database.is_closed() else nullcontext()
+
+
+def _apply(database, migration: Migration):
+    print(f"Applying migration {migration.version}: {migration.description}")  # Replace with proper logging in production
+    record_sql = f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description) VALUES ({database.param}, {database.param})"
+    if migration.transactional:
+        with database.atomic():
+            migration.upgrade(database)
+            database.execute_sql(record_sql, (migration.version, migration.description))
+    else:
+        migration.upgrade(database)
+        database.execute_sql(record_sql, (migration.version, migration.description))
+
+
+@contextmanager
+def _migration_lock(database):
+    if isinstance(database, SqliteDatabase):
+        yield  # SQLite serialises writers itself
+        return
+    database.execute_sql("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+    try:
+        yield
+    finally:
+        database.execute_sql("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
@@ -0,0 +1,43 @@
+"""
+Schema migrations command line.
+
+Usage:
+    python -m app.db.migrations status
+    python -m app.db.migrations upgrade [--to VERSION]
+
+Run ``upgrade`` once per deploy, before the new app version starts (see the Procfile);
+the app itself only checks the version at startup.
+"""
+import argparse
+import sys
+from typing import List, Optional
+
+from app.db.database import database_instance
+from app.db.migrations import LATEST_VERSION, MIGRATIONS, connection, current_version, upgrade
+
+
+def main(argv: Optional[List[str]] = None, database=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.db.migrations", description="Versioned schema migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="Show the schema version and pending migrations")
+    upgrade_parser = commands.add_parser("upgrade", help="Apply pending migrations")
+    upgrade_parser.add_argument("--to", type=int, default=None, help="Stop at this version")
+    args = parser.parse_args(argv)
+    database = database or database_instance.database
+
+    if args.command == "status":
+        with connection(database):
+            version = current_version(database)
+        print(f"Schema version {version}, latest {LATEST_VERSION}")
+        for migration in MIGRATIONS:
+            if migration.version > version:
+                print(f"  pending {migration.version}: {migration.description}")
+        return 0
+
+    applied = upgrade(database, target=args.to)
+    print(f"Applied {len(applied)} migration(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
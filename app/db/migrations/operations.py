@@ -0,0 +1,67 @@
+# app/db/migrations/operations.py
+# Schema operations shared by the migration scripts
+from typing import List
+
+from peewee import SqliteDatabase
+
+
+def create_index_concurrently(database, name: str, table: str, columns: str, using: str = '', unique: bool = False,
+                              include: str = '', where: str = ''):
+    """
+    Create an index without blocking writes to ``table``. Safe to run repeatedly.
+
+    Postgres builds it with CREATE INDEX CONCURRENTLY, which cannot run in a transaction,
+    so call it from a migration with ``TRANSACTIONAL = False``. A build that failed halfway
+    leaves an invalid index behind, which is dropped and rebuilt. Partitioned tables have no
+    concurrent builds, so the index is declared on the parent alone, built concurrently on
+    each partition and attached. SQLite gets a plain CREATE INDEX, or none for index methods
+    it lacks, such as BRIN. ``include`` lists non-key columns stored in the index for
+    index-only scans; SQLite has no INCLUDE, so they are appended to its key instead.
+    ``where`` makes it a partial index of the rows matching that condition.
+    """
+    unique_sql = 'UNIQUE ' if unique else ''
+    if isinstance(database, SqliteDatabase):
+        if using in ('', 'btree'):
+            key = f"{columns}, {include}" if include and not unique else columns
+            predicate = f" WHERE {where}" if where else ''
+            database.execute_sql(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({key}){predicate}")
+        return
+    definition = f"{'USING ' + using + ' ' if using else ''}({columns})"
+    if include:
+        definition += f" INCLUDE ({include})"
+    if where:
+        definition += f" WHERE {where}"
+    if relkind(database, table) != 'p':
+        _build_concurrently(database, name, table, definition, unique_sql)
+        return
+    database.execute_sql(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON ONLY {table} {definition}")
+    for partition in partitions_of(database, table):
+        child = f"{partition}_{name}"[:63]  # Postgres identifier limit
+        _build_concurrently(database, child, partition, definition, unique_sql)
+        if not _index_attached(database, child):
+            database.execute_sql(f"ALTER INDEX {name} ATTACH PARTITION {child}")
+
+
+def relkind(database, table: str):
+    """pg_class.relkind of ``table``: 'r' for a plain table, 'p' for a partitioned one; None if missing."""
+    row = database.execute_sql("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,)).fetchone()
+    return row[0] if row else None
+
+
+def partitions_of(database, table: str) -> List[str]:
+    cursor = database.execute_sql("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = to_regclass(%s) "
+                                  "ORDER BY 1", (table,))
+    return [name for name, in cursor.fetchall()]
+
+
+def _build_concurrently(database, name: str, table: str, definition: str, unique_sql: str):
+    row = database.execute_sql("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)",
+                               (name,)).fetchone()
+    if row is not None and not row[0]:
+        database.execute_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    database.execute_sql(f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}")
+
+
+def _index_attached(database, index: str) -> bool:
+    row = database.execute_sql("SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(%s)", (index,)).fetchone()
+    return row is not None
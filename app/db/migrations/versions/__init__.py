@@ -0,0 +1 @@
+# Migration scripts, one module per schema version; see app.db.migrations.Migration
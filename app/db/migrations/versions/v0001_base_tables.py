@@ -0,0 +1,45 @@
+# Tasks, users and table_versions as they stood before versioned migrations. The models are
+# frozen copies, so this script keeps creating the same schema as the app models change.
+# Ids are serial: the app inserts tasks and users without one.
+from peewee import Model, AutoField, CharField, TextField, DateTimeField, BigIntegerField, fn
+
+VERSION = 1
+DESCRIPTION = "Create tasks, users and table_versions"
+
+
+class Task(Model):
+    id = AutoField()
+    title = CharField()
+    description = TextField(null=True)
+    status = TextField(null=False)
+    created_at = DateTimeField(default=fn.now)
+
+    class Meta:
+        table_name = 'tasks'
+
+
+class User(Model):
+    id = AutoField()
+    username = CharField(unique=True, max_length=50)
+    email = CharField(unique=True, max_length=100)
+    password = CharField(max_length=100)
+    created_at = DateTimeField(default=fn.now)
+    role = CharField(default="user")
+
+    class Meta:
+        table_name = 'users'
+
+
+class TableVersion(Model):
+    table_name = CharField(primary_key=True, max_length=63)
+    version = BigIntegerField(default=0)
+
+    class Meta:
+        table_name = 'table_versions'
+
+
+def upgrade(database):
+    # safe=True: databases created by the old create_tables at startup already have these.
+    # The task indexes are left to migration 3, which builds them concurrently
+    with database.bind_ctx([Task, User, TableVersion]):
+        database.create_tables([Task, User, TableVersion], safe=True)
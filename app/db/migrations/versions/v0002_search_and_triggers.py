@@ -0,0 +1,82 @@
+# The search column, table version triggers and task change trigger as they stood at this
+# version. Frozen copies of what app.db.search, app.db.versioning and app.db.change_feed
+# installed then, so this script keeps creating the same schema as those modules change.
+from peewee import SqliteDatabase
+
+VERSION = 2
+DESCRIPTION = "Full-text search, table version triggers and the task change NOTIFY trigger"
+
+POSTGRES_SQL = (
+    # Search: a generated tsvector column with a GIN index
+    "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS task_search_vector ON tasks USING GIN (search_vector)",
+    # Table versions: one statement-level trigger per table
+    "CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$ "
+    "BEGIN "
+    "INSERT INTO table_versions (table_name, version) VALUES (TG_TABLE_NAME, 1) "
+    "ON CONFLICT (table_name) DO UPDATE SET version = table_versions.version + 1; "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql",
+    *(sql.format(table=table) for table in ('tasks', 'users') for sql in (
+        "DROP TRIGGER IF EXISTS {table}_bump_version ON {table}",
+        "CREATE TRIGGER {table}_bump_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()",
+    )),
+    # Task changes: a NOTIFY per row on the task_changes channel
+    "CREATE SEQUENCE IF NOT EXISTS task_change_seq",
+    "CREATE OR REPLACE FUNCTION notify_task_change() RETURNS trigger AS $$ "
+    "DECLARE seq bigint := nextval('task_change_seq'); payload text; "
+    "BEGIN "
+    "IF TG_OP = 'DELETE' THEN "
+    "payload := json_build_object('seq', seq, 'op', 'delete', 'id', OLD.id)::text; "
+    "ELSE "
+    "payload := json_build_object('seq', seq, 'op', lower(TG_OP), 'id', NEW.id, 'task', json_build_object("
+    "'id', NEW.id, 'title', NEW.title, 'description', NEW.description, 'status', NEW.status))::text; "
+    "IF octet_length(payload) > 7900 THEN "
+    "payload := json_build_object('seq', seq, 'op', lower(TG_OP), 'id', NEW.id)::text; "
+    "END IF; "
+    "END IF; "
+    "PERFORM pg_notify('task_changes', payload); "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql",
+    "DROP TRIGGER IF EXISTS tasks_notify_change ON tasks",
+    "CREATE TRIGGER tasks_notify_change AFTER INSERT OR UPDATE OR DELETE ON tasks "
+    "FOR EACH ROW EXECUTE FUNCTION notify_task_change()",
+)
+SQLITE_SQL = (
+    # Search: an FTS5 table kept in sync by triggers
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5("
+    "title, description, content='tasks', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN "
+    "INSERT INTO tasks_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN "
+    "INSERT INTO tasks_fts (tasks_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE ON tasks BEGIN "
+    "INSERT INTO tasks_fts (tasks_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO tasks_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')",
+    # Table versions: row-level triggers
+    *(f"CREATE TRIGGER IF NOT EXISTS {table}_bump_version_{event} AFTER {event} ON {table} BEGIN "
+      f"INSERT INTO table_versions (table_name, version) VALUES ('{table}', 1) "
+      "ON CONFLICT (table_name) DO UPDATE SET version = version + 1; END"
+      for table in ('tasks', 'users') for event in ("INSERT", "UPDATE", "DELETE")),
+    # Task changes: calls of the notify_task_change() function the change listener registers
+    *(f"CREATE TRIGGER IF NOT EXISTS tasks_notify_change_{event} AFTER {event} ON tasks BEGIN "
+      f"SELECT notify_task_change(json_object('op', '{event.lower()}', 'id', {row}.id{task})); END"
+      for event, row, task in (
+          ("INSERT", "new", ", 'task', json_object('id', new.id, 'title', new.title, "
+                            "'description', new.description, 'status', new.status)"),
+          ("UPDATE", "new", ", 'task', json_object('id', new.id, 'title', new.title, "
+                            "'description', new.description, 'status', new.status)"),
+          ("DELETE", "old", ""),
+      )),
+)
+
+
+def upgrade(database):
+    for sql in SQLITE_SQL if isinstance(database, SqliteDatabase) else POSTGRES_SQL:
+        database.execute_sql(sql)
@@ -0,0 +1,17 @@
+from app.db.migrations.operations import create_index_concurrently
+
+VERSION = 3
+DESCRIPTION = "Task title and keyset pagination indexes, built concurrently"
+TRANSACTIONAL = False  # CREATE INDEX CONCURRENTLY cannot run in a transaction
+
+# Named as peewee named them, so databases that already have them skip the build
+INDEXES = (
+    ('task_title', 'title'),
+    ('task_created_at_id', 'created_at, id'),  # Keyset pagination order
+    ('task_status_created_at_id', 'status, created_at, id'),  # Status filter + keyset pagination
+)
+
+
+def upgrade(database):
+    for name, columns in INDEXES:
+        create_index_concurrently(database, name, 'tasks', columns)
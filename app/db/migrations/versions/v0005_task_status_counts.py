@@ -0,0 +1,68 @@
+# The task_status_counts table and its triggers as app.db.board installed them at this
+# version; a frozen copy, so this script keeps creating the same schema as that module changes.
+from peewee import SqliteDatabase
+
+VERSION = 5
+DESCRIPTION = "task_status_counts table kept up to date by triggers on tasks"
+
+CREATE_SQL = (
+    "CREATE TABLE IF NOT EXISTS task_status_counts ("
+    "status TEXT PRIMARY KEY, "
+    "task_count BIGINT NOT NULL DEFAULT 0)"
+)
+# Recount from scratch; runs in the migration's transaction with the triggers, so no write is missed
+BACKFILL_SQL = (
+    "DELETE FROM task_status_counts",
+    "INSERT INTO task_status_counts (status, task_count) SELECT status, COUNT(*) FROM tasks GROUP BY status",
+)
+_UPSERT_DELTAS = (
+    "INSERT INTO task_status_counts (status, task_count) "
+    "SELECT status, SUM(delta) FROM ({deltas}) AS d GROUP BY status HAVING SUM(delta) <> 0 "
+    "ORDER BY status "
+    "ON CONFLICT (status) DO UPDATE SET task_count = task_status_counts.task_count + EXCLUDED.task_count; "
+)
+POSTGRES_SQL = (
+    "CREATE OR REPLACE FUNCTION count_task_statuses() RETURNS trigger AS $$ "
+    "BEGIN "
+    "IF TG_OP = 'INSERT' THEN "
+    + _UPSERT_DELTAS.format(deltas="SELECT status, 1 AS delta FROM new_rows") +
+    "ELSIF TG_OP = 'DELETE' THEN "
+    + _UPSERT_DELTAS.format(deltas="SELECT status, -1 AS delta FROM old_rows") +
+    "ELSIF TG_OP = 'UPDATE' THEN "
+    + _UPSERT_DELTAS.format(deltas="SELECT status, 1 AS delta FROM new_rows "
+                                   "UNION ALL SELECT status, -1 FROM old_rows") +
+    "ELSE "
+    "UPDATE task_status_counts SET task_count = 0; "
+    "END IF; "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql",
+    *(f"DROP TRIGGER IF EXISTS {trigger} ON tasks"
+      for trigger in ('tasks_count_insert', 'tasks_count_update', 'tasks_count_delete', 'tasks_count_truncate')),
+    "CREATE TRIGGER tasks_count_insert AFTER INSERT ON tasks REFERENCING NEW TABLE AS new_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION count_task_statuses()",
+    "CREATE TRIGGER tasks_count_update AFTER UPDATE ON tasks REFERENCING OLD TABLE AS old_rows "
+    "NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION count_task_statuses()",
+    "CREATE TRIGGER tasks_count_delete AFTER DELETE ON tasks REFERENCING OLD TABLE AS old_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION count_task_statuses()",
+    "CREATE TRIGGER tasks_count_truncate AFTER TRUNCATE ON tasks "
+    "FOR EACH STATEMENT EXECUTE FUNCTION count_task_statuses()",
+)
+SQLITE_SQL = (
+    "CREATE TRIGGER IF NOT EXISTS tasks_count_insert AFTER INSERT ON tasks BEGIN "
+    "INSERT INTO task_status_counts (status, task_count) VALUES (new.status, 1) "
+    "ON CONFLICT (status) DO UPDATE SET task_count = task_count + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_count_delete AFTER DELETE ON tasks BEGIN "
+    "UPDATE task_status_counts SET task_count = task_count - 1 WHERE status = old.status; END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_count_update AFTER UPDATE OF status ON tasks "
+    "WHEN old.status IS NOT new.status BEGIN "
+    "UPDATE task_status_counts SET task_count = task_count - 1 WHERE status = old.status; "
+    "INSERT INTO task_status_counts (status, task_count) VALUES (new.status, 1) "
+    "ON CONFLICT (status) DO UPDATE SET task_count = task_count + 1; END",
+)
+
+
+def upgrade(database):
+    # The board reads the (status, created_at, id) index from migration 3
+    triggers = SQLITE_SQL if isinstance(database, SqliteDatabase) else POSTGRES_SQL
+    for sql in (CREATE_SQL, *triggers, *BACKFILL_SQL):
+        database.execute_sql(sql)
@@ -0,0 +1,8 @@
+VERSION = 7
+DESCRIPTION = "Row version column on tasks for optimistic concurrency"
+
+
+def upgrade(database):
+    # A constant default is stored in the catalog, so Postgres adds the column without rewriting tasks
+    if 'version' not in {column.name for column in database.get_columns('tasks')}:
+        database.execute_sql("ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
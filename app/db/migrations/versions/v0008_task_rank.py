@@ -0,0 +1,17 @@
+from peewee import SqliteDatabase
+
+from app.db.migrations.operations import create_index_concurrently
+
+VERSION = 8
+DESCRIPTION = "Fractional rank column on tasks for manual ordering within a status"
+TRANSACTIONAL = False  # CREATE INDEX CONCURRENTLY cannot run in a transaction
+
+
+def upgrade(database):
+    if 'rank' not in {column.name for column in database.get_columns('tasks')}:
+        # Nullable with no default, so adding it rewrites nothing. Ranks compare bytewise
+        # (see app.utils.ranks), whatever the database's default collation
+        collation = '' if isinstance(database, SqliteDatabase) else ' COLLATE "C"'
+        database.execute_sql(f"ALTER TABLE tasks ADD COLUMN rank TEXT{collation}")
+    # Board order: ranked tasks first, then the never moved ones oldest first
+    create_index_concurrently(database, 'task_status_rank_created_at_id', 'tasks', 'status, rank, created_at, id')
@@ -0,0 +1,81 @@
+from peewee import SqliteDatabase
+
+from app.db.migrations.operations import create_index_concurrently
+
+VERSION = 9
+DESCRIPTION = "Task owner column, its foreign key to users and indexes of an owner's tasks"
+TRANSACTIONAL = False  # CREATE INDEX CONCURRENTLY cannot run in a transaction
+
+FOREIGN_KEY = 'tasks_owner_id_fkey'
+
+# The task change trigger as app.db.change_feed installed it at this version, now with the
+# owner in every event; a frozen copy, so this script keeps creating the same schema
+CHANGE_TRIGGER_POSTGRES_SQL = (
+    "CREATE SEQUENCE IF NOT EXISTS task_change_seq",
+    "CREATE OR REPLACE FUNCTION notify_task_change() RETURNS trigger AS $$ "
+    "DECLARE seq bigint; payload text; "
+    "BEGIN "
+    "IF current_setting('app.bulk_task_write', true) = 'on' THEN RETURN NULL; END IF; "
+    "seq := nextval('task_change_seq'); "
+    "IF TG_OP = 'DELETE' THEN "
+    "payload := json_build_object('seq', seq, 'op', 'delete', 'id', OLD.id, 'owner_id', OLD.owner_id)::text; "
+    "ELSE "
+    "payload := json_build_object('seq', seq, 'op', lower(TG_OP), 'id', NEW.id, 'owner_id', NEW.owner_id, "
+    "'task', json_build_object("
+    "'id', NEW.id, 'title', NEW.title, 'description', NEW.description, 'status', NEW.status))::text; "
+    "IF octet_length(payload) > 7900 THEN "
+    "payload := json_build_object('seq', seq, 'op', lower(TG_OP), 'id', NEW.id, 'owner_id', NEW.owner_id)::text; "
+    "END IF; "
+    "END IF; "
+    "PERFORM pg_notify('task_changes', payload); "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql",
+    "DROP TRIGGER IF EXISTS tasks_notify_change ON tasks",
+    "CREATE TRIGGER tasks_notify_change AFTER INSERT OR UPDATE OR DELETE ON tasks "
+    "FOR EACH ROW EXECUTE FUNCTION notify_task_change()",
+)
+CHANGE_TRIGGER_SQLITE_SQL = tuple(
+    sql
+    for event, row, task in (
+        ("INSERT", "new", ", 'task', json_object('id', new.id, 'title', new.title, "
+                          "'description', new.description, 'status', new.status)"),
+        ("UPDATE", "new", ", 'task', json_object('id', new.id, 'title', new.title, "
+                          "'description', new.description, 'status', new.status)"),
+        ("DELETE", "old", ""),
+    )
+    for sql in (
+        f"DROP TRIGGER IF EXISTS tasks_notify_change_{event}",
+        f"CREATE TRIGGER tasks_notify_change_{event} AFTER {event} ON tasks BEGIN "
+        f"SELECT notify_task_change(json_object('op', '{event.lower()}', 'id', {row}.id, "
+        f"'owner_id', {row}.owner_id{task})); END",
+    )
+)
+
+
+def upgrade(database):
+    if isinstance(database, SqliteDatabase):
+        if 'owner_id' not in {column.name for column in database.get_columns('tasks')}:
+            database.execute_sql("ALTER TABLE tasks ADD COLUMN owner_id INTEGER REFERENCES users (id) ON DELETE CASCADE")
+    else:
+        database.execute_sql("ALTER TABLE tasks ADD COLUMN IF NOT EXISTS owner_id INTEGER")
+        exists = database.execute_sql("SELECT 1 FROM pg_constraint WHERE conrelid = 'tasks'::regclass AND conname = %s",
+                                      (FOREIGN_KEY,)).fetchone()
+        if not exists:
+            # NOT VALID takes effect for new rows at once; the check of the existing ones that
+            # follows only needs a lock that lets reads and writes go on
+            database.execute_sql(f"ALTER TABLE tasks ADD CONSTRAINT {FOREIGN_KEY} FOREIGN KEY (owner_id) "
+                                 "REFERENCES users (id) ON DELETE CASCADE NOT VALID")
+        database.execute_sql(f"ALTER TABLE tasks VALIDATE CONSTRAINT {FOREIGN_KEY}")
+    # "My open tasks": an owner's tasks of one status in keyset order, titles included, so
+    # listing them is an index-only scan that never reads other owners' rows
+    create_index_concurrently(database, 'task_owner_id_status_created_at_id', 'tasks',
+                              'owner_id, status, created_at, id', include='title')
+    # An owner's moved tasks in column order (see app.db.ranks); the never moved ones follow
+    # in the order of the index above. Partial, so it only grows with the tasks users move
+    create_index_concurrently(database, 'task_owner_id_status_rank', 'tasks', 'owner_id, status, rank',
+                              where='rank IS NOT NULL')
+    # Change events carry the owner, so streams can be scoped to it
+    sqlite = isinstance(database, SqliteDatabase)
+    with database.atomic():
+        for sql in CHANGE_TRIGGER_SQLITE_SQL if sqlite else CHANGE_TRIGGER_POSTGRES_SQL:
+            database.execute_sql(sql)
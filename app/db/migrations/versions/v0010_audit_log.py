@@ -0,0 +1,36 @@
+from peewee import SqliteDatabase
+
+VERSION = 10
+DESCRIPTION = "Append-only audit_log table of task and user changes"
+
+# No foreign keys: entries outlive the rows they describe. The key leads with occurred_at,
+# so the table can become range-partitioned on it without changing the key
+CREATE_POSTGRES_SQL = (
+    "CREATE TABLE IF NOT EXISTS audit_log ("
+    "id BIGINT GENERATED ALWAYS AS IDENTITY, "
+    "occurred_at TIMESTAMP NOT NULL, "
+    "actor_id INTEGER, "
+    "action TEXT NOT NULL, "
+    "entity TEXT NOT NULL, "
+    "entity_id INTEGER, "
+    "changes JSONB, "
+    "PRIMARY KEY (occurred_at, id))"
+)
+CREATE_SQLITE_SQL = (
+    "CREATE TABLE IF NOT EXISTS audit_log ("
+    "id INTEGER PRIMARY KEY, "
+    "occurred_at TIMESTAMP NOT NULL, "
+    "actor_id INTEGER, "
+    "action TEXT NOT NULL, "
+    "entity TEXT NOT NULL, "
+    "entity_id INTEGER, "
+    "changes TEXT)"
+)
+
+
+def upgrade(database):
+    database.execute_sql(CREATE_SQLITE_SQL if isinstance(database, SqliteDatabase) else CREATE_POSTGRES_SQL)
+    # The history of one task or user; time ranges use the primary key. A new, empty table,
+    # so the index is built in the migration's transaction
+    database.execute_sql("CREATE INDEX IF NOT EXISTS audit_log_entity_entity_id_occurred_at ON audit_log "
+                         "(entity, entity_id, occurred_at)")
@@ -0,0 +1,47 @@
+# table_versions spread over slots, so concurrent writers to one table stop queueing on its
+# row. The function and triggers are frozen copies of what app.db.versioning installs at this
+# version, so this script keeps creating the same schema as that module changes.
+from peewee import SqliteDatabase
+
+VERSION = 11
+DESCRIPTION = "Spread each table's version over 64 slots bumped by transaction id"
+
+TABLES = ('tasks', 'users')
+
+# The existing count becomes slot 0, so versions carry on from where they were. The function
+# is replaced in the same transaction as the key its ON CONFLICT names
+POSTGRES_SQL = (
+    "ALTER TABLE table_versions ADD COLUMN IF NOT EXISTS slot SMALLINT NOT NULL DEFAULT 0",
+    "ALTER TABLE table_versions DROP CONSTRAINT IF EXISTS table_versions_pkey",
+    "ALTER TABLE table_versions ADD PRIMARY KEY (table_name, slot)",
+    "CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$ "
+    "BEGIN "
+    "INSERT INTO table_versions (table_name, slot, version) "
+    "VALUES (TG_TABLE_NAME, mod(txid_current(), 64), 1) "
+    "ON CONFLICT (table_name, slot) DO UPDATE SET version = table_versions.version + 1; "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql",
+)
+# SQLite cannot change a primary key in place: rebuild the table. The triggers go first, as
+# renaming a table checks every trigger that names it
+SQLITE_SQL = (
+    *(f"DROP TRIGGER IF EXISTS {table}_bump_version_{event}"
+      for table in TABLES for event in ("INSERT", "UPDATE", "DELETE")),
+    "CREATE TABLE table_versions_new ("
+    "table_name VARCHAR(63) NOT NULL, "
+    "slot SMALLINT NOT NULL DEFAULT 0, "
+    "version INTEGER NOT NULL DEFAULT 0, "
+    "PRIMARY KEY (table_name, slot))",
+    "INSERT INTO table_versions_new (table_name, slot, version) SELECT table_name, 0, version FROM table_versions",
+    "DROP TABLE table_versions",
+    "ALTER TABLE table_versions_new RENAME TO table_versions",
+    *(f"CREATE TRIGGER {table}_bump_version_{event} AFTER {event} ON {table} BEGIN "
+      f"INSERT INTO table_versions (table_name, slot, version) VALUES ('{table}', 0, 1) "
+      "ON CONFLICT (table_name, slot) DO UPDATE SET version = version + 1; END"
+      for table in TABLES for event in ("INSERT", "UPDATE", "DELETE")),
+)
+
+
+def upgrade(database):
+    for sql in SQLITE_SQL if isinstance(database, SqliteDatabase) else POSTGRES_SQL:
+        database.execute_sql(sql)
@@ -0,0 +1,66 @@
+# task_status_counts spread over slots, so concurrent writers of one status stop queueing on
+# its row. The function and triggers are frozen copies of what app.db.board installs at this
+# version, so this script keeps creating the same schema as that module changes.
+from peewee import SqliteDatabase
+
+VERSION = 12
+DESCRIPTION = "Spread each status's task count over 64 slots bumped by transaction id"
+
+_UPSERT_DELTAS = (
+    "INSERT INTO task_status_counts (status, slot, task_count) "
+    "SELECT status, mod(txid_current(), 64), SUM(delta) FROM ({deltas}) AS d "
+    "GROUP BY status HAVING SUM(delta) <> 0 "
+    "ORDER BY status "
+    "ON CONFLICT (status, slot) DO UPDATE SET task_count = task_status_counts.task_count + EXCLUDED.task_count; "
+)
+# The existing counts become slot 0. The function is replaced in the same transaction as the
+# key its ON CONFLICT names; the triggers calling it stay as they are
+POSTGRES_SQL = (
+    "ALTER TABLE task_status_counts ADD COLUMN IF NOT EXISTS slot SMALLINT NOT NULL DEFAULT 0",
+    "ALTER TABLE task_status_counts DROP CONSTRAINT IF EXISTS task_status_counts_pkey",
+    "ALTER TABLE task_status_counts ADD PRIMARY KEY (status, slot)",
+    "CREATE OR REPLACE FUNCTION count_task_statuses() RETURNS trigger AS $$ "
+    "BEGIN "
+    "IF TG_OP = 'INSERT' THEN "
+    + _UPSERT_DELTAS.format(deltas="SELECT status, 1 AS delta FROM new_rows") +
+    "ELSIF TG_OP = 'DELETE' THEN "
+    + _UPSERT_DELTAS.format(deltas="SELECT status, -1 AS delta FROM old_rows") +
+    "ELSIF TG_OP = 'UPDATE' THEN "
+    + _UPSERT_DELTAS.format(deltas="SELECT status, 1 AS delta FROM new_rows "
+                                   "UNION ALL SELECT status, -1 FROM old_rows") +
+    "ELSE "
+    "UPDATE task_status_counts SET task_count = 0; "
+    "END IF; "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql",
+)
+# SQLite cannot change a primary key in place: rebuild the table. The triggers go first, as
+# renaming a table checks every trigger that names it
+SQLITE_SQL = (
+    "DROP TRIGGER IF EXISTS tasks_count_insert",
+    "DROP TRIGGER IF EXISTS tasks_count_delete",
+    "DROP TRIGGER IF EXISTS tasks_count_update",
+    "CREATE TABLE task_status_counts_new ("
+    "status TEXT NOT NULL, "
+    "slot SMALLINT NOT NULL DEFAULT 0, "
+    "task_count BIGINT NOT NULL DEFAULT 0, "
+    "PRIMARY KEY (status, slot))",
+    "INSERT INTO task_status_counts_new (status, slot, task_count) SELECT status, 0, task_count FROM task_status_counts",
+    "DROP TABLE task_status_counts",
+    "ALTER TABLE task_status_counts_new RENAME TO task_status_counts",
+    "CREATE TRIGGER tasks_count_insert AFTER INSERT ON tasks BEGIN "
+    "INSERT INTO task_status_counts (status, slot, task_count) VALUES (new.status, 0, 1) "
+    "ON CONFLICT (status, slot) DO UPDATE SET task_count = task_count + 1; END",
+    "CREATE TRIGGER tasks_count_delete AFTER DELETE ON tasks BEGIN "
+    "UPDATE task_status_counts SET task_count = task_count - 1 WHERE status = old.status AND slot = 0; END",
+    "CREATE TRIGGER tasks_count_update AFTER UPDATE OF status ON tasks "
+    "WHEN old.status IS NOT new.status BEGIN "
+    "UPDATE task_status_counts SET task_count = task_count - 1 WHERE status = old.status AND slot = 0; "
+    "INSERT INTO task_status_counts (status, slot, task_count) VALUES (new.status, 0, 1) "
+    "ON CONFLICT (status, slot) DO UPDATE SET task_count = task_count + 1; END",
+)
+
+
+def upgrade(database):
+    for sql in SQLITE_SQL if isinstance(database, SqliteDatabase) else POSTGRES_SQL:
+        database.execute_sql(sql)
@@ -0,0 +1,77 @@
+# task_status_counts keyed by owner as well, so an owner's board reads its counts instead of
+# counting their tasks. The function and triggers are frozen copies of what app.db.board
+# installs at this version, so this script keeps creating the same schema as that module changes.
+from peewee import SqliteDatabase
+
+VERSION = 13
+DESCRIPTION = "Key task_status_counts by owner, status and slot"
+
+_UPSERT_DELTAS = (
+    "INSERT INTO task_status_counts (owner_id, status, slot, task_count) "
+    "SELECT owner_id, status, mod(txid_current(), 64), SUM(delta) FROM ({deltas}) AS d "
+    "GROUP BY owner_id, status HAVING SUM(delta) <> 0 "
+    "ORDER BY owner_id, status "
+    "ON CONFLICT (owner_id, status, slot) DO UPDATE SET task_count = task_status_counts.task_count "
+    "+ EXCLUDED.task_count; "
+)
+_NEW_ROWS = "SELECT COALESCE(owner_id, 0) AS owner_id, status, 1 AS delta FROM new_rows"
+_OLD_ROWS = "SELECT COALESCE(owner_id, 0) AS owner_id, status, -1 AS delta FROM old_rows"
+# The counts by status alone cannot be split by owner: recount. The ALTER locks the table
+# until commit, so triggers of writes still in progress add their deltas after the recount
+RECOUNT_SQL = (
+    "DELETE FROM task_status_counts",
+    "INSERT INTO task_status_counts (owner_id, status, task_count) "
+    "SELECT COALESCE(owner_id, 0), status, COUNT(*) FROM tasks GROUP BY COALESCE(owner_id, 0), status",
+)
+POSTGRES_SQL = (
+    "ALTER TABLE task_status_counts ADD COLUMN IF NOT EXISTS owner_id BIGINT NOT NULL DEFAULT 0",
+    "ALTER TABLE task_status_counts DROP CONSTRAINT IF EXISTS task_status_counts_pkey",
+    *RECOUNT_SQL,
+    "ALTER TABLE task_status_counts ADD PRIMARY KEY (owner_id, status, slot)",
+    "CREATE OR REPLACE FUNCTION count_task_statuses() RETURNS trigger AS $$ "
+    "BEGIN "
+    "IF TG_OP = 'INSERT' THEN "
+    + _UPSERT_DELTAS.format(deltas=_NEW_ROWS) +
+    "ELSIF TG_OP = 'DELETE' THEN "
+    + _UPSERT_DELTAS.format(deltas=_OLD_ROWS) +
+    "ELSIF TG_OP = 'UPDATE' THEN "
+    + _UPSERT_DELTAS.format(deltas=f"{_NEW_ROWS} UNION ALL {_OLD_ROWS}") +
+    "ELSE "
+    "UPDATE task_status_counts SET task_count = 0; "
+    "END IF; "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql",
+)
+# SQLite cannot change a primary key in place: rebuild the table, triggers first as in migration 12
+SQLITE_SQL = (
+    "DROP TRIGGER IF EXISTS tasks_count_insert",
+    "DROP TRIGGER IF EXISTS tasks_count_delete",
+    "DROP TRIGGER IF EXISTS tasks_count_update",
+    "DROP TABLE task_status_counts",
+    "CREATE TABLE task_status_counts ("
+    "owner_id BIGINT NOT NULL DEFAULT 0, "
+    "status TEXT NOT NULL, "
+    "slot SMALLINT NOT NULL DEFAULT 0, "
+    "task_count BIGINT NOT NULL DEFAULT 0, "
+    "PRIMARY KEY (owner_id, status, slot))",
+    RECOUNT_SQL[1],
+    "CREATE TRIGGER tasks_count_insert AFTER INSERT ON tasks BEGIN "
+    "INSERT INTO task_status_counts (owner_id, status, slot, task_count) "
+    "VALUES (COALESCE(new.owner_id, 0), new.status, 0, 1) "
+    "ON CONFLICT (owner_id, status, slot) DO UPDATE SET task_count = task_count + 1; END",
+    "CREATE TRIGGER tasks_count_delete AFTER DELETE ON tasks BEGIN "
+    "UPDATE task_status_counts SET task_count = task_count - 1 "
+    "WHERE owner_id = COALESCE(old.owner_id, 0) AND status = old.status AND slot = 0; END",
+    "CREATE TRIGGER tasks_count_update AFTER UPDATE OF status, owner_id ON tasks "
+    "WHEN old.status IS NOT new.status OR old.owner_id IS NOT new.owner_id BEGIN "
+    "UPDATE task_status_counts SET task_count = task_count - 1 "
+    "WHERE owner_id = COALESCE(old.owner_id, 0) AND status = old.status AND slot = 0; "
+    "INSERT INTO task_status_counts (owner_id, status, slot, task_count) "
+    "VALUES (COALESCE(new.owner_id, 0), new.status, 0, 1) "
+    "ON CONFLICT (owner_id, status, slot) DO UPDATE SET task_count = task_count + 1; END",
+)
+
+
+def upgrade(database):
+    for sql in SQLITE_SQL if isinstance(database, SqliteDatabase) else POSTGRES_SQL:
+        database.execute_sql(sql)
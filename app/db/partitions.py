@@ -0,0 +1,342 @@
+# app/db/partitions.py
+"""
+Monthly range partitioning of ``tasks`` on created_at, and archival of old tasks.
+
+Partitioning is opt-in. ``enable`` converts the existing table in place: it becomes the
+first partition, holding everything up to the end of the current month, and new months get
+partitions of their own. Nothing is copied, and the table is only locked briefly to swap
+names. A DEFAULT partition takes the rows no month has a partition for, e.g. imported tasks
+dated before archived months or beyond the prepared ones, so such inserts never fail. Run ``maintain`` from a scheduler, e.g. daily. It creates the partitions for the next
+months ahead of the inserts that need them, moving any rows the DEFAULT partition holds for
+those months into them, and archives tasks older than TASK_ARCHIVE_AFTER_MONTHS. On a
+partitioned table, whole partitions are detached, so nothing is deleted row by row; old rows
+in the DEFAULT partition are moved in batches. In 'move' mode the rows are copied into tasks_archive and the detached
+partition is dropped. In 'detach' mode it is kept as a table of its own. An unpartitioned
+table, including SQLite, moves rows into tasks_archive in batches.
+
+Queries that bound created_at, such as the filters and keyset pages of TaskCRUD, only read
+the partitions in their range.
+
+Usage:
+    python -m app.db.partitions enable
+    python -m app.db.partitions maintain
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+
+from peewee import OperationalError, SqliteDatabase
+
+from app.db.board import POSTGRES_TRIGGERS as BOARD_TRIGGERS, get_task_board, subtract_status_counts
+from app.db.change_feed import BULK_WRITE_SETTING, CHANGE_CHANNEL, install_change_triggers
+from app.db.database import database_instance
+from app.db.migrations import connection
+from app.db.migrations.operations import create_index_concurrently, relkind
+from app.db.versioning import bump_table_version, install_version_triggers
+
+TASK_TABLE = 'tasks'
+ARCHIVE_TABLE = 'tasks_archive'
+# The unpartitioned table becomes this partition when partitioning is enabled
+LEGACY_PARTITION = 'tasks_p_legacy'
+# Rows outside every monthly partition
+DEFAULT_PARTITION = 'tasks_p_default'
+# Columns copied into tasks_archive
+ARCHIVE_COLUMNS = ('id', 'title', 'description', 'status', 'created_at')
+# Months of partitions kept ready beyond the current one
+PARTITION_MONTHS_AHEAD = int(os.getenv('TASK_PARTITION_MONTHS_AHEAD', 3))
+# Tasks created more than this many whole months ago are archived
+ARCHIVE_AFTER_MONTHS = int(os.getenv('TASK_ARCHIVE_AFTER_MONTHS', 12))
+# 'move' copies archived partitions into tasks_archive; 'detach' keeps them as standalone tables
+ARCHIVE_MODE = os.getenv('TASK_ARCHIVE_MODE', 'move')
+# Rows moved per transaction when archiving an unpartitioned table
+ARCHIVE_BATCH_SIZE = int(os.getenv('TASK_ARCHIVE_BATCH_SIZE', 5000))
+# DDL on tasks gives up rather than queue behind long transactions, which would block every
+# query queued behind it in turn
+DDL_LOCK_TIMEOUT = os.getenv('TASK_PARTITION_LOCK_TIMEOUT', '5s')
+# Tries at detaching a partition, each waiting up to DDL_LOCK_TIMEOUT for its lock
+DETACH_ATTEMPTS = int(os.getenv('TASK_PARTITION_DETACH_ATTEMPTS', 5))
+# SQLSTATE lock_not_available, raised when lock_timeout runs out
+_LOCK_NOT_AVAILABLE = '55P03'
+
+_BOUND_PATTERN = re.compile(r"FROM \((MINVALUE|'[^']*')\) TO \((MAXVALUE|'[^']*')\)")
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TASK_TABLE}_p{month:%Y_%m}"
+
+
+def is_partitioned(database) -> bool:
+    return not isinstance(database, SqliteDatabase) and relkind(database, TASK_TABLE) == 'p'
+
+
+def partition_bounds(database) -> List[Tuple[str, Optional[date], Optional[date]]]:
+    """
+    (name, lower, upper) of each tasks range partition; None stands for MINVALUE / MAXVALUE.
+    The DEFAULT partition has no range and is left out.
+    """
+    cursor = database.execute_sql(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(%s) ORDER BY 1", (TASK_TABLE,))
+    bounds = []
+    for name, expression in cursor.fetchall():
+        match = _BOUND_PATTERN.search(expression)
+        if match is None:
+            continue  # DEFAULT
+        lower, upper = match.groups()
+        bounds.append((name, _parse_bound(lower), _parse_bound(upper)))
+    return bounds
+
+
+def detached_partitions(database) -> List[str]:
+    """
+    Partitions detached by an archive run that stopped before archiving them: tables named
+    like a partition that are no longer one. Archiving a partition renames or drops it in the
+    transaction that takes it off the counts, so each of these is still counted.
+    """
+    cursor = database.execute_sql(
+        "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition AND pg_table_is_visible(oid) "
+        "AND relname LIKE %s AND relname <> %s ORDER BY 1", (f"{TASK_TABLE}\\_p%", DEFAULT_PARTITION))
+    return [name for name, in cursor.fetchall()]
+
+
+def enable_partitioning(database, today: Optional[date] = None) -> bool:
+    """Turn tasks into a partitioned table. Returns False if it already is one."""
+    if isinstance(database, SqliteDatabase):
+        raise ValueError("Partitioning needs Postgres")
+    if is_partitioned(database):
+        return False
+    # The legacy partition ends after the current month, or after the newest task if that is later
+    newest = database.execute_sql(f"SELECT MAX(created_at) FROM {TASK_TABLE}").fetchone()[0]
+    boundary = add_months(month_start(max(filter(None, [today or date.today(), newest and newest.date()]))), 1)
+    # A validated CHECK matching the partition bound lets ATTACH skip scanning the table.
+    # Validation only takes a lock that lets reads and writes continue
+    database.execute_sql(f"ALTER TABLE {TASK_TABLE} DROP CONSTRAINT IF EXISTS {LEGACY_PARTITION}_bound")
+    database.execute_sql(f"ALTER TABLE {TASK_TABLE} ADD CONSTRAINT {LEGACY_PARTITION}_bound "
+                         f"CHECK (created_at < '{boundary}') NOT VALID")
+    database.execute_sql(f"ALTER TABLE {TASK_TABLE} VALIDATE CONSTRAINT {LEGACY_PARTITION}_bound")
+    # The primary key of a partitioned table must include the partition column
+    create_index_concurrently(database, f"{LEGACY_PARTITION}_id_created_at", TASK_TABLE, 'id, created_at',
+                              unique=True)
+    indexes = database.execute_sql(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN (%s, %s)",
+        (TASK_TABLE, f"{TASK_TABLE}_pkey", f"{LEGACY_PARTITION}_id_created_at")).fetchall()
+    # LIKE copies no foreign keys, so they are added to the parent by hand, like the indexes
+    foreign_keys = database.execute_sql(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        (TASK_TABLE,)).fetchall()
+    with database.atomic():
+        database.execute_sql(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'")
+        database.execute_sql(f"ALTER TABLE {TASK_TABLE} RENAME TO {LEGACY_PARTITION}")
+        # Swapped for the (id, created_at) key the parent needs, using the index built above;
+        # it leads with id, so id lookups are served all the same
+        database.execute_sql(f"ALTER TABLE {LEGACY_PARTITION} DROP CONSTRAINT {TASK_TABLE}_pkey")
+        database.execute_sql(f"ALTER TABLE {LEGACY_PARTITION} ADD CONSTRAINT {LEGACY_PARTITION}_pkey "
+                             f"PRIMARY KEY USING INDEX {LEGACY_PARTITION}_id_created_at")
+        for trigger in ('tasks_bump_version', 'tasks_notify_change', *BOARD_TRIGGERS):
+            # Recreated on the parent below, which clones its row triggers onto every partition
+            database.execute_sql(f"DROP TRIGGER IF EXISTS {trigger} ON {LEGACY_PARTITION}")
+        database.execute_sql(f"CREATE TABLE {TASK_TABLE} (LIKE {LEGACY_PARTITION} INCLUDING DEFAULTS "
+                             f"INCLUDING GENERATED) PARTITION BY RANGE (created_at)")
+        database.execute_sql(f"ALTER TABLE {TASK_TABLE} ADD PRIMARY KEY (id, created_at)")
+        sequence = database.execute_sql("SELECT pg_get_serial_sequence(%s, 'id')", (LEGACY_PARTITION,)).fetchone()[0]
+        if sequence:
+            # Archiving the legacy partition must not drop the sequence the ids come from
+            database.execute_sql(f"ALTER SEQUENCE {sequence} OWNED BY {TASK_TABLE}.id")
+        for name, definition in indexes:
+            # Same names and definitions on the parent; ATTACH adopts the existing indexes
+            # of the legacy partition as its partitions instead of building new ones
+            database.execute_sql(f"ALTER INDEX {name} RENAME TO {LEGACY_PARTITION}_{name}")
+            database.execute_sql(re.sub(r" ON \S+ ", f" ON {TASK_TABLE} ", definition, count=1))
+        database.execute_sql(f"ALTER TABLE {TASK_TABLE} ATTACH PARTITION {LEGACY_PARTITION} "
+                             f"FOR VALUES FROM (MINVALUE) TO ('{boundary}')")
+        database.execute_sql(f"ALTER TABLE {LEGACY_PARTITION} DROP CONSTRAINT {LEGACY_PARTITION}_bound")
+        for name, definition in foreign_keys:
+            # The legacy partition's matching key is adopted as is, without checking its rows again
+            database.execute_sql(f"ALTER TABLE {TASK_TABLE} ADD CONSTRAINT {name} {definition}")
+        install_version_triggers(database, [TASK_TABLE])
+        install_change_triggers(database)
+        get_task_board(database).install()
+    ensure_partitions(database, today=today)
+    return True
+
+
+def ensure_partitions(database, months_ahead: int = PARTITION_MONTHS_AHEAD, today: Optional[date] = None) -> List[str]:
+    """
+    Create the DEFAULT partition if missing and the monthly partitions from the current month
+    to ``months_ahead`` months on. Returns the new monthly ones.
+    """
+    if not is_partitioned(database):
+        return []
+    with database.atomic():
+        database.execute_sql(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'")
+        database.execute_sql(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TASK_TABLE} DEFAULT")
+    bounds = partition_bounds(database)
+    created = []
+    month = month_start(today or date.today())
+    for _ in range(months_ahead + 1):
+        end = add_months(month, 1)
+        if not any(_overlaps(lower, upper, month, end) for _, lower, upper in bounds):
+            name = partition_name(month)
+            with database.atomic():
+                database.execute_sql(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'")
+                if _default_has_rows(database, month, end):
+                    _split_default(database, name, month, end)
+                else:
+                    database.execute_sql(f"CREATE TABLE {name} PARTITION OF {TASK_TABLE} "
+                                         f"FOR VALUES FROM ('{month}') TO ('{end}')")
+            created.append(name)
+        month = end
+    return created
+
+
+def archive(database, older_than_months: int = ARCHIVE_AFTER_MONTHS, mode: str = ARCHIVE_MODE,
+            today: Optional[date] = None, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Archive tasks created before the cutoff month. Returns the partitions detached, or rows moved."""
+    cutoff = add_months(month_start(today or date.today()), -older_than_months)
+    if is_partitioned(database):
+        archived = archive_partitions(database, cutoff, mode)
+        archive_rows(database, cutoff, batch_size)  # The old rows of the DEFAULT partition
+        return archived
+    return archive_rows(database, cutoff, batch_size)
+
+
+def archive_partitions(database, cutoff: date, mode: str = ARCHIVE_MODE) -> int:
+    """
+    Detach every partition that ends on or before ``cutoff`` and archive it per ``mode``,
+    after any partition a previous run detached but did not get to archive.
+    """
+    archived = 0
+    for name in detached_partitions(database):
+        _archive_detached(database, name, mode)
+        archived += 1
+    for name, _, upper in partition_bounds(database):
+        if upper is None or upper > cutoff:
+            continue
+        _detach(database, name)
+        _archive_detached(database, name, mode)
+        archived += 1
+    if archived:
+        # Detaching fires no triggers: move the ETag counter and make change feed clients refetch
+        bump_table_version(database, TASK_TABLE)
+        database.execute_sql("SELECT pg_notify(%s, %s)", (CHANGE_CHANNEL, '{"op": "reset"}'))
+    return archived
+
+
+def archive_rows(database, cutoff: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move tasks created before ``cutoff`` into tasks_archive, one transaction per batch."""
+    columns, param = ', '.join(ARCHIVE_COLUMNS), database.param
+    moved = 0
+    while True:
+        with database.atomic():
+            ids = [task_id for task_id, in database.execute_sql(
+                f"SELECT id FROM {TASK_TABLE} WHERE created_at < {param} ORDER BY created_at LIMIT {param}",
+                (datetime.combine(cutoff, datetime.min.time()), batch_size)).fetchall()]
+            if not ids:
+                return moved
+            placeholders = ', '.join([param] * len(ids))
+            database.execute_sql(f"INSERT INTO {ARCHIVE_TABLE} ({columns}) SELECT {columns} FROM {TASK_TABLE} "
+                                 f"WHERE id IN ({placeholders})", ids)
+            database.execute_sql(f"DELETE FROM {TASK_TABLE} WHERE id IN ({placeholders})", ids)
+        moved += len(ids)
+
+
+def _archive_detached(database, name: str, mode: str):
+    # One transaction, so the partition is taken off the counts exactly once: until it
+    # commits, the table keeps the name detached_partitions finds it by
+    columns = ', '.join(ARCHIVE_COLUMNS)
+    with database.atomic():
+        subtract_status_counts(database, name)  # Counted by the partition's rows, not by a recount of tasks
+        if mode == 'move':
+            database.execute_sql(f"INSERT INTO {ARCHIVE_TABLE} ({columns}) SELECT {columns} FROM {name}")
+            database.execute_sql(f"DROP TABLE {name}")
+        else:
+            database.execute_sql(f"ALTER TABLE {name} RENAME TO {name.replace(TASK_TABLE, ARCHIVE_TABLE, 1)}")
+
+
+def _default_has_rows(database, start: date, end: date) -> bool:
+    return database.execute_sql(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s)",
+        (start, end)).fetchone()[0]
+
+
+def _split_default(database, name: str, start: date, end: date):
+    # A partition cannot be created while the DEFAULT partition holds rows of its range: build
+    # it as a table of its own, move those rows over and attach it. The rows only change
+    # partition, so the change events are held back (see app.db.change_feed). The count and
+    # version triggers sit on the parent and don't fire for writes to a partition
+    columns = ', '.join(name for name, in database.execute_sql(
+        "SELECT attname FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attnum > 0 "
+        "AND NOT attisdropped AND attgenerated = '' ORDER BY attnum", (TASK_TABLE,)).fetchall())
+    database.execute_sql("SELECT set_config(%s, 'on', true)", (BULK_WRITE_SETTING,))
+    database.execute_sql(f"CREATE TABLE {name} (LIKE {TASK_TABLE} INCLUDING DEFAULTS INCLUDING GENERATED)")
+    database.execute_sql(f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s "
+                         f"RETURNING {columns}) INSERT INTO {name} ({columns}) SELECT {columns} FROM moved",
+                         (start, end))
+    database.execute_sql(f"ALTER TABLE {TASK_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')")
+
+
+def _detach(database, name: str, attempts: int = DETACH_ATTEMPTS, pause: float = 1.0):
+    # Postgres refuses DETACH ... CONCURRENTLY while a DEFAULT partition exists, so the plain
+    # detach locks tasks for a moment instead; lock_timeout makes it give way to running
+    # queries rather than hold up every query queued behind it, and it is tried again after
+    # a pause. A detach left pending by an interrupted CONCURRENTLY is completed with FINALIZE
+    pending = database.execute_sql("SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = to_regclass(%s)",
+                                   (name,)).fetchone()
+    finalize = ' FINALIZE' if pending and pending[0] else ''
+    for attempt in range(1, attempts + 1):
+        try:
+            with database.atomic():
+                database.execute_sql(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'")
+                database.execute_sql(f"ALTER TABLE {TASK_TABLE} DETACH PARTITION {name}{finalize}")
+            return
+        except OperationalError as error:
+            if getattr(error.args[0], 'pgcode', None) != _LOCK_NOT_AVAILABLE or attempt == attempts:
+                raise
+        time.sleep(pause * attempt)
+
+
+def _parse_bound(value: str) -> Optional[date]:
+    if value in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return datetime.fromisoformat(value.strip("'")).date()
+
+
+def _overlaps(lower: Optional[date], upper: Optional[date], start: date, end: date) -> bool:
+    return (lower is None or lower < end) and (upper is None or upper > start)
+
+
+def main(argv: Optional[List[str]] = None, database=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.db.partitions", description="Task partitions and archival")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("enable", help="Convert tasks into a table partitioned by month")
+    commands.add_parser("maintain", help="Create upcoming partitions and archive old tasks")
+    args = parser.parse_args(argv)
+    database = database or database_instance.database
+
+    with connection(database):
+        if args.command == "enable":
+            converted = enable_partitioning(database)
+            print("Partitioning enabled" if converted else "Tasks are already partitioned")
+            return 0
+        created = ensure_partitions(database)
+        archived = archive(database)
+        unit = 'partition(s)' if is_partitioned(database) else 'task(s)'
+    print(f"Created {len(created)} partition(s), archived {archived} {unit}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+# app/db/ranks.py
+"""
+Manual ordering of tasks within a status column: every task of one status or, for a
+TaskCRUD scoped to an owner, that owner's tasks of one status.
+
+Every task that was ever moved holds a fractional rank (see app.utils.ranks) and a column
+lists its ranked tasks by rank, then the others oldest first. Moving a task gives it a rank
+between its new neighbours, so a move writes that one row however long the column is.
+Keys grow when the same gap is split over and over; a column whose keys get longer than
+TASK_RANK_MAX_LENGTH is rebalanced in the background, which respreads its ranks evenly.
+
+Usage: python -m app.db.ranks rebalance [status ...]
+"""
+import argparse
+import os
+import sys
+import threading
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from peewee import SqliteDatabase
+
+from app.db.change_feed import BULK_WRITE_SETTING
+from app.db.database import database_instance
+from app.db.migrations import connection
+from app.utils.ranks import rank_between, spread_ranks
+
+# A move producing a longer rank queues its column for rebalancing
+TASK_RANK_MAX_LENGTH = int(os.getenv('TASK_RANK_MAX_LENGTH', 24))
+# Rows per UPDATE when ranks are written in bulk
+RANK_CHUNK_SIZE = 500
+# First key of the Postgres advisory locks on columns; the second is a hash of the status
+RANK_LOCK_CLASS = 7305
+
+
+def lock_column(database, status: str, owner_id: Optional[int] = None):
+    """
+    Serialise writes to the ranks of one column until the transaction ends, so two moves
+    never pick the same gap and no move interleaves with a rebalance. SQLite already runs
+    one writer at a time.
+    """
+    if not isinstance(database, SqliteDatabase):
+        key = status if owner_id is None else f"{owner_id}:{status}"
+        database.execute_sql("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (RANK_LOCK_CLASS, key))
+
+
+def place(database, task_id: int, status: str, after_id: Optional[int] = None,
+          before_id: Optional[int] = None, owner_id: Optional[int] = None) -> str:
+    """
+    Rank that puts task ``task_id`` right after ``after_id``, right before ``before_id``
+    or, with neither, at the top of the ``status`` column. Reads the anchor and its
+    neighbour on the other side through the (status, rank, ...) index; call it in a
+    transaction holding lock_column. Raises ValueError when the anchor is not in the column.
+    """
+    anchor_id = after_id if after_id is not None else before_id
+    if anchor_id is None:
+        return rank_between(None, _neighbour(database, status, owner_id, None, task_id, after=True))
+    if anchor_id == task_id:
+        raise ValueError("A task cannot be placed next to itself.")
+    anchor = _anchor_rank(database, status, owner_id, anchor_id)
+    if after_id is not None:
+        return rank_between(anchor, _neighbour(database, status, owner_id, anchor, task_id, after=True))
+    return rank_between(_neighbour(database, status, owner_id, anchor, task_id, after=False), anchor)
+
+
+def rank_unranked(database, status: str, through: Optional[Tuple[object, int]] = None,
+                  owner_id: Optional[int] = None) -> int:
+    """
+    Rank the column's unranked tasks after its ranked ones, oldest first, which is the
+    order they are already listed in. With ``through``, a (created_at, id) position, only
+    the ones up to it: the rest still follow every ranked task, so the order holds. A move
+    anchored on an unranked task ranks the tasks listed above it once, not the whole tail.
+    Returns the number of tasks ranked.
+    """
+    p = database.param
+    sql, params = _column(database, status, owner_id)
+    sql += " AND rank IS NULL"
+    if through is not None:
+        sql += f" AND (created_at, id) <= ({p}, {p})"
+        params.extend(through)
+    cursor = database.execute_sql(f"SELECT id FROM tasks WHERE {sql} ORDER BY created_at, id", params)
+    task_ids = [task_id for task_id, in cursor.fetchall()]
+    last = _neighbour(database, status, owner_id, None, None, after=False)
+    _write_ranks(database, list(zip(task_ids, spread_ranks(len(task_ids), last, None))))
+    return len(task_ids)
+
+
+def rebalance(database, status: str, owner_id: Optional[int] = None) -> List[int]:
+    """
+    Respread the ranks of a column evenly, keeping its order, so they are short again.
+    Runs in a transaction of its own holding the column's lock; moves into the column wait
+    for it. Returns the ids of the tasks whose rank was rewritten.
+    """
+    with database.atomic():
+        lock_column(database, status, owner_id)
+        sql, params = _column(database, status, owner_id)
+        cursor = database.execute_sql(
+            f"SELECT id FROM tasks WHERE {sql} AND rank IS NOT NULL ORDER BY rank, id", params)
+        task_ids = [task_id for task_id, in cursor.fetchall()]
+        _write_ranks(database, list(zip(task_ids, spread_ranks(len(task_ids)))))
+    return task_ids
+
+
+def _anchor_rank(database, status: str, owner_id: Optional[int], anchor_id: int) -> str:
+    sql = f"SELECT status, owner_id, rank, created_at FROM tasks WHERE id = {database.param}"
+    row = database.execute_sql(sql, (anchor_id,)).fetchone()
+    if row is None or row[0] != status or (owner_id is not None and row[1] != owner_id):
+        raise ValueError(f"Task {anchor_id} is not in the {status!r} column.")
+    if row[2] is None:
+        rank_unranked(database, status, through=(row[3], anchor_id), owner_id=owner_id)
+        row = database.execute_sql(sql, (anchor_id,)).fetchone()
+    return row[2]
+
+
+def _column(database, status: str, owner_id: Optional[int]) -> Tuple[str, list]:
+    """WHERE condition and parameters selecting one column."""
+    if owner_id is None:
+        return f"status = {database.param}", [status]
+    return f"owner_id = {database.param} AND status = {database.param}", [owner_id, status]
+
+
+def _neighbour(database, status: str, owner_id: Optional[int], rank: Optional[str], exclude_id: Optional[int],
+               after: bool) -> Optional[str]:
+    """
+    The closest rank after (or before) ``rank`` in the column, ignoring task ``exclude_id``;
+    with ``rank`` None the first (or last) rank of the column. None when there is none.
+    """
+    p = database.param
+    sql, params = _column(database, status, owner_id)
+    sql = f"SELECT rank FROM tasks WHERE {sql}"
+    if rank is None:
+        sql += " AND rank IS NOT NULL"
+    else:
+        sql += f" AND rank {'>' if after else '<'} {p}"
+        params.append(rank)
+    if exclude_id is not None:
+        sql += f" AND id <> {p}"
+        params.append(exclude_id)
+    sql += f" ORDER BY rank{'' if after else ' DESC'} LIMIT 1"
+    row = database.execute_sql(sql, params).fetchone()
+    return row[0] if row else None
+
+
+def _write_ranks(database, ranks: List[Tuple[int, str]]):
+    if not ranks:
+        return
+    quiet = not isinstance(database, SqliteDatabase)
+    if quiet:
+        # The order is unchanged, so there is nothing for change feed listeners to hear
+        database.execute_sql("SELECT set_config(%s, 'on', true)", (BULK_WRITE_SETTING,))
+    p = database.param
+    for start in range(0, len(ranks), RANK_CHUNK_SIZE):
+        chunk = ranks[start:start + RANK_CHUNK_SIZE]
+        values = ", ".join([f"({p}, {p})"] * len(chunk))
+        database.execute_sql(
+            f"WITH ranked (id, rank) AS (VALUES {values}) "
+            "UPDATE tasks SET rank = ranked.rank FROM ranked WHERE tasks.id = ranked.id",
+            [value for row in chunk for value in row])
+    if quiet:
+        database.execute_sql("SELECT set_config(%s, 'off', true)", (BULK_WRITE_SETTING,))
+
+
+class RankRebalancer:
+    """
+    Rebalances columns on a background thread, so the move whose rank grew too long does
+    not wait for it. A column requested again before its turn is rebalanced once.
+    ``rebalance`` takes the arguments given to request (a status, and an owner id for an
+    owner's column), opens its own connection and returns the rows rewritten.
+    """
+
+    def __init__(self, rebalance: Callable[..., int]):
+        self.rebalance = rebalance
+        self._pending: List[tuple] = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self.rebalances = 0
+        self.rows = 0
+        self.failures = 0
+
+    def request(self, *column):
+        """Queue a column; starts the background thread on first use."""
+        with self._cond:
+            if column not in self._pending:
+                self._pending.append(column)
+                self._cond.notify()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="task-rank-rebalancer", daemon=True)
+                self._thread.start()
+
+    def run_pending(self):
+        """Rebalance every queued column on the calling thread."""
+        while True:
+            with self._cond:
+                if not self._pending:
+                    return
+                column = self._pending.pop(0)
+            try:
+                rows = self.rebalance(*column)
+            except Exception as e:
+                print(f"Failed to rebalance the {column[0]!r} column: {e}")  # Replace with proper logging in production
+                with self._cond:
+                    self.failures += 1
+            else:
+                with self._cond:
+                    self.rebalances += 1
+                    self.rows += rows
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "rebalances": self.rebalances,
+                "rows": self.rows,
+                "failures": self.failures,
+                "pending": len(self._pending),
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            self.run_pending()
+
+
+def long_rank_columns(database, max_length: int = TASK_RANK_MAX_LENGTH) -> List[Tuple[str, Optional[int]]]:
+    """(status, owner_id) of the owners' columns with a rank longer than ``max_length``. Reads every ranked task."""
+    cursor = database.execute_sql(
+        f"SELECT DISTINCT status, owner_id FROM tasks WHERE length(rank) > {database.param} "
+        "ORDER BY status, owner_id", (max_length,))
+    return [tuple(row) for row in cursor.fetchall()]
+
+
+def main(argv: Optional[Sequence[str]] = None, database=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.db.ranks", description="Task ranks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("rebalance", help="Respread the ranks of status columns evenly")
+    command.add_argument("statuses", nargs="*",
+                         help=f"Defaults to the columns with ranks over {TASK_RANK_MAX_LENGTH} characters")
+    args = parser.parse_args(argv)
+    database = database or database_instance.database
+
+    with connection(database):
+        if args.statuses:
+            columns = [(status, None) for status in args.statuses]
+        else:
+            columns = long_rank_columns(database)
+        rows = sum(len(rebalance(database, status, owner_id)) for status, owner_id in columns)
+    print(f"Rebalanced {rows} task(s) in {len(columns)} column(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+# app/db/routing.py
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+# How replicas are picked: 'round_robin' or 'least_connections'
+REPLICA_STRATEGY = os.getenv('DB_REPLICA_STRATEGY', 'round_robin')
+# Replication delay in seconds beyond which a replica is skipped
+REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 2))
+# Seconds between lag measurements of one replica
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_LAG_CHECK_INTERVAL', 1))
+# Seconds after a client's write during which its reads stay on the primary
+PRIMARY_STICKY_SECONDS = float(os.getenv('DB_PRIMARY_STICKY_SECONDS', 5))
+# Cookie carrying the end of that window between requests
+PRIMARY_STICKY_COOKIE = 'db_primary_until'
+
+# Zero while the replica has replayed everything it received, otherwise the age of the last replayed commit
+REPLICA_LAG_SQL = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+# Database the cursors of the current replica_reads block go to
+_read_target: ContextVar = ContextVar('db_read_target', default=None)
+# Per-request session: sticky_until, wrote, and the replica picked for the request
+_session: ContextVar[Optional[dict]] = ContextVar('db_session', default=None)
+
+
+def begin_session(sticky_until: float = 0.0) -> dict:
+    """Start the routing session of a request. ``sticky_until`` comes from the client's cookie."""
+    session = {"sticky_until": sticky_until, "wrote": False, "target": None}
+    _session.set(session)
+    return session
+
+
+def mark_write():
+    session = _session.get()
+    if session is not None:
+        session["wrote"] = True
+
+
+def current_read_target():
+    return _read_target.get()
+
+
+class ReplicaRouter:
+    """
+    Picks the database the reads of a request go to.
+
+    Replicas are tried in strategy order and skipped while their measured lag is above
+    ``max_lag`` or they cannot be reached; with none left, reads go to the primary. Clients
+    that wrote within the sticky window, and requests that already wrote, read from the
+    primary so they see their own writes.
+    """
+
+    def __init__(self, primary, replicas: List, strategy: str = REPLICA_STRATEGY, max_lag: float = REPLICA_MAX_LAG,
+                 lag_check_interval: float = REPLICA_LAG_CHECK_INTERVAL, clock=time.monotonic):
+        self.primary = primary
+        self.replicas = replicas
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self._clock = clock
+        self._turn = itertools.count()
+        self._lag = {}  # replica index -> (lag seconds, measured at)
+        self._lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.lag_fallbacks = 0
+
+    def choose(self):
+        session = _session.get()
+        if session is not None:
+            if session["wrote"] or time.time() < session["sticky_until"]:
+                return self._count(self.primary)
+            if session["target"] is not None:
+                return session["target"]  # One database per request keeps its reads consistent
+        target = self._count(self._pick_replica() or self.primary)
+        if session is not None:
+            session["target"] = target
+        return target
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "replicas": len(self.replicas),
+                "strategy": self.strategy,
+                "replica_reads": self.replica_reads,
+                "primary_reads": self.primary_reads,
+                "lag_fallbacks": self.lag_fallbacks,
+                "lag_seconds": [self._lag.get(index, (None,))[0] for index in range(len(self.replicas))],
+            }
+
+    def _pick_replica(self):
+        for index in self._order():
+            if self._replica_lag(index) <= self.max_lag:
+                return self.replicas[index]
+        if self.replicas:
+            with self._lock:
+                self.lag_fallbacks += 1
+        return None
+
+    def _order(self) -> List[int]:
+        indexes = list(range(len(self.replicas)))
+        if self.strategy == 'least_connections':
+            return sorted(indexes, key=lambda index: len(self.replicas[index]._in_use))
+        start = next(self._turn) % len(indexes) if indexes else 0
+        return indexes[start:] + indexes[:start]
+
+    def _replica_lag(self, index: int) -> float:
+        now = self._clock()
+        with self._lock:
+            lag, measured_at = self._lag.get(index, (None, None))
+        if measured_at is not None and now - measured_at < self.lag_check_interval:
+            return lag
+        try:
+            lag = float(self.replicas[index].execute_sql(REPLICA_LAG_SQL).fetchone()[0])
+        except Exception as e:
+            print(f"Replica {index} unavailable: {e}")  # Replace with proper logging in production
+            lag = float('inf')  # Skipped until the next check
+        with self._lock:
+            self._lag[index] = (lag, now)
+        return lag
+
+    def _count(self, target):
+        with self._lock:
+            if target is self.primary:
+                self.primary_reads += 1
+            else:
+                self.replica_reads += 1
+        return target
+
+
+@contextmanager
+def replica_reads(database):
+    """Send the queries of this block to the database the router of ``database`` picks, if it has one."""
+    router = getattr(database, 'router', None)
+    if router is None or database.in_transaction():
+        # Inside a transaction, reads must see its uncommitted writes
+        yield database
+        return
+    target = router.choose()
+    token = _read_target.set(target)
+    try:
+        yield target
+    finally:
+        _read_target.reset(token)
@@ -0,0 +1,134 @@
+# app/db/search.py
+import re
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+from peewee import SqliteDatabase
+
+from app.utils.pagination import encode_rank_cursor, decode_rank_cursor
+
+# Longest query we turn into search terms; anything beyond is ignored
+MAX_SEARCH_TERMS = 8
+
+
+def search_terms(q: str) -> List[str]:
+    """Split a free-text query into word terms, dropping any search syntax characters."""
+    return re.findall(r"\w+", q.lower())[:MAX_SEARCH_TERMS]
+
+
+class TaskSearch(ABC):
+    """Ranked, keyset-paginated prefix search over task titles and descriptions."""
+
+    INSTALL_SQL = ()
+
+    def __init__(self, database):
+        self.database = database
+
+    def install(self):
+        """Create the search column/index or virtual table. Safe to run repeatedly."""
+        for sql in self.INSTALL_SQL:
+            self.database.execute_sql(sql)
+
+    @abstractmethod
+    def search(self, q: str, limit: int, cursor: Optional[str] = None,
+               owner_id: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        Return one page of matching tasks, best match first, and the cursor of the next page.
+        With ``owner_id`` only that user's tasks match.
+        """
+
+    def _page(self, sql: str, params: list, limit: int) -> Tuple[List[dict], Optional[str]]:
+        # Fetch one extra row to find out whether another page exists
+        cursor = self.database.execute_sql(sql, params + [limit + 1])
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_rank_cursor(rows[-1]["rank"], rows[-1]["id"])
+        for row in rows:
+            del row["rank"]  # Only selected for ordering and the cursor
+        return rows, next_cursor
+
+
+class PostgresTaskSearch(TaskSearch):
+    """Search over a generated tsvector column with a GIN index."""
+
+    INSTALL_SQL = (
+        "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED",
+        "CREATE INDEX IF NOT EXISTS task_search_vector ON tasks USING GIN (search_vector)",
+    )
+
+    def search(self, q: str, limit: int, cursor: Optional[str] = None,
+               owner_id: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+        terms = search_terms(q)
+        if not terms:
+            return [], None
+        # Every term must match, each as a prefix: "rep bug" -> 'rep:* & bug:*'
+        params = [" & ".join(f"{term}:*" for term in terms)]
+        keyset = ""
+        if owner_id is not None:
+            keyset = "AND t.owner_id = %s "
+            params.append(owner_id)
+        if cursor:
+            # ts_rank returns real, so compare at real precision to match the value we handed out
+            keyset += "AND (ts_rank(t.search_vector, query), t.id) < (CAST(%s AS real), %s)"
+            params.extend(decode_rank_cursor(cursor))
+        sql = (
+            "SELECT t.id, t.title, t.description, t.status, ts_rank(t.search_vector, query) AS rank "
+            "FROM tasks AS t, to_tsquery('english', %s) AS query "
+            f"WHERE t.search_vector @@ query {keyset} "
+            "ORDER BY rank DESC, t.id DESC LIMIT %s"
+        )
+        return self._page(sql, params, limit)
+
+
+class SqliteTaskSearch(TaskSearch):
+    """FTS5 stand-in for local development and tests, kept in sync with tasks by triggers."""
+
+    INSTALL_SQL = (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5("
+        "title, description, content='tasks', content_rowid='id')",
+        "CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN "
+        "INSERT INTO tasks_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN "
+        "INSERT INTO tasks_fts (tasks_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE ON tasks BEGIN "
+        "INSERT INTO tasks_fts (tasks_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO tasks_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        "INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')",
+    )
+
+    def search(self, q: str, limit: int, cursor: Optional[str] = None,
+               owner_id: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+        terms = search_terms(q)
+        if not terms:
+            return [], None
+        # Implicit AND of quoted prefix terms: "rep bug" -> "rep"* "bug"*
+        params = [" ".join(f'"{term}"*' for term in terms)]
+        keyset = ""
+        if owner_id is not None:
+            keyset = "AND t.owner_id = ? "
+            params.append(owner_id)
+        if cursor:
+            keyset += "AND (-bm25(tasks_fts), t.id) < (?, ?)"
+            params.extend(decode_rank_cursor(cursor))
+        # bm25 is lower-is-better, so negate it to rank like ts_rank
+        sql = (
+            "SELECT t.id, t.title, t.description, t.status, -bm25(tasks_fts) AS rank "
+            "FROM tasks_fts JOIN tasks AS t ON t.id = tasks_fts.rowid "
+            f"WHERE tasks_fts MATCH ? {keyset} "
+            "ORDER BY rank DESC, t.id DESC LIMIT ?"
+        )
+        return self._page(sql, params, limit)
+
+
+def get_task_search(database) -> TaskSearch:
+    """Pick the search backend matching the database the Task model is bound to."""
+    if isinstance(database, SqliteDatabase):
+        return SqliteTaskSearch(database)
+    return PostgresTaskSearch(database)
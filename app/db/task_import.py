@@ -0,0 +1,261 @@
+# app/db/task_import.py
+import argparse
+import csv
+import os
+import sys
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from peewee import SqliteDatabase
+from pydantic import ValidationError
+from pydantic_core import to_json
+
+from app.api.schemas.task_schemas import TaskImportRow
+from app.db.change_feed import BULK_WRITE_SETTING, CHANGE_CHANNEL, RESET_EVENT
+from app.db.database import database_instance
+from app.db.migrations import connection
+from app.db.routing import mark_write
+from app.utils.import_formats import IMPORT_READERS, Record
+
+# Invalid rows reported before an import stops reading; nothing is imported once there is one
+MAX_IMPORT_ERRORS = int(os.getenv('TASK_IMPORT_MAX_ERRORS', 100))
+# Bytes of COPY data handed to the driver per read
+COPY_CHUNK_SIZE = 64 * 1024
+# Rows per INSERT where COPY is not available
+INSERT_CHUNK_SIZE = 500
+
+# Staging table: one session-local table per import, dropped when it commits or rolls back
+STAGING_TABLE = 'tasks_import'
+IMPORT_COLUMNS = ('title', 'description', 'status', 'created_at')
+# Characters with a meaning in COPY text format, as backslash escapes
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+# A validated row, in IMPORT_COLUMNS order
+ImportRow = Tuple[str, Optional[str], str, Optional[datetime]]
+
+
+class TaskImportError(ValueError):
+    """
+    Raised when uploaded rows fail validation; ``errors`` lists them as {"index", "detail"},
+    with index None for an upload that cannot be read at all.
+    """
+
+    def __init__(self, errors: List[dict]):
+        super().__init__(f"{len(errors)} error(s)")
+        self.errors = errors
+
+
+def validated_rows(records: Iterable[Record], errors: List[dict],
+                   max_errors: int = MAX_IMPORT_ERRORS) -> Iterator[ImportRow]:
+    """
+    Validate records one at a time against TaskImportRow, yielding the good ones as tuples
+    and appending the bad ones to ``errors``. Stops once ``max_errors`` rows were bad.
+    """
+    for index, record in records:
+        if record is None:
+            errors.append({"index": index, "detail": "Row is not a JSON object."})
+        else:
+            try:
+                row = TaskImportRow.model_validate(record)
+            except ValidationError as e:
+                detail = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+                errors.append({"index": index, "detail": detail})
+            else:
+                created_at = row.created_at
+                if created_at is not None and created_at.tzinfo is not None:
+                    # created_at holds naive UTC times
+                    created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+                yield row.title, row.description, row.status, created_at
+                continue
+        if len(errors) >= max_errors:
+            return
+
+
+class TaskImporter(ABC):
+    """
+    Loads validated rows into tasks in one transaction: all of them, or none when any
+    uploaded row was invalid.
+    """
+
+    def __init__(self, database):
+        self.database = database
+
+    def import_tasks(self, stream: BinaryIO, format: str, owner_id: Optional[int] = None) -> int:
+        """
+        Import a CSV or NDJSON upload, owned by ``owner_id`` when given; returns the number of
+        tasks created. Raises TaskImportError.
+        """
+        self.owner_id = owner_id
+        errors = []
+        rows = validated_rows(IMPORT_READERS[format](stream), errors)
+        with self.database.atomic():
+            try:
+                self._stage(rows)
+            except (UnicodeDecodeError, csv.Error) as e:
+                raise TaskImportError([{"index": None, "detail": f"The upload could not be read: {e}"}])
+            if errors:
+                raise TaskImportError(errors)  # Rolls the staged rows back
+            imported = self._merge()
+        mark_write()
+        return imported
+
+    @abstractmethod
+    def _stage(self, rows: Iterator[ImportRow]):
+        """Load the rows into the staging area of the current transaction."""
+
+    @abstractmethod
+    def _merge(self) -> int:
+        """Move the staged rows into tasks; returns how many were created."""
+
+
+class PostgresTaskImporter(TaskImporter):
+    """
+    Streams the rows into a temporary table with COPY FROM STDIN and moves them into tasks
+    with a single INSERT ... SELECT. Per-row change events are suppressed for the merge and
+    replaced by one reset event, so listeners refetch instead of receiving every row.
+    """
+
+    STAGING_SQL = (
+        f"CREATE TEMPORARY TABLE {STAGING_TABLE} (title TEXT, description TEXT, status TEXT, "
+        "created_at TIMESTAMP) ON COMMIT DROP"
+    )
+    COPY_SQL = f"COPY {STAGING_TABLE} ({', '.join(IMPORT_COLUMNS)}) FROM STDIN"
+    MERGE_SQL = (
+        f"INSERT INTO tasks ({', '.join(IMPORT_COLUMNS)}, owner_id) "
+        f"SELECT title, description, status, COALESCE(created_at, now()), %s FROM {STAGING_TABLE}"
+    )
+
+    def _stage(self, rows: Iterator[ImportRow]):
+        self.database.execute_sql(self.STAGING_SQL)
+        stream = CopyStream(copy_chunks(rows))
+        try:
+            self.database.cursor().copy_expert(self.COPY_SQL, stream, size=COPY_CHUNK_SIZE)
+        except Exception:
+            if stream.error is not None:
+                raise stream.error  # The driver reports it as a cancelled COPY
+            raise
+
+    def _merge(self) -> int:
+        # Transaction-local, like SET LOCAL
+        self.database.execute_sql("SELECT set_config(%s, 'on', true)", (BULK_WRITE_SETTING,))
+        imported = self.database.execute_sql(self.MERGE_SQL, (self.owner_id,)).rowcount
+        if imported:
+            self.database.execute_sql("SELECT pg_notify(%s, %s)", (CHANGE_CHANNEL, to_json(RESET_EVENT).decode()))
+        return imported
+
+
+class SqliteTaskImporter(TaskImporter):
+    """Multi-row INSERTs straight into tasks for local development and tests; SQLite has no COPY."""
+
+    def _stage(self, rows: Iterator[ImportRow]):
+        self.imported = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == INSERT_CHUNK_SIZE:
+                self._insert(chunk)
+                chunk = []
+        if chunk:
+            self._insert(chunk)
+
+    def _insert(self, chunk: List[ImportRow]):
+        placeholders = ", ".join(["(?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)"] * len(chunk))
+        self.database.execute_sql(f"INSERT INTO tasks ({', '.join(IMPORT_COLUMNS)}, owner_id) VALUES {placeholders}",
+                                  [value for row in chunk for value in (*row, self.owner_id)])
+        self.imported += len(chunk)
+
+    def _merge(self) -> int:
+        return self.imported
+
+
+def copy_chunks(rows: Iterable[ImportRow], chunk_size: int = COPY_CHUNK_SIZE) -> Iterator[bytes]:
+    """Encode rows in COPY text format, grouped into chunks of about ``chunk_size`` bytes."""
+    lines, size = [], 0
+    for row in rows:
+        line = "\t".join(copy_value(value) for value in row) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(lines).encode()
+            lines, size = [], 0
+    if lines:
+        yield "".join(lines).encode()
+
+
+def copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value.translate(COPY_ESCAPES)
+    return str(value)
+
+
+class CopyStream:
+    """Read-only file over an iterator of byte chunks, which is what COPY FROM STDIN reads from."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b""
+        self.error: Optional[Exception] = None  # Raised by the chunks, e.g. while decoding the upload
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            try:
+                chunk = next(self._chunks, None)
+            except Exception as e:
+                self.error = e
+                raise
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def get_task_importer(database) -> TaskImporter:
+    """Pick the importer matching the database the Task model is bound to."""
+    if isinstance(database, SqliteDatabase):
+        return SqliteTaskImporter(database)
+    return PostgresTaskImporter(database)
+
+
+def import_format(filename: Optional[str]) -> Optional[str]:
+    """Guess the upload format from a file name: .csv, or .ndjson/.jsonl."""
+    extension = os.path.splitext(filename or "")[1].lower()
+    return {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}.get(extension)
+
+
+def main(argv: Optional[List[str]] = None, database=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.db.task_import", description="Import tasks from a file")
+    parser.add_argument("path", help="CSV or NDJSON file, or - for standard input")
+    parser.add_argument("--format", choices=sorted(IMPORT_READERS), help="Defaults to the file extension")
+    parser.add_argument("--owner-id", type=int, help="Id of the user who owns the imported tasks")
+    args = parser.parse_args(argv)
+    format = args.format or import_format(args.path)
+    if format is None:
+        parser.error("cannot tell the format from the file name, pass --format")
+    database = database or database_instance.database
+
+    stream = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    try:
+        with connection(database):
+            imported = get_task_importer(database).import_tasks(stream, format, args.owner_id)
+    except TaskImportError as e:
+        for error in e.errors:
+            row = f"Row {error['index']}: " if error['index'] is not None else ""
+            print(f"{row}{error['detail']}", file=sys.stderr)
+        print(f"Nothing imported: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+    print(f"Imported {imported} task(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
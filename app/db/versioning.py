@@ -0,0 +1,58 @@
+# app/db/versioning.py
+from typing import Iterable
+
+from peewee import SqliteDatabase
+
+# A table's version is the sum of its rows in table_versions, one row per slot. Each
+# transaction bumps the slot its id hashes to, so concurrent writers rarely share a row and
+# don't queue behind one another's row lock until commit. The counter stays transactional:
+# a reader never sees a version whose rows haven't committed yet.
+VERSION_SLOTS = 64
+
+# One statement-level trigger per table keeps table_versions in step with every write,
+# including ones that bypass the CRUD classes, inside the writing transaction.
+POSTGRES_BUMP_SQL = (
+    "INSERT INTO table_versions (table_name, slot, version) "
+    "VALUES ({table}, mod(txid_current(), " + str(VERSION_SLOTS) + "), 1) "
+    "ON CONFLICT (table_name, slot) DO UPDATE SET version = table_versions.version + 1"
+)
+POSTGRES_FUNCTION_SQL = (
+    "CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$ "
+    "BEGIN "
+    + POSTGRES_BUMP_SQL.format(table="TG_TABLE_NAME") + "; "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql"
+)
+POSTGRES_TRIGGER_SQL = (
+    "DROP TRIGGER IF EXISTS {table}_bump_version ON {table}",
+    "CREATE TRIGGER {table}_bump_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+    "FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()",
+)
+# SQLite only has row-level triggers, and a single writer, so one slot is enough; good
+# enough for local development and tests
+SQLITE_TRIGGER_SQL = (
+    "DROP TRIGGER IF EXISTS {table}_bump_version_{event}",
+    "CREATE TRIGGER {table}_bump_version_{event} AFTER {event} ON {table} BEGIN "
+    "INSERT INTO table_versions (table_name, slot, version) VALUES ('{table}', 0, 1) "
+    "ON CONFLICT (table_name, slot) DO UPDATE SET version = version + 1; END",
+)
+
+
+def install_version_triggers(database, tables: Iterable[str]):
+    """Install the table_versions change-counter triggers on ``tables``. Safe to run repeatedly."""
+    with database.atomic():
+        if isinstance(database, SqliteDatabase):
+            for table in tables:
+                for event in ("INSERT", "UPDATE", "DELETE"):
+                    for sql in SQLITE_TRIGGER_SQL:
+                        database.execute_sql(sql.format(table=table, event=event))
+            return
+        database.execute_sql(POSTGRES_FUNCTION_SQL)
+        for table in tables:
+            for sql in POSTGRES_TRIGGER_SQL:
+                database.execute_sql(sql.format(table=table))
+
+
+def bump_table_version(database, table: str):
+    """Move ``table``'s version on by hand, for changes that fire no triggers. Postgres only."""
+    database.execute_sql(POSTGRES_BUMP_SQL.format(table="%s"), (table,))
@@ -1,4 +1,7 @@
-from app.db.database import Database
+from fastapi import HTTPException
+from playhouse.pool import MaxConnectionsExceeded
+
+from app.db.database import Database, begin_request_state
 from app.utils.auth_service import AuthService
 
 
@@ -6,12 +9,19 @@ class Dependency:
     def __init__(self, db: Database ):
         self.db = db
 
-    def get_db(self):
+    async def get_db(self):
+        # Checks a pooled connection out for one request and returns it once the handler is done.
+        # The state is created here, on the event loop, so the threads that connect, run the
+        # handler and close all share it.
+        begin_request_state()
+        try:
+            await self.db.acquire()
+        except MaxConnectionsExceeded:
+            raise HTTPException(status_code=503, detail="The database is busy, please retry.")
         try:
-            self.db.connect()
             yield self.db.database
         finally:
-            self.db.close()
+            await self.db.release()
 
     def get_auth_service(self):
-        return AuthService(self.db)
\ No newline at end of file
+        return AuthService(self.db)
@@ -3,10 +3,19 @@ import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .api.endpoints import TaskRoutes, UserRoutes, PathfinderRoutes, TextGeneratorRoutes
+from .api.endpoints import (TaskRoutes, UserRoutes, PathfinderRoutes, TextGeneratorRoutes, MetricsRoutes,
+                            AsyncTaskRoutes, AsyncUserRoutes)
 from .core.initializer import AppInitializer
+from .core.read_your_writes import PrimaryStickinessMiddleware
+from .db.async_database import async_database_instance
+from .db.audit import audit_log
 from .db.database import database_instance
 from .dependencies import Dependency
+from .utils.passwords import password_pool
+
+
+# Serve the hot task and user routes from async handlers on the psycopg 3 pool
+ASYNC_DB_ENABLED = os.getenv('ASYNC_DB_ENABLED', 'false').lower() in ('1', 'true', 'yes')
 
 
 def create_app() -> FastAPI:
@@ -18,22 +27,38 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],  # Allow all HTTP methods
         allow_headers=["*"],  # Allow all headers
+        expose_headers=["X-Next-Cursor", "ETag"],  # Let the frontend read pagination cursors and ETags
     )
 
+    if database_instance.replicas:
+        # Read-your-writes for clients whose reads would otherwise go to a lagging replica
+        app.add_middleware(PrimaryStickinessMiddleware)
+
     # Initialize application components
     initializer = AppInitializer(app, database_instance.database)
     initializer.initialize()
 
-    dependency = Dependency(initializer.db)
+    # Write out the audit events still queued before the process exits
+    app.add_event_handler("shutdown", audit_log.flush)
+    app.add_event_handler("shutdown", password_pool.close)
+
+    dependency = Dependency(database_instance)
     # Include routers
+    if ASYNC_DB_ENABLED:
+        # Registered first, so they take the paths they share with the sync routers
+        app.include_router(AsyncTaskRoutes(async_database_instance).router)
+        app.include_router(AsyncUserRoutes(async_database_instance).router)
+        app.add_event_handler("shutdown", async_database_instance.close)
     task_routes = TaskRoutes(dependency = dependency)
     user_routes = UserRoutes(dependency = dependency)
     pathfinder_routes = PathfinderRoutes()
     text_generator_routes = TextGeneratorRoutes(ollama_host=os.getenv('OLLAMA_HOST'))
+    metrics_routes = MetricsRoutes()
     app.include_router(task_routes.router)
     app.include_router(user_routes.router)
     app.include_router(pathfinder_routes.router)
     app.include_router(text_generator_routes.router)
+    app.include_router(metrics_routes.router)
 
 
 
@@ -0,0 +1,25 @@
+from peewee import Model, CharField, BigIntegerField, SmallIntegerField, CompositeKey, fn
+
+from app.db.database import database_instance
+
+
+class TableVersion(Model):
+    # Change counter per table, spread over slots and bumped by triggers installed from app.db.versioning
+    table_name = CharField(max_length=63)
+    slot = SmallIntegerField(default=0)
+    version = BigIntegerField(default=0)
+
+    class Meta:
+        database = database_instance.database  # Set the database attribute
+        table_name = 'table_versions'
+        primary_key = CompositeKey('table_name', 'slot')
+
+    @classmethod
+    def current_query(cls, table_name: str):
+        """The table's version, the sum of its slots, as a one-row ``version`` column."""
+        total = fn.COALESCE(fn.SUM(cls.version), 0).cast('BIGINT')
+        return cls.select(total.alias('version')).where(cls.table_name == table_name)
+
+    @classmethod
+    def current(cls, table_name: str) -> int:
+        return cls.current_query(table_name).scalar()
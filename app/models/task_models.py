@@ -1,6 +1,7 @@
-from peewee import Model, IntegerField, CharField, TextField, DateTimeField, fn
+from peewee import Model, IntegerField, CharField, TextField, DateTimeField, ForeignKeyField, SQL, fn
 
 from app.db.database import database_instance
+from app.models.user_models import User
 
 
 class Task(Model):
@@ -9,7 +10,23 @@ class Task(Model):
     description = TextField(null=True)
     status = TextField(null=False)  # Add completed status
     created_at = DateTimeField(default=fn.now)
+    # Bumped by every update; the ETag of the task. The column default covers inserts made in SQL
+    version = IntegerField(default=1, constraints=[SQL('DEFAULT 1')])
+    # Position within the status column (see app.db.ranks); NULL until the task is first moved.
+    # Postgres compares it with COLLATE "C", declared by the migration that adds it
+    rank = TextField(null=True)
+    # The user the task belongs to; NULL for tasks created without one. Read it as owner_id,
+    # since ``owner`` loads the user. Indexed by the (owner, status, ...) index below
+    owner = ForeignKeyField(User, null=True, on_delete='CASCADE', backref='tasks', index=False)
 
     class Meta:
         database = database_instance.database  # Set the database attribute
-        table_name = 'tasks'
\ No newline at end of file
+        table_name = 'tasks'
+        indexes = (
+            (('created_at', 'id'), False),  # Keyset pagination order
+            (('status', 'created_at', 'id'), False),  # Status filter + keyset pagination
+            (('status', 'rank', 'created_at', 'id'), False),  # Board order within a status
+            # An owner's tasks per status; the migration adds INCLUDE (title) on Postgres, and a
+            # partial (owner_id, status, rank) index of the moved ones
+            (('owner', 'status', 'created_at', 'id'), False),
+        )
\ No newline at end of file
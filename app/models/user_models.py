@@ -1,9 +1,6 @@
-from argon2 import PasswordHasher
 from peewee import Model, IntegerField, CharField, DateTimeField, fn
 from app.db.database import database_instance
-
-# Initialize Argon2 password hasher
-ph = PasswordHasher()
+from app.utils.passwords import password_pool
 
 class User(Model):
     id = IntegerField(primary_key=True)
@@ -18,9 +15,8 @@ class User(Model):
         table_name = 'users'
 
     def set_password(self, plain_password):
-        self.password = ph.hash(plain_password)  # Hash password with Argon2
+        self.password = password_pool.hash(plain_password)  # Hash password with Argon2, on the password pool
 
     def verify_password(self, plain_password):
         # Verify password against the hashed password
-        ph.verify(self.password, plain_password)
-        return True
+        return password_pool.verify(self.password, plain_password)
@@ -1,14 +1,27 @@
+import hashlib
 import os
-from typing import Optional
+import time
+from typing import Awaitable, Callable, NamedTuple, Optional
 
 import jwt
 from datetime import datetime, timedelta
 
-from argon2 import PasswordHasher
 from fastapi import HTTPException
 from peewee import DoesNotExist
 
+from app.crud.user_crud import invalidate_user, token_cache
 from app.models.user_models import User
+from app.utils.metrics import register_metrics
+from app.utils.passwords import PasswordRehasher, needs_rehash, password_pool
+
+# Signing key of the access tokens, read once at import; app.db.database has loaded .env by now
+SECRET_KEY = os.getenv('SECRET_KEY')
+
+
+class VerifiedToken(NamedTuple):
+    """What token_cache holds for a verified access token."""
+    claims: dict
+    user: User
 
 
 class AuthService:
@@ -17,7 +30,6 @@ class AuthService:
 
     def __init__(self, db):
         self.db = db
-        self.ph = PasswordHasher()
 
     def create_access_token(self, data: dict, expires_delta: timedelta = None) -> str:
         """Create a new JWT access token."""
@@ -27,39 +39,116 @@ class AuthService:
         else:
             expire = datetime.utcnow() + timedelta(minutes=self.ACCESS_TOKEN_EXPIRE_MINUTES)
         to_encode.update({"exp": expire})
-        encoded_jwt = jwt.encode(to_encode, os.getenv('SECRET_KEY'), algorithm=self.ALGORITHM)
+        encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_jwt
 
     def authenticate_user(self, username: str, password: str) -> Optional[User]:
-        """Authenticate the user by verifying the username and password."""
+        """
+        Authenticate the user by verifying the username and password. The hash is checked on
+        the password pool, so this raises PasswordPoolBusy when too many logins are pending.
+        A hash made with other Argon2 parameters than the configured ones is replaced in the
+        background once the password is known to be right. The user is read on a connection of
+        its own, returned before the check, so call this without one checked out.
+        """
         try:
-            user = User.get(User.username == username)
-            if self.ph.verify(user.password, password):
-                return user
+            with self.db.database.connection_context():
+                user = User.get(User.username == username)
         except DoesNotExist:
             return None
-        return None
+        if not password_pool.verify(user.password, password):
+            return None
+        if needs_rehash(user.password):
+            password_rehasher.request(user.id, user.password, password)
+        return user
+
+    def token_subject(self, token: str) -> str:
+        """Verify a JWT token's signature and expiry and return its subject, the username."""
+        return self._decode(token)["sub"]
 
     def verify_token(self, token: str) -> User:
-        """Verify a JWT token and return the associated user."""
-        credentials_exception = HTTPException(
-            status_code=401,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        """
+        Verify a JWT token and return the associated user. A token verified before is answered
+        from token_cache until it expires, without decoding it or reading the user again; a
+        token without an expiry is never cached.
+        """
+        verified = token_cache.get_or_load(token_key(token), lambda: self._verify(token), ttl_of=token_ttl)
+        return verified.user
+
+    async def verify_token_async(self, token: str,
+                                 get_by_username: Callable[[str], Awaitable[Optional[dict]]]) -> User:
+        """
+        verify_token for the async routes, sharing token_cache with it. On a miss the user row
+        comes from ``get_by_username``, e.g. AsyncUserCRUD.get_by_username.
+        """
+        user = self.cached_user(token)
+        if user is not None:
+            return user
+        claims = self._decode(token)
+        row = await get_by_username(claims["sub"])
+        if row is None:
+            raise credentials_exception()
+        verified = VerifiedToken(claims, User(**row))
+        return token_cache.get_or_load(token_key(token), lambda: verified, ttl_of=token_ttl).user
+
+    def cached_user(self, token: str) -> Optional[User]:
+        """The user of a token found in token_cache, or None; never touches the database."""
+        verified = token_cache.get(token_key(token))
+        return verified.user if verified is not None else None
+
+    def _verify(self, token: str) -> VerifiedToken:
+        claims = self._decode(token)
         try:
-            payload = jwt.decode(token, os.getenv('SECRET_KEY'), algorithms=[self.ALGORITHM])
-            username: str = payload.get("sub")
-            if username is None:
-                raise credentials_exception
-        except HTTPException as e:
-            raise e
-        except jwt.PyJWTError:
-            raise credentials_exception
+            return VerifiedToken(claims, User.get(User.username == claims["sub"]))
+        except DoesNotExist:
+            raise credentials_exception()
+
+    def _decode(self, token: str) -> dict:
         try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[self.ALGORITHM])
+        except jwt.PyJWTError:
+            raise credentials_exception()
+        if payload.get("sub") is None:
+            raise credentials_exception()
+        return payload
+
+
+def token_ttl(verified: VerifiedToken) -> float:
+    """Seconds left until the token expires; token_cache keeps it no longer."""
+    return verified.claims.get("exp", 0) - time.time()
+
+
+def token_key(token: str) -> bytes:
+    """token_cache key of a token: its digest, so the cache holds no usable credentials."""
+    return hashlib.sha256(token.encode()).digest()
+
+
+def store_rehashed_password(user_id: int, old_hash: str, new_hash: str) -> bool:
+    """Swap in a rehashed password on a connection of its own, unless the password changed meanwhile."""
+    with User._meta.database.connection_context():
+        query = User.update(password=new_hash).where((User.id == user_id) & (User.password == old_hash))
+        stored = query.execute() > 0
+    if stored:
+        invalidate_user(user_id)
+    return stored
+
+
+# Outdated hashes found at login, replaced in the background for every AuthService in this process
+password_rehasher = PasswordRehasher(store_rehashed_password)
+register_metrics('password_rehasher', password_rehasher.stats)
+
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=401,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 
-            user = User.get(User.username == username)
-            if user is not None:
-               return user
-        except DoesNotExist as e:
-            raise credentials_exception
+def password_pool_busy() -> HTTPException:
+    """Answer to PasswordPoolBusy: the client should retry shortly rather than wait."""
+    return HTTPException(
+        status_code=503,
+        detail="Too many logins in progress, please retry.",
+        headers={"Retry-After": "1"},
+    )
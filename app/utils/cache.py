@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class _Flight:
+    """A load in progress that concurrent misses on the same key wait for."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache whose entries also expire after ``ttl`` seconds.
+
+    Misses go through ``get_or_load``, which lets only one caller per key run the loader
+    while the others wait for its result (single-flight), so a hot key expiring does not
+    send a burst of identical queries to the database. Entries are per process: writes
+    made by other workers are only picked up once the TTL runs out.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._inflight = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # Misses served by another caller's load
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Return the cached value for ``key``, or None, without loading it. Only a hit is counted:
+        a miss here is expected to be followed by ``get_or_load``, which counts it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any],
+                    ttl_of: Optional[Callable[[Any], float]] = None) -> Any:
+        """
+        Return the cached value for ``key``, calling ``loader`` on a miss. None results are not cached.
+        ``ttl_of(value)`` can shorten the lifetime of a loaded value below ``ttl``, down to not caching it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                # An invalidation during the load detaches the flight, so a stale result is not stored
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                    if flight.error is None and flight.value is not None:
+                        ttl = self.ttl if ttl_of is None else min(self.ttl, ttl_of(flight.value))
+                        if ttl > 0:
+                            self._store(key, flight.value, ttl)
+            flight.event.set()
+        return flight.value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._inflight.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]):
+        """Drop every entry for which ``predicate(key, value)`` is true, and any load in progress."""
+        with self._lock:
+            for key in [key for key, (_, value) in self._entries.items() if predicate(key, value)]:
+                del self._entries[key]
+            self._inflight.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._inflight.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _store(self, key: Hashable, value: Any, ttl: float):
+        self._entries[key] = (self._clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
@@ -0,0 +1,56 @@
+import hashlib
+from typing import List, Optional
+
+
+def make_etag(*parts) -> str:
+    """
+    Build a weak ETag from cheap inputs such as a table version and the request's query string.
+
+    The representation is never serialised to compute it, so a conditional request can be
+    answered before any row is read.
+    """
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header value against ``etag``."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def request_etag(request, version: int, *scope) -> str:
+    """
+    ETag of a read whose result depends only on ``version``, the request path and query and
+    ``scope``, such as the id of the user the read was limited to.
+    """
+    return make_etag(version, request.url.path, sorted(request.query_params.multi_items()), *scope)
+
+
+def cache_headers(etag: str) -> dict:
+    # no-cache makes browsers revalidate with If-None-Match instead of reusing a stale copy
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def version_etag(version: int) -> str:
+    """Strong ETag of a single row, taken from its version column; If-Match compares against it."""
+    return f'"{version}"'
+
+
+def if_match_versions(if_match: Optional[str]) -> Optional[List[int]]:
+    """
+    Row versions an If-Match header accepts, or None when it places no condition (absent or ``*``).
+    Weak and unparseable tags never match, as If-Match uses strong comparison.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    versions = []
+    for candidate in if_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith('"') and candidate.endswith('"') and candidate[1:-1].isdigit():
+            versions.append(int(candidate[1:-1]))
+    return versions
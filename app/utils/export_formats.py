@@ -0,0 +1,30 @@
+import csv
+import io
+from typing import Iterable, Iterator, List, Sequence
+
+from pydantic_core import to_json
+
+
+def ndjson_chunks(batches: Iterable[List[dict]]) -> Iterator[bytes]:
+    """Encode each batch of rows as newline-delimited JSON, one chunk per batch."""
+    for rows in batches:
+        yield b"".join(to_json(row) + b"\n" for row in rows)
+
+
+def csv_chunks(batches: Iterable[List[dict]], columns: Sequence[str]) -> Iterator[bytes]:
+    """Encode a header line and then each batch of rows as CSV, one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    for rows in batches:
+        writer.writerows(rows)
+        yield _drain(buffer)
+    if buffer.tell():
+        yield _drain(buffer)  # No rows at all: still send the header
+
+
+def _drain(buffer: io.StringIO) -> bytes:
+    data = buffer.getvalue().encode()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
@@ -0,0 +1,19 @@
+from typing import Iterable, Optional, Tuple
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Parse a comma separated ``fields=`` query value into a tuple of field names.
+
+    Returns None when no fields were requested. Raises ValueError if any name is not in ``allowed``.
+    """
+    if fields is None:
+        return None
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    allowed = tuple(allowed)
+    if not names:
+        raise ValueError(f"No fields requested. Allowed fields: {', '.join(allowed)}.")
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed fields: {', '.join(allowed)}.")
+    return names
@@ -0,0 +1,30 @@
+import csv
+import io
+import json
+from typing import BinaryIO, Iterator, Tuple
+
+# Record number (1-based, the header line not counted) and the fields of one uploaded row
+Record = Tuple[int, dict]
+
+
+def ndjson_records(stream: BinaryIO) -> Iterator[Record]:
+    """Decode newline-delimited JSON objects one line at a time; blank lines are skipped."""
+    for number, line in enumerate(io.TextIOWrapper(stream, encoding="utf-8"), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, None  # Reported by the caller along with the other invalid rows
+            continue
+        yield number, record if isinstance(record, dict) else None
+
+
+def csv_records(stream: BinaryIO) -> Iterator[Record]:
+    """Decode CSV rows keyed by the header line. Empty cells and cells beyond the header are dropped."""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8", newline=""))
+    for number, row in enumerate(reader, start=1):
+        yield number, {name: value for name, value in row.items() if name is not None and value != ""}
+
+
+IMPORT_READERS = {"ndjson": ndjson_records, "csv": csv_records}
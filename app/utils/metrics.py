@@ -0,0 +1,13 @@
+from typing import Callable, Dict
+
+# Name -> zero-argument callable returning a JSON-serialisable snapshot
+_providers: Dict[str, Callable[[], dict]] = {}
+
+
+def register_metrics(name: str, provider: Callable[[], dict]):
+    """Expose ``provider()`` under ``name`` in the /api/metrics response."""
+    _providers[name] = provider
+
+
+def collect_metrics() -> dict:
+    return {name: provider() for name, provider in _providers.items()}
@@ -0,0 +1,58 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+
+def encode_cursor(created_at: datetime, task_id: int) -> str:
+    """Encode a (created_at, id) keyset position as an opaque URL-safe cursor."""
+    return _encode([created_at.isoformat(), task_id])
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        created_at, task_id = _decode(cursor)
+        return datetime.fromisoformat(created_at), int(task_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def encode_rank_cursor(rank: float, task_id: int) -> str:
+    """Encode a (rank, id) keyset position of a ranked search result."""
+    return _encode([rank, task_id])
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    """Decode a cursor produced by encode_rank_cursor. Raises ValueError if it is malformed."""
+    try:
+        rank, task_id = _decode(cursor)
+        return float(rank), int(task_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def encode_column_cursor(rank: Optional[str], created_at: datetime, task_id: int) -> str:
+    """Encode a (rank, created_at, id) keyset position in a status column; rank None for unranked tasks."""
+    return _encode([rank, created_at.isoformat(), task_id])
+
+
+def decode_column_cursor(cursor: str) -> Tuple[Optional[str], datetime, int]:
+    """Decode a cursor produced by encode_column_cursor. Raises ValueError if it is malformed."""
+    try:
+        rank, created_at, task_id = _decode(cursor)
+        if rank is not None and not isinstance(rank, str):
+            raise TypeError(rank)
+        return rank, datetime.fromisoformat(created_at), int(task_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _encode(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> list:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
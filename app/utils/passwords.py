@@ -0,0 +1,323 @@
+# app/utils/passwords.py
+"""
+Argon2 hashing and verification on a bounded pool of worker processes.
+
+An Argon2 call is tens of milliseconds of CPU and tens of megabytes of memory by design. Run
+on request threads, a burst of logins takes every core and the rest of the API waits behind
+it. ``password_pool`` runs them on PASSWORD_POOL_WORKERS processes instead, so password work
+never uses more cores than that. At most PASSWORD_POOL_MAX_PENDING calls may be queued or
+running at once. Past that, a call raises PasswordPoolBusy straight away instead of queueing
+behind work that would make it time out anyway, and the routes answer 503. Sync callers block
+on ``hash``/``verify``. Async ones await ``hash_async``/``verify_async``, which leave the
+event loop free.
+
+PASSWORD_POOL_WORKERS=0 runs the calls on the calling thread, as before the pool existed.
+
+Every hash uses the one configuration in ARGON2_TIME_COST, ARGON2_MEMORY_COST and
+ARGON2_PARALLELISM. The defaults are argon2-cffi's. ``calibrate`` picks values for the host
+it runs on. A login whose stored hash uses other values gets it rehashed in the background
+(see PasswordRehasher), so changing them upgrades users as they log in.
+
+This module is imported by the worker processes, so it only depends on argon2 and the
+standard library at import time.
+
+Usage: python -m app.utils.passwords calibrate [--target-ms MS] [--max-memory-mib MIB]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import argon2
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHash, VerificationError
+
+from app.utils.metrics import register_metrics
+
+# Argon2 parameters of new hashes: passes over memory, KiB of memory, and lanes
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', argon2.DEFAULT_TIME_COST))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', argon2.DEFAULT_MEMORY_COST))
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', argon2.DEFAULT_PARALLELISM))
+
+# Processes doing Argon2 work; by default half the cores, leaving the rest to the API
+PASSWORD_POOL_WORKERS = int(os.getenv('PASSWORD_POOL_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+# Calls queued or running at once before new ones are turned away
+PASSWORD_POOL_MAX_PENDING = int(os.getenv('PASSWORD_POOL_MAX_PENDING', max(1, PASSWORD_POOL_WORKERS) * 8))
+
+# One per process, workers included; spawned workers read the same environment
+_hasher = PasswordHasher(time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_COST, parallelism=ARGON2_PARALLELISM)
+# Rehashes queued after logins, at most; more wait for the user's next login
+REHASH_MAX_PENDING = 100
+# Lower bound of calibrate's memory cost, from the OWASP password storage guidance
+CALIBRATE_MIN_MEMORY_MIB = 19
+
+
+class PasswordPoolBusy(RuntimeError):
+    """Too many password hashes or verifications are already queued; retry later."""
+
+
+def hash_password(plain_password: str) -> str:
+    return _hasher.hash(plain_password)
+
+
+def verify_password(password_hash: str, plain_password: str) -> bool:
+    """True when ``plain_password`` matches; False on a mismatch or a hash that is not Argon2."""
+    try:
+        return _hasher.verify(password_hash, plain_password)
+    except (VerificationError, InvalidHash):
+        return False
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """
+    True when ``password_hash`` was made with other parameters than the configured ones; only
+    parses it. False for a string that is not an Argon2 hash, which verify_password rejects anyway.
+    """
+    try:
+        return _hasher.check_needs_rehash(password_hash)
+    except InvalidHash:
+        return False
+
+
+class PasswordPool:
+    """
+    Runs hash_password and verify_password on a process pool started on first use, with a
+    cap on the calls queued or running. A pool whose worker died is replaced on the next call.
+    """
+
+    def __init__(self, workers: int = PASSWORD_POOL_WORKERS, max_pending: int = PASSWORD_POOL_MAX_PENDING,
+                 executor_factory: Optional[Callable[[int], ProcessPoolExecutor]] = None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor_factory = executor_factory or _spawn_executor
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.max_seen = 0
+        self.submitted = 0
+        self.rejected = 0
+
+    def hash(self, plain_password: str) -> str:
+        """Hash on the pool, blocking the calling thread. Raises PasswordPoolBusy."""
+        return self._call(hash_password, plain_password).result()
+
+    def verify(self, password_hash: str, plain_password: str) -> bool:
+        """Verify on the pool, blocking the calling thread. Raises PasswordPoolBusy."""
+        return self._call(verify_password, password_hash, plain_password).result()
+
+    async def hash_async(self, plain_password: str) -> str:
+        return await asyncio.wrap_future(self._call(hash_password, plain_password))
+
+    async def verify_async(self, password_hash: str, plain_password: str) -> bool:
+        return await asyncio.wrap_future(self._call(verify_password, password_hash, plain_password))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self.pending,
+                "max_seen": self.max_seen,
+                "max_pending": self.max_pending,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+            }
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _call(self, fn: Callable, *args) -> Future:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordPoolBusy(f"{self.pending} password operation(s) already pending")
+            self.pending += 1
+            self.submitted += 1
+            self.max_seen = max(self.max_seen, self.pending)
+        try:
+            future = self._submit(fn, *args)
+        except BaseException:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _submit(self, fn: Callable, *args) -> Future:
+        if self.workers <= 0:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        try:
+            return self._pool().submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker was killed, e.g. by the OOM killer; start a fresh pool and retry once
+            self.close()
+            return self._pool().submit(fn, *args)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._executor_factory(self.workers)
+            return self._executor
+
+    def _done(self, future: Optional[Future]):
+        with self._lock:
+            self.pending -= 1
+
+
+def _spawn_executor(workers: int) -> ProcessPoolExecutor:
+    # Spawned rather than forked: the API process runs pool, listener and writer threads
+    # that a fork would copy mid-operation
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+# Argon2 work of every request in this process
+password_pool = PasswordPool()
+register_metrics('password_pool', password_pool.stats)
+
+
+class PasswordRehasher:
+    """
+    Replaces outdated hashes on a background thread, so the login that found one does not
+    wait for it. The new hash is made on ``pool`` and handed to ``store(user_id, old_hash,
+    new_hash)``, which must only write it while the stored hash is still ``old_hash`` and
+    returns whether it did. Requests are dropped, not queued, when ``max_pending`` are
+    waiting or the pool is busy: the next login asks again.
+    """
+
+    def __init__(self, store: Callable[[int, str, str], bool], pool: PasswordPool = password_pool,
+                 max_pending: int = REHASH_MAX_PENDING):
+        self.store = store
+        self.pool = pool
+        self.max_pending = max_pending
+        self._pending: Dict[int, Tuple[str, str]] = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self.rehashed = 0
+        self.skipped = 0
+        self.failures = 0
+
+    def request(self, user_id: int, old_hash: str, plain_password: str) -> bool:
+        """Queue a rehash of the user's password; False when it was dropped."""
+        with self._cond:
+            if user_id not in self._pending and len(self._pending) >= self.max_pending:
+                self.skipped += 1
+                return False
+            self._pending[user_id] = (old_hash, plain_password)
+            self._cond.notify()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="password-rehasher", daemon=True)
+                self._thread.start()
+        return True
+
+    def run_pending(self):
+        """Rehash every queued password on the calling thread."""
+        while True:
+            with self._cond:
+                if not self._pending:
+                    return
+                user_id = next(iter(self._pending))
+                old_hash, plain_password = self._pending.pop(user_id)
+            try:
+                stored = self.store(user_id, old_hash, self.pool.hash(plain_password))
+            except PasswordPoolBusy:
+                stored = False
+            except Exception as e:
+                print(f"Failed to rehash the password of user {user_id}: {e}")  # Replace with proper logging in production
+                with self._cond:
+                    self.failures += 1
+                continue
+            with self._cond:
+                if stored:
+                    self.rehashed += 1
+                else:
+                    self.skipped += 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "rehashed": self.rehashed,
+                "skipped": self.skipped,
+                "failures": self.failures,
+                "pending": len(self._pending),
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            self.run_pending()
+
+
+def verify_seconds(time_cost: int, memory_cost: int, parallelism: int, repeat: int = 5) -> float:
+    """Median time one verification takes on this host with the given parameters."""
+    hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    password_hash = hasher.hash("calibration")
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hasher.verify(password_hash, "calibration")
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def calibrate(target: float, max_memory_cost: int, parallelism: int = 1,
+              measure: Callable[[int, int, int], float] = verify_seconds) -> Tuple[int, int, float]:
+    """
+    Strongest (time_cost, memory_cost) whose verification takes at most ``target`` seconds,
+    and the time it takes. Memory is what makes Argon2 expensive to attack, so it is spent
+    first: the largest memory cost up to ``max_memory_cost`` KiB that fits at one pass, then
+    as many passes as still fit. Memory stops halving at CALIBRATE_MIN_MEMORY_MIB, which is
+    returned even when it misses the target.
+    """
+    min_memory_cost = CALIBRATE_MIN_MEMORY_MIB * 1024
+    memory_cost = max_memory_cost
+    seconds = measure(1, memory_cost, parallelism)
+    while seconds > target and memory_cost > min_memory_cost:
+        memory_cost = max(memory_cost // 2, min_memory_cost)
+        seconds = measure(1, memory_cost, parallelism)
+    time_cost = 1
+    while True:
+        slower = measure(time_cost + 1, memory_cost, parallelism)
+        if slower > target:
+            return time_cost, memory_cost, seconds
+        time_cost, seconds = time_cost + 1, slower
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.utils.passwords", description="Argon2 password hashing")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("calibrate", help="Pick Argon2 costs for a target verification time on this host")
+    command.add_argument("--target-ms", type=float, default=50, help="Longest a verification may take (default 50)")
+    command.add_argument("--max-memory-mib", type=int, default=64, help="Most memory per hash (default 64)")
+    command.add_argument("--parallelism", type=int, default=1,
+                         help="Lanes per hash (default 1; the pool already runs hashes side by side)")
+    args = parser.parse_args(argv)
+
+    time_cost, memory_cost, seconds = calibrate(args.target_ms / 1000, args.max_memory_mib * 1024, args.parallelism)
+    current = verify_seconds(ARGON2_TIME_COST, ARGON2_MEMORY_COST, ARGON2_PARALLELISM)
+    print(f"Current: t={ARGON2_TIME_COST}, m={ARGON2_MEMORY_COST} KiB, p={ARGON2_PARALLELISM}: "
+          f"{current * 1000:.1f} ms per verification")
+    print(f"Calibrated: t={time_cost}, m={memory_cost} KiB, p={args.parallelism}: "
+          f"{seconds * 1000:.1f} ms per verification")
+    print(f"ARGON2_TIME_COST={time_cost}")
+    print(f"ARGON2_MEMORY_COST={memory_cost}")
+    print(f"ARGON2_PARALLELISM={args.parallelism}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
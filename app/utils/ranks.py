@@ -0,0 +1,49 @@
+from typing import List, Optional
+
+# Digits of a rank in ascending order, so ranks compare as plain strings (bytewise, COLLATE "C")
+RANK_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+_BASE = len(RANK_DIGITS)
+_VALUES = {digit: value for value, digit in enumerate(RANK_DIGITS)}
+
+
+def rank_between(before: Optional[str], after: Optional[str]) -> str:
+    """
+    Return a rank that sorts strictly between ``before`` and ``after``; None stands for the
+    start or the end of the column.
+
+    Ranks are base-62 fractions 0.d1d2d3... written without the "0." and without trailing
+    zeros, so there is always room between two of them. Each split of the same gap adds a
+    digit about every six times; spread_ranks makes short ones again.
+    Raises ValueError unless ``before`` < ``after``.
+    """
+    before = before or ""
+    if after is not None and before >= after:
+        raise ValueError(f"No rank between {before!r} and {after!r}")
+    return _midpoint(before, after)
+
+
+def spread_ranks(count: int, before: Optional[str] = None, after: Optional[str] = None) -> List[str]:
+    """``count`` ascending ranks between ``before`` and ``after``, as short as bisection makes them."""
+    if count <= 0:
+        return []
+    middle = rank_between(before, after)
+    left = (count - 1) // 2
+    return spread_ranks(left, before, middle) + [middle] + spread_ranks(count - 1 - left, middle, after)
+
+
+def _midpoint(low: str, high: Optional[str]) -> str:
+    if high is not None:
+        # Keep the digits both share, then split what follows
+        shared = 0
+        while shared < len(high) and (low[shared] if shared < len(low) else "0") == high[shared]:
+            shared += 1
+        if shared:
+            return high[:shared] + _midpoint(low[shared:], high[shared:])
+    low_digit = _VALUES[low[0]] if low else 0
+    high_digit = _VALUES[high[0]] if high is not None else _BASE
+    if high_digit - low_digit > 1:
+        return RANK_DIGITS[(low_digit + high_digit + 1) // 2]
+    # Adjacent digits: a longer high rank leaves room under its first digit alone
+    if high is not None and len(high) > 1:
+        return high[0]
+    return RANK_DIGITS[low_digit] + _midpoint(low[1:], None)
@@ -0,0 +1,14 @@
+from pydantic_core import to_json
+
+# Comment line sent on idle streams so proxies and load balancers keep the connection open
+SSE_KEEPALIVE = b": keepalive\n\n"
+
+
+def format_sse(event: dict) -> bytes:
+    """Encode a change event as a server-sent event named after its op, with its seq as the resume id."""
+    lines = []
+    if "seq" in event:
+        lines.append(f"id: {event['seq']}".encode())
+    lines.append(f"event: {event['op']}".encode())
+    lines.append(b"data: " + to_json(event))
+    return b"\n".join(lines) + b"\n\n"
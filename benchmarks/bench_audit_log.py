@@ -0,0 +1,57 @@
+"""
+Measure what the audit log adds to task writes.
+
+Runs the same TaskCRUD.create_task calls from a number of threads, each on a pooled
+connection of its own as a request would be. The first run has auditing off, the second
+has it on. For each run it prints the median and p99 latency of a create, and how long the
+audit writer then takes to drain its queue. Audit rows go out in COPY batches from the
+writer thread, so a create should cost about the same with auditing on. Needs
+DATABASE_PUBLIC_URL pointing at a migrated Postgres. The tasks and audit rows it writes are
+left in place, so use a scratch database.
+
+Usage: python -m benchmarks.bench_audit_log [threads] [creates per thread]
+"""
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.api.schemas.task_schemas import TaskCreate
+from app.crud.task_crud import TaskCRUD
+from app.db.audit import audit_log
+from app.db.database import begin_request_state, database_instance
+
+
+def creates(count: int) -> list:
+    begin_request_state()
+    database_instance.database.connect(reuse_if_open=True)
+    timings = []
+    try:
+        crud = TaskCRUD(database_instance.database)
+        for i in range(count):
+            start = time.perf_counter()
+            crud.create_task(TaskCreate(title=f"Bench {i}", description="audit log"))
+            timings.append(time.perf_counter() - start)
+    finally:
+        database_instance.database.close()
+    return timings
+
+
+def run(threads: int, per_thread: int, audited: bool):
+    audit_log.enabled = audited
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        timings = sorted(t for result in pool.map(creates, [per_thread] * threads) for t in result)
+    start = time.perf_counter()
+    audit_log.flush(60)
+    drain = time.perf_counter() - start
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"audit {'on ' if audited else 'off'}: median {statistics.median(timings) * 1000:6.3f} ms, "
+          f"p99 {p99 * 1000:6.3f} ms per create; queue drained {drain * 1000:7.1f} ms after the last one")
+
+
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    run(threads, per_thread, audited=False)
+    run(threads, per_thread, audited=True)
+    print(audit_log.stats())
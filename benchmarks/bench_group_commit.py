@@ -0,0 +1,45 @@
+"""
+Compare single-task creates committed one by one with creates sharing a group commit.
+
+Runs the same number of TaskCRUD.create_task calls from a number of threads, each thread
+on a pooled connection of its own as a request would be, with TASK_GROUP_COMMIT off and
+then on. Needs DATABASE_PUBLIC_URL pointing at a migrated Postgres; the tasks it creates
+are left in place, so use a scratch database.
+
+Usage: python -m benchmarks.bench_group_commit [threads] [creates per thread]
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.api.schemas.task_schemas import TaskCreate
+from app.crud import task_crud
+from app.db.database import begin_request_state, database_instance
+
+
+def creates(count: int):
+    begin_request_state()
+    database_instance.database.connect(reuse_if_open=True)
+    try:
+        crud = task_crud.TaskCRUD(database_instance.database)
+        for i in range(count):
+            crud.create_task(TaskCreate(title=f"Bench {i}", description="group commit"))
+    finally:
+        database_instance.database.close()
+
+
+def run(name: str, group_commit: bool, threads: int, count: int):
+    task_crud.TASK_GROUP_COMMIT = group_commit
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(creates, [count] * threads))
+    elapsed = time.perf_counter() - start
+    print(f"{name:>12}: {threads * count / elapsed:8,.0f} creates/s")
+
+
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    run("one by one", False, threads, count)
+    run("group", True, threads, count)
+    print(task_crud.task_writes.stats())
@@ -0,0 +1,63 @@
+"""
+Compare the model-hydration list path with the direct row-to-JSON path.
+
+The old path builds a peewee model per row, validates it into the Pydantic
+response schema and lets FastAPI encode the result. The fast path selects the
+response columns as dicts and encodes them straight to JSON bytes.
+
+Usage: python -m benchmarks.bench_list_serialization [rows]
+"""
+import json
+import sys
+import time
+from datetime import datetime
+
+from peewee import SqliteDatabase
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+
+from app.api.schemas.task_schemas import Task as TaskSchema
+from app.crud.task_crud import TASK_RESPONSE_COLUMNS
+from app.models.task_models import Task
+
+
+def model_path():
+    adapter = TypeAdapter(list[TaskSchema])
+    tasks = adapter.validate_python(list(Task.select()), from_attributes=True)
+    return json.dumps(adapter.dump_python(tasks, mode="json")).encode()
+
+
+def fast_path():
+    return to_json(list(Task.select(*TASK_RESPONSE_COLUMNS).dicts()))
+
+
+def measure(name, fn, rows, repeat=5):
+    best = min(_timed(fn) for _ in range(repeat))
+    print(f"{name:>12}: {best * 1000:8.1f} ms  {rows / best:12,.0f} rows/s")
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(rows: int):
+    db = SqliteDatabase(":memory:")
+    with db.bind_ctx([Task]):
+        db.create_tables([Task])
+        created_at = datetime(2024, 1, 1)
+        with db.atomic():
+            Task.insert_many(
+                [(i, f"Task {i}", "x" * 200, "todo", created_at) for i in range(1, rows + 1)],
+                fields=[Task.id, Task.title, Task.description, Task.status, Task.created_at],
+            ).execute()
+
+        assert json.loads(model_path()) == json.loads(fast_path())
+        print(f"{rows} rows")
+        measure("model path", model_path, rows)
+        measure("fast path", fast_path, rows)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
@@ -0,0 +1,87 @@
+"""
+Time one user's "my open tasks" page while the rest of the table grows around it.
+
+Creates a user with a fixed set of tasks, then adds tasks owned by other users in steps.
+After each step it times TaskCRUD(db, owner_id).get_tasks_page for the user's todo tasks,
+selecting id and title, and prints the plan of that query. With the
+(owner_id, status, created_at, id) INCLUDE (title) index the plan is an Index Only Scan
+reading the same few pages at every size. Needs DATABASE_PUBLIC_URL pointing at a
+migrated Postgres; the users and tasks it creates are left in place, so use a scratch
+database.
+
+Usage: python -m benchmarks.bench_owner_tasks [rows per step] [steps]
+"""
+import statistics
+import sys
+import time
+
+from app.crud.task_crud import TaskCRUD, page_query
+from app.db.database import database_instance
+from app.models.task_models import Task
+
+OWNER_TASKS = 500
+OTHER_USERS = 1000
+PAGE_SIZE = 50
+
+
+def seed_users(db) -> int:
+    owner_id = db.execute_sql(
+        "INSERT INTO users (username, email, password, created_at, role) "
+        "VALUES ('bench-owner', 'bench-owner@example.com', 'x', now(), 'user') "
+        "RETURNING id").fetchone()[0]
+    db.execute_sql(
+        "INSERT INTO users (username, email, password, created_at, role) "
+        "SELECT 'bench-' || i, 'bench-' || i || '@example.com', 'x', now(), 'user' FROM generate_series(1, %s) AS i",
+        (OTHER_USERS,))
+    db.execute_sql(
+        "INSERT INTO tasks (title, description, status, created_at, owner_id) "
+        "SELECT 'Mine ' || i, 'x', CASE WHEN i %% 5 = 0 THEN 'done' ELSE 'todo' END, "
+        "now() - i * interval '1 minute', %s FROM generate_series(1, %s) AS i",
+        (owner_id, OWNER_TASKS))
+    return owner_id
+
+
+def grow(db, rows: int, owner_id: int):
+    # Other users' tasks, spread over their owners and over the same statuses and times
+    db.execute_sql(
+        "INSERT INTO tasks (title, description, status, created_at, owner_id) "
+        "SELECT 'Task ' || i, 'x', CASE WHEN i %% 3 = 0 THEN 'done' ELSE 'todo' END, "
+        "now() - (i %% 100000) * interval '1 minute', "
+        "%s + 1 + i %% %s FROM generate_series(1, %s) AS i",  # The other users were inserted right after the owner
+        (owner_id, OTHER_USERS, rows))
+    # Index-only scans skip the heap once the visibility map marks the pages all-visible;
+    # VACUUM runs outside a transaction, which is how peewee runs statements outside atomic()
+    db.execute_sql("VACUUM ANALYZE tasks")
+
+
+def measure(crud: TaskCRUD, repeat: int = 200) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows, cursor = crud.get_tasks_page(limit=PAGE_SIZE, status="todo", fields=["id", "title"])
+        timings.append(time.perf_counter() - start)
+    assert len(rows) == PAGE_SIZE and cursor is not None
+    return statistics.median(timings)
+
+
+def plan(db, owner_id: int) -> str:
+    query, _ = page_query(PAGE_SIZE, None, "todo", None, None, False, ["id", "title"], owner_id)
+    sql, params = query.sql()
+    lines = db.execute_sql(f"EXPLAIN (ANALYZE, BUFFERS, COSTS OFF) {sql}", params).fetchall()
+    return "\n".join(f"    {line}" for line, in lines)
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    db = database_instance.database
+    db.connect(reuse_if_open=True)
+    owner_id = seed_users(db)
+    crud = TaskCRUD(db, owner_id)
+    for step in range(steps + 1):
+        if step:
+            grow(db, rows, owner_id)
+        total = Task.select().count()
+        print(f"{total:>10,} tasks: {measure(crud) * 1000:6.3f} ms per page")
+        print(plan(db, owner_id))
+    db.close()
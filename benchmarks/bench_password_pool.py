@@ -0,0 +1,79 @@
+"""
+Measure how a burst of logins slows everything else down, with and without the password pool.
+
+A number of threads verify Argon2 passwords back to back, as concurrent logins would. Meanwhile
+one thread times a small piece of CPU work standing in for some other request: it encodes a
+page of task rows to JSON. The burst runs twice. The first time the threads verify inline, as
+the API did before the pool. The second time they go through a PasswordPool of
+PASSWORD_POOL_WORKERS processes. The script prints the median and p99 time of that other
+request, the logins completed per second and, for the pool, how many were turned away.
+Needs no database.
+
+Usage: python -m benchmarks.bench_password_pool [login threads] [seconds]
+"""
+import statistics
+import sys
+import threading
+import time
+
+from pydantic_core import to_json
+
+from app.utils.passwords import (PASSWORD_POOL_MAX_PENDING, PASSWORD_POOL_WORKERS, PasswordPool, PasswordPoolBusy,
+                                 hash_password, verify_password)
+
+ROWS = [{"id": i, "title": f"Task {i}", "description": "x" * 40, "status": "todo"} for i in range(500)]
+
+
+def other_request() -> float:
+    start = time.perf_counter()
+    for _ in range(20):
+        to_json(ROWS)
+    return time.perf_counter() - start
+
+
+def run(label: str, verify, threads: int, seconds: float):
+    password_hash = hash_password("Password1234!")
+    stop = threading.Event()
+    logins, rejected = [0], [0]
+    lock = threading.Lock()
+
+    def login_loop():
+        while not stop.is_set():
+            try:
+                verify(password_hash, "Password1234!")
+            except PasswordPoolBusy:
+                with lock:
+                    rejected[0] += 1
+                time.sleep(0.1)  # A client backing off after a 503
+                continue
+            with lock:
+                logins[0] += 1
+
+    workers = [threading.Thread(target=login_loop, daemon=True) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    timings = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        timings.append(other_request())
+        time.sleep(0.005)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    timings.sort()
+    print(f"{label}: other request median {statistics.median(timings) * 1000:6.3f} ms, "
+          f"p99 {timings[int(len(timings) * 0.99) - 1] * 1000:6.3f} ms; "
+          f"{logins[0] / seconds:6.1f} logins/s, {rejected[0]} rejected")
+
+
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    baseline = [other_request() for _ in range(200)]
+    print(f"idle: other request median {statistics.median(baseline) * 1000:6.3f} ms")
+    run("inline", verify_password, threads, seconds)
+    pool = PasswordPool(PASSWORD_POOL_WORKERS, PASSWORD_POOL_MAX_PENDING)
+    pool.verify(hash_password("warm"), "warm")  # Start the worker processes outside the measurement
+    run(f"pool of {PASSWORD_POOL_WORKERS}", pool.verify, threads, seconds)
+    print(pool.stats())
+    pool.close()
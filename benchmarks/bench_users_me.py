@@ -0,0 +1,62 @@
+"""
+Measure GET /users/me/ with and without the token cache.
+
+Registers a user, logs in once and then calls /users/me/ with that token through the
+application's own routes, in-process. The first run clears the token cache before every
+call, so each request decodes the token and reads the user as before the cache. The second
+run keeps it. For each run it prints the median and p99 latency and the number of SQL
+statements sent per request. Needs DATABASE_PUBLIC_URL pointing at a migrated Postgres;
+the user it registers is left in place, so use a scratch database.
+
+Usage: python -m benchmarks.bench_users_me [requests]
+"""
+import statistics
+import sys
+import time
+import uuid
+
+from fastapi.testclient import TestClient
+
+from app.crud.user_crud import token_cache
+from app.db.database import database_instance
+from app.main import create_app
+
+
+def run(client: TestClient, headers: dict, requests: int, cached: bool):
+    statements = [0]
+    execute_sql = database_instance.database.execute_sql
+
+    def counted(*args, **kwargs):
+        statements[0] += 1
+        return execute_sql(*args, **kwargs)
+
+    database_instance.database.execute_sql = counted
+    timings = []
+    try:
+        for _ in range(requests):
+            if not cached:
+                token_cache.clear()
+            start = time.perf_counter()
+            response = client.get("/users/me/", headers=headers)
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.text
+    finally:
+        del database_instance.database.execute_sql
+    timings.sort()
+    print(f"token cache {'on ' if cached else 'off'}: median {statistics.median(timings) * 1000:6.3f} ms, "
+          f"p99 {timings[int(len(timings) * 0.99) - 1] * 1000:6.3f} ms, "
+          f"{statements[0] / requests:.2f} SQL statements per request")
+
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    username = f"bench{uuid.uuid4().hex[:8]}"
+    with TestClient(create_app()) as client:
+        response = client.post("/register/", json={"username": username, "email": f"{username}@example.com",
+                                                   "password": "Password1234!", "role": "user"})
+        assert response.status_code == 200, response.text
+        token = client.post("/login/", data={"username": username, "password": "Password1234!"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        run(client, headers, requests, cached=False)
+        run(client, headers, requests, cached=True)
+        print(token_cache.stats())
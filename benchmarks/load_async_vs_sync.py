@@ -0,0 +1,77 @@
+"""
+Load test the sync (threadpool + peewee) and async (event loop + psycopg 3 pool) handlers.
+
+Starts the app under uvicorn twice, once with ASYNC_DB_ENABLED off and once on, and fires
+the same burst of concurrent GET requests at each. Needs DATABASE_PUBLIC_URL pointing at a
+Postgres with some tasks in it. Set ASYNC_DB_POOL_MIN to ASYNC_DB_POOL_MAX so the async
+pool is fully open before the burst, as the threads of the sync path connect on first use.
+Run the load generator on other cores than the server, or it competes with the handlers.
+The task routes need a bearer token: set BENCH_TOKEN to the access_token /login/ returns.
+
+Usage: python -m benchmarks.load_async_vs_sync [concurrency] [path]
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+PORT = 8799
+AUTHORIZATION = f"Authorization: Bearer {os.environ['BENCH_TOKEN']}\r\n" if os.getenv('BENCH_TOKEN') else ""
+
+
+async def request(path: str):
+    # Bare HTTP/1.1 over a socket: a full HTTP client costs more CPU than the handlers being measured
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n{AUTHORIZATION}Connection: close\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response[9:12]), time.perf_counter() - start
+
+
+async def burst(path: str, concurrency: int):
+    await asyncio.gather(*(request(path) for _ in range(min(concurrency, 50))))  # Warm up pools
+    start = time.perf_counter()
+    results = await asyncio.gather(*(request(path) for _ in range(concurrency)))
+    return time.perf_counter() - start, results
+
+
+def run(name: str, async_enabled: bool, path: str, concurrency: int):
+    env = {**os.environ, "ASYNC_DB_ENABLED": "1" if async_enabled else "0"}
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT),
+                               "--log-level", "warning"], env=env)
+    try:
+        _wait_until_up()
+        elapsed, results = asyncio.run(burst(path, concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+    latencies = sorted(latency for _, latency in results)
+    errors = sum(1 for status, _ in results if status != 200)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:>6}: {concurrency / elapsed:8,.0f} req/s  p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+          f"p99 {p99 * 1000:7.1f} ms  errors {errors}")
+
+
+def _wait_until_up(deadline: float = 30.0):
+    start = time.perf_counter()
+    while time.perf_counter() - start < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/api/metrics", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("uvicorn did not start")
+
+
+if __name__ == "__main__":
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    path = sys.argv[2] if len(sys.argv) > 2 else "/api/tasks/?limit=20"
+    print(f"{concurrency} concurrent GET {path}")
+    run("sync", False, path, concurrency)
+    run("async", True, path, concurrency)
@@ -0,0 +1,160 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock, create_autospec
+
+from app.api.endpoints.async_task_routes import AsyncTaskRoutes
+from app.crud.async_task_crud import AsyncTaskCRUD
+from app.crud.async_user_crud import AsyncUserCRUD
+from app.crud.user_crud import token_cache
+
+TASK = {"id": 1, "title": "One", "description": "d", "status": "todo"}
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    token_cache.clear()
+    yield
+    token_cache.clear()
+
+
+@pytest.fixture
+def async_client():
+    app = FastAPI()
+    mock_task_crud = create_autospec(AsyncTaskCRUD)
+    crud = mock_task_crud.return_value
+    crud.get_version.return_value = 1
+    mock_user_crud = create_autospec(AsyncUserCRUD)
+    mock_user_crud.return_value.get_by_username.return_value = {"id": 1, "username": "ann"}
+    routes = AsyncTaskRoutes(async_db=MagicMock(), task_crud=mock_task_crud, user_crud=mock_user_crud)
+    app.include_router(routes.router)
+    token = routes.auth_service.create_access_token({"sub": "ann"})
+    return TestClient(app, headers={"Authorization": f"Bearer {token}"}), crud
+
+def test_read_tasks(async_client):
+    client, crud = async_client
+    crud.get_tasks_page.return_value = ([TASK], "next")
+
+    response = client.get("/api/tasks/", params={"limit": 1})
+
+    assert response.status_code == 200
+    assert response.json() == [TASK]
+    assert response.headers["X-Next-Cursor"] == "next"
+
+def test_read_tasks_not_modified(async_client):
+    client, crud = async_client
+    crud.get_tasks_page.return_value = ([TASK], None)
+    etag = client.get("/api/tasks/").headers["ETag"]
+
+    response = client.get("/api/tasks/", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert crud.get_tasks_page.await_count == 1
+
+def test_read_tasks_invalid_cursor(async_client):
+    client, crud = async_client
+    crud.get_tasks_page.side_effect = ValueError("Invalid cursor: bad")
+
+    response = client.get("/api/tasks/", params={"cursor": "bad"})
+
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'Invalid cursor.'}
+
+def test_read_task_not_found(async_client):
+    client, crud = async_client
+    crud.get_task.return_value = None
+
+    response = client.get("/api/tasks/1")
+
+    assert response.status_code == 404
+    assert response.json() == {'detail': 'Task not found.'}
+
+def test_read_task_with_fields(async_client):
+    client, crud = async_client
+    crud.get_task.return_value = {"title": "One", "version": 2}
+
+    response = client.get("/api/tasks/1", params={"fields": "title"})
+
+    assert response.status_code == 200
+    assert response.json() == {"title": "One"}
+    assert response.headers["ETag"] == '"2"'
+    crud.get_task.assert_called_once_with(1, ("title",))
+
+def test_create_task_exception(async_client):
+    client, crud = async_client
+    crud.create_task.side_effect = Exception("Simulated error")
+
+    response = client.post("/api/tasks/", json={"title": "One", "description": "d", "status": "todo"})
+
+    assert response.status_code == 500
+    assert response.json() == {'detail': 'An error occurred while creating the task.'}
+
+def test_patch_and_delete_task(async_client):
+    client, crud = async_client
+    crud.patch_task.return_value = {**TASK, "status": "done", "version": 2}
+    crud.delete_task.return_value = False
+
+    response = client.patch("/api/tasks/1", json={"status": "done"})
+    assert response.json() == {**TASK, "status": "done"}  # The version only goes out as the ETag
+    assert response.headers["ETag"] == '"2"'
+    assert client.delete("/api/tasks/1").status_code == 404
+
+def test_bearer_token_scopes_the_crud_to_its_user():
+    app = FastAPI()
+    mock_task_crud = create_autospec(AsyncTaskCRUD)
+    mock_task_crud.return_value.get_task.return_value = None
+    mock_user_crud = create_autospec(AsyncUserCRUD)
+    mock_user_crud.return_value.get_by_username.return_value = {"id": 42, "username": "ann"}
+    routes = AsyncTaskRoutes(async_db=MagicMock(), task_crud=mock_task_crud, user_crud=mock_user_crud)
+    app.include_router(routes.router)
+    token = routes.auth_service.create_access_token({"sub": "ann"})
+
+    response = TestClient(app).get("/api/tasks/1", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 404  # Another user's task reads as missing
+    assert mock_task_crud.call_args.args[1] == 42
+    mock_user_crud.return_value.get_by_username.assert_called_once_with("ann")
+    assert TestClient(app).get("/api/tasks/1", headers={"Authorization": "Bearer bad"}).status_code == 401
+
+def test_request_without_token_rejected(async_client):
+    client, crud = async_client
+    del client.headers["Authorization"]
+
+    response = client.get("/api/tasks/")
+
+    assert response.status_code == 401
+    crud.get_tasks_page.assert_not_called()
+
+def test_owner_lookup_goes_through_token_cache():
+    app = FastAPI()
+    mock_task_crud = create_autospec(AsyncTaskCRUD)
+    mock_task_crud.return_value.get_version.return_value = 1
+    mock_task_crud.return_value.get_tasks_page.return_value = ([], None)
+    mock_user_crud = create_autospec(AsyncUserCRUD)
+    mock_user_crud.return_value.get_by_username.return_value = {"id": 7, "username": "ann"}
+    routes = AsyncTaskRoutes(async_db=MagicMock(), task_crud=mock_task_crud, user_crud=mock_user_crud)
+    app.include_router(routes.router)
+    token = routes.auth_service.create_access_token({"sub": "ann"})
+    client = TestClient(app, headers={"Authorization": f"Bearer {token}"})
+
+    client.get("/api/tasks/")
+    client.get("/api/tasks/")
+
+    mock_user_crud.return_value.get_by_username.assert_awaited_once_with("ann")
+    assert routes.auth_service.cached_user(token).id == 7  # Shared with the sync routes
+    assert mock_task_crud.call_args.args[1] == 7
+
+def test_token_of_unknown_user_rejected():
+    app = FastAPI()
+    mock_task_crud = create_autospec(AsyncTaskCRUD)
+    mock_user_crud = create_autospec(AsyncUserCRUD)
+    mock_user_crud.return_value.get_by_username.return_value = None  # Deleted since the token was issued
+    routes = AsyncTaskRoutes(async_db=MagicMock(), task_crud=mock_task_crud, user_crud=mock_user_crud)
+    app.include_router(routes.router)
+    token = routes.auth_service.create_access_token({"sub": "gone"})
+
+    response = TestClient(app).get("/api/tasks/", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 401
+    assert routes.auth_service.cached_user(token) is None
+    mock_task_crud.assert_not_called()
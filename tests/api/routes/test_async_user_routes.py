@@ -0,0 +1,50 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock, create_autospec
+
+from app.api.endpoints.async_user_routes import AsyncUserRoutes
+from app.crud.async_user_crud import AsyncUserCRUD
+
+USER = {"id": 1, "username": "username", "email": "a@b.com", "role": "user"}
+
+
+@pytest.fixture
+def async_client():
+    app = FastAPI()
+    mock_user_crud = create_autospec(AsyncUserCRUD)
+    crud = mock_user_crud.return_value
+    crud.get_version.return_value = 1
+    routes = AsyncUserRoutes(async_db=MagicMock(), user_crud=mock_user_crud)
+    app.include_router(routes.router)
+    return TestClient(app), crud
+
+def test_read_users_fields(async_client):
+    client, crud = async_client
+    crud.get_user_rows.return_value = [{"username": "username"}]
+
+    response = client.get("/api/users/", params={"fields": "username"})
+
+    assert response.status_code == 200
+    assert response.json() == [{"username": "username"}]
+    crud.get_user_rows.assert_awaited_once_with(fields=("username",))
+
+def test_register(async_client):
+    client, crud = async_client
+    crud.get_by_username.return_value = None
+    crud.get_by_email.return_value = None
+    crud.create_user.return_value = USER
+
+    response = client.post("/register/", json={"username": "username", "email": "a@b.com", "password": "Password123!"})
+
+    assert response.status_code == 200
+    assert response.json() == {"username": "username", "email": "a@b.com", "role": "user"}
+
+def test_register_duplicate_username(async_client):
+    client, crud = async_client
+    crud.get_by_username.return_value = USER
+
+    response = client.post("/register/", json={"username": "username", "email": "a@b.com", "password": "Password123!"})
+
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'Username already registered.'}
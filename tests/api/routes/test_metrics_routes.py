@@ -0,0 +1,40 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock
+
+from app.api.endpoints.metrics_routes import MetricsRoutes
+from app.utils.metrics import register_metrics, collect_metrics
+
+
+def create_client(collect):
+    app = FastAPI()
+    app.include_router(MetricsRoutes(collect=collect).router)
+    return TestClient(app)
+
+def test_read_metrics():
+    """Test reading the registered metrics."""
+    client = create_client(MagicMock(return_value={"task_cache": {"hits": 3}}))
+
+    response = client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.json() == {"task_cache": {"hits": 3}}
+
+def test_read_metrics_exception():
+    client = create_client(MagicMock(side_effect=Exception("Simulated error")))
+
+    response = client.get("/api/metrics")
+
+    assert response.status_code == 500
+    assert response.json() == {'detail': 'An error occurred while collecting metrics.'}
+
+def test_cache_metrics_registered():
+    import app.crud.task_crud  # noqa: F401 - registers task_cache
+    import app.crud.user_crud  # noqa: F401 - registers user_cache
+
+    register_metrics("test", lambda: {"value": 1})
+    metrics = collect_metrics()
+
+    assert metrics["test"] == {"value": 1}
+    assert "hit_rate" in metrics["task_cache"]
+    assert "hit_rate" in metrics["user_cache"]
@@ -1,13 +1,24 @@
 import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
-from unittest.mock import MagicMock, create_autospec
+from unittest.mock import AsyncMock, MagicMock, create_autospec
 
 from app.api.endpoints.task_routes import TaskRoutes  # Adjust this import based on your app's structure
-from app.db.database import Database
 from app.dependencies import Dependency
-from app.crud.task_crud import TaskCRUD
+from app.crud.task_crud import TaskCRUD, TaskVersionConflict
 from app.api.schemas.task_schemas import TaskCreate, Task
+from app.db.task_import import TaskImportError
+from app.models.task_models import Task as TaskModel
+from app.db.export import ExportsBusy
+from app.utils.auth_service import AuthService
+
+# Task routes need a bearer token; with signed_in below, "Bearer <n>" is user n's
+AUTH = {"Authorization": "Bearer 1"}
+
+
+@pytest.fixture(autouse=True)
+def signed_in(monkeypatch):
+    monkeypatch.setattr(AuthService, "verify_token", lambda self, token: MagicMock(id=int(token)))
 
 
 @pytest.fixture
@@ -18,10 +29,10 @@ def client_success():
     # Create a mock for the TaskCRUD
     mock_task_crud = create_autospec(TaskCRUD)
     mock_task_crud.return_value.create_task.return_value = sample_task
-    mock_task_crud.return_value.get_tasks.return_value = [sample_task]
+    mock_task_crud.return_value.get_tasks_page.return_value = ([sample_task.model_dump()], None)
 
-    # Create a mock for the Dependency
-    mock_dependency = MagicMock(spec=Dependency)
+    # Create a Dependency around a mocked Database; AsyncMock makes acquire/release awaitable
+    mock_dependency = Dependency(AsyncMock())
 
     # Initialize the TaskRoutes with mocked dependencies
     task_routes = TaskRoutes(dependency=mock_dependency, task_crud=mock_task_crud)
@@ -29,7 +40,7 @@ def client_success():
     # Include the router in the FastAPI app
     app.include_router(task_routes.router)
 
-    return TestClient(app)
+    return TestClient(app, headers=AUTH)
 
 @pytest.fixture
 def client_exception():
@@ -39,10 +50,10 @@ def client_exception():
     # Create a mock for the TaskCRUD
     mock_task_crud = create_autospec(TaskCRUD)
     mock_task_crud.return_value.create_task.side_effect = Exception("Simulated error")
-    mock_task_crud.return_value.get_tasks.side_effect = Exception("Simulated error")
+    mock_task_crud.return_value.get_tasks_page.side_effect = Exception("Simulated error")
 
-    # Create a mock for the Dependency
-    mock_dependency = MagicMock(spec=Dependency)
+    # Create a Dependency around a mocked Database; AsyncMock makes acquire/release awaitable
+    mock_dependency = Dependency(AsyncMock())
 
     # Initialize the TaskRoutes with mocked dependencies
     task_routes = TaskRoutes(dependency=mock_dependency, task_crud=mock_task_crud)
@@ -50,7 +61,7 @@ def client_exception():
     # Include the router in the FastAPI app
     app.include_router(task_routes.router)
 
-    return TestClient(app)
+    return TestClient(app, headers=AUTH)
 
 
 def test_create_task(client_success):
@@ -98,3 +109,569 @@ def test_read_tasks_exception(client_exception):
     # Assertions
     assert response.status_code == 500
     assert response.json() == {'detail': 'An error occurred while fetching tasks.'}
+
+def test_read_tasks_next_cursor_header():
+    """Test that the next page cursor is returned in a response header."""
+    app = FastAPI()
+    sample_task = Task(id=1, title="Test Task", description="A task for testing.", status="todo")
+
+    mock_task_crud = create_autospec(TaskCRUD)
+    mock_task_crud.return_value.get_tasks_page.return_value = ([sample_task.model_dump()], "next-page")
+
+    task_routes = TaskRoutes(dependency=Dependency(AsyncMock()), task_crud=mock_task_crud)
+    app.include_router(task_routes.router)
+    client = TestClient(app, headers=AUTH)
+
+    response = client.get("/api/tasks/", params={"limit": 1, "status": "todo", "order": "desc"})
+
+    assert response.status_code == 200
+    assert response.headers["X-Next-Cursor"] == "next-page"
+    _, kwargs = mock_task_crud.return_value.get_tasks_page.call_args
+    assert kwargs["limit"] == 1
+    assert kwargs["status"] == "todo"
+    assert kwargs["descending"] is True
+
+def test_read_tasks_invalid_cursor():
+    """Test that a malformed cursor is rejected with a 400."""
+    app = FastAPI()
+    mock_task_crud = create_autospec(TaskCRUD)
+    mock_task_crud.return_value.get_tasks_page.side_effect = ValueError("Invalid cursor")
+
+    task_routes = TaskRoutes(dependency=Dependency(AsyncMock()), task_crud=mock_task_crud)
+    app.include_router(task_routes.router)
+    client = TestClient(app, headers=AUTH)
+
+    response = client.get("/api/tasks/", params={"cursor": "garbage"})
+
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'Invalid cursor.'}
+
+def test_read_tasks_limit_out_of_range(client_success):
+    """Test that page sizes outside the allowed range are rejected."""
+    response = client_success.get("/api/tasks/", params={"limit": 0})
+
+    assert response.status_code == 422
+
+def test_read_tasks_sparse_fields():
+    """Test that requested fields are validated and passed down to the CRUD layer."""
+    app = FastAPI()
+    mock_task_crud = create_autospec(TaskCRUD)
+    mock_task_crud.return_value.get_tasks_page.return_value = ([{"id": 1, "title": "Test Task"}], None)
+
+    task_routes = TaskRoutes(dependency=Dependency(AsyncMock()), task_crud=mock_task_crud)
+    app.include_router(task_routes.router)
+    client = TestClient(app, headers=AUTH)
+
+    response = client.get("/api/tasks/", params={"fields": "id, title"})
+
+    assert response.status_code == 200
+    assert response.json() == [{"id": 1, "title": "Test Task"}]
+    _, kwargs = mock_task_crud.return_value.get_tasks_page.call_args
+    assert kwargs["fields"] == ("id", "title")
+
+def test_read_tasks_unknown_field(client_success):
+    """Test that fields outside the allow-list are rejected."""
+    response = client_success.get("/api/tasks/", params={"fields": "id,created_at"})
+
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'Unknown fields: created_at. Allowed fields: id, title, description, status.'}
+
+@pytest.fixture
+def bulk_client():
+    app = FastAPI()
+    mock_task_crud = create_autospec(TaskCRUD)
+    task_routes = TaskRoutes(dependency=Dependency(AsyncMock()), task_crud=mock_task_crud)
+    app.include_router(task_routes.router)
+    return TestClient(app, headers=AUTH), mock_task_crud.return_value
+
+def test_bulk_create_tasks_reports_invalid_items(bulk_client):
+    """Test that invalid items are reported by index while valid ones are created."""
+    client, crud = bulk_client
+    crud.create_tasks.return_value = [{"id": 1, "title": "One", "description": "d", "status": "todo"}]
+
+    response = client.post("/api/tasks/bulk", json=[{"title": "One", "description": "d"}, {"title": "A" * 101}])
+
+    assert response.status_code == 200
+    created = crud.create_tasks.call_args.args[0]
+    assert [task.title for task in created] == ["One"]
+    body = response.json()
+    assert body["tasks"] == [{"id": 1, "title": "One", "description": "d", "status": "todo"}]
+    assert [error["index"] for error in body["errors"]] == [1]
+    assert "title: String should have at most 100 characters" in body["errors"][0]["detail"]
+    assert "description: Field required" in body["errors"][0]["detail"]
+
+def test_bulk_create_tasks_exception(bulk_client):
+    """Test handling of exceptions during bulk task creation."""
+    client, crud = bulk_client
+    crud.create_tasks.side_effect = Exception("Simulated error")
+
+    response = client.post("/api/tasks/bulk", json=[{"title": "One", "description": "d"}])
+
+    assert response.status_code == 500
+    assert response.json() == {'detail': 'An error occurred while creating the tasks.'}
+
+def test_bulk_create_tasks_rejects_empty_batch(bulk_client):
+    client, _ = bulk_client
+
+    response = client.post("/api/tasks/bulk", json=[])
+
+    assert response.status_code == 422
+
+def test_bulk_update_tasks_reports_missing_and_duplicates(bulk_client):
+    """Test that unknown and duplicate ids are reported per item."""
+    client, crud = bulk_client
+    crud.update_tasks.return_value = [{"id": 1, "title": "One", "description": "d", "status": "done"}]
+    items = [{"id": 1, "title": "One", "description": "d", "status": "done"},
+             {"id": 2, "title": "Two", "description": "d"},
+             {"id": 1, "title": "Again", "description": "d"},
+             {"id": "x", "title": "Bad", "description": "d"}]
+
+    response = client.put("/api/tasks/bulk", json=items)
+
+    assert response.status_code == 200
+    assert [task.id for task in crud.update_tasks.call_args.args[0]] == [1, 2]
+    assert response.json()["errors"] == [
+        {"index": 1, "id": 2, "detail": "Task not found."},
+        {"index": 2, "id": 1, "detail": "Duplicate id in request."},
+        {"index": 3, "id": None, "detail": "id: Input should be a valid integer, unable to parse string as an integer"},
+    ]
+
+def test_bulk_delete_tasks(bulk_client):
+    """Test that ids that were not deleted are reported as not found."""
+    client, crud = bulk_client
+    crud.delete_tasks.return_value = [1, 3]
+
+    response = client.request("DELETE", "/api/tasks/bulk", json={"ids": [1, 2, 3, 1]})
+
+    assert response.status_code == 200
+    crud.delete_tasks.assert_called_once_with([1, 2, 3])
+    assert response.json() == {"deleted": [1, 3], "errors": [{"index": 1, "id": 2, "detail": "Task not found."}]}
+
+def test_bulk_delete_tasks_exception(bulk_client):
+    """Test handling of exceptions during bulk task deletion."""
+    client, crud = bulk_client
+    crud.delete_tasks.side_effect = Exception("Simulated error")
+
+    response = client.request("DELETE", "/api/tasks/bulk", json={"ids": [1]})
+
+    assert response.status_code == 500
+    assert response.json() == {'detail': 'An error occurred while deleting the tasks.'}
+
+def test_search_tasks(bulk_client):
+    """Test searching tasks returns rows and the next cursor."""
+    client, crud = bulk_client
+    crud.search_tasks.return_value = ([{"id": 1, "title": "Report", "description": None, "status": "todo"}], "more")
+
+    response = client.get("/api/tasks/search", params={"q": "rep", "limit": 1})
+
+    assert response.status_code == 200
+    assert response.json() == [{"id": 1, "title": "Report", "description": None, "status": "todo"}]
+    assert response.headers["X-Next-Cursor"] == "more"
+    crud.search_tasks.assert_called_once_with("rep", limit=1, cursor=None)
+
+def test_search_tasks_requires_query(bulk_client):
+    client, _ = bulk_client
+
+    assert client.get("/api/tasks/search").status_code == 422
+
+def test_search_tasks_invalid_cursor(bulk_client):
+    client, crud = bulk_client
+    crud.search_tasks.side_effect = ValueError("Invalid cursor")
+
+    response = client.get("/api/tasks/search", params={"q": "rep", "cursor": "bad"})
+
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'Invalid cursor.'}
+
+def test_read_task_board(bulk_client):
+    client, crud = bulk_client
+    crud.get_version.return_value = 4
+    crud.get_board.return_value = [{"status": "todo", "count": 3, "next_cursor": "more",
+                                    "tasks": [{"id": 1, "title": "One", "description": "d", "status": "todo"}]}]
+
+    response = client.get("/api/tasks/board", params={"limit": 1})
+
+    assert response.status_code == 200
+    assert response.json() == {"columns": crud.get_board.return_value}
+    crud.get_board.assert_called_once_with(1)
+
+    response = client.get("/api/tasks/board", params={"limit": 1}, headers={"If-None-Match": response.headers["ETag"]})
+
+    assert response.status_code == 304
+    crud.get_board.assert_called_once()
+
+def test_read_task_board_error(bulk_client):
+    client, crud = bulk_client
+    crud.get_board.side_effect = Exception("Simulated error")
+
+    response = client.get("/api/tasks/board")
+
+    assert response.status_code == 500
+    assert response.json() == {'detail': 'An error occurred while loading the task board.'}
+
+def test_import_tasks(bulk_client):
+    client, crud = bulk_client
+    crud.import_tasks.return_value = 2
+
+    response = client.post("/api/tasks/import", files={"file": ("tasks.jsonl", b'{"title": "One"}\n{"title": "Two"}\n')})
+
+    assert response.status_code == 200
+    assert response.json() == {"imported": 2}
+    stream, format = crud.import_tasks.call_args.args
+    assert format == "ndjson"
+
+def test_import_tasks_invalid_rows(bulk_client):
+    client, crud = bulk_client
+    crud.import_tasks.side_effect = TaskImportError([{"index": 2, "detail": "title: Field required"}])
+
+    response = client.post("/api/tasks/import", params={"format": "csv"}, files={"file": ("upload", b"status\ntodo\n")})
+
+    assert response.status_code == 422
+    assert response.json() == {"detail": [{"index": 2, "detail": "title: Field required"}]}
+
+def test_import_tasks_unknown_format(bulk_client):
+    client, crud = bulk_client
+
+    response = client.post("/api/tasks/import", files={"file": ("tasks.txt", b"")})
+
+    assert response.status_code == 400
+    crud.import_tasks.assert_not_called()
+
+def test_read_task(bulk_client):
+    client, crud = bulk_client
+    crud.get_task.return_value = TaskModel(id=1, title="One", description="d", status="todo", version=3)
+
+    response = client.get("/api/tasks/1")
+
+    assert response.status_code == 200
+    assert response.json() == {"id": 1, "title": "One", "description": "d", "status": "todo"}
+    assert response.headers["ETag"] == '"3"'  # The row version, usable in If-Match
+
+def test_read_task_with_fields(bulk_client):
+    client, crud = bulk_client
+    crud.get_task_fields.return_value = {"id": 1, "status": "todo", "version": 3}
+
+    response = client.get("/api/tasks/1", params={"fields": "id,status"})
+
+    assert response.status_code == 200
+    assert response.json() == {"id": 1, "status": "todo"}
+    assert response.headers["ETag"] == '"3"'
+    crud.get_task_fields.assert_called_once_with(1, ("id", "status"))
+    crud.get_task.assert_not_called()  # The whole row and task_cache are skipped
+
+def test_read_task_with_unknown_field(bulk_client):
+    client, crud = bulk_client
+
+    response = client.get("/api/tasks/1", params={"fields": "id,version"})
+
+    assert response.status_code == 400
+    assert "Unknown fields: version" in response.json()["detail"]
+    crud.get_task.assert_not_called()
+
+def test_read_task_not_found(bulk_client):
+    client, crud = bulk_client
+    crud.get_task.return_value = None
+
+    response = client.get("/api/tasks/1")
+
+    assert response.status_code == 404
+    assert response.json() == {'detail': 'Task not found.'}
+
+def test_update_task(bulk_client):
+    """Test replacing a task."""
+    client, crud = bulk_client
+    crud.update_task.return_value = TaskModel(id=1, title="New", description="d", status="done", version=2)
+
+    response = client.put("/api/tasks/1", json={"title": "New", "description": "d", "status": "done"})
+
+    assert response.status_code == 200
+    assert response.json() == {"id": 1, "title": "New", "description": "d", "status": "done"}
+    assert response.headers["ETag"] == '"2"'
+    assert crud.update_task.call_args.args[0] == 1
+    assert crud.update_task.call_args.args[2] is None  # No If-Match: last write wins
+
+def test_update_task_if_match(bulk_client):
+    client, crud = bulk_client
+    crud.update_task.return_value = TaskModel(id=1, title="New", description="d", status="done", version=4)
+
+    response = client.put("/api/tasks/1", json={"title": "New", "description": "d"}, headers={"If-Match": '"3"'})
+
+    assert response.status_code == 200
+    assert crud.update_task.call_args.args[2] == [3]
+
+def test_update_task_version_conflict(bulk_client):
+    client, crud = bulk_client
+    crud.update_task.side_effect = TaskVersionConflict(5)
+
+    response = client.put("/api/tasks/1", json={"title": "New", "description": "d"}, headers={"If-Match": '"3"'})
+
+    assert response.status_code == 409
+    assert response.headers["ETag"] == '"5"'  # The version to fetch and retry against
+
+def test_update_task_not_found(bulk_client):
+    client, crud = bulk_client
+    crud.update_task.return_value = None
+
+    response = client.put("/api/tasks/1", json={"title": "New", "description": "d"})
+
+    assert response.status_code == 404
+    assert response.json() == {'detail': 'Task not found.'}
+
+def test_patch_task(bulk_client):
+    """Test that PATCH passes only the fields that were sent."""
+    client, crud = bulk_client
+    crud.patch_task.return_value = TaskModel(id=1, title="Old", description="d", status="done", version=2)
+
+    response = client.patch("/api/tasks/1", json={"status": "done"})
+
+    assert response.status_code == 200
+    assert crud.patch_task.call_args.args[1].model_dump(exclude_unset=True) == {"status": "done"}
+
+def test_patch_task_version_conflict(bulk_client):
+    client, crud = bulk_client
+    crud.patch_task.side_effect = TaskVersionConflict(2)
+
+    response = client.patch("/api/tasks/1", json={"status": "done"}, headers={"If-Match": 'W/"1"'})
+
+    assert response.status_code == 409
+    assert crud.patch_task.call_args.args[2] == []  # Weak tags never match
+
+def test_move_task(bulk_client):
+    client, crud = bulk_client
+    crud.move_task.return_value = TaskModel(id=1, title="One", description="d", status="doing", version=4)
+
+    response = client.post("/api/tasks/1/move", json={"status": "doing", "after_id": 2}, headers={"If-Match": '"3"'})
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "doing"
+    assert response.headers["ETag"] == '"4"'
+    task_id, move, versions = crud.move_task.call_args.args
+    assert (task_id, move.status, move.after_id, move.before_id, versions) == (1, "doing", 2, None, [3])
+
+def test_move_task_errors(bulk_client):
+    client, crud = bulk_client
+
+    assert client.post("/api/tasks/1/move", json={"after_id": 2, "before_id": 3}).status_code == 422
+
+    crud.move_task.side_effect = ValueError("Task 2 is not in the 'todo' column.")
+    response = client.post("/api/tasks/1/move", json={"after_id": 2})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Task 2 is not in the 'todo' column."}
+
+    crud.move_task.side_effect = TaskVersionConflict(5)
+    response = client.post("/api/tasks/1/move", json={}, headers={"If-Match": '"3"'})
+    assert response.status_code == 409
+    assert response.headers["ETag"] == '"5"'
+
+    crud.move_task.side_effect = None
+    crud.move_task.return_value = None
+    assert client.post("/api/tasks/1/move", json={}).status_code == 404
+
+def test_read_task_column(bulk_client):
+    client, crud = bulk_client
+    crud.get_version.return_value = 7
+    crud.get_column_page.return_value = ([{"id": 2, "title": "Two", "description": "d", "status": "todo"}], "next")
+
+    response = client.get("/api/tasks/column", params={"status": "todo", "limit": 1, "cursor": "abc"})
+
+    assert response.status_code == 200
+    assert response.json() == [{"id": 2, "title": "Two", "description": "d", "status": "todo"}]
+    assert response.headers["X-Next-Cursor"] == "next"
+    crud.get_column_page.assert_called_once_with("todo", limit=1, cursor="abc")
+
+    crud.get_column_page.side_effect = ValueError("Invalid cursor")
+    response = client.get("/api/tasks/column", params={"status": "todo", "cursor": "bad"})
+    assert response.status_code == 400
+    assert client.get("/api/tasks/column").status_code == 422  # status is required
+
+def test_patch_task_rejects_null_title(bulk_client):
+    client, _ = bulk_client
+
+    response = client.patch("/api/tasks/1", json={"title": None})
+
+    assert response.status_code == 422
+
+def test_patch_task_exception(bulk_client):
+    client, crud = bulk_client
+    crud.patch_task.side_effect = Exception("Simulated error")
+
+    response = client.patch("/api/tasks/1", json={"status": "done"})
+
+    assert response.status_code == 500
+    assert response.json() == {'detail': 'An error occurred while updating the task.'}
+
+def test_delete_task(bulk_client):
+    client, crud = bulk_client
+    crud.delete_task.return_value = True
+
+    response = client.delete("/api/tasks/1")
+
+    assert response.status_code == 204
+    crud.delete_task.assert_called_once_with(1)
+
+def test_delete_task_not_found(bulk_client):
+    client, crud = bulk_client
+    crud.delete_task.return_value = False
+
+    response = client.delete("/api/tasks/1")
+
+    assert response.status_code == 404
+    assert response.json() == {'detail': 'Task not found.'}
+
+def test_read_tasks_not_modified(bulk_client):
+    """Test that a matching If-None-Match is answered with 304 without reading any rows."""
+    client, crud = bulk_client
+    crud.get_version.return_value = 7
+    crud.get_tasks_page.return_value = ([], None)
+
+    etag = client.get("/api/tasks/", params={"status": "todo"}).headers["ETag"]
+    crud.get_tasks_page.reset_mock()
+    response = client.get("/api/tasks/", params={"status": "todo"}, headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    crud.get_tasks_page.assert_not_called()
+
+def test_read_tasks_etag_changes_with_version_and_query(bulk_client):
+    client, crud = bulk_client
+    crud.get_tasks_page.return_value = ([], None)
+    crud.get_version.return_value = 7
+    first = client.get("/api/tasks/").headers["ETag"]
+    other_query = client.get("/api/tasks/", params={"status": "todo"}).headers["ETag"]
+    crud.get_version.return_value = 8
+    response = client.get("/api/tasks/", headers={"If-None-Match": first})
+
+    assert response.status_code == 200
+    assert len({first, other_query, response.headers["ETag"]}) == 3
+    assert response.headers["Cache-Control"] == "no-cache"
+
+def test_read_task_not_modified(bulk_client):
+    client, crud = bulk_client
+    crud.get_task.return_value = TaskModel(id=1, title="One", description="d", status="todo", version=3)
+
+    etag = client.get("/api/tasks/1").headers["ETag"]
+    response = client.get("/api/tasks/1", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    crud.get_task.return_value = TaskModel(id=1, title="One", description="d", status="done", version=4)
+    assert client.get("/api/tasks/1", headers={"If-None-Match": etag}).status_code == 200
+
+def test_export_tasks_ndjson(bulk_client):
+    client, crud = bulk_client
+    crud.export_tasks.return_value = iter([[{"id": 1, "title": "One"}], [{"id": 2, "title": "Two"}]])
+
+    response = client.get("/api/tasks/export", params={"status": "todo"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.text == '{"id":1,"title":"One"}\n{"id":2,"title":"Two"}\n'
+    assert crud.export_tasks.call_args.kwargs["status"] == "todo"
+
+def test_export_tasks_csv(bulk_client):
+    client, crud = bulk_client
+    crud.export_tasks.return_value = iter([[{"id": 1, "title": "One", "description": None, "status": "todo",
+                                             "created_at": "2024-01-01 00:00:00"}]])
+
+    response = client.get("/api/tasks/export", params={"format": "csv"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="tasks.csv"'
+    assert response.text == "id,title,description,status,created_at\n1,One,,todo,2024-01-01 00:00:00\n"
+
+def test_export_tasks_exception(bulk_client):
+    client, crud = bulk_client
+    crud.export_tasks.side_effect = Exception("Simulated error")
+
+    response = client.get("/api/tasks/export")
+
+    assert response.status_code == 500
+    assert response.json() == {'detail': 'An error occurred while exporting tasks.'}
+
+def test_export_tasks_rejected_while_export_connections_are_busy(bulk_client):
+    client, crud = bulk_client
+
+    def busy():
+        raise ExportsBusy("4 export(s) already running")
+        yield
+
+    crud.export_tasks.return_value = busy()
+
+    response = client.get("/api/tasks/export")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def test_task_change_feed_streams_sse():
+    """Test that the change feed subscribes with the resume token and sends events as SSE."""
+    from app.db.change_feed import ChangeHub
+    from app.api.endpoints import task_routes as task_routes_module
+
+    hub = ChangeHub()
+    hub.publish({"seq": 1, "op": "insert", "id": 1, "owner_id": 1})
+    hub.publish({"seq": 2, "op": "delete", "id": 1, "owner_id": 1})
+    app = FastAPI()
+    routes = TaskRoutes(dependency=Dependency(MagicMock()), task_crud=create_autospec(TaskCRUD), change_hub=hub)
+    app.include_router(routes.router)
+    async def is_disconnected(self):
+        return True  # Client leaves once the replayed events are sent
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(task_routes_module, "SSE_KEEPALIVE_INTERVAL", 0.01)
+        mp.setattr("starlette.requests.Request.is_disconnected", is_disconnected)
+        response = TestClient(app, headers=AUTH).get("/api/tasks/changes", headers={"Last-Event-ID": "1"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == 'id: 2\nevent: delete\ndata: {"seq":2,"op":"delete","id":1,"owner_id":1}\n\n'
+    assert hub.stats()["subscribers"] == 0
+
+def owner_client(**routes_kwargs):
+    app = FastAPI()
+    mock_task_crud = create_autospec(TaskCRUD)
+    routes = TaskRoutes(dependency=Dependency(AsyncMock()), task_crud=mock_task_crud, **routes_kwargs)
+    app.include_router(routes.router)
+    return TestClient(app), mock_task_crud
+
+def test_bearer_token_scopes_the_crud_to_its_user():
+    client, mock_task_crud = owner_client()
+    mock_task_crud.return_value.get_version.return_value = 7
+    mock_task_crud.return_value.get_tasks_page.return_value = ([], None)
+
+    mine = client.get("/api/tasks/", headers={"Authorization": "Bearer 42"})
+    theirs = client.get("/api/tasks/", headers={"Authorization": "Bearer 7"})
+
+    assert [call.args[1] for call in mock_task_crud.call_args_list] == [42, 7]
+    assert mine.headers["ETag"] != theirs.headers["ETag"]  # Same version and query, other rows
+
+@pytest.mark.parametrize("method, path", [("get", "/api/tasks/"), ("get", "/api/tasks/1"), ("delete", "/api/tasks/1"),
+                                          ("get", "/api/tasks/export"), ("get", "/api/tasks/changes")])
+def test_task_requests_without_token_rejected(method, path):
+    client, mock_task_crud = owner_client()
+
+    response = client.request(method, path)
+
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+    mock_task_crud.assert_not_called()
+
+def test_task_change_feed_sends_only_the_users_changes():
+    from app.db.change_feed import ChangeHub
+
+    hub = ChangeHub()
+    for seq, op, owner_id in [(1, "insert", 7), (2, "insert", 42), (3, "update", 7), (4, "delete", 42)]:
+        hub.publish({"seq": seq, "op": op, "id": seq, "owner_id": owner_id})
+    app = FastAPI()
+    routes = TaskRoutes(dependency=Dependency(MagicMock()), task_crud=create_autospec(TaskCRUD), change_hub=hub)
+    routes.auth_service.verify_token = MagicMock(return_value=MagicMock(id=42))
+    app.include_router(routes.router)
+    async def is_disconnected(self):
+        return True
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("app.api.endpoints.task_routes.SSE_KEEPALIVE_INTERVAL", 0.01)
+        mp.setattr("starlette.requests.Request.is_disconnected", is_disconnected)
+        response = TestClient(app, headers=AUTH).get("/api/tasks/changes", headers={"Last-Event-ID": "1",
+                                                                      "Authorization": "Bearer token"})
+
+    assert [line for line in response.text.splitlines() if line.startswith("id:")] == ["id: 2", "id: 4"]
@@ -1,7 +1,8 @@
 import pytest
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.testclient import TestClient
-from unittest.mock import MagicMock, create_autospec
+from peewee import IntegrityError
+from unittest.mock import AsyncMock, MagicMock, create_autospec
 
 from app.api.endpoints.user_routes import UserRoutes  # Adjust this import based on your app's structure
 from app.dependencies import Dependency
@@ -9,8 +10,15 @@ from app.crud.user_crud import UserCRUD
 from app.api.schemas.user_schemas import UserCreate, User
 from app.models.user_models import User  as UserModel
 from app.utils.auth_service import AuthService
+from app.utils.passwords import PasswordPoolBusy
 
 
+def mock_database():
+    """A mocked Database: acquire/release are awaitable, connection_context a plain context manager."""
+    db = AsyncMock()
+    db.database = MagicMock()
+    return db
+
 @pytest.fixture
 def client_success():
     app = FastAPI()
@@ -18,7 +26,7 @@ def client_success():
     # Create a mock for the UserCRUD
     mock_user_crud = create_autospec(UserCRUD)
     mock_user_crud.return_value.create_user.return_value = sample_user
-    mock_user_crud.return_value.get_users.return_value = [sample_user]
+    mock_user_crud.return_value.get_user_rows.return_value = [sample_user.model_dump()]
     mock_user_crud.return_value.get_by_username.return_value = None
     mock_user_crud.return_value.get_by_email.return_value = None
 
@@ -26,11 +34,10 @@ def client_success():
     mock_auth_service = create_autospec(AuthService)
     mock_auth_service.authenticate_user.return_value = UserModel(id=1, username='username', email='a@b.com', role='user')
     mock_auth_service.create_access_token.return_value = 'testtoken'
-    mock_auth_service.verify_token.return_value = User(id=1, username='username', email='a@b.com', role='user')
-    # Create a mock for the Dependency
-    mock_dependency = MagicMock(spec=Dependency)
-    mock_dependency.get_auth_service.return_value = mock_auth_service
-    mock_dependency.get_db.return_value = MagicMock()  # Mock database if needed
+    mock_auth_service.cached_user.return_value = User(id=1, username='username', email='a@b.com', role='user')
+    # Create a Dependency around a mocked Database
+    mock_dependency = Dependency(mock_database())
+    mock_dependency.get_auth_service = MagicMock(return_value=mock_auth_service)
 
     # Initialize the UserRoutes with mocked dependencies
     user_routes = UserRoutes(dependency=mock_dependency, user_crud=mock_user_crud)
@@ -49,18 +56,18 @@ def client_exception_500():
     # Create a mock for the UserCRUD
     mock_user_crud = create_autospec(UserCRUD)
     mock_user_crud.return_value.create_user.side_effect = Exception("Simulated error")
-    mock_user_crud.return_value.get_users.side_effect = Exception("Simulated error")
+    mock_user_crud.return_value.get_user_rows.side_effect = Exception("Simulated error")
     mock_user_crud.return_value.get_by_username.return_value = None
     mock_user_crud.return_value.get_by_email.return_value = None
 
     # Create a mock for the AuthService
     mock_auth_service = create_autospec(AuthService)
+    mock_auth_service.cached_user.return_value = None
     mock_auth_service.verify_token.side_effect = Exception("Simulated error")
 
-    # Create a mock for the Dependency
-    mock_dependency = MagicMock(spec=Dependency)
-    mock_dependency.get_auth_service.return_value = mock_auth_service
-    mock_dependency.get_db.return_value = MagicMock()  # Mock database if needed
+    # Create a Dependency around a mocked Database
+    mock_dependency = Dependency(mock_database())
+    mock_dependency.get_auth_service = MagicMock(return_value=mock_auth_service)
 
     # Initialize the UserRoutes with mocked dependencies
     user_routes = UserRoutes(dependency=mock_dependency, user_crud=mock_user_crud)
@@ -86,6 +93,13 @@ def test_read_users(client_success):
     assert response.status_code == 200
     assert response.json() == expected_users
 
+def test_read_users_sparse_fields(client_success):
+    """Test that unknown fields are rejected when reading users."""
+    response = client_success.get("/api/users/", params={"fields": "id,password"})
+
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'Unknown fields: password. Allowed fields: id, username, email, role.'}
+
 def test_register_user(client_success):
     """Test registering a user successfully."""
     user_data = {'username': 'newuser', 'email': 'a@b.com', 'password': 'Password123!'}
@@ -128,8 +142,8 @@ def test_register_user_exception_username_exists(client):
     mock_user_crud = create_autospec(UserCRUD)
     mock_user_crud.return_value.get_by_username.return_value = sample_user
 
-    # Create a mock for the Dependency
-    mock_dependency = MagicMock(spec=Dependency)
+    # Create a Dependency around a mocked Database
+    mock_dependency = Dependency(mock_database())
 
     # Initialize the UserRoutes with mocked dependencies
     user_routes = UserRoutes(dependency=mock_dependency, user_crud=mock_user_crud)
@@ -157,8 +171,8 @@ def test_register_user_exception_email_exists(client):
     mock_user_crud.return_value.get_by_username.return_value = None
     mock_user_crud.return_value.get_by_email.return_value = sample_user
 
-    # Create a mock for the Dependency
-    mock_dependency = MagicMock(spec=Dependency)
+    # Create a Dependency around a mocked Database
+    mock_dependency = Dependency(mock_database())
 
     # Initialize the UserRoutes with mocked dependencies
     user_routes = UserRoutes(dependency=mock_dependency, user_crud=mock_user_crud)
@@ -217,10 +231,9 @@ def test_login_user_exception_500():
     mock_auth_service.authenticate_user.return_value = UserModel(id=1, username='username', email='a@b.com')
     mock_auth_service.create_access_token.return_value.side_effect = Exception("Error")
 
-    # Create a mock for the Dependency
-    mock_dependency = MagicMock(spec=Dependency)
-    mock_dependency.get_auth_service.return_value = mock_auth_service
-    mock_dependency.get_db.return_value = MagicMock()  # Mock database if needed
+    # Create a Dependency around a mocked Database
+    mock_dependency = Dependency(mock_database())
+    mock_dependency.get_auth_service = MagicMock(return_value=mock_auth_service)
 
     # Initialize the UserRoutes with mocked dependencies
     user_routes = UserRoutes(dependency=mock_dependency, user_crud=mock_user_crud)
@@ -249,6 +262,41 @@ def test_get_user_me(client_success):
     assert response.status_code == 200
     assert response.json() == {'username': 'username', 'role': 'user', 'email': 'a@b.com'}
 
+def test_get_user_me_with_fields():
+    app = FastAPI()
+    mock_auth_service = create_autospec(AuthService)
+    mock_auth_service.token_subject.return_value = 'username'
+    mock_user_crud = create_autospec(UserCRUD)
+    mock_user_crud.return_value.get_user_fields.return_value = {'email': 'a@b.com'}
+    mock_dependency = Dependency(mock_database())
+    mock_dependency.get_auth_service = MagicMock(return_value=mock_auth_service)
+    app.include_router(UserRoutes(dependency=mock_dependency, user_crud=mock_user_crud).router)
+    client = TestClient(app)
+    headers = {'Authorization': 'Bearer testtoken'}
+
+    assert client.get("/users/me/", params={"fields": "email"}, headers=headers).json() == {'email': 'a@b.com'}
+    mock_user_crud.return_value.get_user_fields.assert_called_once_with('username', ('email',))
+    mock_auth_service.cached_user.assert_not_called()  # The token cache holds whole rows
+    assert client.get("/users/me/", params={"fields": "password"}, headers=headers).status_code == 400
+
+    mock_user_crud.return_value.get_user_fields.return_value = None  # Deleted since the token was issued
+    assert client.get("/users/me/", params={"fields": "email"}, headers=headers).status_code == 401
+
+def test_read_users_me_uncached_token_gets_own_connection():
+    app = FastAPI()
+    mock_auth_service = create_autospec(AuthService)
+    mock_auth_service.cached_user.return_value = None
+    mock_auth_service.verify_token.side_effect = HTTPException(status_code=401, detail="Could not validate credentials")
+    mock_dependency = Dependency(mock_database())
+    mock_dependency.get_auth_service = MagicMock(return_value=mock_auth_service)
+    app.include_router(UserRoutes(dependency=mock_dependency, user_crud=create_autospec(UserCRUD)).router)
+
+    response = TestClient(app).get("/users/me/", headers={'Authorization': 'Bearer badtoken'})
+
+    assert response.status_code == 401
+    mock_dependency.db.database.connection_context.assert_called_once()
+    mock_dependency.db.acquire.assert_not_called()  # No pooled connection is checked out for the request
+
 def test_read_users_me_exception(client_exception_500):
     """Test handling of exceptions during retrieving user info."""
     headers = {'Authorization': 'Bearer testtoken'}
@@ -258,4 +306,69 @@ def test_read_users_me_exception(client_exception_500):
 
     # Assertions
     assert response.status_code == 500
-    assert response.json() == {'detail': 'Failed to retrieve user info'}
\ No newline at end of file
+    assert response.json() == {'detail': 'Failed to retrieve user info'}
+def test_read_users_not_modified():
+    app = FastAPI()
+    mock_user_crud = create_autospec(UserCRUD)
+    mock_user_crud.return_value.get_version.return_value = 4
+    mock_user_crud.return_value.get_user_rows.return_value = []
+    user_routes = UserRoutes(dependency=Dependency(mock_database()), user_crud=mock_user_crud)
+    app.include_router(user_routes.router)
+    client = TestClient(app)
+
+    etag = client.get("/api/users/").headers["ETag"]
+    response = client.get("/api/users/", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    mock_user_crud.return_value.get_user_rows.assert_called_once()
+
+def test_login_rejected_while_password_pool_is_busy():
+    app = FastAPI()
+    mock_auth_service = create_autospec(AuthService)
+    mock_auth_service.authenticate_user.side_effect = PasswordPoolBusy("8 password operation(s) already pending")
+    mock_dependency = Dependency(mock_database())
+    mock_dependency.get_auth_service = MagicMock(return_value=mock_auth_service)
+    app.include_router(UserRoutes(dependency=mock_dependency, user_crud=create_autospec(UserCRUD)).router)
+
+    response = TestClient(app).post("/login/", data={'username': 'username', 'password': 'Password1'})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def test_register_hashes_without_a_connection():
+    app = FastAPI()
+    mock_user_crud = create_autospec(UserCRUD)
+    mock_user_crud.return_value.get_by_username.return_value = None
+    mock_user_crud.return_value.get_by_email.return_value = None
+    mock_user_crud.return_value.create_user.return_value = UserModel(id=1, username='newuser', email='a@b.com', role='user')
+    mock_dependency = Dependency(mock_database())
+    database = mock_dependency.db.database
+    connected = []
+    database.connection_context.return_value.__enter__.side_effect = lambda: connected.append(True)
+    database.connection_context.return_value.__exit__.side_effect = lambda *exc: connected.pop()
+    mock_user_crud.return_value.hash_password.side_effect = lambda password: 'hash' if not connected else None
+    app.include_router(UserRoutes(dependency=mock_dependency, user_crud=mock_user_crud).router)
+
+    response = TestClient(app).post("/register/", json={'username': 'newuser', 'email': 'a@b.com',
+                                                        'password': 'Password123!', 'role': 'user'})
+
+    assert response.status_code == 200
+    # One connection for the lookups, one for the insert, none checked out while hashing
+    assert database.connection_context.call_count == 2
+    mock_user_crud.return_value.create_user.assert_called_once()
+    assert mock_user_crud.return_value.create_user.call_args.kwargs == {'password_hash': 'hash'}
+    mock_dependency.db.acquire.assert_not_called()
+
+def test_register_race_lost_to_concurrent_registration():
+    app = FastAPI()
+    mock_user_crud = create_autospec(UserCRUD)
+    mock_user_crud.return_value.get_by_username.return_value = None
+    mock_user_crud.return_value.get_by_email.return_value = None
+    mock_user_crud.return_value.create_user.side_effect = IntegrityError("duplicate key")
+    app.include_router(UserRoutes(dependency=Dependency(mock_database()), user_crud=mock_user_crud).router)
+
+    response = TestClient(app).post("/register/", json={'username': 'newuser', 'email': 'a@b.com',
+                                                        'password': 'Password123!', 'role': 'user'})
+
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'Username or email already registered.'}
@@ -3,7 +3,7 @@ from anyio.abc import TaskStatus
 from pydantic import ValidationError
 from enum import Enum
 
-from app.api.schemas.task_schemas import TaskBase, TaskCreate, Task
+from app.api.schemas.task_schemas import TaskBase, TaskCreate, Task, TaskPatch
 
 
 def test_task_base_model_valid():
@@ -35,3 +35,11 @@ def test_task_model_invalid_id():
         Task(id="one", title="Sample Task", description="This is a task", status="in_progress")
     assert "should be a valid integer" in str(exc_info.value)
 
+def test_task_patch_tracks_set_fields():
+    patch = TaskPatch(status="done", description=None)
+    assert patch.model_dump(exclude_unset=True) == {"status": "done", "description": None}
+
+def test_task_patch_rejects_null_status():
+    with pytest.raises(ValidationError) as exc_info:
+        TaskPatch(status=None)
+    assert "Field cannot be null." in str(exc_info.value)
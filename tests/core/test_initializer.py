@@ -1,9 +1,7 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from app.core.initializer import AppInitializer  # Adjust the import based on your structure
-from app.db.database import database_instance, Database
-from app.models.task_models import Task
-from app.models.user_models import User
+from app.db.database import database_instance, Database, PingingPooledPostgresqlDatabase
 
 
 @pytest.fixture
@@ -16,17 +14,44 @@ def mock_app():
 @pytest.fixture
 def mock_database():
     # Create a mock Database instance
-    db_mock = MagicMock(spec=Database)
-    db_mock.database = MagicMock()  # Mock the database attribute
-    db_mock.connect = MagicMock()  # Mock the connect method
-    db_mock.close = MagicMock()  # Mock the close method
+    db_mock = MagicMock(spec=PingingPooledPostgresqlDatabase)
     return db_mock
 @pytest.fixture
 def app_initializer(mock_app, mock_database):
     return AppInitializer(mock_app, mock_database)
 
-def test_initialize_spy(app_initializer, mock_database):
-    app_initializer.initialize()
+def test_initialize_checks_schema(app_initializer, mock_database):
+    with patch('app.core.initializer.check_schema') as mock_check, \
+            patch('app.core.initializer.upgrade') as mock_upgrade, \
+            patch('app.core.initializer.get_change_listener') as mock_get_listener, \
+            patch('app.core.initializer.task_changes') as mock_hub:
+        app_initializer.initialize()
     assert app_initializer.app.state.db == mock_database
+    mock_database.connection_context.assert_called_once()
 
-    app_initializer.db.create_tables.assert_called_once_with([Task, User])
+    mock_check.assert_called_once_with(mock_database)
+    mock_upgrade.assert_not_called()
+    mock_database.create_tables.assert_not_called()  # Schema changes belong to the migrations
+    mock_get_listener.assert_called_once_with(mock_database, mock_hub)
+    mock_get_listener.return_value.install.assert_not_called()
+    mock_hub.attach.assert_called_once_with(mock_get_listener.return_value)
+
+def test_initialize_migrates_when_asked(mock_app, mock_database):
+    with patch('app.core.initializer.check_schema') as mock_check, \
+            patch('app.core.initializer.upgrade') as mock_upgrade, \
+            patch('app.core.initializer.get_change_listener'), patch('app.core.initializer.task_changes'):
+        AppInitializer(mock_app, mock_database, schema_mode='migrate').initialize()
+
+    mock_upgrade.assert_called_once_with(mock_database)
+    mock_check.assert_not_called()
+
+def test_initialize_skips_schema_work(mock_app, mock_database):
+    with patch('app.core.initializer.check_schema') as mock_check, \
+            patch('app.core.initializer.upgrade') as mock_upgrade, \
+            patch('app.core.initializer.get_change_listener'), patch('app.core.initializer.task_changes') as mock_hub:
+        AppInitializer(mock_app, mock_database, schema_mode='skip').initialize()
+
+    mock_check.assert_not_called()
+    mock_upgrade.assert_not_called()
+    mock_database.connection_context.assert_not_called()  # Not a single query
+    mock_hub.attach.assert_called_once()
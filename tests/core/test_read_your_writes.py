@@ -0,0 +1,53 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.read_your_writes import PrimaryStickinessMiddleware
+from app.db.routing import PRIMARY_STICKY_COOKIE, _session, mark_write
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(PrimaryStickinessMiddleware, sticky_seconds=5)
+
+    @app.get("/session")
+    def read_session():
+        return _session.get()
+
+    @app.post("/write")
+    def write():
+        mark_write()
+        return {}
+
+    return TestClient(app)
+
+def test_write_sets_sticky_cookie():
+    client = make_client()
+
+    response = client.post("/write")
+
+    cookie = response.headers["set-cookie"]
+    assert cookie.startswith(f"{PRIMARY_STICKY_COOKIE}=")
+    assert "Max-Age=5" in cookie and "HttpOnly" in cookie
+    assert float(response.cookies[PRIMARY_STICKY_COOKIE]) > time.time()
+
+def test_read_does_not_set_cookie():
+    response = make_client().get("/session")
+
+    assert "set-cookie" not in response.headers
+    assert response.json() == {"sticky_until": 0.0, "wrote": False, "target": None}
+
+def test_cookie_starts_session_sticky():
+    client = make_client()
+
+    client.post("/write")
+    session = client.get("/session").json()
+
+    assert session["sticky_until"] > time.time()
+
+def test_malformed_cookie_is_ignored():
+    client = make_client()
+    client.cookies.set(PRIMARY_STICKY_COOKIE, "soon")
+
+    assert client.get("/session").json()["sticky_until"] == 0.0
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from peewee import SqliteDatabase
+
+from app.api.schemas.task_schemas import TaskCreate, TaskPatch
+from app.crud.async_task_crud import AsyncTaskCRUD
+from app.crud.task_crud import TaskVersionConflict, task_cache
+from app.models.table_version_models import TableVersion
+from app.models.task_models import Task
+
+
+class SqliteAsyncDatabase:
+    """Runs the SQL of peewee queries on SQLite with the AsyncDatabase interface, typed like psycopg rows."""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def fetch_all(self, query):
+        sql, params = query.sql()
+        cursor = self.db.execute_sql(sql, params)
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        for row in rows:
+            if 'created_at' in row:
+                row['created_at'] = datetime.fromisoformat(row['created_at'])  # SQLite returns text
+        return rows
+
+    async def fetch_one(self, query):
+        rows = await self.fetch_all(query)
+        return rows[0] if rows else None
+
+@pytest.fixture
+def async_crud():
+    db = SqliteDatabase(':memory:')
+    db.register_function(lambda: datetime.now().isoformat(' '), 'now', 0)
+    with db.bind_ctx([Task, TableVersion]):
+        db.create_tables([Task, TableVersion])
+        start = datetime(2024, 1, 1)
+        for i in range(1, 6):
+            Task.create(id=i, title=f"Task {i}", description="", status="todo", created_at=start + timedelta(minutes=i))
+        TableVersion.create(table_name='tasks', version=5)
+        yield AsyncTaskCRUD(SqliteAsyncDatabase(db))
+    db.close()
+    task_cache.clear()
+
+def test_get_tasks_page_matches_sync_paging(async_crud):
+    rows, next_cursor = asyncio.run(async_crud.get_tasks_page(limit=2))
+    assert [row["id"] for row in rows] == [1, 2]
+    rows, next_cursor = asyncio.run(async_crud.get_tasks_page(limit=2, cursor=next_cursor, fields=("title",)))
+    assert rows == [{"title": "Task 3"}, {"title": "Task 4"}]
+    assert next_cursor is not None
+
+def test_get_task_and_version(async_crud):
+    assert asyncio.run(async_crud.get_task(3)) == {"id": 3, "title": "Task 3", "description": "", "status": "todo",
+                                                   "version": 1}
+    assert asyncio.run(async_crud.get_task(99)) is None
+    assert asyncio.run(async_crud.get_version()) == 5
+
+def test_get_task_selects_only_requested_fields(async_crud):
+    assert asyncio.run(async_crud.get_task(3, ("status",))) == {"status": "todo", "version": 1}
+
+def test_create_update_patch_delete(async_crud):
+    created = asyncio.run(async_crud.create_task(TaskCreate(title="New", description="d", status="todo")))
+    assert created["title"] == "New"
+
+    updated = asyncio.run(async_crud.update_task(created["id"], TaskCreate(title="Renamed", description="d",
+                                                                            status="todo")))
+    assert updated["title"] == "Renamed"
+    patched = asyncio.run(async_crud.patch_task(created["id"], TaskPatch(status="done")))
+    assert patched == {"id": created["id"], "title": "Renamed", "description": "d", "status": "done", "version": 3}
+    assert asyncio.run(async_crud.patch_task(99, TaskPatch(status="done"))) is None
+
+    assert asyncio.run(async_crud.delete_task(created["id"])) is True
+    assert asyncio.run(async_crud.delete_task(created["id"])) is False
+
+def test_conditional_update(async_crud):
+    updated = asyncio.run(async_crud.update_task(3, TaskCreate(title="Renamed", description="d"), [1]))
+    assert updated["version"] == 2
+
+    with pytest.raises(TaskVersionConflict) as conflict:
+        asyncio.run(async_crud.patch_task(3, TaskPatch(status="done"), [1]))
+    assert conflict.value.version == 2
+    assert asyncio.run(async_crud.patch_task(99, TaskPatch(status="done"), [1])) is None
+
+def test_owner_scoped(async_crud):
+    Task.update(owner=7).where(Task.id <= 2).execute()
+    crud = AsyncTaskCRUD(async_crud.db, owner_id=7)
+
+    created = asyncio.run(crud.create_task(TaskCreate(title="Mine", description="d")))
+    rows, _ = asyncio.run(crud.get_tasks_page(limit=10))
+
+    assert [row["id"] for row in rows] == [1, 2, created["id"]]
+    assert Task.get_by_id(created["id"]).owner_id == 7
+    assert asyncio.run(crud.get_task(3)) is None
+    assert asyncio.run(crud.patch_task(3, TaskPatch(status="done"), [1])) is None  # Not a conflict: not theirs
+    assert asyncio.run(crud.delete_task(3)) is False
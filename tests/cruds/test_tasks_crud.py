@@ -1,8 +1,18 @@
 import pytest
+from datetime import datetime, timedelta
 from unittest.mock import MagicMock, patch
-from app.api.schemas.task_schemas import TaskCreate
+from peewee import SqliteDatabase
+from app.api.schemas.task_schemas import TaskCreate, TaskPatch, TaskBulkUpdate, TaskMove
 from app.models.task_models import Task
-from app.crud.task_crud import TaskCRUD  # Adjust the import based on your structure
+from app.utils.pagination import encode_cursor
+from app.crud.task_crud import TaskCRUD, TaskVersionConflict, task_cache, page_query  # Adjust the import based on your structure
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Cached rows would otherwise leak between tests
+    task_cache.clear()
+    yield
+    task_cache.clear()
 
 @pytest.fixture
 def mock_database():
@@ -18,6 +28,20 @@ def task_crud(mock_database):
 def mock_task():
     return MagicMock(spec=Task)
 
+@pytest.fixture
+def sqlite_tasks():
+    # Bind Task to an in-memory database seeded with tasks created one minute apart
+    db = SqliteDatabase(':memory:')
+    db.register_function(lambda: datetime.now().isoformat(' '), 'now', 0)  # Postgres now() for the created_at default
+    with db.bind_ctx([Task]):
+        db.create_tables([Task])
+        start = datetime(2024, 1, 1)
+        for i in range(1, 8):
+            Task.create(id=i, title=f"Task {i}", description="", status="done" if i % 2 else "todo",
+                        created_at=start + timedelta(minutes=i))
+        yield db
+    db.close()
+
 def test_create_task(task_crud, mock_task):
     # Arrange
     task_data = TaskCreate(title="Test Task", description="A task for testing", status="Pending")
@@ -39,6 +63,121 @@ def test_get_tasks(task_crud, mock_task):
         mock_select.assert_called_once()
         assert tasks == [mock_task]
 
+def test_get_tasks_filtered(task_crud, sqlite_tasks):
+    tasks = task_crud.get_tasks(status="todo", created_after=datetime(2024, 1, 1, 0, 3))
+
+    assert [task.id for task in tasks] == [4, 6]
+
+def test_get_tasks_page_walks_all_pages(task_crud, sqlite_tasks):
+    seen, cursor = [], None
+    while True:
+        tasks, cursor = task_crud.get_tasks_page(limit=3, cursor=cursor)
+        seen.extend(task['id'] for task in tasks)
+        if cursor is None:
+            break
+
+    assert seen == [1, 2, 3, 4, 5, 6, 7]
+
+def test_get_tasks_page_last_page_has_no_cursor(task_crud, sqlite_tasks):
+    tasks, cursor = task_crud.get_tasks_page(limit=7)
+
+    assert len(tasks) == 7
+    assert cursor is None
+
+def test_get_tasks_page_descending_with_filters(task_crud, sqlite_tasks):
+    first, cursor = task_crud.get_tasks_page(limit=2, status="done", descending=True,
+                                             created_before=datetime(2024, 1, 1, 0, 7))
+    second, last_cursor = task_crud.get_tasks_page(limit=2, cursor=cursor, status="done", descending=True,
+                                                   created_before=datetime(2024, 1, 1, 0, 7))
+
+    assert [task['id'] for task in first] == [5, 3]
+    assert [task['id'] for task in second] == [1]
+    assert last_cursor is None
+
+def test_get_tasks_page_returns_response_columns_only(task_crud, sqlite_tasks):
+    tasks, _ = task_crud.get_tasks_page(limit=1)
+
+    assert tasks == [{"id": 1, "title": "Task 1", "description": "", "status": "done"}]
+
+def test_get_tasks_page_sparse_fields(task_crud, sqlite_tasks):
+    first, cursor = task_crud.get_tasks_page(limit=2, fields=("title", "status"))
+    second, _ = task_crud.get_tasks_page(limit=2, cursor=cursor, fields=("title", "status"))
+
+    assert first == [{"title": "Task 1", "status": "done"}, {"title": "Task 2", "status": "todo"}]
+    assert second == [{"title": "Task 3", "status": "done"}, {"title": "Task 4", "status": "todo"}]
+
+def test_get_tasks_page_sparse_fields_select_list(task_crud):
+    with patch('app.models.task_models.Task.select') as mock_select:
+        mock_select.return_value.dicts.return_value.order_by.return_value.limit.return_value = []
+        task_crud.get_tasks_page(limit=2, fields=("id", "title"))
+
+    selected = [column.name for column in mock_select.call_args.args]
+    assert selected == ["id", "title", "created_at"]
+
+def test_page_query_bounds_created_at_for_partition_pruning():
+    cursor = encode_cursor(datetime(2024, 1, 3), 3)
+
+    ascending, _ = page_query(2, cursor, None, None, None, False, None)
+    descending, _ = page_query(2, cursor, None, None, None, True, None)
+
+    assert '("t1"."created_at" >= %s)' in ascending.sql()[0]
+    assert '("t1"."created_at" <= %s)' in descending.sql()[0]
+
+def test_get_tasks_page_invalid_cursor(task_crud, sqlite_tasks):
+    with pytest.raises(ValueError):
+        task_crud.get_tasks_page(limit=3, cursor="not-a-cursor")
+
+def test_create_tasks(task_crud, sqlite_tasks):
+    tasks = [TaskCreate(title=f"Bulk {i}", description="bulk", status="todo") for i in range(3)]
+    with patch('app.crud.task_crud.BULK_CHUNK_SIZE', 2):
+        created = task_crud.create_tasks(tasks)
+
+    assert [task["title"] for task in created] == ["Bulk 0", "Bulk 1", "Bulk 2"]
+    assert [task["id"] for task in created] == [8, 9, 10]
+    assert Task.select().count() == 10
+
+def test_create_task_with_group_commit(task_crud, sqlite_tasks):
+    task = TaskCreate(title="Grouped", description="one commit", status="todo")
+    with patch('app.crud.task_crud.TASK_GROUP_COMMIT', True):
+        created = task_crud.create_task(task)
+
+    assert created == {"id": 8, "title": "Grouped", "description": "one commit", "status": "todo"}
+    assert Task.get_by_id(8).title == "Grouped"
+
+def test_create_tasks_rolls_back_whole_batch(task_crud, sqlite_tasks):
+    tasks = [TaskCreate(title=f"Bulk {i}", description="bulk", status="todo") for i in range(3)]
+    with patch('app.crud.task_crud.TaskCRUD._chunks', side_effect=lambda rows: iter([rows[:2], [{"bad": 1}]])):
+        with pytest.raises(Exception):
+            task_crud.create_tasks(tasks)
+
+    assert Task.select().count() == 7
+
+def test_update_tasks(task_crud, sqlite_tasks):
+    updates = [TaskBulkUpdate(id=2, title="Two", description="updated", status="done"),
+               TaskBulkUpdate(id=99, title="Missing", description="", status="done")]
+    updated = task_crud.update_tasks(updates)
+
+    assert updated == [{"id": 2, "title": "Two", "description": "updated", "status": "done"}]
+    assert Task.get_by_id(2).title == "Two"
+    assert Task.get_by_id(3).title == "Task 3"
+
+def test_delete_tasks(task_crud, sqlite_tasks):
+    with patch('app.crud.task_crud.BULK_CHUNK_SIZE', 1):
+        deleted = task_crud.delete_tasks([1, 3, 99])
+
+    assert sorted(deleted) == [1, 3]
+    assert [task.id for task in Task.select().order_by(Task.id)] == [2, 4, 5, 6, 7]
+
+def test_search_tasks_uses_bound_database(task_crud):
+    with patch('app.crud.task_crud.get_task_search') as mock_get_search:
+        mock_get_search.return_value.search.return_value = ([], None)
+
+        result = task_crud.search_tasks("report", limit=5, cursor=None)
+
+        mock_get_search.assert_called_once_with(Task._meta.database)
+        mock_get_search.return_value.search.assert_called_once_with("report", 5, None, None)
+        assert result == ([], None)
+
 def test_get_task_found(task_crud, mock_task):
     # Arrange
     task_id = 1
@@ -61,52 +200,244 @@ def test_get_task_not_found(task_crud):
         mock_get.assert_called_once_with(Task.id == task_id)
         assert task is None
 
-def test_update_task_found(task_crud, mock_task):
-    # Arrange
-    task_id = 1
-    task_data = TaskCreate(title="Updated Task", description="Updated description", status="Completed")
-    with patch('app.models.task_models.Task.get_or_none', return_value=mock_task) as mock_get, \
-         patch.object(mock_task, 'save') as mock_save:
-        # Act
-        updated_task = task_crud.update_task(task_id, task_data)
+def test_get_task_cached(task_crud, mock_task):
+    with patch('app.models.task_models.Task.get_or_none', return_value=mock_task) as mock_get:
+        assert task_crud.get_task(1) == mock_task
+        assert TaskCRUD(None).get_task(1) == mock_task  # Shared across CRUD instances
 
-        # Assert
-        mock_get.assert_called_once_with(Task.id == task_id)
-        assert updated_task == mock_task
-        mock_task.save.assert_called_once()  # Ensure save was called
+        mock_get.assert_called_once()
 
-def test_update_task_not_found(task_crud):
+def test_get_task_fields_selects_only_them(sqlite_tasks):
+    crud = TaskCRUD(sqlite_tasks, owner_id=None)
+    with patch('app.models.task_models.Task.select', wraps=Task.select) as mock_select:
+        row = crud.get_task_fields(2, ("title",))
+
+    assert row == {"title": "Task 2", "version": 1}
+    assert [column.name for column in mock_select.call_args.args] == ["title", "version"]
+    assert crud.get_task_fields(99, ("title",)) is None
+    assert task_cache.get(2) is None  # Neither read nor filled
+
+def test_get_task_fields_of_someone_elses_task(sqlite_tasks):
+    Task.update(owner=7).where(Task.id == 2).execute()
+
+    assert TaskCRUD(sqlite_tasks, owner_id=8).get_task_fields(2, ("title",)) is None
+    assert TaskCRUD(sqlite_tasks, owner_id=7).get_task_fields(2, ("id",)) == {"id": 2, "version": 1}
+
+def test_writes_invalidate_cached_task(task_crud, sqlite_tasks):
+    assert task_crud.get_task(2).title == "Task 2"
+
+    task_crud.patch_task(2, TaskPatch(title="Renamed"))
+    assert task_crud.get_task(2).title == "Renamed"
+
+    task_crud.update_tasks([TaskBulkUpdate(id=2, title="Bulk", description="", status="todo")])
+    assert task_crud.get_task(2).title == "Bulk"
+
+    task_crud.delete_task(2)
+    assert task_crud.get_task(2) is None
+
+def test_bulk_delete_invalidates_cached_task(task_crud, sqlite_tasks):
+    assert task_crud.get_task(3) is not None
+
+    task_crud.delete_tasks([3])
+
+    assert task_crud.get_task(3) is None
+
+def test_update_task_found(task_crud, sqlite_tasks):
     # Arrange
-    task_id = 999  # Assume this task does not exist
     task_data = TaskCreate(title="Updated Task", description="Updated description", status="Completed")
-    with patch('app.models.task_models.Task.get_or_none', return_value=None) as mock_get:
-        # Act
-        updated_task = task_crud.update_task(task_id, task_data)
 
-        # Assert
-        mock_get.assert_called_once_with(Task.id == task_id)
-        assert updated_task is None  # No task found, so return should be None
+    # Act
+    updated_task = task_crud.update_task(2, task_data)
+
+    # Assert
+    assert updated_task.id == 2
+    assert updated_task.title == "Updated Task"
+    assert updated_task.created_at == datetime(2024, 1, 1, 0, 2)
+    assert Task.get_by_id(2).status == "Completed"
 
-def test_delete_task_found(task_crud, mock_task):
+def test_update_task_single_statement(task_crud):
     # Arrange
-    task_id = 1
-    with patch('app.models.task_models.Task.get_or_none', return_value=mock_task) as mock_get, \
-         patch.object(mock_task, 'delete_instance') as mock_delete:
+    task_data = TaskCreate(title="Updated Task", description="Updated description", status="Completed")
+    with patch('app.models.task_models.Task.update') as mock_update, \
+            patch('app.models.task_models.Task.get_or_none') as mock_get:
+        mock_update.return_value.where.return_value.returning.return_value.execute.return_value = []
+
         # Act
-        result = task_crud.delete_task(task_id)
+        task_crud.update_task(1, task_data)
 
         # Assert
-        mock_get.assert_called_once_with(Task.id == task_id)
-        mock_delete.assert_called_once()
-        assert result is True
+        mock_update.assert_called_once_with(**task_data.model_dump(), version=Task.version + 1)
+        mock_get.assert_not_called()
 
-def test_delete_task_not_found(task_crud):
+def test_update_task_not_found(task_crud, sqlite_tasks):
     # Arrange
     task_id = 999  # Assume this task does not exist
-    with patch('app.models.task_models.Task.get_or_none', return_value=None) as mock_get:
-        # Act
-        result = task_crud.delete_task(task_id)
+    task_data = TaskCreate(title="Updated Task", description="Updated description", status="Completed")
 
-        # Assert
-        mock_get.assert_called_once_with(Task.id == task_id)
-        assert result is False
+    # Act
+    updated_task = task_crud.update_task(task_id, task_data)
+
+    # Assert
+    assert updated_task is None  # No task found, so return should be None
+
+def test_patch_task_writes_only_given_columns(task_crud):
+    with patch('app.models.task_models.Task.update') as mock_update:
+        mock_update.return_value.where.return_value.returning.return_value.execute.return_value = []
+
+        task_crud.patch_task(1, TaskPatch(status="done"))
+
+        assert mock_update.call_args.kwargs.keys() == {"status", "version"}
+
+def test_patch_task(task_crud, sqlite_tasks):
+    patched = task_crud.patch_task(2, TaskPatch(description=None, status="done"))
+
+    assert (patched.title, patched.description, patched.status) == ("Task 2", None, "done")
+
+def test_patch_task_without_changes(task_crud, sqlite_tasks):
+    assert task_crud.patch_task(2, TaskPatch()).title == "Task 2"
+    assert task_crud.patch_task(999, TaskPatch()) is None
+
+def test_update_task_bumps_version(task_crud, sqlite_tasks):
+    task_data = TaskCreate(title="Updated", description="d", status="todo")
+
+    assert task_crud.update_task(2, task_data).version == 2
+    assert task_crud.update_task(2, task_data, expected_versions=[2]).version == 3
+
+def test_conditional_update_conflict(task_crud, sqlite_tasks):
+    task_crud.patch_task(2, TaskPatch(status="todo"))  # Someone else's write: version 2
+
+    with pytest.raises(TaskVersionConflict) as conflict:
+        task_crud.patch_task(2, TaskPatch(status="done"), expected_versions=[1])
+
+    assert conflict.value.version == 2
+    assert Task.get_by_id(2).status == "todo"  # The stale write changed nothing
+    with pytest.raises(TaskVersionConflict):
+        task_crud.patch_task(2, TaskPatch(), expected_versions=[1])
+    assert task_crud.update_task(999, TaskCreate(title="x", description="d"), expected_versions=[1]) is None
+
+def test_bulk_update_bumps_version(task_crud, sqlite_tasks):
+    task_crud.update_tasks([TaskBulkUpdate(id=2, title="Two", description="d", status="done")])
+
+    assert Task.get_by_id(2).version == 2
+
+def test_move_task(task_crud, sqlite_tasks):
+    task = task_crud.move_task(6, TaskMove(before_id=2))  # todo column: 2, 4, 6
+
+    assert task.version == 2 and task.rank is not None
+    assert [row["id"] for row in task_crud.get_column_page("todo", limit=10)[0]] == [6, 2, 4]
+
+    task = task_crud.move_task(1, TaskMove(status="todo", after_id=6))
+
+    assert task.status == "todo"
+    assert [row["id"] for row in task_crud.get_column_page("todo", limit=10)[0]] == [6, 1, 2, 4]
+    assert [row["id"] for row in task_crud.get_column_page("done", limit=10)[0]] == [3, 5, 7]
+
+def test_writes_drop_cached_task_after_commit(task_crud, sqlite_tasks):
+    in_transaction = []
+    with patch.object(task_cache, 'invalidate', side_effect=lambda key: in_transaction.append(
+            sqlite_tasks.in_transaction())):
+        task_crud.move_task(6, TaskMove(before_id=2))
+        task_crud.update_task(6, TaskCreate(title="Six", description="", status="todo"))
+        task_crud.patch_task(6, TaskPatch(title="6"))
+
+    assert in_transaction == [False, False, False]
+
+def test_move_task_checks_version_and_existence(task_crud, sqlite_tasks):
+    with pytest.raises(TaskVersionConflict):
+        task_crud.move_task(2, TaskMove(), expected_versions=[5])
+    assert Task.get_by_id(2).rank is None  # Rolled back
+
+    assert task_crud.move_task(999, TaskMove()) is None
+    with pytest.raises(ValueError):
+        task_crud.move_task(2, TaskMove(after_id=3))  # Task 3 is done, not todo
+
+def test_move_task_queues_rebalance_of_long_ranks(task_crud, sqlite_tasks):
+    with patch('app.crud.task_crud.TASK_RANK_MAX_LENGTH', 0), patch('app.crud.task_crud.task_ranks') as task_ranks:
+        task_crud.move_task(2, TaskMove(status="done"))
+
+    task_ranks.request.assert_called_once_with("done", None)
+
+def test_get_column_page_continues_from_ranked_into_unranked(task_crud, sqlite_tasks):
+    task_crud.move_task(7, TaskMove())
+    task_crud.move_task(3, TaskMove(after_id=7))
+
+    pages, cursor = [], None
+    while True:
+        rows, cursor = task_crud.get_column_page("done", limit=1, cursor=cursor)
+        pages.append([row["id"] for row in rows])
+        if cursor is None:
+            break
+
+    assert pages == [[7], [3], [1], [5]]
+    assert set(rows[0]) == {"id", "title", "description", "status"}
+    with pytest.raises(ValueError):
+        task_crud.get_column_page("done", limit=1, cursor="garbage")
+
+def test_delete_task_found(task_crud, sqlite_tasks):
+    # Act
+    result = task_crud.delete_task(1)
+
+    # Assert
+    assert result is True
+    assert Task.get_or_none(Task.id == 1) is None
+
+def test_delete_task_not_found(task_crud, sqlite_tasks):
+    # Act
+    result = task_crud.delete_task(999)
+
+    # Assert
+    assert result is False
+    assert Task.select().count() == 7
+
+def test_export_tasks_streams_filtered_rows_in_order(sqlite_tasks):
+    with sqlite_tasks.bind_ctx([Task]):
+        batches = list(TaskCRUD(sqlite_tasks).export_tasks(status="done", batch_size=3))
+
+    assert [[row["id"] for row in rows] for rows in batches] == [[1, 3, 5], [7]]
+    assert set(batches[0][0]) == {"id", "title", "description", "status", "created_at"}
+
+def test_owner_scoped_crud_sees_only_its_tasks(sqlite_tasks):
+    Task.update(owner=1).where(Task.id <= 4).execute()
+    Task.update(owner=2).where(Task.id > 4).execute()
+    crud = TaskCRUD(sqlite_tasks, owner_id=1)
+
+    created = crud.create_task(TaskCreate(title="Mine", description="", status="todo"))
+    rows, _ = crud.get_tasks_page(limit=10, status="todo", fields=["id", "title"])
+    assert [row["id"] for row in rows] == [2, 4, created.id]
+    assert Task.get_by_id(created.id).owner_id == 1
+    assert [task.id for task in crud.get_tasks(status="done")] == [1, 3]
+
+    assert crud.get_task(5) is None  # Owned by user 2
+    assert crud.update_task(5, TaskCreate(title="Taken", description="", status="todo")) is None
+    assert crud.delete_task(5) is False
+    assert crud.delete_tasks([4, 6]) == [4]
+    assert Task.get_by_id(5).title == "Task 5"
+    with pytest.raises(ValueError):
+        crud.move_task(1, TaskMove(after_id=7))  # In the done column, but not user 1's
+
+def test_owner_scoped_column_page(sqlite_tasks):
+    Task.update(owner=1).where(Task.id.in_([1, 3, 4])).execute()
+    Task.update(owner=2).where(Task.id.not_in([1, 3, 4])).execute()
+    crud = TaskCRUD(sqlite_tasks, owner_id=1)
+
+    crud.move_task(3, TaskMove())
+    rows, _ = crud.get_column_page("done", limit=10)
+
+    assert [row["id"] for row in rows] == [3, 1]
+    assert [row["id"] for row in TaskCRUD(sqlite_tasks).get_column_page("done", limit=10)[0]] == [3, 1, 5, 7]
+
+def test_writes_are_audited(sqlite_tasks):
+    crud = TaskCRUD(sqlite_tasks, owner_id=None)
+    with patch('app.crud.task_crud.audit_log') as audit_log:
+        created = crud.create_task(TaskCreate(title="New", description="d", status="todo"))
+        crud.patch_task(2, TaskPatch(title="Two"))
+        crud.move_task(4, TaskMove(status="done"))
+        crud.update_task(999, TaskCreate(title="x", description="d"))  # Missing, so nothing to audit
+        crud.delete_tasks([1, 999])
+
+    assert [call.args for call in audit_log.record.call_args_list] == [
+        ("create", "task", created.id, None, {"title": "New", "description": "d", "status": "todo"}),
+        ("update", "task", 2, None, {"title": "Two"}),
+        ("move", "task", 4, None, {"status": "done", "rank": Task.get_by_id(4).rank}),
+        ("delete", "task", 1, None, None),
+    ]
@@ -1,11 +1,20 @@
 import pytest
+from datetime import datetime
 from unittest.mock import MagicMock, patch
+from peewee import SqliteDatabase
 
 from app.api.schemas.user_schemas import UserCreate
-from app.crud.user_crud import UserCRUD
+from app.crud.user_crud import UserCRUD, user_cache
 from app.models.user_models import User
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Cached rows would otherwise leak between tests
+    user_cache.clear()
+    yield
+    user_cache.clear()
+
 @pytest.fixture
 def mock_database():
     # Create a mock Database instance
@@ -25,18 +34,18 @@ def test_create_user(user_crud, mock_user):
     user_data = UserCreate(username='username', email='a@b.com', password='Password1234!')
     hashed_password = '$argon2id$v=19$m=65536,t=3,p=4$v//lBZPMjVXwFFfxeCJR8A$GXU19Cj8007AmUriCh1qUYGKKd9Wy50t5WTTgR7tbKQ'  # Updated mock Argon2 hash
 
-    with patch('app.crud.user_crud.PasswordHasher') as MockPasswordHasher, \
+    with patch('app.crud.user_crud.password_pool') as mock_pool, \
             patch('app.models.user_models.User.create', return_value=mock_user) as mock_create:
         # Setup the mock instance
-        mock_hasher = MockPasswordHasher.return_value
-        mock_hasher.hash.return_value = hashed_password
+        mock_pool.hash.return_value = hashed_password
 
         created_user = user_crud.create_user(user_data)
         mock_create.assert_called_once()
 
         args, kwargs = mock_create.call_args
         assert 'password' in kwargs
-        assert kwargs['password'] != user_data.password
+        assert kwargs['password'] == hashed_password
+        mock_pool.hash.assert_called_once_with(user_data.password)  # Hashed on the password pool
         assert created_user == mock_user
 
 def test_get_users(user_crud, mock_user):
@@ -49,6 +58,37 @@ def test_get_users(user_crud, mock_user):
         mock_select.assert_called_once()
         assert users == [mock_user]
 
+def test_get_user_rows_selects_response_columns(user_crud):
+    db = SqliteDatabase(':memory:')
+    with db.bind_ctx([User]):
+        db.create_tables([User])
+        User.create(id=1, username='username', email='a@b.com', password='hashed', role='admin',
+                    created_at=datetime(2024, 1, 1))
+
+        rows = user_crud.get_user_rows()
+
+    assert rows == [{'id': 1, 'username': 'username', 'email': 'a@b.com', 'role': 'admin'}]
+
+def test_get_user_fields_selects_only_them(user_crud):
+    db = SqliteDatabase(':memory:')
+    with db.bind_ctx([User]):
+        db.create_tables([User])
+        User.create(id=1, username='username', email='a@b.com', password='hashed', role='admin',
+                    created_at=datetime(2024, 1, 1))
+
+        assert user_crud.get_user_fields('username', ('email', 'role')) == {'email': 'a@b.com', 'role': 'admin'}
+        assert user_crud.get_user_fields('nobody', ('email',)) is None
+    assert user_cache.stats()['size'] == 0
+
+def test_get_user_rows_sparse_fields(user_crud):
+    with patch('app.models.user_models.User.select') as mock_select:
+        mock_select.return_value.dicts.return_value = [{'id': 1, 'username': 'username'}]
+
+        rows = user_crud.get_user_rows(fields=('id', 'username'))
+
+    mock_select.assert_called_once_with(User.id, User.username)
+    assert rows == [{'id': 1, 'username': 'username'}]
+
 def test_get_user_found(user_crud, mock_user):
     # Arrange
     user_id = 1
@@ -115,18 +155,49 @@ def test_get_user_by_email_not_found(user_crud):
         mock_get.assert_called_once_with(User.email == email)
         assert user is None
 
+def test_get_user_cached(user_crud, mock_user):
+    with patch('app.models.user_models.User.get_or_none', return_value=mock_user) as mock_get:
+        assert user_crud.get_user(1) == mock_user
+        assert user_crud.get_user(1) == mock_user
+        assert user_crud.get_by_username('username') == mock_user
+        assert user_crud.get_by_username('username') == mock_user
+
+        assert mock_get.call_count == 2
+
+def test_update_and_delete_invalidate_cached_user(user_crud):
+    db = SqliteDatabase(':memory:')
+    with db.bind_ctx([User]):
+        db.create_tables([User])
+        User.create(id=1, username='username', email='a@b.com', password='hashed', created_at=datetime(2024, 1, 1))
+        user_crud.get_user(1)
+        user_crud.get_by_username('username')
+
+        User.update(username='renamed').where(User.id == 1).execute()  # Bypasses the CRUD, so still cached
+        assert user_crud.get_by_username('username').username == 'username'
+
+        with patch.object(UserCRUD, 'hash_password', return_value='hashed'):
+            user_crud.update_user(1, UserCreate(username='renamed', email='a@b.com', password='Password1234!'))
+        assert user_crud.get_by_username('username') is None
+        assert user_crud.get_user(1).username == 'renamed'
+
+        user_crud.delete_user(1)
+        assert user_crud.get_user(1) is None
+        assert user_cache.stats()['size'] == 0
+
 def test_update_user_found(user_crud, mock_user):
     # Arrange
     user_id = 1
     user_data = UserCreate(username='username', email='a@b.com', password='Password1234!')
     with patch('app.models.user_models.User.get_or_none', return_value=mock_user) as mock_get, \
-         patch.object(mock_user, 'save') as mock_save:
+         patch.object(mock_user, 'save') as mock_save, \
+         patch.object(UserCRUD, 'hash_password', return_value='hashed'):
         # Act
         updated_user = user_crud.update_user(user_id, user_data)
 
         # Assert
         mock_get.assert_called_once_with(User.id == user_id)
         assert updated_user == mock_user
+        assert mock_user.password == 'hashed'  # The plain password is never stored
         mock_user.save.assert_called_once()  # Ensure save was called
 
 def test_update_user_not_found(user_crud):
@@ -164,3 +235,18 @@ def test_delete_user_not_found(user_crud):
         # Assert
         mock_get.assert_called_once_with(User.id == user_id)
         assert result is False
+
+def test_user_writes_are_audited_without_password(user_crud, mock_user):
+    mock_user.id = 1
+    user_data = UserCreate(username='username', email='a@b.com', password='Password1234!')
+    with patch('app.crud.user_crud.audit_log') as audit_log, \
+            patch.object(UserCRUD, 'hash_password', return_value='hashed'), \
+            patch('app.models.user_models.User.create', return_value=mock_user), \
+            patch('app.models.user_models.User.get_or_none', return_value=mock_user):
+        user_crud.create_user(user_data)
+        user_crud.delete_user(1)
+
+    changes = {'username': 'username', 'email': 'a@b.com', 'role': 'user', 'password': 'set'}
+    assert audit_log.record.call_args_list[0].args == ('create', 'user', 1)
+    assert audit_log.record.call_args_list[0].kwargs == {'changes': changes}
+    assert audit_log.record.call_args_list[1].args == ('delete', 'user', 1)
@@ -0,0 +1,129 @@
+import json
+import threading
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from peewee import SqliteDatabase
+
+from app.db.audit import AuditEvent, AuditLog, AuditWriter, PostgresAuditWriter, SqliteAuditWriter, get_audit_writer
+from app.db.migrations import upgrade
+
+
+class HeldWrite:
+    """Write whose calls block until released, and that fails any batch holding a 'bad' action."""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, events):
+        self.started.set()
+        self.release.wait(5)
+        self.batches.append([event.action for event in events])
+        if any(event.action == "bad" for event in events):
+            raise ValueError("bad event")
+
+
+@pytest.fixture
+def sqlite_db():
+    db = SqliteDatabase(':memory:')
+    db.connect()
+    upgrade(db)
+    yield db
+    db.close()
+
+def test_record_is_written_in_batches():
+    write = HeldWrite()
+    log = AuditLog(write, max_batch_size=10, max_delay=0)
+
+    log.record("first", "task", 1)
+    write.started.wait(5)  # The writer holds the first event while more are recorded
+    for i in range(5):
+        log.record(f"e{i}", "task", i, actor_id=7, changes={"status": "done"})
+    write.release.set()
+
+    assert log.flush(5)
+    assert write.batches == [["first"], [f"e{i}" for i in range(5)]]
+    assert log.stats()["written"] == 6 and log.stats()["batches"] == 2 and log.stats()["pending"] == 0
+
+def test_full_queue_drops_and_counts_events():
+    write = HeldWrite()
+    log = AuditLog(write, max_queue_size=3, max_batch_size=10, max_delay=0)
+
+    log.record("first", "task", 1)
+    write.started.wait(5)
+    accepted = [log.record("event", "task", i) for i in range(5)]
+    stats = log.stats()
+    write.release.set()
+
+    assert accepted == [True, True, True, False, False]  # Recording never waits for the writer
+    assert stats["dropped"] == 2 and stats["pending"] == 4 and stats["max_pending"] == 3
+    assert log.flush(5) and log.stats()["written"] == 4
+
+def test_failed_batch_is_counted_not_retried(capsys):
+    write = HeldWrite()
+    write.release.set()
+    log = AuditLog(write, max_batch_size=10, max_delay=0)
+
+    log.record("bad", "task", 1)
+    assert log.flush(5)
+    log.record("good", "task", 2)
+    assert log.flush(5)
+
+    assert write.batches == [["bad"], ["good"]]
+    assert log.stats()["failed"] == 1 and log.stats()["written"] == 1
+    assert "Failed to write 1 audit event(s): bad event" in capsys.readouterr().out
+
+def test_flush_gives_up_after_timeout():
+    write = HeldWrite()
+    log = AuditLog(write, max_delay=0)
+
+    log.record("held", "task", 1)
+    write.started.wait(5)
+
+    assert log.flush(0.01) is False
+    write.release.set()
+    assert log.flush(5)
+
+def test_disabled_log_records_nothing():
+    write = HeldWrite()
+    log = AuditLog(write, enabled=False)
+
+    assert log.record("create", "task", 1) is False
+    assert log.stats()["recorded"] == 0 and log.flush(0)
+
+def test_get_audit_writer_picks_backend():
+    assert isinstance(get_audit_writer(SqliteDatabase(':memory:')), SqliteAuditWriter)
+    assert isinstance(get_audit_writer(MagicMock()), PostgresAuditWriter)
+
+def test_sqlite_writer_appends_rows(sqlite_db):
+    occurred_at = datetime(2025, 1, 2, 3, 4, 5)
+    events = [AuditEvent(occurred_at, 7, "update", "task", i, {"title": f"T{i}"}) for i in range(250)]
+    events.append(AuditEvent(occurred_at, None, "delete", "user", 3, None))
+
+    get_audit_writer(sqlite_db).write(events)
+
+    rows = sqlite_db.execute_sql("SELECT actor_id, action, entity, entity_id, changes FROM audit_log "
+                                 "ORDER BY id").fetchall()
+    assert len(rows) == 251
+    assert rows[0][:4] == (7, "update", "task", 0) and json.loads(rows[0][4]) == {"title": "T0"}
+    assert rows[-1] == (None, "delete", "user", 3, None)
+
+def test_postgres_writer_copies_batch():
+    database = MagicMock()
+    events = [AuditEvent(datetime(2025, 1, 2), 7, "create", "task", 1, {"title": "Tab\there"}),
+              AuditEvent(datetime(2025, 1, 2), None, "delete", "user", 3, None)]
+
+    PostgresAuditWriter(database).write(events)
+
+    sql, stream = database.cursor.return_value.copy_expert.call_args[0]
+    assert sql == "COPY audit_log (occurred_at, actor_id, action, entity, entity_id, changes) FROM STDIN"
+    assert stream.read() == (b'2025-01-02T00:00:00\t7\tcreate\ttask\t1\t{"title": "Tab\\\\there"}\n'
+                             b'2025-01-02T00:00:00\t\\N\tdelete\tuser\t3\t\\N\n')
+    database.atomic.assert_called_once()
+
+def test_audit_writer_needs_a_backend():
+    with pytest.raises(TypeError):
+        AuditWriter(MagicMock())
@@ -0,0 +1,123 @@
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock
+from peewee import SqliteDatabase
+
+from app.db.board import get_task_board, subtract_status_counts, PostgresTaskBoard, SqliteTaskBoard
+from app.models.task_models import Task
+from app.utils.pagination import decode_column_cursor
+
+
+@pytest.fixture
+def sqlite_board():
+    db = SqliteDatabase(':memory:')
+    with db.bind_ctx([Task]):
+        db.create_tables([Task])
+        Task.create(id=1, title="Old", description="d", status="done", created_at=datetime(2024, 1, 1))
+        board = get_task_board(db)
+        board.install()
+        # Rows written after install are counted by the triggers
+        for i in range(2, 6):
+            Task.create(id=i, title=f"Task {i}", description="d", status="todo", created_at=datetime(2024, 1, i))
+        yield board
+    db.close()
+
+def counts(board):
+    return dict(board.database.execute_sql(
+        "SELECT status, SUM(task_count) FROM task_status_counts GROUP BY status").fetchall())
+
+def test_get_task_board_picks_backend():
+    assert isinstance(get_task_board(SqliteDatabase(':memory:')), SqliteTaskBoard)
+    assert isinstance(get_task_board(MagicMock()), PostgresTaskBoard)
+
+def test_counts_follow_writes(sqlite_board):
+    assert counts(sqlite_board) == {"done": 1, "todo": 4}
+
+    Task.update(status="done").where(Task.id == 2).execute()
+    Task.update(title="Renamed").where(Task.id == 3).execute()  # Status unchanged
+    Task.delete().where(Task.id == 4).execute()
+
+    assert counts(sqlite_board) == {"done": 2, "todo": 2}
+
+def test_counts_follow_owner_changes(sqlite_board):
+    Task.update(owner=7).where(Task.id.in_([2, 3])).execute()
+    Task.update(owner=8).where(Task.id == 3).execute()
+
+    rows = sqlite_board.database.execute_sql(
+        "SELECT owner_id, status, SUM(task_count) FROM task_status_counts GROUP BY owner_id, status "
+        "HAVING SUM(task_count) > 0 ORDER BY owner_id, status").fetchall()
+    assert rows == [(0, "done", 1), (0, "todo", 2), (7, "todo", 1), (8, "todo", 1)]
+
+def test_install_recounts(sqlite_board):
+    sqlite_board.database.execute_sql("UPDATE task_status_counts SET task_count = 99")
+
+    sqlite_board.install()
+
+    assert counts(sqlite_board) == {"done": 1, "todo": 4}
+
+def test_board_lists_oldest_tasks_per_status(sqlite_board):
+    Task.delete().where(Task.id == 1).execute()
+    Task.update(status="done").where(Task.id == 5).execute()
+
+    columns = sqlite_board.board(limit=2)
+
+    assert [(column["status"], column["count"]) for column in columns] == [("done", 1), ("todo", 3)]
+    assert columns[0]["tasks"] == [{"id": 5, "title": "Task 5", "description": "d", "status": "done"}]
+    assert columns[0]["next_cursor"] is None
+    assert [task["id"] for task in columns[1]["tasks"]] == [2, 3]
+    # The column continues after its last listed task
+    assert decode_column_cursor(columns[1]["next_cursor"]) == (None, datetime(2024, 1, 3), 3)
+
+def test_board_lists_ranked_tasks_first(sqlite_board):
+    Task.update(rank="V").where(Task.id == 4).execute()
+    Task.update(rank="G").where(Task.id == 5).execute()
+
+    columns = sqlite_board.board(limit=3)
+
+    # Moved tasks by rank, then the others oldest first
+    assert [task["id"] for task in columns[1]["tasks"]] == [5, 4, 2]
+    assert decode_column_cursor(columns[1]["next_cursor"]) == (None, datetime(2024, 1, 2), 2)
+
+def test_owner_board_counts_only_their_tasks(sqlite_board):
+    Task.update(owner=7).where(Task.id.in_([1, 3, 4])).execute()
+    Task.update(rank="G").where(Task.id == 4).execute()
+
+    columns = sqlite_board.board(limit=1, owner_id=7)
+
+    assert [(column["status"], column["count"]) for column in columns] == [("done", 1), ("todo", 2)]
+    assert [task["id"] for task in columns[1]["tasks"]] == [4]
+    assert decode_column_cursor(columns[1]["next_cursor"]) == ("G", datetime(2024, 1, 4), 4)
+    assert sqlite_board.board(limit=1, owner_id=8) == []
+
+def test_subtract_status_counts(sqlite_board):
+    sqlite_board.database.execute_sql("CREATE TABLE detached AS SELECT * FROM tasks WHERE id IN (2, 3)")
+
+    subtract_status_counts(sqlite_board.database, "detached")
+
+    assert counts(sqlite_board) == {"done": 1, "todo": 2}
+
+def test_postgres_board_reads_top_tasks_through_lateral():
+    db = MagicMock()
+    db.execute_sql.return_value.fetchall.return_value = [
+        ("todo", 5, 2, "Task 2", "d", "G", datetime(2024, 1, 2)),
+        ("todo", 5, 3, "Task 3", "d", "V", datetime(2024, 1, 3)),
+    ]
+
+    columns = PostgresTaskBoard(db).board(limit=2)
+
+    sql, params = db.execute_sql.call_args.args
+    assert "LEFT JOIN LATERAL" in sql and "LIMIT %s" in sql
+    assert params == (2,)
+    assert columns[0]["count"] == 5
+    assert decode_column_cursor(columns[0]["next_cursor"]) == ("V", datetime(2024, 1, 3), 3)
+
+def test_postgres_owner_board_reads_the_owner_counts():
+    db = MagicMock()
+    db.execute_sql.return_value.fetchall.return_value = []
+
+    PostgresTaskBoard(db).board(limit=2, owner_id=7)
+
+    sql, params = db.execute_sql.call_args.args
+    assert "FROM task_status_counts WHERE owner_id = %s GROUP BY status" in sql
+    assert "COUNT(*)" not in sql
+    assert params == (7, 7, 2, 7, 2, 2)
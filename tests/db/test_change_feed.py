@@ -0,0 +1,109 @@
+import asyncio
+import json
+from unittest.mock import MagicMock, patch
+
+from peewee import SqliteDatabase, PostgresqlDatabase
+
+from app.db.change_feed import (ChangeHub, SqliteChangeListener, PostgresChangeListener, get_change_listener,
+                                RESET_EVENT)
+from app.models.task_models import Task
+
+
+def drain(subscription):
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+def test_hub_fans_out_to_every_subscriber():
+    async def scenario():
+        hub = ChangeHub()
+        first, second = hub.subscribe(), hub.subscribe()
+        hub.publish({"seq": 1, "op": "insert", "id": 1})
+        await asyncio.sleep(0)  # Deliveries are scheduled on the loop
+        hub.unsubscribe(second)
+        hub.publish({"seq": 2, "op": "delete", "id": 1})
+        await asyncio.sleep(0)
+        return drain(first), drain(second), hub.stats()
+
+    first, second, stats = asyncio.run(scenario())
+    assert [event["seq"] for event in first] == [1, 2]
+    assert [event["seq"] for event in second] == [1]
+    assert stats == {"subscribers": 1, "published": 2, "backlog": 2}
+
+def test_hub_resumes_after_last_event_id():
+    async def scenario():
+        hub = ChangeHub(backlog_size=2)
+        for seq in (1, 2, 3):
+            hub.publish({"seq": seq, "op": "update", "id": seq})
+        return drain(hub.subscribe("2")), drain(hub.subscribe("1")), drain(hub.subscribe())
+
+    resumed, expired, fresh = asyncio.run(scenario())
+    assert [event["seq"] for event in resumed] == [3]
+    assert expired == [RESET_EVENT]  # Token already left the backlog
+    assert fresh == []
+
+def test_slow_subscriber_is_reset_instead_of_growing():
+    async def scenario():
+        hub = ChangeHub(queue_size=2)
+        subscription = hub.subscribe()
+        for seq in (1, 2, 3):
+            hub.publish({"seq": seq, "op": "update", "id": seq})
+        await asyncio.sleep(0)
+        return drain(subscription)
+
+    assert asyncio.run(scenario()) == [RESET_EVENT]
+
+def test_subscribe_starts_attached_listener():
+    async def scenario():
+        hub = ChangeHub()
+        listener = MagicMock()
+        hub.attach(listener)
+        hub.subscribe()
+        hub.subscribe()
+        return listener
+
+    assert asyncio.run(scenario()).start.call_count == 2  # start() is idempotent on the listener
+
+def test_sqlite_listener_publishes_deltas_from_triggers():
+    db = SqliteDatabase(':memory:')
+    hub = ChangeHub()
+    with db.bind_ctx([Task]):
+        db.create_tables([Task])
+        listener = get_change_listener(db, hub)
+        assert isinstance(listener, SqliteChangeListener)
+        listener.install()
+        listener.install()  # Idempotent
+
+        Task.create(id=1, title="One", description="d", status="todo", created_at="2024-01-01 00:00:00", owner=7)
+        Task.update(status="done").where(Task.id == 1).execute()
+        Task.delete().where(Task.id == 1).execute()
+    db.close()
+
+    events = list(hub._backlog)
+    assert events == [
+        {"seq": 1, "op": "insert", "id": 1, "owner_id": 7,
+         "task": {"id": 1, "title": "One", "description": "d", "status": "todo"}},
+        {"seq": 2, "op": "update", "id": 1, "owner_id": 7,
+         "task": {"id": 1, "title": "One", "description": "d", "status": "done"}},
+        {"seq": 3, "op": "delete", "id": 1, "owner_id": 7},
+    ]
+
+def test_postgres_listener_publishes_notifications():
+    db = PostgresqlDatabase('postgresql://localhost/test')
+    hub = ChangeHub()
+    listener = get_change_listener(db, hub)
+    assert isinstance(listener, PostgresChangeListener)
+    conn = MagicMock()
+    conn.notifies = [MagicMock(payload=json.dumps({"seq": 7, "op": "delete", "id": 3}))]
+
+    def poll():
+        listener._stopping.set()  # Stop after the first batch of notifications
+    conn.poll.side_effect = poll
+    db._connect = MagicMock(return_value=conn)
+    with patch('app.db.change_feed.select.select', return_value=([conn], [], [])):
+        listener._listen()
+
+    conn.cursor.return_value.execute.assert_called_once_with("LISTEN task_changes")
+    assert list(hub._backlog) == [{"seq": 7, "op": "delete", "id": 3}]
+    conn.close.assert_called_once()
@@ -0,0 +1,73 @@
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from peewee import SqliteDatabase, PostgresqlDatabase
+
+from app.db.export import ExportSlots, ExportsBusy, stream_query
+from app.models.task_models import Task
+
+
+def test_sqlite_stream_query_yields_batches():
+    db = SqliteDatabase(':memory:')
+    with db.bind_ctx([Task]):
+        db.create_tables([Task])
+        for i in range(1, 6):
+            Task.create(id=i, title=f"Task {i}", description="", status="todo", created_at=datetime(2024, 1, i))
+
+        batches = list(stream_query(Task.select(Task.id, Task.title).order_by(Task.id), batch_size=2))
+
+    assert [len(rows) for rows in batches] == [2, 2, 1]
+    assert batches[0][0] == {"id": 1, "title": "Task 1"}
+    db.close()
+
+def test_postgres_stream_query_uses_named_cursor_on_own_connection():
+    db = PostgresqlDatabase('postgresql://localhost/test')
+    conn = MagicMock()
+    db._connect = MagicMock(return_value=conn)
+    cursor = conn.cursor.return_value
+    cursor.fetchmany.side_effect = [[(1, "One"), (2, "Two")], [(3, "Three")], []]
+    cursor.description = [("id",), ("title",)]
+
+    with db.bind_ctx([Task]):
+        batches = list(stream_query(Task.select(Task.id, Task.title), batch_size=2))
+
+    assert batches == [[{"id": 1, "title": "One"}, {"id": 2, "title": "Two"}], [{"id": 3, "title": "Three"}]]
+    assert conn.autocommit is False
+    assert conn.cursor.call_args.kwargs["name"].startswith("export_")
+    assert cursor.itersize == 2
+    cursor.fetchmany.assert_called_with(2)
+    conn.rollback.assert_called_once()
+    conn.close.assert_called_once()
+
+def test_postgres_stream_query_closes_connection_when_abandoned():
+    db = PostgresqlDatabase('postgresql://localhost/test')
+    conn = MagicMock()
+    db._connect = MagicMock(return_value=conn)
+    conn.cursor.return_value.fetchmany.return_value = [(1,)]
+    conn.cursor.return_value.description = [("id",)]
+
+    with db.bind_ctx([Task]):
+        batches = stream_query(Task.select(Task.id), batch_size=1)
+        next(batches)
+        batches.close()  # Client went away mid-export
+
+    conn.close.assert_called_once()
+
+def test_postgres_stream_query_turns_away_exports_over_the_limit():
+    db = PostgresqlDatabase('postgresql://localhost/test')
+    db._connect = MagicMock()
+    db._connect.return_value.cursor.return_value.fetchmany.side_effect = [[(1,)], []]
+    db._connect.return_value.cursor.return_value.description = [("id",)]
+    slots = ExportSlots(limit=1)
+
+    with db.bind_ctx([Task]), patch('app.db.export.export_slots', slots):
+        running = stream_query(Task.select(Task.id), batch_size=1)
+        next(running)
+        with pytest.raises(ExportsBusy):
+            next(stream_query(Task.select(Task.id), batch_size=1))
+        assert db._connect.call_count == 1  # The rejected export opened no connection
+        list(running)
+
+    assert slots.stats() == {"in_use": 0, "limit": 1, "rejected": 1}  # The finished export gave its slot back
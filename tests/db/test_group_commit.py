@@ -0,0 +1,76 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.db.group_commit import GroupCommit
+
+
+class HeldFlush:
+    """Flush whose first call blocks until released, and that fails any batch holding a 'bad' item."""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, items):
+        self.started.set()
+        self.release.wait(5)
+        self.batches.append(list(items))
+        if "bad" in items:
+            raise ValueError("bad item")
+        return [f"row-{item}" for item in items]
+
+
+def submit_behind_a_flush(group, flush, items):
+    """Submit ``items`` while a first item is being flushed; returns the futures, the first item's first."""
+    with ThreadPoolExecutor(max_workers=len(items) + 1) as pool:
+        first = pool.submit(group.submit, "first")
+        flush.started.wait(5)
+        futures = [pool.submit(group.submit, item) for item in items]
+        while group.stats()["pending"] < len(items):
+            threading.Event().wait(0.001)
+        flush.release.set()
+        return [first, *futures]
+
+
+def test_single_submit_is_flushed_at_once():
+    flush = HeldFlush()
+    flush.release.set()
+    group = GroupCommit(flush, max_batch_size=10, max_delay=5)  # A lone writer does not wait out the delay
+
+    assert group.submit("a") == "row-a"
+    assert flush.batches == [["a"]]
+    assert group.stats()["batches"] == 1
+
+def test_submits_during_a_flush_share_the_next_batch():
+    flush = HeldFlush()
+    group = GroupCommit(flush, max_batch_size=10, max_delay=5)
+
+    results = [future.result(5) for future in submit_behind_a_flush(group, flush, list(range(8)))]
+
+    assert results == ["row-first"] + [f"row-{i}" for i in range(8)]  # Every caller gets its own row
+    assert flush.batches[0] == ["first"] and sorted(flush.batches[1]) == list(range(8))
+    assert group.stats()["largest_batch"] == 8
+
+def test_overflow_goes_to_the_next_leader():
+    flush = HeldFlush()
+    group = GroupCommit(flush, max_batch_size=2, max_delay=5)
+
+    results = [future.result(5) for future in submit_behind_a_flush(group, flush, list(range(4)))]
+
+    assert results == ["row-first"] + [f"row-{i}" for i in range(4)]
+    assert [len(batch) for batch in flush.batches] == [1, 2, 2]
+    assert group.stats()["pending"] == 0
+
+def test_failed_batch_is_retried_item_by_item():
+    flush = HeldFlush()
+    group = GroupCommit(flush, max_batch_size=10, max_delay=5)
+
+    first, a, bad, c = submit_behind_a_flush(group, flush, ["a", "bad", "c"])
+
+    assert (a.result(5), c.result(5)) == ("row-a", "row-c")
+    with pytest.raises(ValueError, match="bad item"):
+        bad.result(5)
+    assert group.stats()["failed_batches"] == 1
@@ -0,0 +1,148 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from peewee import SqliteDatabase
+
+from app.db.migrations import (LATEST_VERSION, MIGRATIONS, Migration, SchemaVersionError, check_schema,
+                               current_version, upgrade)
+from app.db.migrations.__main__ import main
+from app.db.migrations.operations import create_index_concurrently
+
+
+@pytest.fixture
+def sqlite_db():
+    db = SqliteDatabase(':memory:')
+    db.connect()  # An in-memory database lives as long as its connection
+    yield db
+    db.close()
+
+def test_migrations_are_numbered_in_order():
+    assert [migration.version for migration in MIGRATIONS] == list(range(1, LATEST_VERSION + 1))
+
+def test_upgrade_builds_schema_from_scratch(sqlite_db):
+    applied = upgrade(sqlite_db)
+
+    assert [migration.version for migration in applied] == list(range(1, LATEST_VERSION + 1))
+    assert current_version(sqlite_db) == LATEST_VERSION
+    assert {'tasks', 'users', 'table_versions', 'schema_version', 'audit_log'} <= set(sqlite_db.get_tables())
+    assert 'task_created_at_id' in {index.name for index in sqlite_db.get_indexes('tasks')}
+    assert 'owner_id' in {column.name for column in sqlite_db.get_columns('tasks')}
+    owner_index = {index.name: index for index in sqlite_db.get_indexes('tasks')}['task_owner_id_status_created_at_id']
+    assert owner_index.columns == ['owner_id', 'status', 'created_at', 'id', 'title']  # INCLUDE folded into the key
+    assert 'WHERE rank IS NOT NULL' in sqlite_db.execute_sql(
+        "SELECT sql FROM sqlite_master WHERE name = 'task_owner_id_status_rank'").fetchone()[0]
+    assert upgrade(sqlite_db) == []  # Already up to date
+
+def test_upgrade_stops_at_target(sqlite_db):
+    upgrade(sqlite_db, target=1)
+
+    assert current_version(sqlite_db) == 1
+    assert 'tasks' in sqlite_db.get_tables()
+
+def test_older_target_installs_the_triggers_of_its_version(sqlite_db):
+    events = []
+    sqlite_db.register_function(events.append, 'notify_task_change', 1)
+    upgrade(sqlite_db, target=2)
+
+    # Migration 2's change trigger predates task owners, so writes at version 2 must not read one
+    sqlite_db.execute_sql("INSERT INTO tasks (title, status, created_at) VALUES ('One', 'todo', '2025-01-01')")
+
+    assert json.loads(events[0]) == {"op": "insert", "id": 1,
+                                     "task": {"id": 1, "title": "One", "description": None, "status": "todo"}}
+
+def test_table_version_slots_keep_the_version(sqlite_db):
+    sqlite_db.register_function(lambda payload: None, 'notify_task_change', 1)
+    upgrade(sqlite_db, target=10)
+    sqlite_db.execute_sql("INSERT INTO tasks (title, status, created_at) VALUES ('One', 'todo', '2025-01-01')")
+    upgrade(sqlite_db)
+
+    sqlite_db.execute_sql("UPDATE tasks SET status = 'done'")
+
+    assert sqlite_db.execute_sql("SELECT slot, version FROM table_versions WHERE table_name = 'tasks'"
+                                 ).fetchall() == [(0, 2)]
+
+def test_status_count_slots_keep_the_counts(sqlite_db):
+    sqlite_db.register_function(lambda payload: None, 'notify_task_change', 1)
+    upgrade(sqlite_db, target=11)
+    sqlite_db.execute_sql("INSERT INTO tasks (title, status, created_at) VALUES ('One', 'todo', '2025-01-01')")
+    upgrade(sqlite_db, target=12)
+
+    sqlite_db.execute_sql("UPDATE tasks SET status = 'done'")
+
+    assert sqlite_db.execute_sql("SELECT status, slot, task_count FROM task_status_counts ORDER BY status"
+                                 ).fetchall() == [('done', 0, 1), ('todo', 0, 0)]
+
+def test_status_counts_are_recounted_by_owner(sqlite_db):
+    sqlite_db.register_function(lambda payload: None, 'notify_task_change', 1)
+    upgrade(sqlite_db, target=12)
+    sqlite_db.execute_sql("INSERT INTO tasks (title, status, created_at, owner_id) "
+                          "VALUES ('One', 'todo', '2025-01-01', 1)")
+    sqlite_db.execute_sql("INSERT INTO tasks (title, status, created_at) VALUES ('Two', 'todo', '2025-01-02')")
+    upgrade(sqlite_db)
+
+    sqlite_db.execute_sql("UPDATE tasks SET status = 'done' WHERE owner_id = 1")
+
+    assert sqlite_db.execute_sql("SELECT owner_id, status, task_count FROM task_status_counts "
+                                 "ORDER BY owner_id, status"
+                                 ).fetchall() == [(0, 'todo', 1), (1, 'done', 1), (1, 'todo', 0)]
+
+def test_failed_migration_is_not_recorded(sqlite_db):
+    def broken(database):
+        database.execute_sql("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        upgrade(sqlite_db, migrations=[Migration(1, "broken", broken)])
+
+    assert current_version(sqlite_db) == 0
+    assert 'half_done' not in sqlite_db.get_tables()  # Rolled back with its transaction
+
+def test_check_schema(sqlite_db):
+    with pytest.raises(SchemaVersionError, match="version 0"):
+        check_schema(sqlite_db)  # Never migrated
+
+    upgrade(sqlite_db)
+    assert check_schema(sqlite_db) == LATEST_VERSION
+
+def test_create_index_concurrently_rebuilds_invalid_index():
+    db = MagicMock()
+    # A plain table, then the invalid index a failed build left behind
+    db.execute_sql.return_value.fetchone.side_effect = [('r',), (False,)]
+
+    create_index_concurrently(db, 'task_title', 'tasks', 'title')
+
+    statements = [call.args[0] for call in db.execute_sql.call_args_list]
+    assert statements[2] == "DROP INDEX CONCURRENTLY IF EXISTS task_title"
+    assert statements[3] == "CREATE INDEX CONCURRENTLY IF NOT EXISTS task_title ON tasks (title)"
+
+def test_create_index_concurrently_on_partitioned_table():
+    db = MagicMock()
+    db.execute_sql.return_value.fetchone.side_effect = [('p',), None, None]  # Partitioned; child index missing
+    db.execute_sql.return_value.fetchall.return_value = [('tasks_p2026_10',)]
+
+    create_index_concurrently(db, 'task_created_at_brin', 'tasks', 'created_at', using='brin')
+
+    statements = [call.args[0] for call in db.execute_sql.call_args_list]
+    assert "CREATE INDEX IF NOT EXISTS task_created_at_brin ON ONLY tasks USING brin (created_at)" in statements
+    assert ("CREATE INDEX CONCURRENTLY IF NOT EXISTS tasks_p2026_10_task_created_at_brin ON tasks_p2026_10 "
+            "USING brin (created_at)") in statements
+    assert statements[-1] == "ALTER INDEX task_created_at_brin ATTACH PARTITION tasks_p2026_10_task_created_at_brin"
+
+def test_create_index_concurrently_with_included_columns_and_predicate():
+    db = MagicMock()
+    db.execute_sql.return_value.fetchone.side_effect = [('r',), None]
+
+    create_index_concurrently(db, 'task_owner', 'tasks', 'owner_id, status', include='title', where='rank IS NULL')
+
+    assert db.execute_sql.call_args.args[0] == (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS task_owner ON tasks (owner_id, status) INCLUDE (title) "
+        "WHERE rank IS NULL")
+
+def test_cli_status_and_upgrade(sqlite_db, capsys):
+    assert main(["status"], database=sqlite_db) == 0
+    assert f"Schema version 0, latest {LATEST_VERSION}" in capsys.readouterr().out
+
+    assert main(["upgrade"], database=sqlite_db) == 0
+    assert f"Applied {LATEST_VERSION} migration(s)" in capsys.readouterr().out
+    assert current_version(sqlite_db) == LATEST_VERSION
@@ -0,0 +1,187 @@
+import os
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+from urllib.parse import urlsplit
+
+import pytest
+from peewee import OperationalError, PostgresqlDatabase, SqliteDatabase
+
+from app.db import partitions
+from app.db.migrations import upgrade
+
+
+@pytest.fixture
+def sqlite_db():
+    db = SqliteDatabase(':memory:')
+    db.connect()
+    upgrade(db)
+    db.register_function(lambda payload: None, 'notify_task_change', 1)  # Registered by the change listener in the app
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def postgres_db():
+    # A database of its own on the server the suite runs against, so its tables are left alone
+    url = os.getenv('DATABASE_PUBLIC_URL', '')
+    if not url.startswith('postgres'):
+        pytest.skip("Needs Postgres at DATABASE_PUBLIC_URL")
+    name = f"test_partitions_{os.getpid()}"
+    server = PostgresqlDatabase(url)
+    try:
+        server.connect()
+    except OperationalError:
+        pytest.skip("Postgres at DATABASE_PUBLIC_URL is not reachable")
+    server.execute_sql(f"DROP DATABASE IF EXISTS {name}")
+    server.execute_sql(f"CREATE DATABASE {name}")
+    db = PostgresqlDatabase(urlsplit(url)._replace(path=f"/{name}").geturl())
+    db.connect()
+    upgrade(db)
+    yield db
+    db.close()
+    server.execute_sql(f"DROP DATABASE {name}")
+    server.close()
+
+
+def insert_task(db, title: str, created_at: datetime, status: str = 'todo'):
+    db.execute_sql("INSERT INTO tasks (title, description, status, created_at) VALUES (%s, '', %s, %s)",
+                   (title, status, created_at))
+
+def test_month_arithmetic():
+    assert partitions.month_start(date(2026, 10, 19)) == date(2026, 10, 1)
+    assert partitions.add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert partitions.add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert partitions.partition_name(date(2027, 1, 1)) == 'tasks_p2027_01'
+
+def test_partition_bounds_are_parsed():
+    db = MagicMock()
+    db.execute_sql.return_value.fetchall.return_value = [
+        ('tasks_p_legacy', "FOR VALUES FROM (MINVALUE) TO ('2026-11-01 00:00:00')"),
+        ('tasks_p2026_11', "FOR VALUES FROM ('2026-11-01 00:00:00') TO ('2026-12-01 00:00:00')"),
+        ('tasks_p_default', "DEFAULT"),
+    ]
+
+    assert partitions.partition_bounds(db) == [
+        ('tasks_p_legacy', None, date(2026, 11, 1)),
+        ('tasks_p2026_11', date(2026, 11, 1), date(2026, 12, 1)),
+    ]
+
+def test_ensure_partitions_only_creates_missing_months():
+    db = MagicMock()
+    db.execute_sql.return_value.fetchone.return_value = (False,)  # Nothing of those months in the DEFAULT partition
+    bounds = [('tasks_p_legacy', None, date(2026, 11, 1)), ('tasks_p2026_11', date(2026, 11, 1), date(2026, 12, 1))]
+    with patch.object(partitions, 'is_partitioned', return_value=True), \
+            patch.object(partitions, 'partition_bounds', return_value=bounds):
+        created = partitions.ensure_partitions(db, months_ahead=2, today=date(2026, 10, 19))
+
+    assert created == ['tasks_p2026_12']
+    db.execute_sql.assert_any_call("CREATE TABLE IF NOT EXISTS tasks_p_default PARTITION OF tasks DEFAULT")
+    db.execute_sql.assert_any_call("CREATE TABLE tasks_p2026_12 PARTITION OF tasks "
+                                   "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')")
+
+def test_ensure_partitions_moves_rows_out_of_default_partition():
+    db = MagicMock()
+    db.execute_sql.return_value.fetchone.return_value = (True,)
+    db.execute_sql.return_value.fetchall.return_value = [('id',), ('title',)]
+    with patch.object(partitions, 'is_partitioned', return_value=True), \
+            patch.object(partitions, 'partition_bounds', return_value=[]):
+        created = partitions.ensure_partitions(db, months_ahead=0, today=date(2026, 10, 19))
+
+    statements = [call.args[0] for call in db.execute_sql.call_args_list]
+    assert created == ['tasks_p2026_10']
+    assert "CREATE TABLE tasks_p2026_10 (LIKE tasks INCLUDING DEFAULTS INCLUDING GENERATED)" in statements
+    assert "WITH moved AS (DELETE FROM tasks_p_default WHERE created_at >= %s AND created_at < %s " \
+           "RETURNING id, title) INSERT INTO tasks_p2026_10 (id, title) SELECT id, title FROM moved" in statements
+    assert statements[-1] == ("ALTER TABLE tasks ATTACH PARTITION tasks_p2026_10 "
+                              "FOR VALUES FROM ('2026-10-01') TO ('2026-11-01')")
+
+def test_archive_partitions_moves_old_partitions():
+    db = MagicMock()
+    bounds = [('tasks_p_legacy', None, date(2025, 11, 1)), ('tasks_p2025_11', date(2025, 11, 1), date(2025, 12, 1))]
+    db.execute_sql.return_value.fetchone.return_value = (False,)  # No detach pending
+    with patch.object(partitions, 'partition_bounds', return_value=bounds), \
+            patch.object(partitions, 'detached_partitions', return_value=[]):
+        archived = partitions.archive_partitions(db, cutoff=date(2025, 11, 1), mode='move')
+
+    statements = [call.args[0] for call in db.execute_sql.call_args_list]
+    assert archived == 1
+    assert "ALTER TABLE tasks DETACH PARTITION tasks_p_legacy" in statements
+    assert "INSERT INTO tasks_archive (id, title, description, status, created_at) " \
+           "SELECT id, title, description, status, created_at FROM tasks_p_legacy" in statements
+    assert "DROP TABLE tasks_p_legacy" in statements
+    assert any(sql.startswith("INSERT INTO task_status_counts") and "FROM tasks_p_legacy" in sql for sql in statements)
+    assert not any("tasks_p2025_11" in sql for sql in statements)
+    assert any(sql.startswith("INSERT INTO table_versions") for sql in statements)
+
+def test_archive_partitions_finishes_interrupted_detach():
+    db = MagicMock()
+    db.execute_sql.return_value.fetchone.return_value = (True,)  # Detach pending
+    with patch.object(partitions, 'partition_bounds', return_value=[('tasks_p2025_01', None, date(2025, 2, 1))]), \
+            patch.object(partitions, 'detached_partitions', return_value=[]):
+        partitions.archive_partitions(db, cutoff=date(2025, 6, 1), mode='detach')
+
+    statements = [call.args[0] for call in db.execute_sql.call_args_list]
+    assert "ALTER TABLE tasks DETACH PARTITION tasks_p2025_01 FINALIZE" in statements
+    assert "ALTER TABLE tasks_p2025_01 RENAME TO tasks_archive_p2025_01" in statements
+def test_archive_partitions_finishes_partition_detached_by_earlier_run():
+    db = MagicMock()
+    with patch.object(partitions, 'partition_bounds', return_value=[]), \
+            patch.object(partitions, 'detached_partitions', return_value=['tasks_p2025_01']):
+        archived = partitions.archive_partitions(db, cutoff=date(2025, 6, 1), mode='move')
+
+    statements = [call.args[0] for call in db.execute_sql.call_args_list]
+    assert archived == 1
+    assert not any("DETACH" in sql for sql in statements)
+    assert "DROP TABLE tasks_p2025_01" in statements
+    db.atomic.assert_called_once()  # Taken off the counts and dropped together
+
+def test_archive_rows_moves_old_tasks_in_batches(sqlite_db):
+    for day in range(1, 6):
+        sqlite_db.execute_sql("INSERT INTO tasks (title, description, status, created_at) VALUES (?, '', 'todo', ?)",
+                              (f"Task {day}", datetime(2025, day, 1)))
+
+    moved = partitions.archive(sqlite_db, older_than_months=2, today=date(2025, 6, 15), batch_size=2)
+
+    assert moved == 3  # Cutoff is April 1st, two whole months before June
+    assert sqlite_db.execute_sql("SELECT title FROM tasks ORDER BY created_at").fetchall() == [("Task 4",), ("Task 5",)]
+    archived = sqlite_db.execute_sql("SELECT title FROM tasks_archive ORDER BY created_at").fetchall()
+    assert archived == [("Task 1",), ("Task 2",), ("Task 3",)]
+
+def test_sqlite_cannot_be_partitioned(sqlite_db):
+    assert partitions.is_partitioned(sqlite_db) is False
+    assert partitions.ensure_partitions(sqlite_db) == []
+    with pytest.raises(ValueError):
+        partitions.enable_partitioning(sqlite_db)
+
+def test_postgres_archive_detaches_partitions_beside_default_partition(postgres_db):
+    assert partitions.enable_partitioning(postgres_db, today=date(2026, 10, 19))
+    for title, created_at in (("Legacy", datetime(2026, 5, 1)), ("November", datetime(2026, 11, 10)),
+                              ("January", datetime(2027, 1, 5)), ("Far ahead", datetime(2030, 1, 1))):
+        insert_task(postgres_db, title, created_at)
+
+    archived = partitions.archive(postgres_db, older_than_months=12, today=date(2027, 12, 15), mode='move')
+
+    assert archived == 2  # The legacy and November partitions; the cutoff is December 1st 2026
+    assert [name for name, _, _ in partitions.partition_bounds(postgres_db)] == ['tasks_p2026_12', 'tasks_p2027_01']
+    remaining = postgres_db.execute_sql("SELECT title FROM tasks ORDER BY created_at").fetchall()
+    assert remaining == [("January",), ("Far ahead",)]
+    moved = postgres_db.execute_sql("SELECT title FROM tasks_archive ORDER BY created_at").fetchall()
+    assert moved == [("Legacy",), ("November",)]
+    assert postgres_db.execute_sql("SELECT SUM(task_count) FROM task_status_counts").fetchone()[0] == 2
+    assert partitions.detached_partitions(postgres_db) == []
+
+def test_postgres_detach_gives_way_to_running_queries(postgres_db):
+    partitions.enable_partitioning(postgres_db, today=date(2026, 10, 19))
+    reader = PostgresqlDatabase(postgres_db.database, **postgres_db.connect_params)
+    reader.connect()
+    try:
+        with reader.atomic():
+            reader.execute_sql("SELECT COUNT(*) FROM tasks")  # Holds its lock on tasks until the block ends
+            with patch.object(partitions, 'DDL_LOCK_TIMEOUT', '50ms'), pytest.raises(OperationalError):
+                partitions._detach(postgres_db, 'tasks_p_legacy', attempts=2, pause=0)
+    finally:
+        reader.close()
+
+    assert 'tasks_p_legacy' in [name for name, _, _ in partitions.partition_bounds(postgres_db)]
+    partitions._detach(postgres_db, 'tasks_p_legacy')
+    assert partitions.detached_partitions(postgres_db) == ['tasks_p_legacy']
@@ -0,0 +1,155 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from peewee import SqliteDatabase
+
+from app.db.ranks import (RankRebalancer, RANK_LOCK_CLASS, lock_column, long_rank_columns, main, place,
+                          rank_unranked, rebalance)
+from app.models.task_models import Task
+
+
+@pytest.fixture
+def sqlite_db():
+    db = SqliteDatabase(':memory:')
+    with db.bind_ctx([Task]):
+        db.create_tables([Task])
+        for i in range(1, 6):
+            Task.create(id=i, title=f"Task {i}", description="d", status="todo", created_at=datetime(2024, 1, 6 - i))
+        Task.create(id=6, title="Done", description="d", status="done", created_at=datetime(2024, 1, 1))
+        yield db
+    db.close()
+
+def column(status="todo"):
+    # Board order: ranked tasks first, then the others oldest first
+    query = Task.select().where(Task.status == status)
+    return [task.id for task in query.order_by(Task.rank.asc(nulls='LAST'), Task.created_at, Task.id)]
+
+def move(db, task_id, **anchor):
+    Task.update(rank=place(db, task_id, "todo", **anchor)).where(Task.id == task_id).execute()
+
+def test_move_to_top_writes_one_row(sqlite_db):
+    move(sqlite_db, 3)
+
+    assert column() == [3, 5, 4, 2, 1]
+    assert Task.select().where(Task.rank.is_null(False)).count() == 1
+
+def test_move_after_unranked_task_ranks_the_tasks_above_it_once(sqlite_db):
+    move(sqlite_db, 5, after_id=3)
+
+    assert column() == [4, 3, 5, 2, 1]
+    # Ranked up to the anchor; the rest still follow the ranked tasks
+    assert [task.id for task in Task.select().where(Task.rank.is_null()).order_by(Task.id)] == [1, 2, 6]
+
+    move(sqlite_db, 5, after_id=2)
+
+    assert column() == [4, 3, 2, 5, 1]
+    assert Task.get_by_id(6).rank is None  # Other columns are left alone
+
+    ranks = {task.id: task.rank for task in Task.select()}
+    move(sqlite_db, 1, before_id=4)
+
+    assert column() == [1, 4, 3, 2, 5]
+    changed = [task.id for task in Task.select() if task.rank != ranks[task.id]]
+    assert changed == [1]
+
+def test_place_rejects_bad_anchor(sqlite_db):
+    with pytest.raises(ValueError, match="not in the 'todo' column"):
+        place(sqlite_db, 1, "todo", after_id=6)
+    with pytest.raises(ValueError, match="not in the 'todo' column"):
+        place(sqlite_db, 1, "todo", before_id=999)
+    with pytest.raises(ValueError, match="itself"):
+        place(sqlite_db, 1, "todo", after_id=1)
+
+def test_rank_unranked_follows_ranked_tasks(sqlite_db):
+    Task.update(rank="V").where(Task.id == 1).execute()
+
+    assert rank_unranked(sqlite_db, "todo", through=(Task.get_by_id(4).created_at, 4)) == 2
+
+    assert column() == [1, 5, 4, 3, 2]
+    assert rank_unranked(sqlite_db, "todo") == 2
+    assert rank_unranked(sqlite_db, "todo") == 0
+
+def test_rebalance_shortens_ranks_and_keeps_order(sqlite_db):
+    for task_id in (1, 2, 3):
+        move(sqlite_db, task_id, after_id=5)  # Splits the same gap again and again
+    order = column()
+
+    assert sorted(rebalance(sqlite_db, "todo")) == [1, 2, 3, 5]  # Task 4 was never ranked
+
+    assert column() == order
+    assert max(len(task.rank) for task in Task.select().where(Task.rank.is_null(False))) == 1
+
+def test_long_rank_columns(sqlite_db):
+    Task.update(rank="V" * 30).where(Task.id == 1).execute()
+    Task.update(rank="V" * 25, owner=7).where(Task.id == 2).execute()
+    Task.update(rank="V").where(Task.id == 6).execute()
+
+    assert long_rank_columns(sqlite_db, max_length=24) == [("todo", None), ("todo", 7)]
+
+def test_owner_columns_are_ordered_apart(sqlite_db):
+    Task.update(owner=7).where(Task.id.in_([1, 3, 5])).execute()
+    Task.update(owner=8).where(Task.id.in_([2, 4])).execute()
+
+    Task.update(rank=place(sqlite_db, 1, "todo", owner_id=7)).where(Task.id == 1).execute()
+    Task.update(rank=place(sqlite_db, 5, "todo", after_id=3, owner_id=7)).where(Task.id == 5).execute()
+
+    owned = [task_id for task_id in column() if task_id in (1, 3, 5)]
+    assert owned == [1, 3, 5]
+    assert Task.get_by_id(4).rank is None  # Other owners' tasks are left alone
+    with pytest.raises(ValueError):
+        place(sqlite_db, 1, "todo", after_id=2, owner_id=7)
+    assert sorted(rebalance(sqlite_db, "todo", owner_id=7)) == [1, 3, 5]
+
+def test_lock_column():
+    db = MagicMock()
+
+    lock_column(db, "todo")
+
+    db.execute_sql.assert_called_once_with("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (RANK_LOCK_CLASS, "todo"))
+    lock_column(db, "todo", owner_id=7)
+    db.execute_sql.assert_called_with("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (RANK_LOCK_CLASS, "7:todo"))
+    lock_column(SqliteDatabase(':memory:'), "todo")  # One writer at a time already
+
+def test_rebalancer_merges_requests():
+    rebalanced = []
+    rebalancer = RankRebalancer(lambda status: rebalanced.append(status) or 3)
+    rebalancer._thread = MagicMock(is_alive=lambda: True)  # Run the queue on this thread instead
+
+    for status in ("todo", "done", "todo"):
+        rebalancer.request(status)
+    assert rebalancer.stats()["pending"] == 2
+    rebalancer.run_pending()
+
+    assert rebalanced == ["todo", "done"]
+    assert rebalancer.stats() == {"rebalances": 2, "rows": 6, "failures": 0, "pending": 0}
+
+def test_rebalancer_keeps_owner_columns_apart():
+    rebalanced = []
+    rebalancer = RankRebalancer(lambda status, owner_id: rebalanced.append((status, owner_id)) or 1)
+    rebalancer._thread = MagicMock(is_alive=lambda: True)
+
+    for owner_id in (7, 8, 7):
+        rebalancer.request("todo", owner_id)
+    rebalancer.run_pending()
+
+    assert rebalanced == [("todo", 7), ("todo", 8)]
+
+def test_rebalancer_counts_failures():
+    rebalancer = RankRebalancer(MagicMock(side_effect=RuntimeError("boom")))
+    rebalancer._thread = MagicMock(is_alive=lambda: True)
+
+    rebalancer.request("todo")
+    rebalancer.run_pending()
+
+    assert rebalancer.stats()["failures"] == 1
+
+def test_cli_rebalance(sqlite_db, capsys):
+    Task.update(rank="V" * 30).where(Task.id == 1).execute()
+    Task.update(rank="W").where(Task.id == 6).execute()
+
+    assert main(["rebalance"], database=sqlite_db) == 0
+
+    assert "Rebalanced 1 task(s) in 1 column(s)" in capsys.readouterr().out
+    assert Task.get_by_id(1).rank == "V"
+    assert Task.get_by_id(6).rank == "W"  # Its keys were short already
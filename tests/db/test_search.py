@@ -0,0 +1,107 @@
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock
+from peewee import SqliteDatabase
+
+from app.db.search import get_task_search, search_terms, PostgresTaskSearch, SqliteTaskSearch, TaskSearch
+from app.models.task_models import Task
+from app.utils.pagination import encode_rank_cursor
+
+
+@pytest.fixture
+def sqlite_search():
+    db = SqliteDatabase(':memory:')
+    with db.bind_ctx([Task]):
+        db.create_tables([Task])
+        Task.create(id=1, title="Write report", description="Quarterly numbers", status="todo",
+                    created_at=datetime(2024, 1, 1))
+        search = get_task_search(db)
+        search.install()
+        # Rows written after install reach the index through the triggers
+        for i, (title, description) in enumerate([("Fix bug", "Reported by QA"), ("Report", None),
+                                                  ("Lunch", "Nothing to see")], start=2):
+            Task.create(id=i, title=title, description=description, status="todo", created_at=datetime(2024, 1, 1))
+        yield search
+    db.close()
+
+def test_search_terms_drop_syntax():
+    assert search_terms("Rep* & (bug) | 'x'") == ["rep", "bug", "x"]
+
+def test_get_task_search_picks_backend():
+    assert isinstance(get_task_search(SqliteDatabase(':memory:')), SqliteTaskSearch)
+    assert isinstance(get_task_search(MagicMock()), PostgresTaskSearch)
+
+def test_sqlite_search_prefix_and_rank(sqlite_search):
+    rows, cursor = sqlite_search.search("rep", limit=10)
+
+    assert {row["id"] for row in rows} == {1, 2, 3}
+    assert rows[0] == {"id": 3, "title": "Report", "description": None, "status": "todo"}
+    assert cursor is None
+
+def test_sqlite_search_requires_all_terms(sqlite_search):
+    rows, _ = sqlite_search.search("report quarterly", limit=10)
+
+    assert [row["id"] for row in rows] == [1]
+
+def test_sqlite_search_pages(sqlite_search):
+    first, cursor = sqlite_search.search("rep", limit=2)
+    second, last_cursor = sqlite_search.search("rep", limit=2, cursor=cursor)
+
+    assert len(first) == 2
+    assert [row["id"] for row in first + second] == [row["id"] for row in sqlite_search.search("rep", limit=10)[0]]
+    assert last_cursor is None
+
+def test_sqlite_search_follows_updates_and_deletes(sqlite_search):
+    Task.update(title="Dinner").where(Task.id == 3).execute()
+    Task.delete().where(Task.id == 1).execute()
+
+    rows, _ = sqlite_search.search("rep", limit=10)
+
+    assert [row["id"] for row in rows] == [2]
+
+def test_sqlite_search_by_owner(sqlite_search):
+    Task.update(owner=7).where(Task.id.in_([1, 4])).execute()
+
+    rows, _ = sqlite_search.search("rep", limit=10, owner_id=7)
+
+    assert [row["id"] for row in rows] == [1]
+
+def test_search_without_terms(sqlite_search):
+    assert sqlite_search.search("&&", limit=10) == ([], None)
+
+def test_postgres_search_query():
+    database = MagicMock()
+    database.execute_sql.return_value.description = [("id",), ("title",), ("description",), ("status",), ("rank",)]
+    database.execute_sql.return_value.fetchall.return_value = [(1, "a", None, "todo", 0.5), (2, "b", None, "todo", 0.25)]
+
+    rows, cursor = PostgresTaskSearch(database).search("Rep bug", limit=1, cursor=encode_rank_cursor(0.75, 9))
+
+    sql, params = database.execute_sql.call_args.args
+    assert "search_vector @@ query" in sql
+    assert params == ["rep:* & bug:*", 0.75, 9, 2]
+    assert rows == [{"id": 1, "title": "a", "description": None, "status": "todo"}]
+    assert cursor == encode_rank_cursor(0.5, 1)
+
+def test_postgres_search_by_owner():
+    database = MagicMock()
+    database.execute_sql.return_value.description = [("id",), ("title",), ("description",), ("status",), ("rank",)]
+    database.execute_sql.return_value.fetchall.return_value = []
+
+    PostgresTaskSearch(database).search("bug", limit=5, cursor=encode_rank_cursor(0.75, 9), owner_id=7)
+
+    sql, params = database.execute_sql.call_args.args
+    assert "AND t.owner_id = %s AND (ts_rank" in sql
+    assert params == ["bug:*", 7, 0.75, 9, 6]
+
+def test_postgres_search_install():
+    database = MagicMock()
+
+    PostgresTaskSearch(database).install()
+
+    statements = [call.args[0] for call in database.execute_sql.call_args_list]
+    assert "GENERATED ALWAYS AS" in statements[0]
+    assert "USING GIN (search_vector)" in statements[1]
+
+def test_task_search_needs_a_backend():
+    with pytest.raises(TypeError):
+        TaskSearch(MagicMock())
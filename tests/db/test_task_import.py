@@ -0,0 +1,130 @@
+import io
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from peewee import SqliteDatabase
+
+from app.db.task_import import (CopyStream, PostgresTaskImporter, SqliteTaskImporter, TaskImporter, TaskImportError,
+                                copy_chunks, get_task_importer, import_format, main, validated_rows)
+from app.models.task_models import Task
+
+
+@pytest.fixture
+def sqlite_db():
+    db = SqliteDatabase(':memory:')
+    with db.bind_ctx([Task]):
+        db.create_tables([Task])
+        yield db
+    db.close()
+
+def test_get_task_importer_picks_backend():
+    assert isinstance(get_task_importer(SqliteDatabase(':memory:')), SqliteTaskImporter)
+    assert isinstance(get_task_importer(MagicMock()), PostgresTaskImporter)
+
+def test_import_format_from_file_name():
+    assert import_format("tasks.CSV") == "csv"
+    assert import_format("export.jsonl") == "ndjson"
+    assert import_format("tasks.txt") is None
+
+def test_validated_rows_collects_errors_and_stops_at_limit():
+    records = [(1, {"title": "One", "created_at": "2025-03-01T10:00:00+02:00"}), (2, {"description": "x"}),
+               (3, None), (4, {"title": "Four"})]
+    errors = []
+
+    rows = list(validated_rows(records, errors, max_errors=2))
+
+    assert rows == [("One", None, "todo", datetime(2025, 3, 1, 8))]  # Stored as naive UTC
+    assert errors == [{"index": 2, "detail": "title: Field required"},
+                      {"index": 3, "detail": "Row is not a JSON object."}]
+
+def test_copy_chunks_escape_text_format():
+    rows = [("Tab\there", "back\\slash\nnewline", "todo", None), ("Two", None, "done", datetime(2024, 1, 2))]
+
+    data = b"".join(copy_chunks(rows, chunk_size=1))
+
+    assert data == (b"Tab\\there\tback\\\\slash\\nnewline\ttodo\t\\N\n"
+                    b"Two\t\\N\tdone\t2024-01-02T00:00:00\n")
+
+def test_copy_stream_reads_across_chunks():
+    stream = CopyStream(iter([b"abc", b"de", b"f"]))
+
+    assert [stream.read(4), stream.read(4), stream.read(4)] == [b"abcd", b"ef", b""]
+
+def test_sqlite_import_ndjson(sqlite_db):
+    upload = io.BytesIO(b'{"title": "One", "description": "d", "status": "done"}\n'
+                        b'{"title": "Two", "created_at": "2024-01-02T00:00:00"}\n')
+
+    assert get_task_importer(sqlite_db).import_tasks(upload, "ndjson") == 2
+
+    tasks = list(Task.select().order_by(Task.id))
+    assert [(task.title, task.description, task.status) for task in tasks] == [("One", "d", "done"),
+                                                                                ("Two", None, "todo")]
+    assert tasks[1].created_at == datetime(2024, 1, 2)
+    assert tasks[0].owner_id is None
+
+def test_sqlite_import_for_owner(sqlite_db):
+    get_task_importer(sqlite_db).import_tasks(io.BytesIO(b'{"title": "One"}\n'), "ndjson", owner_id=7)
+
+    assert Task.get().owner_id == 7
+
+def test_sqlite_import_is_all_or_nothing(sqlite_db):
+    upload = io.BytesIO(b"title,status\nGood,todo\n" + b"x" * 101 + b",todo\n")
+
+    with pytest.raises(TaskImportError) as error:
+        get_task_importer(sqlite_db).import_tasks(upload, "csv")
+
+    assert error.value.errors == [{"index": 2, "detail": "title: String should have at most 100 characters"}]
+    assert Task.select().count() == 0
+
+def test_unreadable_upload(sqlite_db):
+    with pytest.raises(TaskImportError, match="1 error"):
+        get_task_importer(sqlite_db).import_tasks(io.BytesIO(b"\xff\xfe"), "ndjson")
+
+def test_postgres_import_copies_then_merges_once():
+    db = MagicMock()
+    db.execute_sql.return_value.rowcount = 2
+    copied = []
+    db.cursor.return_value.copy_expert.side_effect = lambda sql, stream, size: copied.append((sql, stream.read()))
+
+    imported = PostgresTaskImporter(db).import_tasks(io.BytesIO(b'{"title": "One"}\n{"title": "Two"}\n'), "ndjson")
+
+    statements = [call.args[0] for call in db.execute_sql.call_args_list]
+    assert imported == 2
+    assert statements[0].startswith("CREATE TEMPORARY TABLE tasks_import")
+    assert copied == [("COPY tasks_import (title, description, status, created_at) FROM STDIN",
+                       b"One\t\\N\ttodo\t\\N\nTwo\t\\N\ttodo\t\\N\n")]
+    assert statements[2] == PostgresTaskImporter.MERGE_SQL  # After quieting the per-row change events
+    assert db.execute_sql.call_args_list[2].args[1] == (None,)  # No owner
+    db.execute_sql.assert_called_with("SELECT pg_notify(%s, %s)", ("task_changes", '{"op":"reset"}'))
+
+def test_postgres_import_reports_unreadable_upload():
+    db = MagicMock()
+    # psycopg2 turns an error raised by read() into a cancelled COPY
+    def copy_expert(sql, stream, size):
+        try:
+            stream.read(size)
+        except Exception:
+            raise RuntimeError("COPY from stdin failed")
+    db.cursor.return_value.copy_expert.side_effect = copy_expert
+
+    with pytest.raises(TaskImportError) as error:
+        PostgresTaskImporter(db).import_tasks(io.BytesIO(b"\xff\xfe"), "ndjson")
+
+    assert error.value.errors[0]["detail"].startswith("The upload could not be read: 'utf-8' codec")
+
+def test_cli_imports_file(sqlite_db, tmp_path, capsys):
+    path = tmp_path / "tasks.csv"
+    path.write_text("title,description,status\nOne,,todo\nTwo,d,done\n")
+
+    assert main([str(path)], database=sqlite_db) == 0
+    assert "Imported 2 task(s)" in capsys.readouterr().out
+
+    path.write_text("description\nno title\n")
+    assert main([str(path)], database=sqlite_db) == 1
+    assert "Row 1: title: Field required" in capsys.readouterr().err
+    assert Task.select().count() == 2
+
+def test_task_importer_needs_a_backend():
+    with pytest.raises(TypeError):
+        TaskImporter(MagicMock())
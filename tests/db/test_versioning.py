@@ -0,0 +1,36 @@
+from unittest.mock import MagicMock
+
+from peewee import SqliteDatabase
+
+from app.db.versioning import install_version_triggers
+from app.models.table_version_models import TableVersion
+from app.models.task_models import Task
+
+
+def test_sqlite_triggers_bump_version_on_every_write():
+    db = SqliteDatabase(':memory:')
+    with db.bind_ctx([Task, TableVersion]):
+        db.create_tables([Task, TableVersion])
+        install_version_triggers(db, ['tasks'])
+        install_version_triggers(db, ['tasks'])  # Idempotent
+        assert TableVersion.current('tasks') == 0
+
+        task = Task.create(title="One", description="", status="todo", created_at="2024-01-01 00:00:00")
+        assert TableVersion.current('tasks') == 1
+        Task.update(status="done").where(Task.id == task.id).execute()
+        assert TableVersion.current('tasks') == 2
+        Task.delete().execute()
+        assert TableVersion.current('tasks') == 3
+        assert TableVersion.current('users') == 0
+    db.close()
+
+def test_postgres_installs_statement_triggers():
+    db = MagicMock()
+    install_version_triggers(db, ['tasks', 'users'])
+
+    statements = [call.args[0] for call in db.execute_sql.call_args_list]
+    assert statements[0].startswith("CREATE OR REPLACE FUNCTION bump_table_version()")
+    assert "VALUES (TG_TABLE_NAME, mod(txid_current(), 64), 1) ON CONFLICT (table_name, slot)" in statements[0]
+    assert "CREATE TRIGGER tasks_bump_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON tasks" in statements[2]
+    assert "FOR EACH STATEMENT" in statements[4]
+    db.atomic.assert_called_once()
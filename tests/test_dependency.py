@@ -1,6 +1,12 @@
 # test_dependency.py
+import asyncio
+
 import pytest
 from unittest.mock import MagicMock
+
+from fastapi import HTTPException
+from playhouse.pool import MaxConnectionsExceeded
+
 from app.db.database import Database
 from app.dependencies import Dependency
 
@@ -23,26 +29,41 @@ def test_get_db_connects_and_yields_database(dependency_instance):
     # Arrange
     mock_db_instance = dependency_instance.db.database
 
-    # Act
-    db_gen = dependency_instance.get_db()
-    database = next(db_gen)  # Get the yielded value
+    async def scenario():
+        # Act
+        db_gen = dependency_instance.get_db()
+        database = await db_gen.__anext__()  # Get the yielded value
+        await db_gen.aclose()  # Clean up: close the generator to trigger cleanup
+        return database
+
+    database = asyncio.run(scenario())
 
     # Assert
-    assert dependency_instance.db.connect.called
+    dependency_instance.db.acquire.assert_awaited_once()
     assert database == mock_db_instance
 
-    # Clean up: close the generator to trigger cleanup
-    db_gen.close()
-
 def test_get_db_closes_connection(dependency_instance):
-    # Arrange
-    mock_db_instance = dependency_instance.db.database
+    async def scenario():
+        db_gen = dependency_instance.get_db()
+        await db_gen.__anext__()  # Get the yielded value
+        dependency_instance.db.release.assert_not_awaited()
+        await db_gen.aclose()  # Close the generator to trigger cleanup
 
     # Act
-    db_gen = dependency_instance.get_db()
-    next(db_gen)  # Get the yielded value
-    db_gen.close()  # Close the generator to trigger cleanup
+    asyncio.run(scenario())
 
     # Assert
-    assert dependency_instance.db.connect.called
-    assert dependency_instance.db.close.called
+    dependency_instance.db.acquire.assert_awaited_once()
+    dependency_instance.db.release.assert_awaited_once()
+
+def test_get_db_busy_pool_is_503(dependency_instance):
+    dependency_instance.db.acquire.side_effect = MaxConnectionsExceeded("Timed out")
+
+    async def scenario():
+        await dependency_instance.get_db().__anext__()
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(scenario())
+
+    assert exc_info.value.status_code == 503
+    dependency_instance.db.release.assert_not_awaited()
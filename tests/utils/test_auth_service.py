@@ -5,10 +5,19 @@ import jwt
 from datetime import datetime, timedelta
 from unittest.mock import MagicMock, patch
 from fastapi import HTTPException
-from peewee import DoesNotExist
+from argon2 import PasswordHasher
+from peewee import DoesNotExist, SqliteDatabase
 
+from app.crud.user_crud import invalidate_user, token_cache
 from app.models.user_models import User
-from app.utils.auth_service import AuthService
+from app.utils.auth_service import AuthService, store_rehashed_password
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    token_cache.clear()
+    yield
+    token_cache.clear()
 
 
 @pytest.fixture
@@ -64,16 +73,40 @@ def test_authenticate_user_success(mock_user_get, auth_service):
     mock_user.verify_password.return_value = True
     mock_user_get.return_value = mock_user
 
-    # Mock the password hasher to avoid actual hashing
-    with patch('argon2.PasswordHasher.verify') as mock_verify:
-        mock_verify.return_value = True
+    # Mock the password pool to avoid actual hashing
+    with patch('app.utils.auth_service.password_pool') as mock_pool:
+        mock_pool.verify.return_value = True
 
         # Authenticate the user
         user = auth_service.authenticate_user("testuser", "correctpassword")
 
         # Assertions
         assert user == mock_user
-        mock_verify.assert_called_once_with('hashedpassword', 'correctpassword')
+        mock_pool.verify.assert_called_once_with('hashedpassword', 'correctpassword')
+
+
+@patch('app.models.user_models.User.get')
+def test_authenticate_user_queues_rehash_of_outdated_hash(mock_user_get, auth_service):
+    outdated = PasswordHasher(time_cost=1, memory_cost=8, parallelism=1).hash('correctpassword')
+    mock_user_get.return_value = MagicMock(spec=User, id=1, password=outdated)
+
+    with patch('app.utils.auth_service.password_rehasher') as mock_rehasher:
+        assert auth_service.authenticate_user("testuser", "correctpassword") is mock_user_get.return_value
+        assert auth_service.authenticate_user("testuser", "wrongpassword") is None
+
+    mock_rehasher.request.assert_called_once_with(1, outdated, 'correctpassword')
+
+
+def test_store_rehashed_password_only_replaces_the_old_hash(tmp_path):
+    db = SqliteDatabase(str(tmp_path / 'users.db'))  # Outlives the connection the store opens and closes
+    with db.bind_ctx([User]):
+        db.create_tables([User])
+        User.create(id=1, username='testuser', email='a@b.com', password='old', created_at=datetime(2024, 1, 1))
+
+        assert store_rehashed_password(1, 'old', 'new') is True
+        assert store_rehashed_password(1, 'old', 'newer') is False  # Changed meanwhile, left alone
+        assert User.get_by_id(1).password == 'new'
+    db.close()
 
 
 @patch('app.models.user_models.User.get')
@@ -83,13 +116,13 @@ def test_authenticate_user_failure(mock_user_get, auth_service):
     mock_user.verify_password.return_value = False
     mock_user_get.return_value = mock_user
 
-    # Mock the password hasher to avoid actual hashing
-    with patch('argon2.PasswordHasher.verify') as mock_verify:
-        mock_verify.return_value = False
+    # Mock the password pool to avoid actual hashing
+    with patch('app.utils.auth_service.password_pool') as mock_pool:
+        mock_pool.verify.return_value = False
         user = auth_service.authenticate_user("testuser", "wrongpassword")
 
         assert user is None
-        mock_verify.assert_called_once()
+        mock_pool.verify.assert_called_once()
 
 
 @patch('app.models.user_models.User.get', side_effect=DoesNotExist)
@@ -113,6 +146,47 @@ def test_verify_token_success(mock_user_get, auth_service):
     assert user == mock_user
     mock_user_get.assert_called_once_with(User.username == "testuser")
 
+@patch('app.models.user_models.User.get')
+def test_verify_token_is_cached_until_user_changes(mock_user_get, auth_service):
+    mock_user_get.return_value = MagicMock(spec=User, id=1)
+    token = auth_service.create_access_token({"sub": "testuser"})
+
+    assert auth_service.cached_user(token) is None
+    user = auth_service.verify_token(token)
+    with patch('app.utils.auth_service.jwt.decode') as mock_decode:
+        assert auth_service.verify_token(token) is user
+        assert auth_service.cached_user(token) is user
+    mock_decode.assert_not_called()
+    mock_user_get.assert_called_once()
+
+    invalidate_user(1)  # The user was updated or deleted
+    assert auth_service.cached_user(token) is None
+    auth_service.verify_token(token)
+    assert mock_user_get.call_count == 2
+
+@patch('app.models.user_models.User.get')
+def test_verify_token_caches_until_token_expiry(mock_user_get, auth_service):
+    mock_user_get.return_value = MagicMock(spec=User, id=1)
+    token = auth_service.create_access_token({"sub": "testuser"}, expires_delta=timedelta(seconds=20))
+    without_expiry = jwt.encode({"sub": "testuser"}, os.getenv('SECRET_KEY'), algorithm=auth_service.ALGORITHM)
+
+    auth_service.verify_token(token)
+    auth_service.verify_token(without_expiry)
+
+    expires_at, _ = next(iter(token_cache._entries.values()))
+    assert 10 < expires_at - token_cache._clock() <= 20
+    assert token_cache.stats()["size"] == 1 and auth_service.cached_user(without_expiry) is None
+
+@patch('app.models.user_models.User.get')
+def test_verify_token_cache_is_capped_for_other_workers(mock_user_get, auth_service):
+    # A user deleted on another worker is only dropped from this cache when the entry runs out
+    mock_user_get.return_value = MagicMock(spec=User, id=1)
+
+    auth_service.verify_token(auth_service.create_access_token({"sub": "testuser"}))  # Valid for 30 minutes
+
+    expires_at, _ = next(iter(token_cache._entries.values()))
+    assert expires_at - token_cache._clock() <= token_cache.ttl <= 60
+
 @patch('app.models.user_models.User.get')
 def test_verify_token_invalid_token_missing_username(mock_user_get, auth_service):
     """Test verifying a valid JWT token."""
@@ -126,6 +200,14 @@ def test_verify_token_invalid_token_missing_username(mock_user_get, auth_service
     assert exc_info.value.status_code == 401
     assert exc_info.value.detail == "Could not validate credentials"
 
+def test_token_subject_needs_no_database(auth_service):
+    token = auth_service.create_access_token({"sub": "testuser"})
+
+    assert auth_service.token_subject(token) == "testuser"
+    with pytest.raises(HTTPException) as exc_info:
+        auth_service.token_subject(token + "x")
+    assert exc_info.value.status_code == 401
+
 @patch('app.models.user_models.User.get')
 def test_verify_token_invalid_token(mock_user_get, auth_service):
     """Test verifying an invalid JWT token."""
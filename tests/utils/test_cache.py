@@ -0,0 +1,145 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.utils.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def test_hit_after_miss(clock):
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    loader = MagicMock(return_value="value")
+
+    assert cache.get_or_load("key", loader) == "value"
+    assert cache.get_or_load("key", loader) == "value"
+
+    loader.assert_called_once()
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hit_rate"] == 0.5
+
+def test_entries_expire(clock):
+    cache = TTLCache(ttl=10, clock=clock)
+    loader = MagicMock(side_effect=["old", "new"])
+
+    cache.get_or_load("key", loader)
+    clock.now = 10.5
+
+    assert cache.get_or_load("key", loader) == "new"
+
+def test_ttl_of_shortens_entry_lifetime(clock):
+    cache = TTLCache(ttl=10, clock=clock)
+
+    cache.get_or_load("short", lambda: 3, ttl_of=lambda value: value)
+    cache.get_or_load("long", lambda: 60, ttl_of=lambda value: value)  # Still capped by ttl
+    cache.get_or_load("gone", lambda: -1, ttl_of=lambda value: value)
+    clock.now = 5
+
+    assert cache.get("short") is None and cache.get("long") == 60 and cache.get("gone") is None
+    clock.now = 10.5
+    assert cache.get("long") is None
+
+def test_get_does_not_load_or_count_misses(clock):
+    cache = TTLCache(clock=clock)
+
+    assert cache.get("key") is None
+    cache.get_or_load("key", lambda: "value")
+
+    assert cache.get("key") == "value"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_none_is_not_cached(clock):
+    cache = TTLCache(clock=clock)
+    loader = MagicMock(return_value=None)
+
+    cache.get_or_load("key", loader)
+    cache.get_or_load("key", loader)
+
+    assert loader.call_count == 2
+
+def test_least_recently_used_is_evicted(clock):
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.get_or_load("a", lambda: 1)
+    cache.get_or_load("b", lambda: 2)
+    cache.get_or_load("a", lambda: 1)  # "b" is now least recently used
+    cache.get_or_load("c", lambda: 3)
+
+    loader = MagicMock(return_value=2)
+    cache.get_or_load("b", loader)
+    loader.assert_called_once()
+    assert cache.stats()["evictions"] == 2
+
+def test_invalidate(clock):
+    cache = TTLCache(clock=clock)
+    cache.get_or_load("key", lambda: "old")
+
+    cache.invalidate("key")
+
+    assert cache.get_or_load("key", lambda: "new") == "new"
+
+def test_invalidate_where(clock):
+    cache = TTLCache(clock=clock)
+    cache.get_or_load(("id", 1), lambda: {"id": 1})
+    cache.get_or_load(("username", "alice"), lambda: {"id": 1})
+    cache.get_or_load(("id", 2), lambda: {"id": 2})
+
+    cache.invalidate_where(lambda key, value: value["id"] == 1)
+
+    assert cache.stats()["size"] == 1
+
+def test_concurrent_misses_load_once():
+    cache = TTLCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_load("key", loader)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_load("key", loader))) for _ in range(5)]
+    for follower in followers:
+        follower.start()
+    while cache.stats()["coalesced"] < 5:
+        pass
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == ["value"] * 6
+
+def test_loader_error_reaches_waiters_and_is_not_cached(clock):
+    cache = TTLCache(clock=clock)
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("key", MagicMock(side_effect=RuntimeError("db down")))
+
+    assert cache.get_or_load("key", lambda: "value") == "value"
+
+def test_invalidation_during_load_discards_result(clock):
+    cache = TTLCache(clock=clock)
+
+    def loader():
+        cache.invalidate("key")  # A write lands while the read is in flight
+        return "stale"
+
+    assert cache.get_or_load("key", loader) == "stale"
+    assert cache.get_or_load("key", lambda: "fresh") == "fresh"
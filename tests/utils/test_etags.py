@@ -0,0 +1,29 @@
+import pytest
+
+from app.utils.etags import make_etag, etag_matches, if_match_versions, version_etag
+
+
+def test_make_etag_is_weak_and_stable():
+    etag = make_etag(3, "/api/tasks/", [("status", "todo")])
+    assert etag.startswith('W/"')
+    assert etag == make_etag(3, "/api/tasks/", [("status", "todo")])
+    assert etag != make_etag(4, "/api/tasks/", [("status", "todo")])
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    ("*", True),
+    ('W/"abc"', True),
+    ('"abc"', True),
+    ('"xyz", W/"abc"', True),
+    ('W/"xyz"', False),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(header, 'W/"abc"') is expected
+
+def test_if_match_versions():
+    assert if_match_versions(None) is None
+    assert if_match_versions(" * ") is None
+    assert if_match_versions('"3", "4"') == [3, 4]
+    assert if_match_versions('W/"3", "x", 3') == []  # Weak or malformed tags never match
+    assert if_match_versions(version_etag(7)) == [7]
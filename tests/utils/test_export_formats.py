@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from app.utils.export_formats import ndjson_chunks, csv_chunks
+
+BATCHES = [
+    [{"id": 1, "title": "One", "created_at": datetime(2024, 1, 1)}],
+    [{"id": 2, "title": "Two, with comma", "created_at": datetime(2024, 1, 2)}],
+]
+
+
+def test_ndjson_chunks_one_line_per_row():
+    chunks = list(ndjson_chunks(BATCHES))
+    assert chunks == [
+        b'{"id":1,"title":"One","created_at":"2024-01-01T00:00:00"}\n',
+        b'{"id":2,"title":"Two, with comma","created_at":"2024-01-02T00:00:00"}\n',
+    ]
+
+def test_csv_chunks_header_then_rows():
+    chunks = list(csv_chunks(BATCHES, ["id", "title", "created_at"]))
+    assert chunks[0] == b'id,title,created_at\n1,One,2024-01-01 00:00:00\n'
+    assert chunks[1] == b'2,"Two, with comma",2024-01-02 00:00:00\n'
+
+def test_csv_chunks_header_only_when_empty():
+    assert list(csv_chunks([], ["id", "title"])) == [b'id,title\n']
@@ -0,0 +1,17 @@
+import pytest
+
+from app.utils.fieldsets import parse_fields
+
+ALLOWED = ("id", "title", "description", "status")
+
+
+def test_parse_fields_none():
+    assert parse_fields(None, ALLOWED) is None
+
+def test_parse_fields_strips_and_dedupes():
+    assert parse_fields(" id,title , id,status", ALLOWED) == ("id", "title", "status")
+
+@pytest.mark.parametrize("fields", ["id,password", "", " , "])
+def test_parse_fields_rejects_unknown_or_empty(fields):
+    with pytest.raises(ValueError):
+        parse_fields(fields, ALLOWED)
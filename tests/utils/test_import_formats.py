@@ -0,0 +1,17 @@
+import io
+
+from app.utils.import_formats import csv_records, ndjson_records
+
+
+def test_ndjson_records_numbered_by_line():
+    stream = io.BytesIO(b'{"title": "One"}\n\n[1, 2]\nnot json\n{"title": "Two"}\n')
+
+    assert list(ndjson_records(stream)) == [(1, {"title": "One"}), (3, None), (4, None), (5, {"title": "Two"})]
+
+def test_csv_records_drop_empty_and_extra_cells():
+    stream = io.BytesIO(b'title,description,status\nOne,,done\n"Two, quoted","multi\nline",todo,extra\n')
+
+    assert list(csv_records(stream)) == [
+        (1, {"title": "One", "status": "done"}),
+        (2, {"title": "Two, quoted", "description": "multi\nline", "status": "todo"}),
+    ]
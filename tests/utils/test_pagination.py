@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pytest
+
+from app.utils.pagination import (encode_cursor, decode_cursor, encode_rank_cursor, decode_rank_cursor,
+                                  encode_column_cursor, decode_column_cursor)
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 17, 12, 30, 45, 123456)
+    cursor = encode_cursor(created_at, 42)
+
+    assert decode_cursor(cursor) == (created_at, 42)
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(datetime(2024, 5, 17), 1)
+
+    assert "=" not in cursor
+    assert "+" not in cursor and "/" not in cursor
+
+@pytest.mark.parametrize("cursor", ["garbage", "", encode_cursor(datetime(2024, 1, 1), 1)[:-3], "WzEsMiwzXQ"])
+def test_decode_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_rank_cursor_round_trip():
+    assert decode_rank_cursor(encode_rank_cursor(0.0607927143573761, 7)) == (0.0607927143573761, 7)
+
+def test_decode_invalid_rank_cursor():
+    with pytest.raises(ValueError):
+        decode_rank_cursor(encode_cursor(datetime(2024, 1, 1), 1))
+
+@pytest.mark.parametrize("rank", ["V", None])
+def test_column_cursor_round_trip(rank):
+    created_at = datetime(2024, 5, 17, 12, 30)
+
+    assert decode_column_cursor(encode_column_cursor(rank, created_at, 7)) == (rank, created_at, 7)
+
+@pytest.mark.parametrize("cursor", [encode_cursor(datetime(2024, 1, 1), 1), encode_rank_cursor(0.5, 1), "WzEsIjIwMjQtMDEtMDEiLDFd"])
+def test_decode_invalid_column_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_column_cursor(cursor)
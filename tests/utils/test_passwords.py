@@ -0,0 +1,124 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import MagicMock, patch
+
+import pytest
+from argon2 import PasswordHasher
+
+from app.utils.passwords import (PasswordPool, PasswordPoolBusy, PasswordRehasher, calibrate, hash_password, main,
+                                 needs_rehash, verify_password)
+
+
+class HeldExecutor(ThreadPoolExecutor):
+    """Thread pool standing in for the process pool, whose calls wait until released."""
+
+    def __init__(self, workers: int):
+        super().__init__(max_workers=workers)
+        self.release = threading.Event()
+
+    def submit(self, fn, *args):
+        return super().submit(self._held, fn, *args)
+
+    def _held(self, fn, *args):
+        self.release.wait(5)
+        return fn(*args)
+
+
+def test_verify_password():
+    password_hash = hash_password("Password1234!")
+
+    assert verify_password(password_hash, "Password1234!") is True
+    assert verify_password(password_hash, "wrong") is False
+    assert verify_password("not an argon2 hash", "Password1234!") is False
+
+def test_inline_pool_runs_on_calling_thread():
+    pool = PasswordPool(workers=0)
+
+    password_hash = pool.hash("Password1234!")
+
+    assert pool.verify(password_hash, "Password1234!") and not pool.verify(password_hash, "wrong")
+    assert pool.stats()["submitted"] == 3 and pool.stats()["pending"] == 0
+
+def test_saturated_pool_rejects_at_once():
+    executors = []
+    pool = PasswordPool(workers=1, max_pending=2, executor_factory=lambda n: executors.append(HeldExecutor(n))
+                        or executors[-1])
+
+    futures = [pool._call(hash_password, "a"), pool._call(hash_password, "b")]
+    with pytest.raises(PasswordPoolBusy):
+        pool.hash("c")
+    stats = pool.stats()
+    executors[0].release.set()
+
+    assert all(verify_password(future.result(5), password) for future, password in zip(futures, "ab"))
+    assert stats["pending"] == 2 and stats["rejected"] == 1
+    assert pool.stats()["pending"] == 0 and pool.stats()["max_seen"] == 2
+    pool.close()
+
+def test_async_calls_leave_the_event_loop_free():
+    executors = []
+    pool = PasswordPool(workers=1, max_pending=4, executor_factory=lambda n: executors.append(HeldExecutor(n))
+                        or executors[-1])
+
+    async def login():
+        verified = asyncio.ensure_future(pool.verify_async(hash_password("secret"), "secret"))
+        await asyncio.sleep(0.01)
+        assert not verified.done()  # Waiting on the pool, while the loop keeps running
+        executors[0].release.set()
+        return await verified
+
+    assert asyncio.run(login()) is True
+    pool.close()
+
+def test_broken_pool_is_replaced():
+    broken = MagicMock()
+    broken.submit.side_effect = BrokenProcessPool("worker died")
+    executors = [broken, HeldExecutor(1)]
+    executors[1].release.set()
+    pool = PasswordPool(workers=1, executor_factory=lambda n: executors.pop(0))
+
+    assert verify_password(pool.hash("secret"), "secret")
+    broken.shutdown.assert_called_once()
+    assert pool.stats()["pending"] == 0
+    pool.close()
+
+def test_needs_rehash_compares_with_configured_parameters():
+    assert needs_rehash(hash_password("secret")) is False
+    assert needs_rehash(PasswordHasher(time_cost=1, memory_cost=8, parallelism=1).hash("secret")) is True
+    assert needs_rehash("not an argon2 hash") is False
+
+def test_calibrate_spends_memory_before_passes():
+    # Pretend a verification costs 1 ms per pass per MiB
+    measure = lambda time_cost, memory_cost, parallelism: time_cost * memory_cost / 1024 / 1000
+
+    assert calibrate(0.05, 64 * 1024, measure=measure) == (1, 32 * 1024, 0.032)  # 64 MiB misses, 32 fits once
+    assert calibrate(0.2, 64 * 1024, measure=measure) == (3, 64 * 1024, 0.192)
+    assert calibrate(0.001, 64 * 1024, measure=measure)[:2] == (1, 19 * 1024)  # Never below the floor
+
+def test_calibrate_command_prints_settings(capsys):
+    with patch('app.utils.passwords.calibrate', return_value=(3, 32768, 0.041)) as mock_calibrate, \
+            patch('app.utils.passwords.verify_seconds', return_value=0.29):
+        assert main(["calibrate", "--target-ms", "50", "--max-memory-mib", "32"]) == 0
+
+    mock_calibrate.assert_called_once_with(0.05, 32768, 1)
+    output = capsys.readouterr().out
+    assert "Calibrated: t=3, m=32768 KiB, p=1: 41.0 ms per verification" in output
+    assert "ARGON2_TIME_COST=3\nARGON2_MEMORY_COST=32768\nARGON2_PARALLELISM=1" in output
+
+def test_rehasher_stores_new_hash():
+    store = MagicMock(side_effect=[True, False])
+    rehasher = PasswordRehasher(store, PasswordPool(workers=0), max_pending=1)
+    rehasher._thread = MagicMock(is_alive=lambda: True)  # Run the queue on this thread instead
+
+    assert rehasher.request(1, "old", "secret")
+    assert rehasher.request(1, "old", "secret")  # Already queued, replaces the request
+    assert not rehasher.request(2, "old", "secret")  # Over max_pending, asked again at the next login
+    rehasher.run_pending()
+    rehasher.request(3, "old", "secret")
+    rehasher.run_pending()
+
+    user_id, old_hash, new_hash = store.call_args_list[0].args
+    assert (user_id, old_hash) == (1, "old") and verify_password(new_hash, "secret")
+    assert rehasher.stats() == {"rehashed": 1, "skipped": 2, "failures": 0, "pending": 0}
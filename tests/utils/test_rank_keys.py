@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from app.utils.ranks import RANK_DIGITS, rank_between, spread_ranks
+
+
+def test_digits_sort_like_their_values():
+    assert list(RANK_DIGITS) == sorted(RANK_DIGITS)
+
+@pytest.mark.parametrize("before, after", [(None, None), (None, "V"), ("V", None), ("1", "2"), ("A", "A1"), ("z", None),
+                                           (None, "01"), ("Vz", "W")])
+def test_rank_between_sorts_between_bounds(before, after):
+    rank = rank_between(before, after)
+
+    assert before is None or before < rank
+    assert after is None or rank < after
+    assert not rank.endswith("0")  # There is always room below a rank
+
+@pytest.mark.parametrize("before, after", [("V", "V"), ("W", "V")])
+def test_rank_between_rejects_empty_gap(before, after):
+    with pytest.raises(ValueError):
+        rank_between(before, after)
+
+def test_repeated_moves_keep_order():
+    rng = random.Random(7)
+    ranks = []
+    for _ in range(2000):
+        position = rng.randint(0, len(ranks))
+        before = ranks[position - 1] if position else None
+        after = ranks[position] if position < len(ranks) else None
+        ranks.insert(position, rank_between(before, after))
+
+    assert ranks == sorted(ranks)
+    assert len(set(ranks)) == len(ranks)
+
+def test_splitting_one_gap_grows_slowly():
+    rank = "W"
+    for _ in range(100):
+        rank = rank_between("V", rank)
+
+    assert len(rank) <= 20
+
+def test_spread_ranks_are_short_and_ordered():
+    ranks = spread_ranks(3000)
+
+    assert ranks == sorted(ranks) and len(set(ranks)) == 3000
+    assert max(map(len, ranks)) == 3
+    assert spread_ranks(0) == []
+    assert all("V" < rank < "W" for rank in spread_ranks(10, "V", "W"))
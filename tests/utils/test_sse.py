@@ -0,0 +1,10 @@
+from app.utils.sse import format_sse
+
+
+def test_format_sse_with_resume_id():
+    event = {"seq": 4, "op": "update", "id": 2, "task": {"id": 2, "title": "Two"}}
+    assert format_sse(event) == (b'id: 4\nevent: update\n'
+                                 b'data: {"seq":4,"op":"update","id":2,"task":{"id":2,"title":"Two"}}\n\n')
+
+def test_format_sse_reset_has_no_id():
+    assert format_sse({"op": "reset"}) == b'event: reset\ndata: {"op":"reset"}\n\n'